@@ -1,12 +1,147 @@
+import asyncio
 import hashlib
 import json
+import logging
+import math
+import os
+import threading
+import time
+import weakref
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
 from functools import wraps
-from typing import Callable
+from typing import Any, Awaitable, Callable, Dict, Optional, Tuple
 
-from django.core.cache import cache
+from django.conf import settings
+from django.core.cache import caches
+from django.core.cache.backends.dummy import DummyCache
+from django.core.cache.backends.locmem import LocMemCache
+from django.core.exceptions import ImproperlyConfigured
+
+logger = logging.getLogger(__name__)
+
+# (value, fresh until, stale until) as stored in both tiers
+Entry = Tuple[Any, float, float]
+
+# Seconds between checks while another process loads a value
+_WAIT_INTERVAL = 0.05
+
+# Every cache in the process, for ``cache_metrics``
+_instances = weakref.WeakSet()
+
+_refresh_executor: Optional[ThreadPoolExecutor] = None
+_refresh_executor_pid = None
+_refresh_executor_lock = threading.Lock()
+
+
+def _refresh_pool() -> ThreadPoolExecutor:
+    """Executor for stale-while-revalidate refreshes, rebuilt after a fork"""
+    global _refresh_executor, _refresh_executor_pid
+    if _refresh_executor is None or _refresh_executor_pid != os.getpid():
+        with _refresh_executor_lock:
+            if _refresh_executor is None or _refresh_executor_pid != os.getpid():
+                _refresh_executor = ThreadPoolExecutor(
+                    max_workers=getattr(settings, "CACHE_REFRESH_WORKERS", 2),
+                    thread_name_prefix="cache-refresh",
+                )
+                _refresh_executor_pid = os.getpid()
+    return _refresh_executor
+
+
+def is_shared(backend: Optional[str] = "default") -> bool:
+    """Whether a Django cache alias is shared between processes, rather than local memory or a dummy cache"""
+    if backend is None:
+        return False
+    return not isinstance(caches[backend], (LocMemCache, DummyCache))
+
+
+def cache_metrics() -> Dict[str, Dict[str, int]]:
+    """Metrics of every cache in this process by namespace"""
+    return {cache.namespace: cache.metrics() for cache in list(_instances)}
+
+
+class LRUCache:
+    """Bounded, thread-safe mapping that evicts the least recently used key"""
+
+    def __init__(self, max_entries: int):
+        self.max_entries = max_entries
+        self.evictions = 0
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key, default=None):
+        with self._lock:
+            value = self._data.get(key, default)
+            if key in self._data:
+                self._data.move_to_end(key)
+            return value
+
+    def set(self, key, value):
+        with self._lock:
+            self._data[key] = value
+            self._data.move_to_end(key)
+            while len(self._data) > self.max_entries:
+                self._data.popitem(last=False)
+                self.evictions += 1
+
+    def delete(self, key):
+        with self._lock:
+            self._data.pop(key, None)
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+    def __len__(self):
+        return len(self._data)
 
 
 class CacheService:
+    """
+    Two-tier cache: a bounded LRU in each process (L1) in front of the shared
+    Django cache (L2), which is Redis when ``REDIS_URL`` is set.
+
+    Entries are fresh for ``ttl`` seconds and may then be served stale for
+    ``stale_ttl`` more seconds while ``get_or_set`` refreshes them in the
+    background. On a miss only one caller per key runs the loader, guarded
+    by a lock in the process and a lock key in L2 across processes; the
+    others wait for its result. L1 keeps entries for at most ``l1_ttl``
+    seconds, which bounds how long another process's ``delete`` takes to
+    be seen. Values are returned by reference from L1, so callers must not
+    mutate them. An unreachable L2 is logged and skipped.
+    """
+
+    def __init__(
+        self,
+        namespace: str,
+        ttl: float = 300,
+        stale_ttl: float = 0,
+        max_entries: Optional[int] = None,
+        l1_ttl: Optional[float] = None,
+        backend: Optional[str] = "default",
+        lock_timeout: Optional[float] = None,
+    ):
+        self.namespace = namespace
+        self.ttl = ttl
+        self.stale_ttl = stale_ttl
+        self.l1_ttl = l1_ttl
+        # Django cache alias of L2; None keeps entries in L1 only
+        self.backend = backend
+        self.lock_timeout = lock_timeout or getattr(settings, "CACHE_LOCK_TIMEOUT", 30)
+        self._l1 = LRUCache(max_entries or getattr(settings, "CACHE_L1_MAX_ENTRIES", 1024))
+        self._locks: Dict[str, list] = {}
+        self._locks_lock = threading.Lock()
+        self._refreshing = set()
+        self._inflight: Dict[tuple, asyncio.Task] = {}
+        # Generations by scope, used when L2 is disabled or unreachable
+        self._generations: Dict[str, int] = {}
+        self._stats = dict.fromkeys(
+            ("l1_hits", "l2_hits", "stale_hits", "misses", "coalesced", "loads", "load_errors", "l2_errors"), 0
+        )
+        self._stats_lock = threading.Lock()
+        _instances.add(self)
+
     @staticmethod
     def cache_key(prefix: str, *args, **kwargs) -> str:
         """Generate a unique cache key based on arguments"""
@@ -15,30 +150,359 @@ class CacheService:
         return f"{prefix}:{hashlib.md5(key_str.encode()).hexdigest()}"
 
     @staticmethod
-    def cache_decorator(prefix: str, timeout: int = 3600):
+    def cache_decorator(prefix: str, timeout: int = 3600, stale_ttl: float = 0):
+        """Cache the results of a function, sync or async, by its arguments"""
         def decorator(func: Callable):
-            @wraps(func)
-            async def wrapper(*args, **kwargs):
-                # Generate cache key
-                cache_key = CacheService.cache_key(prefix, *args, **kwargs)
+            cache = CacheService(prefix, ttl=timeout, stale_ttl=stale_ttl)
+
+            if asyncio.iscoroutinefunction(func):
+                @wraps(func)
+                async def async_wrapper(*args, **kwargs):
+                    key = CacheService.cache_key(func.__qualname__, *args, **kwargs)
+                    return await cache.aget_or_set(key, lambda: func(*args, **kwargs))
 
-                # Try to get from cache
-                cached_result = cache.get(cache_key)
-                if cached_result is not None:
-                    return cached_result
+                async_wrapper.cache = cache
+                return async_wrapper
 
-                # Execute function and cache result
-                result = await func(*args, **kwargs)
-                cache.set(cache_key, result, timeout)
-                return result
+            @wraps(func)
+            def wrapper(*args, **kwargs):
+                key = CacheService.cache_key(func.__qualname__, *args, **kwargs)
+                return cache.get_or_set(key, lambda: func(*args, **kwargs))
 
+            wrapper.cache = cache
             return wrapper
 
         return decorator
 
+    # Bookkeeping
+
+    def _count(self, name: str, amount: int = 1):
+        with self._stats_lock:
+            self._stats[name] += amount
+
+    def metrics(self) -> Dict[str, int]:
+        """Hit, miss and load counters of this cache in this process"""
+        with self._stats_lock:
+            metrics = dict(self._stats)
+        lookups = metrics["l1_hits"] + metrics["l2_hits"] + metrics["stale_hits"] + metrics["misses"]
+        metrics["hit_rate"] = round((lookups - metrics["misses"]) / lookups, 4) if lookups else 0.0
+        metrics["l1_entries"] = len(self._l1)
+        metrics["l1_evictions"] = self._l1.evictions
+        return metrics
+
+    def _key(self, key: str) -> str:
+        return f"{self.namespace}:{key}"
+
+    def _entry(self, value, ttl: Optional[float], stale_ttl: Optional[float]) -> Entry:
+        now = time.time()
+        fresh_until = now + (self.ttl if ttl is None else ttl)
+        return value, fresh_until, fresh_until + (self.stale_ttl if stale_ttl is None else stale_ttl)
+
+    def _l1_set(self, key: str, entry: Entry):
+        expires = entry[2] if self.l1_ttl is None else min(entry[2], time.time() + self.l1_ttl)
+        self._l1.set(key, (entry, expires))
+
+    def _l1_get(self, key: str) -> Optional[Entry]:
+        cached = self._l1.get(key)
+        if cached is None:
+            return None
+        entry, expires = cached
+        if time.time() >= expires:
+            self._l1.delete(key)
+            return None
+        return entry
+
+    @staticmethod
+    def _l2_timeout(entry: Entry) -> int:
+        return max(1, math.ceil(entry[2] - time.time()))
+
+    def _l2_call(self, method: str, *args, default=None):
+        if self.backend is None:
+            return default
+        try:
+            return getattr(caches[self.backend], method)(*args)
+        except Exception as e:
+            self._count("l2_errors")
+            logger.warning(f"Cache {self.namespace}: L2 {method} failed: {str(e)}")
+            return default
+
+    async def _al2_call(self, method: str, *args, default=None):
+        if self.backend is None:
+            return default
+        try:
+            return await getattr(caches[self.backend], f"a{method}")(*args)
+        except Exception as e:
+            self._count("l2_errors")
+            logger.warning(f"Cache {self.namespace}: L2 {method} failed: {str(e)}")
+            return default
+
+    def _classify(self, entry: Optional[Entry], tier: str) -> Optional[str]:
+        """Count a lookup; returns "fresh", "stale" or None for a miss"""
+        now = time.time()
+        if entry is not None and now < entry[1]:
+            self._count(f"{tier}_hits")
+            return "fresh"
+        if entry is not None and now < entry[2]:
+            self._count("stale_hits")
+            return "stale"
+        self._count("misses")
+        return None
+
+    # Synchronous API
+
+    def _lookup(self, key: str) -> Tuple[Optional[Entry], str]:
+        entry = self._l1_get(key)
+        if entry is not None:
+            return entry, "l1"
+        entry = self._l2_call("get", self._key(key))
+        if entry is not None:
+            self._l1_set(key, entry)
+        return entry, "l2"
+
+    def get(self, key: str, default=None):
+        """The fresh value of ``key``, or ``default``"""
+        entry, tier = self._lookup(key)
+        return entry[0] if self._classify(entry, tier) == "fresh" else default
+
+    def set(self, key: str, value, ttl: Optional[float] = None, stale_ttl: Optional[float] = None):
+        entry = self._entry(value, ttl, stale_ttl)
+        self._l1_set(key, entry)
+        self._l2_call("set", self._key(key), entry, self._l2_timeout(entry))
+
+    def delete(self, key: str):
+        self._l1.delete(key)
+        self._l2_call("delete", self._key(key))
+
+    def clear_local(self):
+        """Drop this process's L1 entries; L2 entries expire on their own"""
+        self._l1.clear()
+
+    def get_or_set(
+        self,
+        key: str,
+        loader: Callable[[], Any],
+        ttl: Optional[float] = None,
+        stale_ttl: Optional[float] = None,
+    ):
+        """
+        The cached value of ``key``, loading it with ``loader`` on a miss.
+        A stale value is returned as is while it is refreshed in the
+        background. Exceptions of the loader propagate and nothing is cached.
+        """
+        entry, tier = self._lookup(key)
+        state = self._classify(entry, tier)
+        if state == "fresh":
+            return entry[0]
+        if state == "stale":
+            self._refresh_in_background(key, loader, ttl, stale_ttl)
+            return entry[0]
+        return self._load(key, loader, ttl, stale_ttl)
+
+    @contextmanager
+    def _key_lock(self, key: str):
+        with self._locks_lock:
+            holder = self._locks.setdefault(key, [threading.Lock(), 0])
+            holder[1] += 1
+        try:
+            with holder[0]:
+                yield
+        finally:
+            with self._locks_lock:
+                holder[1] -= 1
+                if not holder[1]:
+                    self._locks.pop(key, None)
+
+    def _fresh(self, key: str) -> Optional[Entry]:
+        entry, _ = self._lookup(key)
+        return entry if entry is not None and time.time() < entry[1] else None
+
+    def _load(self, key: str, loader, ttl, stale_ttl):
+        with self._key_lock(key):
+            # Another thread may have loaded the value while this one waited
+            entry = self._l1_get(key)
+            if entry is not None and time.time() < entry[1]:
+                self._count("coalesced")
+                return entry[0]
+
+            lock_key = self._key(f"{key}:lock")
+            locked = self._l2_call("add", lock_key, os.getpid(), math.ceil(self.lock_timeout), default=True)
+            if not locked:
+                # Another process is loading the value; wait for it within the lock timeout
+                deadline = time.monotonic() + self.lock_timeout
+                while time.monotonic() < deadline:
+                    time.sleep(_WAIT_INTERVAL)
+                    entry = self._fresh(key)
+                    if entry is not None:
+                        self._count("coalesced")
+                        return entry[0]
+                    if self._l2_call("get", lock_key) is None:
+                        break
+            try:
+                return self._run_loader(key, loader, ttl, stale_ttl)
+            finally:
+                if self.backend is not None:
+                    self._l2_call("delete", lock_key)
+
+    def _run_loader(self, key: str, loader, ttl, stale_ttl):
+        self._count("loads")
+        try:
+            value = loader()
+        except Exception:
+            self._count("load_errors")
+            raise
+        self.set(key, value, ttl, stale_ttl)
+        return value
+
+    def _refresh_in_background(self, key: str, loader, ttl, stale_ttl):
+        with self._locks_lock:
+            if key in self._refreshing:
+                return
+            self._refreshing.add(key)
+
+        def refresh():
+            lock_key = self._key(f"{key}:lock")
+            try:
+                # Another process already refreshing this key is enough
+                if not self._l2_call("add", lock_key, os.getpid(), math.ceil(self.lock_timeout), default=True):
+                    return
+                try:
+                    self._run_loader(key, loader, ttl, stale_ttl)
+                finally:
+                    if self.backend is not None:
+                        self._l2_call("delete", lock_key)
+            except Exception as e:
+                logger.warning(f"Cache {self.namespace}: refreshing {key} failed, serving stale value: {str(e)}")
+            finally:
+                with self._locks_lock:
+                    self._refreshing.discard(key)
+
+        _refresh_pool().submit(refresh)
+
+    # Versioned invalidation
+
+    def _generation_key(self, scope) -> str:
+        if self.backend is not None and not is_shared(self.backend):
+            # A bump would only reach this process while other processes kept
+            # serving entries of the old generation
+            raise ImproperlyConfigured(
+                f"Cache {self.namespace}: generations need an L2 shared between processes (set REDIS_URL), "
+                f"or backend=None to keep them explicitly in this process"
+            )
+        return self._key(f"generation:{scope}")
+
+    def generation(self, scope) -> int:
+        """
+        Current generation of ``scope``. Keys that include it are all
+        invalidated at once by ``bump_generation``, without finding or
+        deleting them; the old entries age out of both tiers. Needs a
+        shared L2, or ``backend=None`` for generations local to the process.
+        """
+        key = self._generation_key(scope)
+        generation = self._l2_call("get", key)
+        if generation is None and self.backend is not None:
+            # Generations start from the clock, so one lost from L2 is never reused
+            self._l2_call("add", key, time.time_ns(), None)
+            generation = self._l2_call("get", key)
+        if generation is None:
+            with self._stats_lock:
+                generation = self._generations.setdefault(key, time.time_ns())
+        return generation
+
+    def bump_generation(self, scope):
+        """Invalidate every key built with the current generation of ``scope``"""
+        key = self._generation_key(scope)
+        with self._stats_lock:
+            self._generations[key] = max(self._generations.get(key, 0) + 1, time.time_ns())
+        if self.backend is None:
+            return
+        try:
+            caches[self.backend].incr(key)
+        except ValueError:
+            # Not in L2 yet, or evicted
+            self._l2_call("add", key, time.time_ns(), None)
+        except Exception as e:
+            self._count("l2_errors")
+            logger.warning(f"Cache {self.namespace}: L2 incr failed: {str(e)}")
+
+    # Asynchronous API
+
+    async def _alookup(self, key: str) -> Tuple[Optional[Entry], str]:
+        entry = self._l1_get(key)
+        if entry is not None:
+            return entry, "l1"
+        entry = await self._al2_call("get", self._key(key))
+        if entry is not None:
+            self._l1_set(key, entry)
+        return entry, "l2"
+
+    async def aget(self, key: str, default=None):
+        entry, tier = await self._alookup(key)
+        return entry[0] if self._classify(entry, tier) == "fresh" else default
+
+    async def aset(self, key: str, value, ttl: Optional[float] = None, stale_ttl: Optional[float] = None):
+        entry = self._entry(value, ttl, stale_ttl)
+        self._l1_set(key, entry)
+        await self._al2_call("set", self._key(key), entry, self._l2_timeout(entry))
+
+    async def adelete(self, key: str):
+        self._l1.delete(key)
+        await self._al2_call("delete", self._key(key))
+
+    async def aget_or_set(
+        self,
+        key: str,
+        loader: Callable[[], Awaitable[Any]],
+        ttl: Optional[float] = None,
+        stale_ttl: Optional[float] = None,
+    ):
+        """``get_or_set`` for coroutines: ``loader`` returns an awaitable"""
+        entry, tier = await self._alookup(key)
+        state = self._classify(entry, tier)
+        if state == "fresh":
+            return entry[0]
+
+        # One load per key and event loop; concurrent callers await the same task.
+        # Background refreshes are tracked apart since they give up on contention
+        inflight_key = (id(asyncio.get_running_loop()), key, state is None)
+        task = self._inflight.get(inflight_key)
+        if task is None:
+            task = asyncio.ensure_future(self._aload(key, loader, ttl, stale_ttl, wait=state is None))
+            self._inflight[inflight_key] = task
+            task.add_done_callback(lambda _: self._inflight.pop(inflight_key, None))
+        elif state is None:
+            self._count("coalesced")
+
+        if state == "stale":
+            return entry[0]
+        return await asyncio.shield(task)
 
-# Usage example in prompt service:
-@CacheService.cache_decorator("prompt_template", timeout=3600)
-async def get_prompt_template(style: str = "") -> str:
-    # Your existing code here
-    pass
+    async def _aload(self, key: str, loader, ttl, stale_ttl, wait: bool):
+        lock_key = self._key(f"{key}:lock")
+        locked = await self._al2_call("add", lock_key, os.getpid(), math.ceil(self.lock_timeout), default=True)
+        if not locked:
+            if not wait:
+                return None
+            deadline = time.monotonic() + self.lock_timeout
+            while time.monotonic() < deadline:
+                await asyncio.sleep(_WAIT_INTERVAL)
+                entry, _ = await self._alookup(key)
+                if entry is not None and time.time() < entry[1]:
+                    self._count("coalesced")
+                    return entry[0]
+                if await self._al2_call("get", lock_key) is None:
+                    break
+        try:
+            self._count("loads")
+            try:
+                value = await loader()
+            except Exception as e:
+                self._count("load_errors")
+                if wait:
+                    raise
+                logger.warning(f"Cache {self.namespace}: refreshing {key} failed, serving stale value: {str(e)}")
+                return None
+            await self.aset(key, value, ttl, stale_ttl)
+            return value
+        finally:
+            if self.backend is not None:
+                await self._al2_call("delete", lock_key)
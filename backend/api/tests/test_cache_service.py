@@ -0,0 +1,181 @@
+import asyncio
+import threading
+import time
+
+import pytest
+from django.core.cache import caches
+from django.core.exceptions import ImproperlyConfigured
+
+from api.services.cache_service import CacheService, LRUCache, cache_metrics, is_shared
+
+
+@pytest.fixture(autouse=True)
+def clear_shared_cache():
+    caches["default"].clear()
+    yield
+    caches["default"].clear()
+
+
+def wait_for(condition, timeout=2.0):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if condition():
+            return True
+        time.sleep(0.01)
+    return False
+
+
+def test_lru_evicts_least_recently_used_key():
+    lru = LRUCache(2)
+    lru.set("a", 1)
+    lru.set("b", 2)
+    lru.get("a")
+    lru.set("c", 3)
+
+    assert lru.get("a") == 1
+    assert lru.get("b") is None
+    assert lru.get("c") == 3
+    assert lru.evictions == 1
+
+
+def test_entries_expire_after_ttl():
+    cache = CacheService("test_ttl", ttl=0.05, backend=None)
+    cache.set("key", "value")
+
+    assert cache.get("key") == "value"
+    time.sleep(0.1)
+    assert cache.get("key", "missing") == "missing"
+
+
+def test_second_process_reads_from_the_shared_tier():
+    writer = CacheService("test_shared")
+    reader = CacheService("test_shared")
+    writer.set("key", {"answer": 42})
+
+    assert reader.get("key") == {"answer": 42}
+    assert reader.metrics()["l2_hits"] == 1
+
+    writer.delete("key")
+    reader.clear_local()
+    assert reader.get("key") is None
+
+
+def test_bumped_generation_is_seen_by_every_instance(settings, tmp_path):
+    settings.CACHES = {
+        **settings.CACHES,
+        "shared": {"BACKEND": "django.core.cache.backends.filebased.FileBasedCache", "LOCATION": str(tmp_path)},
+    }
+    first = CacheService("test_generation", backend="shared")
+    second = CacheService("test_generation", backend="shared")
+    local = CacheService("test_generation_local", backend=None)
+    assert is_shared("shared") and not is_shared("default")
+
+    generation = first.generation("user:1")
+    assert second.generation("user:1") == generation
+    assert local.generation("user:1") == local.generation("user:1")
+
+    second.bump_generation("user:1")
+    assert first.generation("user:1") > generation
+    assert first.generation("user:2") == second.generation("user:2")
+
+    before = local.generation("user:1")
+    local.bump_generation("user:1")
+    assert local.generation("user:1") > before
+
+
+def test_generations_refuse_a_cache_local_to_the_process():
+    cache = CacheService("test_generation_locmem")
+
+    with pytest.raises(ImproperlyConfigured):
+        cache.generation("user:1")
+    with pytest.raises(ImproperlyConfigured):
+        cache.bump_generation("user:1")
+
+
+def test_get_or_set_loads_once_and_does_not_cache_errors():
+    cache = CacheService("test_load", backend=None)
+    calls = []
+
+    def failing():
+        calls.append("fail")
+        raise RuntimeError("unreachable")
+
+    with pytest.raises(RuntimeError):
+        cache.get_or_set("key", failing)
+
+    assert cache.get_or_set("key", lambda: calls.append("load") or "value") == "value"
+    assert cache.get_or_set("key", lambda: calls.append("load") or "other") == "value"
+    assert calls == ["fail", "load"]
+    assert cache.metrics()["load_errors"] == 1
+
+
+def test_concurrent_misses_run_the_loader_once():
+    cache = CacheService("test_stampede")
+    calls = []
+    results = []
+
+    def loader():
+        calls.append(1)
+        time.sleep(0.1)
+        return "value"
+
+    threads = [
+        threading.Thread(target=lambda: results.append(cache.get_or_set("key", loader)))
+        for _ in range(8)
+    ]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert results == ["value"] * 8
+    assert len(calls) == 1
+    assert cache.metrics()["coalesced"] == 7
+
+
+def test_stale_value_is_served_while_refreshing():
+    cache = CacheService("test_stale", ttl=0.05, stale_ttl=60)
+    cache.set("key", "old")
+    time.sleep(0.1)
+
+    assert cache.get("key") is None
+    assert cache.get_or_set("key", lambda: "new") == "old"
+    assert wait_for(lambda: cache.get("key") == "new")
+    assert cache.metrics()["stale_hits"] >= 1
+
+
+def test_async_get_or_set_coalesces_concurrent_loads():
+    cache = CacheService("test_async")
+    calls = []
+
+    async def loader():
+        calls.append(1)
+        await asyncio.sleep(0.05)
+        return "value"
+
+    async def main():
+        return await asyncio.gather(*(cache.aget_or_set("key", loader) for _ in range(5)))
+
+    assert asyncio.run(main()) == ["value"] * 5
+    assert len(calls) == 1
+    assert asyncio.run(cache.aget("key")) == "value"
+
+
+def test_decorator_caches_sync_and_async_functions():
+    calls = []
+
+    @CacheService.cache_decorator("test_decorator", timeout=60)
+    def square(number):
+        calls.append(number)
+        return number * number
+
+    @CacheService.cache_decorator("test_decorator_async", timeout=60)
+    async def cube(number):
+        calls.append(number)
+        return number ** 3
+
+    assert square(3) == 9 and square(3) == 9
+    assert asyncio.run(cube(2)) == 8 and asyncio.run(cube(2)) == 8
+    assert calls == [3, 2]
+    assert cache_metrics()["test_decorator"]["l1_hits"] == 1
+    assert square.cache.metrics()["hit_rate"] == 0.5
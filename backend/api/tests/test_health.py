@@ -0,0 +1,28 @@
+import pytest
+from django.test import Client
+
+from features.knowledge.services.embedding_model import LOADING, READY, embedding_model
+
+
+@pytest.fixture
+def client():
+    return Client()
+
+
+def test_health_needs_no_authentication(client):
+    response = client.get("/api/health/")
+
+    assert response.status_code == 200
+    assert response.json() == {"status": "ok"}
+
+
+def test_ready_waits_for_the_embedding_model(client, settings, monkeypatch):
+    settings.USE_SENTENCE_TRANSFORMERS = True
+    monkeypatch.setattr(embedding_model, "_state", LOADING)
+
+    response = client.get("/api/ready/")
+    assert response.status_code == 503
+    assert response.json()["embedding_model"]["state"] == LOADING
+
+    monkeypatch.setattr(embedding_model, "_state", READY)
+    assert client.get("/api/ready/").status_code == 200
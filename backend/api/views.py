@@ -0,0 +1,18 @@
+from django.http import JsonResponse
+
+from features.knowledge.services.embedding_model import embedding_model
+
+
+def health(request):
+    """Liveness: the process is up and serving requests"""
+    return JsonResponse({"status": "ok"})
+
+
+def ready(request):
+    """Readiness: models needed by requests are loaded, so traffic can be sent here"""
+    model = embedding_model.status()
+    ready = embedding_model.ready
+    return JsonResponse(
+        {"status": "ready" if ready else "starting", "embedding_model": model},
+        status=200 if ready else 503,
+    )
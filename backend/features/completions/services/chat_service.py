@@ -6,6 +6,7 @@ import logging
 import traceback
 from threading import Event
 from typing import Generator, List, Optional, Union
+from django.conf import settings
 from features.completions.models import MessageError
 from features.analytics.services.analytics_service import AnalyticsEventService
 from features.conversations.services.conversation_service import ConversationService
@@ -13,7 +14,10 @@ from features.providers.clients.provider_factory import provider_factory, Provid
 from features.conversations.repositories.message_repository import MessageRepository
 from features.authentication.models import CustomUser
 
+from features.knowledge.services.context_packer import pack_context
 from features.knowledge.services.knowledge_service import KnowledgeService
+from features.knowledge.services.retrieval import RetrievalResult
+from features.knowledge.services.tokens import count_tokens
 from features.prompts.services.prompt_service import (
     PromptBuilderService,
     PromptService,
@@ -43,111 +47,131 @@ class ChatService:
         self.current_user_message = None
         self.current_full_content = ""
         self.current_tokens_generated = 0
+        self.current_context_tokens = 0
         self.current_generation_start = None
         self.current_request_data = None
         self.current_user = None
 
-    def _prepare_context(self, message_content: str, user_id: int, knowledge_ids=None) -> str:
+    def _prepare_context(self, message_content: str, user_id: int, knowledge_ids=None, token_budget: Optional[int] = None) -> RetrievalResult:
         """
         Prepare knowledge context for the message. In this instance, knowledge refers
         to data sources uploaded by the user via the knowledge service.
         
-        If knowledge_ids are provided, fetch those specific documents.
-        Otherwise, perform semantic search based on message content.
+        If knowledge_ids are provided, the chunks of those documents are ranked
+        against the message. Otherwise, perform semantic search based on message content.
+        The best chunks are packed into ``token_budget`` tokens and the number of
+        tokens spent is kept in ``current_context_tokens``.
+        
+        Retrieval runs once per turn: the returned result carries both the prompt
+        context and the chunks to resolve citations against.
         """
+        if token_budget is None:
+            token_budget = getattr(settings, 'RAG_DEFAULT_CONTEXT_TOKENS', 2048)
+        retrieval = RetrievalResult(query=message_content, budget=token_budget)
+        self.current_context_tokens = 0
         try:
-            relevant_docs = []
+            documents = {}
             
-            # If specific knowledge IDs are provided, fetch those documents
+            # If specific knowledge IDs are provided, rank the chunks of those documents
             if knowledge_ids and isinstance(knowledge_ids, list) and len(knowledge_ids) > 0:
                 self.logger.info(f"Using specific knowledge documents: {knowledge_ids}")
-                print(f"DEBUG: Processing knowledge_ids: {knowledge_ids}")
                 
                 for knowledge_id in knowledge_ids:
-                    try:
-                        # Ensure knowledge_id is a string
-                        knowledge_id_str = str(knowledge_id)
-                        print(f"DEBUG: Fetching knowledge document with ID: {knowledge_id_str}, user_id: {user_id}")
-                        
-                        # Get the knowledge document
-                        knowledge = self.knowledge_service.get_knowledge(knowledge_id_str, user_id)
-                        
-                        if knowledge:
-                            print(f"DEBUG: Found knowledge document: {knowledge.name}, content length: {len(knowledge.content)}")
-                            
-                            # Get chunks with citation information from ChromaDB
-                            chunks = self.knowledge_service.get_chunks_for_knowledge(knowledge.id)
-                            
-                            if chunks and len(chunks) > 0:
-                                print(f"DEBUG: Found {len(chunks)} chunks for knowledge document")
-                                # Add each chunk as a separate document with citation
-                                for chunk in chunks:
-                                    relevant_docs.append({
-                                        'content': chunk['content'],
-                                        'metadata': {
-                                            'name': knowledge.name,
-                                            'identifier': knowledge.identifier,
-                                            'citation': chunk.get('metadata', {}).get('citation', knowledge.name)
-                                        },
-                                        'similarity': 1.0  # Perfect match since explicitly selected
-                                    })
-                            else:
-                                print(f"DEBUG: No chunks found, using entire document content")
-                                # Fallback to using the entire document if no chunks are found
+                    knowledge = self.knowledge_service.get_knowledge(str(knowledge_id), user_id)
+                    if knowledge:
+                        documents[str(knowledge.id)] = knowledge
+                    else:
+                        self.logger.warning(f"Knowledge document with ID {knowledge_id} not found")
+                
+                relevant_docs = []
+                if documents:
+                    limit = getattr(settings, 'RAG_MAX_CANDIDATE_CHUNKS', 200)
+                    relevant_docs = self.knowledge_service.rank_document_chunks(
+                        message_content, user_id, list(documents), limit=limit
+                    )
+                    
+                    if len(relevant_docs) < limit:
+                        # Documents without indexed chunks fall back to their whole content,
+                        # ranked last so they only fill what budget is left
+                        ranked_ids = {doc["metadata"].get("knowledge_id") for doc in relevant_docs}
+                        for knowledge_id, knowledge in documents.items():
+                            if knowledge_id not in ranked_ids and knowledge.content:
                                 relevant_docs.append({
+                                    'id': knowledge_id,
                                     'content': knowledge.content,
-                                    'metadata': {
-                                        'name': knowledge.name,
-                                        'identifier': knowledge.identifier,
-                                        'citation': knowledge.name
-                                    },
-                                    'similarity': 1.0  # Perfect match since explicitly selected
+                                    'metadata': {'knowledge_id': knowledge_id, 'citation': knowledge.name},
+                                    'similarity': 0.0,
                                 })
-                        else:
-                            print(f"DEBUG: Knowledge document with ID {knowledge_id} not found")
-                    except Exception as e:
-                        print(f"DEBUG: Error fetching knowledge {knowledge_id}: {str(e)}")
-                        self.logger.warning(f"Error fetching knowledge {knowledge_id}: {str(e)}")
-                        traceback.print_exc()
             else:
                 # Otherwise perform semantic search
-                print(f"DEBUG: No knowledge_ids provided, performing semantic search with query: {message_content[:50]}...")
                 relevant_docs = self.knowledge_service.find_relevant_context(message_content, user_id)
 
             if not relevant_docs:
-                print("DEBUG: No relevant documents found")
-                return ""
+                self.logger.info("No relevant documents found")
+                return retrieval
 
-            print(f"DEBUG: Found {len(relevant_docs)} relevant documents")
-            
             # Format the context in a way that's optimized for LLMs
-            context = "I'll provide you with some relevant information to help answer the user's question. " \
-                      "Please use this information to inform your response and cite the sources when appropriate.\n\n"
+            preamble = "I'll provide you with some relevant information to help answer the user's question. " \
+                       "Please use this information to inform your response and cite the sources when appropriate.\n\n"
+            instructions = "\nPlease use the above information to answer the user's question. " \
+                           "If the information doesn't contain the answer, just say so - don't make up information. " \
+                           "When using information from the sources, cite them using the citation format provided.\n\n"
+            
+            # Pack the best chunks into the budget, merging overlapping neighbours
+            packed = pack_context(relevant_docs, token_budget - count_tokens(preamble + instructions))
+            if not packed.passages:
+                self.logger.info(f"No relevant documents fit in a context budget of {token_budget} tokens")
+                return retrieval
             
-            # Add each document with clear separation and citation information
-            for i, doc in enumerate(relevant_docs):
-                print(f"DEBUG: Document {i+1} content length: {len(doc['content'])}")
-                citation = doc.get('metadata', {}).get('citation', f"Document {i+1}")
-                source_name = doc.get('metadata', {}).get('name', f"Source {i+1}")
+            context = preamble
+            
+            # Add each passage with clear separation and citation information
+            for i, passage in enumerate(packed.passages):
+                metadata = passage['metadata']
+                knowledge = documents.get(metadata.get('knowledge_id'))
+                citation = metadata.get('citation') or f"Document {i+1}"
+                source_name = knowledge.name if knowledge else metadata.get('name', f"Source {i+1}")
                 
-                # Add document with clear formatting
+                # Add passage with clear formatting
                 context += f"SOURCE {i+1}: {source_name}\n"
                 context += f"CITATION: {citation}\n"
-                context += f"CONTENT:\n{doc['content']}\n\n"
+                context += f"CONTENT:\n{passage['content']}\n\n"
             
             # Add instructions for the LLM
-            context += "\nPlease use the above information to answer the user's question. " \
-                       "If the information doesn't contain the answer, just say so - don't make up information. " \
-                       "When using information from the sources, cite them using the citation format provided.\n\n"
+            context += instructions
             
-            print(f"DEBUG: Final context length: {len(context)}")
-            return context
+            retrieval.chunks = packed.chunks
+            retrieval.context = context
+            retrieval.context_tokens = self.current_context_tokens = count_tokens(context)
+            self.logger.info(
+                f"Packed {len(packed.chunk_ids)} of {packed.candidates} chunks into "
+                f"{retrieval.context_tokens} context tokens (budget {token_budget})"
+            )
+            return retrieval
 
         except Exception as e:
-            print(f"DEBUG: Error in _prepare_context: {str(e)}")
             self.logger.error(f"Error preparing context: {str(e)}")
             traceback.print_exc()
-            return ""
+            return RetrievalResult(query=message_content, budget=token_budget)
+
+    def _context_token_budget(self, provider, model_name: str, messages: List[dict]) -> int:
+        """
+        Tokens available for knowledge context: ``RAG_CONTEXT_BUDGET_RATIO`` of the
+        model's ``max_input_tokens``, less what the conversation already uses.
+        """
+        max_input_tokens = None
+        try:
+            for model in provider.models() or []:
+                if isinstance(model, dict) and model_name in (model.get("name"), model.get("model"), model.get("id")):
+                    max_input_tokens = model.get("max_input_tokens")
+                    break
+        except Exception as e:
+            self.logger.warning(f"Could not look up the input limit of model {model_name}: {str(e)}")
+        
+        max_input_tokens = max_input_tokens or getattr(settings, 'RAG_DEFAULT_MAX_INPUT_TOKENS', 4096)
+        used = sum(count_tokens(message.get("content") or "") for message in messages)
+        ratio = getattr(settings, 'RAG_CONTEXT_BUDGET_RATIO', 0.6)
+        return max(0, min(int(max_input_tokens * ratio), max_input_tokens - used))
 
     def _process_message_images(self, message):
         """
@@ -183,12 +207,13 @@ class ChatService:
         assistant_message = None
         tokens_generated = 0
         full_content = ""
-        relevant_chunks = []  # Track relevant chunks for citation
+        retrieval = None  # Knowledge retrieved for this turn, reused for citations
         
         # Reset state tracking variables
         self.current_user_message = None
         self.current_full_content = ""
         self.current_tokens_generated = 0
+        self.current_context_tokens = 0
         self.current_generation_start = start
         self.current_request_data = data
         self.current_user = user
@@ -266,27 +291,20 @@ class ChatService:
                 # Get the last user message (the one we just created)
                 last_user_message = formatted_messages[-1]
 
-                # Prepare context - use a thread to avoid blocking
-                # This is a synchronous approach that doesn't use async/await
-                context = self._prepare_context(
+                # Retrieve once; the result feeds both the prompt and the citations
+                retrieval = self._prepare_context(
                     message_content=last_user_message["content"],
                     user_id=user.id,
-                    knowledge_ids=knowledge_ids
+                    knowledge_ids=knowledge_ids,
+                    token_budget=self._context_token_budget(provider, model_name, formatted_messages),
                 )
                 
-                if context:
+                if retrieval.context:
                     # Add context to the user message
                     self.logger.info("Adding knowledge context to user message")
-                    last_user_message["content"] = f"{last_user_message['content']}\n\n{context}"
+                    last_user_message["content"] = f"{last_user_message['content']}\n\n{retrieval.context}"
                     # Update the formatted messages
                     formatted_messages[-1] = last_user_message
-                    
-                    # Store relevant chunks for citation
-                    relevant_chunks = self.knowledge_service.find_relevant_context(
-                        last_user_message["content"], 
-                        user.id, 
-                        max_results=5
-                    )
                 else:
                     print("DEBUG: No context was generated from knowledge documents")
             else:
@@ -406,12 +424,12 @@ class ChatService:
             end = timer()
             generation_time = end - start
 
-            # Process citations if we have relevant chunks
+            # Process citations against the chunks that were placed in the prompt
             citation_data = {}
-            if relevant_chunks:
-                self.logger.info(f"Processing citations for {len(relevant_chunks)} relevant chunks")
+            if retrieval and retrieval.chunks:
+                self.logger.info(f"Processing citations for {len(retrieval.chunks)} relevant chunks")
                 
-                citation_data = self.knowledge_service.get_citations_for_response(full_content, relevant_chunks)
+                citation_data = self.knowledge_service.get_citations_for_response(full_content, retrieval)
                 self.logger.info(f"Generated {len(citation_data.get('citations', []))} citations for response")
 
             # Create the assistant message regardless of how we got here
@@ -465,6 +483,7 @@ class ChatService:
                     "message_id": str(assistant_message.id),
                     "has_citations": citation_data.get("has_citations", False),
                     "citations": citation_data.get("citations", []),
+                    "context_tokens": self.current_context_tokens,
                 }) + "\n"
 
         except Exception as e:
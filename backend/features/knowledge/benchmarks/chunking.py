@@ -0,0 +1,139 @@
+"""
+Micro-benchmark of semantic chunking on multi-megabyte texts.
+
+    python -m features.knowledge.benchmarks.chunking [--megabytes N] [--chunk-size N] [--overlap N] [--repeat N]
+
+Compares the streaming chunker with the previous implementation, which split
+the whole text up front, recomputed the overlap window for every sentence and
+re-chunked oversized chunks in a second pass.
+"""
+import argparse
+import random
+import re
+import time
+
+from features.knowledge.services.chunking import SemanticChunker, semantic_chunks, simple_chunks
+
+
+def legacy_chunks(text, chunk_size=1000, overlap=100):
+    """Chunks as produced by the previous implementation"""
+    chunks = []
+    paragraphs = re.split(r'\n\s*\n', text)
+    sentence_pattern = r'(?<=[.!?])\s+'
+
+    current_chunk = ""
+    last_sentences = []
+
+    for paragraph in paragraphs:
+        if not paragraph.strip():
+            continue
+
+        for sentence in re.split(sentence_pattern, paragraph):
+            if not sentence.strip():
+                continue
+
+            if len(current_chunk) + len(sentence) + 1 > chunk_size and current_chunk:
+                chunks.append(current_chunk)
+
+                overlap_text = ""
+                overlap_size = 0
+                for prev_sentence in reversed(last_sentences):
+                    if overlap_size + len(prev_sentence) > overlap:
+                        break
+                    overlap_text = prev_sentence + " " + overlap_text
+                    overlap_size += len(prev_sentence) + 1
+
+                current_chunk = overlap_text + sentence
+                last_sentences = [sentence]
+            else:
+                if current_chunk and not current_chunk.endswith(" "):
+                    current_chunk += " "
+                current_chunk += sentence
+
+                last_sentences.append(sentence)
+                while sum(len(s) + 1 for s in last_sentences) > overlap * 2:
+                    last_sentences.pop(0)
+
+        if current_chunk and not current_chunk.endswith("\n"):
+            current_chunk += "\n\n"
+
+    if current_chunk:
+        chunks.append(current_chunk)
+
+    final_chunks = []
+    for chunk in chunks:
+        if len(chunk) > chunk_size * 1.5:
+            final_chunks.extend(simple_chunks(chunk, chunk_size, overlap))
+        else:
+            final_chunks.append(chunk)
+    return final_chunks
+
+
+def make_text(characters, rng):
+    """Prose with short and long sentences, lists and a few unbroken runs"""
+    words = "the index stores chunks of every document with their pages and sections for citations".split()
+    parts = []
+    size = 0
+    while size < characters:
+        kind = rng.random()
+        if kind < 0.05:
+            part = "- " + " ".join(rng.choice(words) for _ in range(rng.randint(2, 8))) + "\n"
+        elif kind < 0.07:
+            part = "x" * rng.randint(500, 4000) + " "
+        else:
+            sentence = " ".join(rng.choice(words) for _ in range(rng.randint(1, 40)))
+            part = sentence.capitalize() + rng.choice([". ", "? ", "! ", ".\n", ", "])
+        if rng.random() < 0.08:
+            part += rng.choice(["\n\n", "\n \n", "\n\n\n  "])
+        parts.append(part)
+        size += len(part)
+    return "".join(parts)
+
+
+def pieces(text, size):
+    for start in range(0, len(text), size):
+        yield text[start:start + size]
+
+
+def run(megabytes=4.0, chunk_size=1000, overlap=100, repeat=3, seed=11):
+    rng = random.Random(seed)
+    text = make_text(int(megabytes * 1024 * 1024), rng)
+
+    def timed(fn):
+        started = time.perf_counter()
+        for _ in range(repeat):
+            result = fn()
+        return (time.perf_counter() - started) / repeat * 1000, result
+
+    def streamed():
+        chunker = SemanticChunker(chunk_size, overlap)
+        chunks = []
+        for piece in pieces(text, 64 * 1024):
+            chunks.extend(chunker.feed(piece))
+        chunks.extend(chunker.close())
+        return chunks
+
+    legacy_ms, expected = timed(lambda: legacy_chunks(text, chunk_size, overlap))
+    whole_ms, whole = timed(lambda: semantic_chunks(text, chunk_size, overlap))
+    streamed_ms, stream = timed(streamed)
+
+    return {
+        "characters": len(text),
+        "chunks": len(expected),
+        "identical": whole == expected and stream == expected,
+        "legacy_ms": round(legacy_ms, 1),
+        "chunker_ms": round(whole_ms, 1),
+        "streamed_64k_ms": round(streamed_ms, 1),
+    }
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--megabytes", type=float, default=4.0)
+    parser.add_argument("--chunk-size", type=int, default=1000)
+    parser.add_argument("--overlap", type=int, default=100)
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+    result = run(args.megabytes, args.chunk_size, args.overlap, args.repeat)
+    for key, value in result.items():
+        print(f"{key:>16}: {value}")
@@ -0,0 +1,97 @@
+"""
+Micro-benchmark of citation extraction on long responses.
+
+    python -m features.knowledge.benchmarks.citations [--paragraphs N] [--chunks N] [--repeat N]
+
+Compares the single-pass scanner and prebuilt source tables with the previous
+implementation (six regex passes and a citations x chunks substring match).
+"""
+import argparse
+import random
+import re
+import time
+
+from features.knowledge.services.citation_scanner import CitationMatcher, scan_citations
+
+LEGACY_PATTERNS = [
+    r'\[(\d+)\]',
+    r'\[(Source|Reference|Citation|Document)\s+(\d+|[A-Za-z]+)\]',
+    r'Source\s+(\d+|[A-Za-z]+)',
+    r'Reference\s+(\d+|[A-Za-z]+)',
+    r'Citation\s+(\d+|[A-Za-z]+)',
+    r'Document\s+(\d+|[A-Za-z]+)',
+]
+
+
+def legacy_scan(text):
+    """Citation labels as found by the previous multi-pass implementation"""
+    cleaned = re.sub(r'(\[\?+\]|\[0+\])+', '', text)
+    found = set()
+    for pattern in LEGACY_PATTERNS:
+        for match in re.finditer(pattern, cleaned):
+            label = None
+            for group in match.groups():
+                if group:
+                    label = group
+            if label and not re.match(r'^[\?\[\]0]+$', label):
+                found.add(label.strip())
+    return found
+
+
+def legacy_match(label, sources):
+    for index, source in enumerate(sources):
+        if label in source or source in label:
+            return index
+    return None
+
+
+def make_sources(count, rng):
+    names = ["handbook.pdf", "pricing.xlsx", "notes.md", "contract.docx", "faq.html", "report.pdf"]
+    return [f"{rng.choice(names)}, Page {rng.randint(1, 400)}" for _ in range(count)]
+
+
+def make_response(paragraphs, rng):
+    words = "the model answer uses retrieved passages to explain pricing terms and refund rules".split()
+    markers = ["[{n}]", "[Source {n}]", "Source {n}", "according to Document {n}", "see Reference {n}", "[0]", "[??]"]
+    parts = []
+    for _ in range(paragraphs):
+        sentence = " ".join(rng.choice(words) for _ in range(60))
+        parts.append(f"{sentence} {rng.choice(markers).format(n=rng.randint(1, 40))}.")
+    return "\n\n".join(parts)
+
+
+def run(paragraphs=400, chunks=200, repeat=20, seed=7):
+    rng = random.Random(seed)
+    text = make_response(paragraphs, rng)
+    sources = make_sources(chunks, rng)
+
+    def timed(fn):
+        started = time.perf_counter()
+        for _ in range(repeat):
+            fn()
+        return (time.perf_counter() - started) / repeat * 1000
+
+    def legacy():
+        return [legacy_match(label, sources) for label in legacy_scan(text)]
+
+    def current():
+        matcher = CitationMatcher(sources)
+        return [matcher.match(label) for label in scan_citations(text)]
+
+    return {
+        "response_chars": len(text),
+        "chunks": chunks,
+        "legacy_ms": round(timed(legacy), 3),
+        "scanner_ms": round(timed(current), 3),
+    }
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--paragraphs", type=int, default=400)
+    parser.add_argument("--chunks", type=int, default=200)
+    parser.add_argument("--repeat", type=int, default=20)
+    args = parser.parse_args()
+    result = run(args.paragraphs, args.chunks, args.repeat)
+    for key, value in result.items():
+        print(f"{key:>15}: {value}")
@@ -0,0 +1,78 @@
+"""
+Recall, latency and memory of quantized and truncated embedding storage.
+
+    python -m features.knowledge.benchmarks.quantization [--vectors N] [--dimensions N] [--queries N] [--k N]
+
+Searches a synthetic corpus of normalized embeddings whose variance decays
+across dimensions, like Matryoshka-trained models, and compares each storage
+mode with exact float32 search. Pick the mode per deployment from the table:
+recall@k against float32, milliseconds per query and bytes held in memory.
+"""
+import argparse
+import time
+
+import numpy as np
+
+from features.knowledge.services.quantization import QuantizedMatrix, fit_dimensions
+
+
+def make_corpus(vectors, dimensions, queries, seed=5):
+    rng = np.random.default_rng(seed)
+    decay = np.exp(-np.arange(dimensions) / (dimensions / 5))
+    centers = rng.normal(size=(max(vectors // 50, 1), dimensions)) * decay
+    corpus = centers[rng.integers(len(centers), size=vectors)] + 0.6 * rng.normal(size=(vectors, dimensions)) * decay
+    corpus /= np.linalg.norm(corpus, axis=1, keepdims=True)
+    picked = corpus[rng.integers(vectors, size=queries)]
+    probes = picked + 0.3 * rng.normal(size=picked.shape) * decay
+    probes /= np.linalg.norm(probes, axis=1, keepdims=True)
+    return corpus.astype(np.float32), probes.astype(np.float32)
+
+
+def run(vectors=50_000, dimensions=768, queries=100, k=10, oversample=4):
+    corpus, probes = make_corpus(vectors, dimensions, queries)
+    truth = [set(np.argsort(-(corpus @ query))[:k]) for query in probes]
+
+    modes = [
+        ("float32", dimensions, "float32", None),
+        ("float16", dimensions, "float16", None),
+        ("int8", dimensions, "int8", None),
+        ("int8+rescore", dimensions, "int8", True),
+        (f"float32@{dimensions // 3}", dimensions // 3, "float32", None),
+        (f"int8@{dimensions // 3}+rescore", dimensions // 3, "int8", True),
+    ]
+
+    results = []
+    for name, dims, precision, rescore in modes:
+        matrix = QuantizedMatrix(dims, precision)
+        matrix.add(fit_dimensions(corpus, dims))
+        fitted = fit_dimensions(probes, dims)
+
+        found = []
+        started = time.perf_counter()
+        for query, full_query in zip(fitted, probes):
+            # Candidates come from the compact matrix, final scores from the full float32 vectors
+            exact_scores = (lambda rows, q=full_query: corpus[rows] @ q) if rescore else None
+            rows, _ = matrix.search(query, k, rescore=exact_scores, oversample=oversample)
+            found.append(set(rows))
+        elapsed = (time.perf_counter() - started) / len(probes) * 1000
+
+        recall = np.mean([len(hits & expected) / k for hits, expected in zip(found, truth)])
+        results.append({
+            "mode": name,
+            "recall": round(float(recall), 4),
+            "ms_per_query": round(elapsed, 3),
+            "megabytes": round(matrix.nbytes / 1024 / 1024, 1),
+        })
+    return results
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--vectors", type=int, default=50_000)
+    parser.add_argument("--dimensions", type=int, default=768)
+    parser.add_argument("--queries", type=int, default=100)
+    parser.add_argument("--k", type=int, default=10)
+    args = parser.parse_args()
+    print(f"{'mode':>22} {'recall@' + str(args.k):>10} {'ms/query':>10} {'MB':>8}")
+    for row in run(args.vectors, args.dimensions, args.queries, args.k):
+        print(f"{row['mode']:>22} {row['recall']:>10} {row['ms_per_query']:>10} {row['megabytes']:>8}")
@@ -0,0 +1,345 @@
+"""
+Offline benchmark of knowledge ingestion and retrieval quality and latency.
+
+    python manage.py benchmark_knowledge [--corpus labeled|synthetic] [--documents N] [--queries N]
+                                         [--k 1 3 5 10] [--set NAME=VALUE ...] [--output FILE]
+
+Documents are chunked with ``_chunk_text`` and stored with
+``_store_chunks_in_chroma`` into throwaway stores in a temporary directory,
+then every query runs through the semantic, keyword and hybrid search paths.
+Embeddings come from ``HashingEmbedder``, a deterministic stand-in for
+Ollama, so runs need no model and are comparable across commits. Reports
+recall@k and MRR at the document level, ingestion chunks/sec, p50/p95 query
+latency and peak memory as JSON.
+"""
+import hashlib
+import json
+import math
+import os
+import random
+import re
+import tempfile
+import time
+import tracemalloc
+import numpy as np
+from django.conf import settings
+from django.test import override_settings
+
+from api.services.cache_service import CacheService
+from features.knowledge.services.dedup import MAX_DISTANCE, DuplicateIndex
+from features.knowledge.services.embedding_cache import EmbeddingCache
+from features.knowledge.services.keyword_index import KeywordIndex
+from features.knowledge.services.vector_store import ChromaVectorStore, NumpyVectorStore
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+LABELED_CORPUS = os.path.join(os.path.dirname(__file__), "labeled_corpus.json")
+SEARCH_MODES = ("semantic", "keyword", "hybrid")
+USER_ID = 1
+
+# Settings that shape the results and their defaults, recorded with every report
+REPORTED_SETTINGS = {
+    "CHUNKING_STRATEGY": "semantic",
+    "CHUNK_SIZE_UNIT": "tokens",
+    "CHUNK_SIZE_TOKENS": 256,
+    "CHUNK_OVERLAP_TOKENS": 32,
+    "CHUNK_SIZE": 1000,
+    "CHUNK_OVERLAP": 100,
+    "RAG_SIMILARITY_THRESHOLD": 0.5,
+    "HYBRID_FUSION": "rrf",
+    "HYBRID_RRF_K": 60,
+    "HYBRID_SEMANTIC_WEIGHT": 0.7,
+    "HYBRID_KEYWORD_WEIGHT": 0.3,
+    "DEDUP_ENABLED": True,
+}
+
+_WORD = re.compile(r"\w+")
+_STOPWORDS = frozenset(
+    "a an and are as at be by do does for from how i in is it its my of on or that the this to what when "
+    "where which who why will with you your".split()
+)
+
+
+class HashingEmbedder:
+    """
+    Ollama client stand-in with deterministic bag-of-words embeddings.
+
+    Words are lowercased, stop words dropped and a plural "s" stripped; each
+    remaining word is hashed to a signed dimension and weighted by
+    ``1 + log(tf)``. Similarity is lexical, so it rewards chunks that share
+    words with the query but knows no synonyms.
+
+    Real embedding models are anisotropic: unrelated texts still score well
+    above zero. An extra dimension shared by every vector reproduces that, so
+    cosine similarity is ``baseline + (1 - baseline) * lexical`` and lands in
+    the range ``RAG_SIMILARITY_THRESHOLD`` is tuned for.
+    """
+
+    def __init__(self, dimensions: int = 384, baseline: float = 0.4):
+        self.dimensions = dimensions
+        self.baseline = baseline
+        self.calls = 0
+        self.texts = 0
+
+    def vector(self, text: str) -> list:
+        counts = {}
+        for word in _WORD.findall(text.lower()):
+            if word in _STOPWORDS:
+                continue
+            if len(word) > 3 and word.endswith("s") and not word.endswith("ss"):
+                word = word[:-1]
+            counts[word] = counts.get(word, 0) + 1
+        vector = np.zeros(self.dimensions + 1, dtype=np.float32)
+        for word, count in counts.items():
+            digest = int.from_bytes(hashlib.blake2b(word.encode("utf-8"), digest_size=8).digest(), "little")
+            sign = 1.0 if digest >> 63 else -1.0
+            vector[digest % self.dimensions] += sign * (1.0 + math.log(count))
+        norm = np.linalg.norm(vector)
+        if norm == 0:
+            # Texts of stop words only still get a valid embedding
+            vector[0] = norm = 1.0
+        vector *= math.sqrt(1.0 - self.baseline) / norm
+        vector[-1] = math.sqrt(self.baseline)
+        return vector.tolist()
+
+    def embed(self, model, input):
+        self.calls += 1
+        self.texts += len(input)
+        return {"embeddings": [self.vector(text) for text in input]}
+
+    def embeddings(self, model, prompt):
+        self.calls += 1
+        self.texts += 1
+        return {"embedding": self.vector(prompt)}
+
+    def list(self):
+        return {"models": []}
+
+
+def load_labeled_corpus(path: str = LABELED_CORPUS) -> dict:
+    """
+    The small hand-labeled corpus: ``documents`` with id, name and text, and
+    ``queries`` with the ids of the documents that answer them.
+    """
+    with open(path, encoding="utf-8") as f:
+        return json.load(f)
+
+
+def synthetic_corpus(documents: int = 200, facts: int = 20, queries: int = 200, seed: int = 7) -> dict:
+    """
+    Generated documents of pseudo-words. Each document states ``facts`` facts
+    ("The <attribute> of <entity> is <value>.") between filler sentences on
+    its topic; every query asks for one fact and is answered by its document.
+    Entities are unique, attributes and topic words are shared, so retrieval
+    has to find one chunk among many similar ones.
+    """
+    rng = random.Random(seed)
+    syllables = [c + v for c in "bdfgklmnprstvz" for v in "aeiou"]
+    used = set()
+
+    def word():
+        while True:
+            candidate = "".join(rng.choice(syllables) for _ in range(rng.randint(2, 4)))
+            if candidate not in used:
+                used.add(candidate)
+                return candidate
+
+    attributes = [word() for _ in range(40)]
+    topics = [[word() for _ in range(30)] for _ in range(max(1, documents // 10))]
+
+    corpus = {"documents": [], "queries": []}
+    stated = []
+    for number in range(documents):
+        document_id = f"doc-{number}"
+        topic = topics[number % len(topics)]
+        paragraphs = []
+        sentences = []
+        for _ in range(facts):
+            entity, attribute, value = word(), rng.choice(attributes), word()
+            stated.append((document_id, entity, attribute))
+            sentences.append(f"The {attribute} of {entity} is {value}.")
+            for _ in range(rng.randint(1, 3)):
+                filler = " ".join(rng.choice(topic) for _ in range(rng.randint(6, 14)))
+                sentences.append(filler.capitalize() + ".")
+            if len(sentences) >= 8:
+                paragraphs.append(" ".join(sentences))
+                sentences = []
+        if sentences:
+            paragraphs.append(" ".join(sentences))
+        corpus["documents"].append({
+            "id": document_id,
+            "name": f"{document_id}.txt",
+            "text": "\n\n".join(paragraphs),
+        })
+
+    for document_id, entity, attribute in rng.sample(stated, min(queries, len(stated))):
+        corpus["queries"].append({"query": f"What is the {attribute} of {entity}?", "relevant": [document_id]})
+    return corpus
+
+
+def _percentile(values, percentile):
+    return round(float(np.percentile(values, percentile)), 3) if values else 0.0
+
+
+def _peak_rss_mb():
+    if resource is None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Kilobytes on Linux, bytes on macOS
+    return round(peak / 1024 / (1024 if os.uname().sysname == "Darwin" else 1), 1)
+
+
+def score(ranked, relevant, ks):
+    """
+    Document-level metrics of one query.
+
+    Args:
+        ranked: Knowledge IDs of the results, best first (repeats allowed)
+        relevant: Knowledge IDs that answer the query
+        ks: Cut-offs for recall
+
+    Returns:
+        Dictionary of ``recall@k`` per cut-off and the reciprocal rank
+    """
+    relevant = set(relevant)
+    metrics = {}
+    for k in ks:
+        found = relevant.intersection(ranked[:k])
+        metrics[f"recall@{k}"] = len(found) / len(relevant) if relevant else 0.0
+    first = next((rank for rank, knowledge_id in enumerate(ranked, start=1) if knowledge_id in relevant), None)
+    metrics["reciprocal_rank"] = 1.0 / first if first else 0.0
+    return metrics
+
+
+def _benchmark_service(directory, backend):
+    """A ``KnowledgeService`` whose stores all live in ``directory``"""
+    from features.knowledge.services.knowledge_service import KnowledgeService
+
+    service = KnowledgeService()
+    service.embedding_cache = EmbeddingCache(os.path.join(directory, "embedding_cache.sqlite3"))
+    service.keyword_index = KeywordIndex(os.path.join(directory, "keyword_index.sqlite3"))
+    service.duplicate_index = DuplicateIndex(
+        os.path.join(directory, "duplicate_index.sqlite3"),
+        max_distance=getattr(settings, "DEDUP_MAX_DISTANCE", MAX_DISTANCE),
+    )
+    if backend == "numpy":
+        service.collection = NumpyVectorStore(os.path.join(directory, "vectors"))
+    else:
+        import chromadb
+        from chromadb.config import Settings
+
+        client = chromadb.PersistentClient(
+            path=os.path.join(directory, "chroma"), settings=Settings(anonymized_telemetry=False)
+        )
+        service.collection = ChromaVectorStore(client.get_or_create_collection(
+            name="benchmark", metadata={"hnsw:space": "cosine"}, embedding_function=None
+        ))
+    service.ollama_client = HashingEmbedder()
+    # Never shared with the application's caches or between runs
+    service._search_results_cache = CacheService("knowledge_benchmark_search", ttl=0, backend=None)
+    return service
+
+
+def _ingest(service, corpus):
+    chunks = 0
+    started = time.perf_counter()
+    for document in corpus["documents"]:
+        texts = service._chunk_text(document["text"])
+        stats = service._store_chunks_in_chroma(
+            document["id"],
+            [{"id": f"chunk_{i}", "content": text, "metadata": {"chunk": i}} for i, text in enumerate(texts)],
+            {"source": document["name"], "citation": document["name"]},
+            user_id=USER_ID,
+        )
+        chunks += stats.get("stored", 0) if stats else 0
+    seconds = time.perf_counter() - started
+    return {
+        "documents": len(corpus["documents"]),
+        "chunks": chunks,
+        "seconds": round(seconds, 3),
+        "chunks_per_second": round(chunks / seconds, 1) if seconds > 0 else 0.0,
+        "embedding_calls": service.ollama_client.calls,
+    }
+
+
+def _search(service, mode, queries, ks):
+    search = {
+        "semantic": service._semantic_search,
+        "keyword": service._keyword_search,
+        "hybrid": service._hybrid_search,
+    }[mode]
+    limit = max(ks)
+    latencies = []
+    totals = {}
+    returned = 0
+    for query in queries:
+        # Measure the search itself, never a cached result
+        service._search_results_cache.clear_local()
+        started = time.perf_counter()
+        results = search(query["query"], USER_ID, limit)
+        latencies.append((time.perf_counter() - started) * 1000)
+        returned += len(results)
+        ranked = [(result.get("metadata") or {}).get("knowledge_id") for result in results]
+        for name, value in score(ranked, query["relevant"], ks).items():
+            totals[name] = totals.get(name, 0.0) + value
+
+    count = len(queries) or 1
+    report = {name: round(value / count, 4) for name, value in totals.items() if name.startswith("recall@")}
+    report["mrr"] = round(totals.get("reciprocal_rank", 0.0) / count, 4)
+    report["mean_results"] = round(returned / count, 2)
+    report["p50_ms"] = _percentile(latencies, 50)
+    report["p95_ms"] = _percentile(latencies, 95)
+    report["mean_ms"] = round(sum(latencies) / count, 3)
+    return report
+
+
+def run(corpus="labeled", documents=200, facts=20, queries=200, ks=(1, 3, 5, 10), modes=SEARCH_MODES,
+        backend="numpy", overrides=None, trace_memory=False, seed=7):
+    """
+    Ingest a corpus into throwaway stores and evaluate every search mode.
+
+    Args:
+        corpus: "labeled", "synthetic" or the path of a JSON corpus file
+        documents, facts, queries, seed: Size and seed of the synthetic corpus
+        ks: Cut-offs for recall@k; searches ask for ``max(ks)`` results
+        modes: Search modes to evaluate
+        backend: Vector store backend, "numpy" or "chroma"
+        overrides: Django settings to apply for the run, e.g. chunk sizes
+        trace_memory: Also report the peak of Python allocations (slows the run)
+
+    Returns:
+        JSON-serializable report
+    """
+    if corpus == "synthetic":
+        data = synthetic_corpus(documents, facts, queries, seed)
+    else:
+        data = load_labeled_corpus(LABELED_CORPUS if corpus == "labeled" else corpus)
+    overrides = {"EMBEDDING_MODEL_VERSION": "benchmark", **(overrides or {})}
+
+    report = {"corpus": {
+        "name": corpus,
+        "documents": len(data["documents"]),
+        "queries": len(data["queries"]),
+        "characters": sum(len(document["text"]) for document in data["documents"]),
+    }}
+    with tempfile.TemporaryDirectory(prefix="knowledge-benchmark-") as directory, override_settings(**overrides):
+        service = _benchmark_service(directory, backend)
+        report["backend"] = backend
+        report["settings"] = {name: getattr(settings, name, default) for name, default in REPORTED_SETTINGS.items()}
+        if trace_memory:
+            tracemalloc.start()
+        try:
+            report["ingestion"] = _ingest(service, data)
+            # Embed the queries up front so every mode finds them in the cache
+            service._generate_embeddings([query["query"] for query in data["queries"]])
+            report["search"] = {mode: _search(service, mode, data["queries"], ks) for mode in modes}
+            report["memory"] = {"peak_rss_mb": _peak_rss_mb()}
+            if trace_memory:
+                report["memory"]["peak_traced_mb"] = round(tracemalloc.get_traced_memory()[1] / 1024 / 1024, 1)
+        finally:
+            if trace_memory:
+                tracemalloc.stop()
+    return report
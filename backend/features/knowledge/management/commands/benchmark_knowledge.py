@@ -0,0 +1,77 @@
+import json
+import logging
+
+from django.core.management.base import BaseCommand, CommandError
+
+from features.knowledge.benchmarks.retrieval import SEARCH_MODES, run
+
+
+def _setting(assignment):
+    """Parse NAME=VALUE, reading VALUE as JSON when possible"""
+    name, separator, value = assignment.partition("=")
+    if not separator or not name:
+        raise CommandError(f"Expected NAME=VALUE, got {assignment!r}")
+    try:
+        return name, json.loads(value)
+    except ValueError:
+        return name, value
+
+
+class Command(BaseCommand):
+    help = "Benchmark knowledge ingestion and retrieval offline and print the report as JSON"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--corpus",
+            default="labeled",
+            help='"labeled" (default), "synthetic" or the path of a JSON corpus file',
+        )
+        parser.add_argument("--documents", type=int, default=200, help="Documents in the synthetic corpus")
+        parser.add_argument("--facts", type=int, default=20, help="Facts per synthetic document")
+        parser.add_argument("--queries", type=int, default=200, help="Queries on the synthetic corpus")
+        parser.add_argument("--seed", type=int, default=7, help="Seed of the synthetic corpus")
+        parser.add_argument("--k", type=int, nargs="+", default=[1, 3, 5, 10], help="Cut-offs for recall@k")
+        parser.add_argument("--modes", nargs="+", choices=SEARCH_MODES, default=list(SEARCH_MODES))
+        parser.add_argument("--backend", choices=["numpy", "chroma"], default="numpy")
+        parser.add_argument(
+            "--set",
+            dest="overrides",
+            action="append",
+            default=[],
+            metavar="NAME=VALUE",
+            help="Override a setting for the run, e.g. --set CHUNK_SIZE=500",
+        )
+        parser.add_argument(
+            "--trace-memory",
+            action="store_true",
+            help="Also report peak Python allocations (slows the run down)",
+        )
+        parser.add_argument("--output", help="Write the report to this file instead of stdout")
+
+    def handle(self, *args, **options):
+        # Per-query service logging would drown the report
+        overrides = dict(_setting(assignment) for assignment in options["overrides"])
+        if options["verbosity"] < 2:
+            logging.disable(logging.INFO)
+        try:
+            report = run(
+                corpus=options["corpus"],
+                documents=options["documents"],
+                facts=options["facts"],
+                queries=options["queries"],
+                ks=sorted(set(options["k"])),
+                modes=options["modes"],
+                backend=options["backend"],
+                overrides=overrides,
+                trace_memory=options["trace_memory"],
+                seed=options["seed"],
+            )
+        finally:
+            logging.disable(logging.NOTSET)
+        output = json.dumps(report, indent=2)
+        if options["output"]:
+            with open(options["output"], "w", encoding="utf-8") as f:
+                f.write(output + "\n")
+            self.stdout.write(self.style.SUCCESS(f"Wrote benchmark report to {options['output']}"))
+        else:
+            self.stdout.write(output)
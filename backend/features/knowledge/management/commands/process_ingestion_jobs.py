@@ -0,0 +1,25 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from features.knowledge.services.ingestion_worker import run_workers
+
+
+class Command(BaseCommand):
+    help = "Run worker processes that parse and index queued knowledge uploads"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--workers",
+            type=int,
+            default=getattr(settings, "INGESTION_WORKER_COUNT", 2),
+            help="Number of worker processes (default: INGESTION_WORKER_COUNT or 2)",
+        )
+        parser.add_argument(
+            "--once",
+            action="store_true",
+            help="Exit once the queue is empty instead of polling for new jobs",
+        )
+
+    def handle(self, *args, **options):
+        self.stdout.write(f"Starting {options['workers']} ingestion worker(s)")
+        run_workers(options["workers"], once=options["once"])
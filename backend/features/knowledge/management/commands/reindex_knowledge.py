@@ -0,0 +1,24 @@
+from django.core.management.base import BaseCommand
+
+from features.knowledge.services.knowledge_service import KnowledgeService
+
+
+class Command(BaseCommand):
+    help = "Rebuild the knowledge vector index in a shadow collection and swap it in when complete"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--restart",
+            action="store_true",
+            help="Abandon an unfinished reindex instead of resuming it",
+        )
+
+    def handle(self, *args, **options):
+        def progress(fraction, message):
+            self.stdout.write(f"[{fraction:6.1%}] {message}")
+
+        job = KnowledgeService().reindex_all_knowledge(progress=progress, restart=options["restart"])
+        self.stdout.write(self.style.SUCCESS(
+            f"Reindexed {job.processed_documents} documents ({job.failed_documents} failed) "
+            f"into {job.collection_name}"
+        ))
@@ -0,0 +1,18 @@
+# Generated by Django 5.1.4 on 2026-10-16 21:01
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("knowledge", "0001_initial"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="knowledge",
+            name="ingestion_stats",
+            field=models.JSONField(blank=True, null=True),
+        ),
+    ]
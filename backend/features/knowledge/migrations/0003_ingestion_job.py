@@ -0,0 +1,39 @@
+# Generated by Django 5.1.4 on 2026-10-16 21:08
+
+import django.db.models.deletion
+import uuid
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("knowledge", "0002_knowledge_ingestion_stats"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="IngestionJob",
+            fields=[
+                ("id", models.UUIDField(default=uuid.uuid4, primary_key=True, serialize=False)),
+                ("created_at", models.DateTimeField(auto_now_add=True, db_index=True)),
+                ("updated_at", models.DateTimeField(auto_now=True)),
+                ("file_path", models.CharField(max_length=1024)),
+                ("file_name", models.CharField(max_length=255)),
+                ("content_type", models.CharField(blank=True, default="", max_length=100)),
+                ("status", models.CharField(choices=[("queued", "Queued"), ("running", "Running"), ("succeeded", "Succeeded"), ("failed", "Failed")], default="queued", max_length=20)),
+                ("progress", models.FloatField(default=0.0)),
+                ("progress_message", models.CharField(blank=True, default="", max_length=255)),
+                ("attempts", models.IntegerField(default=0)),
+                ("max_attempts", models.IntegerField(default=3)),
+                ("available_at", models.DateTimeField(db_index=True)),
+                ("locked_by", models.CharField(blank=True, max_length=255, null=True)),
+                ("heartbeat_at", models.DateTimeField(blank=True, null=True)),
+                ("last_error", models.TextField(blank=True, null=True)),
+                ("knowledge", models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name="ingestion_jobs", to="knowledge.knowledge")),
+            ],
+            options={
+                "indexes": [models.Index(fields=["status", "available_at"], name="knowledge_i_status_4c4442_idx")],
+            },
+        ),
+    ]
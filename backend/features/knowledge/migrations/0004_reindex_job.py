@@ -0,0 +1,37 @@
+# Generated by Django 5.1.4 on 2026-10-16 22:22
+
+import uuid
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("knowledge", "0003_ingestion_job"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="ReindexJob",
+            fields=[
+                ("id", models.UUIDField(default=uuid.uuid4, primary_key=True, serialize=False)),
+                ("created_at", models.DateTimeField(auto_now_add=True, db_index=True)),
+                ("updated_at", models.DateTimeField(auto_now=True)),
+                ("collection_name", models.CharField(max_length=255)),
+                ("status", models.CharField(choices=[("running", "Running"), ("succeeded", "Succeeded"), ("failed", "Failed"), ("abandoned", "Abandoned")], default="running", max_length=20)),
+                ("total_documents", models.IntegerField(default=0)),
+                ("processed_documents", models.IntegerField(default=0)),
+                ("failed_documents", models.IntegerField(default=0)),
+                ("stored_chunks", models.IntegerField(default=0)),
+                ("cursor_created_at", models.DateTimeField(blank=True, null=True)),
+                ("cursor_id", models.UUIDField(blank=True, null=True)),
+                ("locked_by", models.CharField(blank=True, max_length=255, null=True)),
+                ("heartbeat_at", models.DateTimeField(blank=True, null=True)),
+                ("finished_at", models.DateTimeField(blank=True, null=True)),
+                ("last_error", models.TextField(blank=True, null=True)),
+            ],
+            options={
+                "abstract": False,
+            },
+        ),
+    ]
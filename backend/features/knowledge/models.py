@@ -26,6 +26,7 @@ class Knowledge(BaseModel):
         default="ready",
     )
     error_message = models.TextField(null=True, blank=True)
+    ingestion_stats = models.JSONField(null=True, blank=True)
 
     class Meta:
         verbose_name_plural = "Knowledge"
@@ -36,3 +37,73 @@ class Knowledge(BaseModel):
 
     def __str__(self):
         return f"{self.name} ({self.identifier})"
+
+
+class IngestionJob(BaseModel):
+    """A queued request to parse and index an uploaded file, processed by `process_ingestion_jobs`"""
+
+    knowledge = models.ForeignKey(
+        Knowledge, on_delete=models.CASCADE, related_name="ingestion_jobs"
+    )
+    file_path = models.CharField(max_length=1024)
+    file_name = models.CharField(max_length=255)
+    content_type = models.CharField(max_length=100, blank=True, default="")
+    status = models.CharField(
+        max_length=20,
+        choices=[
+            ("queued", "Queued"),
+            ("running", "Running"),
+            ("succeeded", "Succeeded"),
+            ("failed", "Failed"),
+        ],
+        default="queued",
+    )
+    progress = models.FloatField(default=0.0)
+    progress_message = models.CharField(max_length=255, blank=True, default="")
+    attempts = models.IntegerField(default=0)
+    max_attempts = models.IntegerField(default=3)
+    available_at = models.DateTimeField(db_index=True)
+    locked_by = models.CharField(max_length=255, null=True, blank=True)
+    heartbeat_at = models.DateTimeField(null=True, blank=True)
+    last_error = models.TextField(null=True, blank=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=["status", "available_at"]),
+        ]
+
+    def __str__(self):
+        return f"IngestionJob {self.id} ({self.status})"
+
+
+class ReindexJob(BaseModel):
+    """
+    A rebuild of the vector index into a shadow collection, run by `reindex_knowledge`.
+    Documents are processed in (created_at, id) order and the cursor is saved after
+    each page, so an interrupted job resumes where it stopped.
+    """
+
+    collection_name = models.CharField(max_length=255)
+    status = models.CharField(
+        max_length=20,
+        choices=[
+            ("running", "Running"),
+            ("succeeded", "Succeeded"),
+            ("failed", "Failed"),
+            ("abandoned", "Abandoned"),
+        ],
+        default="running",
+    )
+    total_documents = models.IntegerField(default=0)
+    processed_documents = models.IntegerField(default=0)
+    failed_documents = models.IntegerField(default=0)
+    stored_chunks = models.IntegerField(default=0)
+    cursor_created_at = models.DateTimeField(null=True, blank=True)
+    cursor_id = models.UUIDField(null=True, blank=True)
+    locked_by = models.CharField(max_length=255, null=True, blank=True)
+    heartbeat_at = models.DateTimeField(null=True, blank=True)
+    finished_at = models.DateTimeField(null=True, blank=True)
+    last_error = models.TextField(null=True, blank=True)
+
+    def __str__(self):
+        return f"ReindexJob {self.id} ({self.status})"
@@ -0,0 +1,464 @@
+import logging
+import multiprocessing
+import os
+import threading
+import time
+import uuid
+from contextlib import contextmanager
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from typing import Dict, List, Optional
+
+import chromadb
+from chromadb.config import Settings
+from django.conf import settings
+from ollama import Client
+
+from api.services.cache_service import CacheService, is_shared
+from features.knowledge.services.collection_aliases import CollectionAliases
+from features.knowledge.services.dedup import MAX_DISTANCE, DuplicateIndex
+from features.knowledge.services.embedding_batcher import EmbeddingBatcher
+from features.knowledge.services.embedding_cache import EmbeddingCache
+from features.knowledge.services.keyword_index import KeywordIndex
+from features.knowledge.services.parse_pool import init_worker
+from features.knowledge.services.vector_store import ChromaVectorStore, NumpyVectorStore, VectorStore
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_COLLECTION = "knowledge_embeddings"
+
+# VECTOR_STORE_BACKEND values: "chroma" keeps an HNSW index in ChromaDB, "numpy"
+# scans a memory-mapped matrix per user (see NumpyVectorStore), or with
+# VECTOR_STORE_PRECISION float16/int8 a reduced-precision copy of it
+VECTOR_STORE_BACKENDS = ("chroma", "numpy")
+
+
+class VectorStoreRegistry:
+    """
+    Process-wide owner of the vector store client, its collections, the embedding
+    client, the query executor and the pool of parse processes. Services borrow
+    these instead of building their own on every request.
+
+    State is tied to the process that created it, so a worker forked from a
+    preloaded parent rebuilds its own client, threads and locks on first use.
+    """
+
+    def __init__(self):
+        self._lock = threading.RLock()
+        self._reset()
+
+    def _reset(self):
+        self._pid = os.getpid()
+        self._client = None
+        self._ollama_client = None
+        self._search_executor: Optional[ThreadPoolExecutor] = None
+        self._parse_executor: Optional[ProcessPoolExecutor] = None
+        self._parse_manager = None
+        self._embedding_cache: Optional[EmbeddingCache] = None
+        self._embedding_batcher: Optional[EmbeddingBatcher] = None
+        self._keyword_index: Optional[KeywordIndex] = None
+        self._duplicate_index: Optional[DuplicateIndex] = None
+        self._search_cache: Optional[CacheService] = None
+        self._chunks_cache: Optional[CacheService] = None
+        self._collection_aliases: Optional[CollectionAliases] = None
+        self._model_versions: Dict[str, str] = {}
+        self._context_lengths: Dict[str, Optional[int]] = {}
+        self._collections: Dict[str, VectorStore] = {}
+        self._writing = threading.local()
+
+    def _ensure_process(self):
+        if self._pid != os.getpid():
+            self._lock = threading.RLock()
+            self._reset()
+
+    def initialize(self):
+        """Open the vector store and the active default collection. Safe to call repeatedly."""
+        self.get_active_collection()
+        logger.info(f"Vector store ({self.backend}) initialized at {self.store_dir}")
+
+    def warm_up(self):
+        """
+        Open the vector store ahead of the first request. Called by the server
+        and worker entrypoints only, so management commands and tests never
+        open it unless they use it; failures are logged and retried on first use.
+        """
+        try:
+            self.initialize()
+        except Exception as e:
+            logger.error(f"Failed to initialize vector store: {str(e)}")
+
+    @property
+    def backend(self) -> str:
+        backend = getattr(settings, "VECTOR_STORE_BACKEND", "chroma")
+        if backend not in VECTOR_STORE_BACKENDS:
+            raise ValueError(
+                f"Unknown vector store backend {backend!r}; expected one of {', '.join(VECTOR_STORE_BACKENDS)}"
+            )
+        return backend
+
+    @property
+    def store_dir(self) -> str:
+        """Directory holding the collections of the configured backend"""
+        if self.backend == "numpy":
+            return getattr(
+                settings,
+                "VECTOR_STORE_DIR",
+                os.path.join(os.path.dirname(settings.CHROMA_PERSIST_DIR), "vectors"),
+            )
+        return settings.CHROMA_PERSIST_DIR
+
+    @property
+    def client(self):
+        self._ensure_process()
+        if self._client is None:
+            with self._lock:
+                if self._client is None:
+                    self._client = chromadb.PersistentClient(
+                        path=settings.CHROMA_PERSIST_DIR,
+                        settings=Settings(anonymized_telemetry=False, allow_reset=False, is_persistent=True),
+                    )
+        return self._client
+
+    @property
+    def ollama_client(self) -> Client:
+        self._ensure_process()
+        if self._ollama_client is None:
+            with self._lock:
+                if self._ollama_client is None:
+                    self._ollama_client = Client(host=settings.OLLAMA_ENDPOINT)
+        return self._ollama_client
+
+    @property
+    def search_executor(self) -> ThreadPoolExecutor:
+        """Executor for query-time work such as the legs of a hybrid search"""
+        self._ensure_process()
+        if self._search_executor is None:
+            with self._lock:
+                if self._search_executor is None:
+                    self._search_executor = ThreadPoolExecutor(
+                        max_workers=getattr(settings, "SEARCH_WORKERS", 4),
+                        thread_name_prefix="knowledge-search",
+                    )
+        return self._search_executor
+
+    @property
+    def parse_executor(self) -> ProcessPoolExecutor:
+        """
+        Processes for CPU-bound file parsing (PDF, DOCX, PPTX, HTML), so a large
+        upload does not hold the GIL of the process that embeds and serves
+        queries. Workers are spawned rather than forked, since this process
+        runs threads and holds database connections.
+        """
+        self._ensure_process()
+        if self._parse_executor is None:
+            with self._lock:
+                if self._parse_executor is None:
+                    self._parse_executor = ProcessPoolExecutor(
+                        max_workers=max(1, getattr(settings, "INGESTION_PARSE_WORKERS", 2)),
+                        mp_context=multiprocessing.get_context("spawn"),
+                        initializer=init_worker,
+                    )
+        return self._parse_executor
+
+    @property
+    def parse_manager(self):
+        """Manager serving the bounded queues that parse workers stream sections through"""
+        self._ensure_process()
+        if self._parse_manager is None:
+            with self._lock:
+                if self._parse_manager is None:
+                    self._parse_manager = multiprocessing.get_context("spawn").Manager()
+        return self._parse_manager
+
+    @property
+    def embedding_cache(self) -> EmbeddingCache:
+        self._ensure_process()
+        if self._embedding_cache is None:
+            with self._lock:
+                if self._embedding_cache is None:
+                    self._embedding_cache = EmbeddingCache(
+                        path=getattr(
+                            settings,
+                            "EMBEDDING_CACHE_PATH",
+                            os.path.join(os.path.dirname(settings.CHROMA_PERSIST_DIR), "embedding_cache.sqlite3"),
+                        ),
+                        max_bytes=getattr(settings, "EMBEDDING_CACHE_MAX_BYTES", 512 * 1024 * 1024),
+                        precision=getattr(settings, "EMBEDDING_CACHE_PRECISION", "float32"),
+                    )
+        return self._embedding_cache
+
+    @property
+    def embedding_batcher(self) -> EmbeddingBatcher:
+        """Dispatcher that batches concurrent single-text embedding calls"""
+        self._ensure_process()
+        if self._embedding_batcher is None:
+            with self._lock:
+                if self._embedding_batcher is None:
+                    self._embedding_batcher = EmbeddingBatcher(
+                        max_wait=getattr(settings, "EMBEDDING_MICROBATCH_MAX_WAIT_MS", 5) / 1000,
+                        max_batch_size=getattr(settings, "EMBEDDING_MICROBATCH_MAX_SIZE", 32),
+                    )
+        return self._embedding_batcher
+
+    @property
+    def keyword_index(self) -> KeywordIndex:
+        self._ensure_process()
+        if self._keyword_index is None:
+            with self._lock:
+                if self._keyword_index is None:
+                    self._keyword_index = KeywordIndex(
+                        path=getattr(
+                            settings,
+                            "KEYWORD_INDEX_PATH",
+                            os.path.join(os.path.dirname(settings.CHROMA_PERSIST_DIR), "keyword_index.sqlite3"),
+                        ),
+                    )
+        return self._keyword_index
+
+    @property
+    def duplicate_index(self) -> DuplicateIndex:
+        self._ensure_process()
+        if self._duplicate_index is None:
+            with self._lock:
+                if self._duplicate_index is None:
+                    self._duplicate_index = DuplicateIndex(
+                        path=getattr(
+                            settings,
+                            "DEDUP_INDEX_PATH",
+                            os.path.join(os.path.dirname(settings.CHROMA_PERSIST_DIR), "duplicate_index.sqlite3"),
+                        ),
+                        max_distance=getattr(settings, "DEDUP_MAX_DISTANCE", MAX_DISTANCE),
+                    )
+        return self._duplicate_index
+
+    @property
+    def search_cache(self) -> CacheService:
+        """
+        Hybrid search results keyed by corpus generation. With a shared L2
+        (Redis), every process sees every bump, so entries can live long.
+        Otherwise the cache and its generations stay in this process, and a
+        short TTL bounds how stale results of changes made elsewhere get.
+        """
+        self._ensure_process()
+        if self._search_cache is None:
+            with self._lock:
+                if self._search_cache is None:
+                    shared = is_shared()
+                    if not shared:
+                        logger.warning(
+                            "No shared cache configured (REDIS_URL); knowledge search results are cached per "
+                            "process and only invalidated by changes made in the same process"
+                        )
+                    self._search_cache = CacheService(
+                        "knowledge_search",
+                        ttl=getattr(settings, "SEARCH_RESULTS_CACHE_TTL", 86400 if shared else 300),
+                        max_entries=getattr(settings, "SEARCH_RESULTS_CACHE_MAX_SIZE", 100),
+                        backend="default" if shared else None,
+                    )
+        return self._search_cache
+
+    @property
+    def chunks_cache(self) -> CacheService:
+        """Chunks of knowledge documents by knowledge ID"""
+        self._ensure_process()
+        if self._chunks_cache is None:
+            with self._lock:
+                if self._chunks_cache is None:
+                    self._chunks_cache = CacheService(
+                        "knowledge_chunks",
+                        ttl=getattr(settings, "CHUNKS_CACHE_TTL", 300),
+                        max_entries=getattr(settings, "CHUNKS_CACHE_MAX_SIZE", 50),
+                    )
+        return self._chunks_cache
+
+    @property
+    def collection_aliases(self) -> CollectionAliases:
+        self._ensure_process()
+        if self._collection_aliases is None:
+            with self._lock:
+                if self._collection_aliases is None:
+                    self._collection_aliases = CollectionAliases(
+                        path=getattr(
+                            settings,
+                            "COLLECTION_ALIASES_PATH",
+                            os.path.join(os.path.dirname(settings.CHROMA_PERSIST_DIR), "collection_aliases.sqlite3"),
+                        ),
+                    )
+        return self._collection_aliases
+
+    def resolve_model_version(self, model: str) -> str:
+        """
+        Resolve the version of an Ollama embedding model (its digest) so cached
+        embeddings are invalidated when the model is re-pulled. Falls back to
+        ``EMBEDDING_MODEL_VERSION`` and is memoized once resolved.
+        """
+        self._ensure_process()
+        configured = getattr(settings, "EMBEDDING_MODEL_VERSION", None)
+        if configured:
+            return configured
+        version = self._model_versions.get(model)
+        if version:
+            return version
+        try:
+            response = self.ollama_client.list()
+            for entry in response.get("models", []):
+                name = entry.get("name") or entry.get("model", "")
+                if name in (model, f"{model}:latest"):
+                    version = entry.get("digest")
+                    break
+        except Exception as e:
+            logger.warning(f"Could not resolve version of embedding model {model}: {str(e)}")
+            return "unknown"
+        self._model_versions[model] = version or "unknown"
+        return self._model_versions[model]
+
+    def resolve_context_length(self, model: str) -> Optional[int]:
+        """
+        Tokens of input Ollama serves an embedding model with: its ``num_ctx``
+        parameter, or Ollama's default context (``OLLAMA_DEFAULT_NUM_CTX``),
+        capped by the context length the model was trained with. None when the
+        server cannot tell; memoized either way.
+        """
+        self._ensure_process()
+        if model in self._context_lengths:
+            return self._context_lengths[model]
+        length = None
+        try:
+            response = self.ollama_client.show(model)
+            info = response.get("model_info") or response.get("modelinfo") or {}
+            trained = next((value for key, value in info.items() if key.endswith(".context_length")), None)
+            served = getattr(settings, "OLLAMA_DEFAULT_NUM_CTX", 2048)
+            for line in (response.get("parameters") or "").splitlines():
+                name, _, value = line.strip().partition(" ")
+                if name == "num_ctx" and value.strip().isdigit():
+                    served = int(value.strip())
+            length = min(served, int(trained)) if trained else served
+        except Exception as e:
+            logger.warning(f"Could not resolve context length of embedding model {model}: {str(e)}")
+        self._context_lengths[model] = length
+        return length
+
+    def get_collection(self, name: str = DEFAULT_COLLECTION) -> VectorStore:
+        """Get or create a cosine-space collection, cached for the lifetime of the process"""
+        self._ensure_process()
+        collection = self._collections.get(name)
+        if collection is None:
+            with self._lock:
+                collection = self._collections.get(name)
+                if collection is None:
+                    if self.backend == "numpy":
+                        collection = NumpyVectorStore(
+                            os.path.join(self.store_dir, name),
+                            precision=getattr(settings, "VECTOR_STORE_PRECISION", "float32"),
+                            oversample=getattr(settings, "VECTOR_STORE_OVERSAMPLE", 4),
+                        )
+                    else:
+                        collection = ChromaVectorStore(self.client.get_or_create_collection(
+                            name=name,
+                            metadata={"hnsw:space": "cosine"},
+                            embedding_function=None,  # We're using Ollama for embeddings
+                        ))
+                    self._collections[name] = collection
+        return collection
+
+    def list_collections(self) -> List[str]:
+        """Names of the collections in the vector store"""
+        if self.backend == "numpy":
+            if not os.path.isdir(self.store_dir):
+                return []
+            return sorted(
+                entry for entry in os.listdir(self.store_dir)
+                if os.path.isdir(os.path.join(self.store_dir, entry))
+            )
+        return [getattr(entry, "name", entry) for entry in self.client.list_collections()]
+
+    def forget_collection(self, name: str):
+        """Drop a cached collection handle, e.g. after it was deleted or renamed"""
+        with self._lock:
+            self._collections.pop(name, None)
+
+    def active_collection_name(self, alias: str = DEFAULT_COLLECTION) -> str:
+        """Name of the collection currently serving ``alias``; the alias itself until it is repointed"""
+        return self.collection_aliases.get(alias) or alias
+
+    def get_active_collection(self, alias: str = DEFAULT_COLLECTION):
+        """Get the collection currently serving ``alias``"""
+        return self.get_collection(self.active_collection_name(alias))
+
+    @contextmanager
+    def collection_writes(self, alias: str = DEFAULT_COLLECTION, knowledge_ids=()):
+        """
+        Register writes to the collection serving ``alias`` for every process,
+        waiting while a reindex holds its fence (see ``collection_fence``).
+        Resolve the active collection inside the block: a swap may just have
+        repointed ``alias``. Nested blocks on the same thread register once.
+        
+        Keep the block to a single batch of writes: a reindex waits for it
+        before swapping collections. ``knowledge_ids`` names the documents
+        written, which a reindex in progress catches up with.
+        """
+        self._ensure_process()
+        if getattr(self._writing, "depth", 0):
+            self._writing.depth += 1
+            self._writing.knowledge_ids.update(knowledge_ids)
+            try:
+                yield
+            finally:
+                self._writing.depth -= 1
+            return
+        
+        writer_id = f"{os.getpid()}:{threading.get_ident()}:{uuid.uuid4().hex[:8]}"
+        while not self.collection_aliases.begin_write(alias, writer_id):
+            time.sleep(getattr(settings, "REINDEX_FENCE_POLL", 0.1))
+        self._writing.depth = 1
+        self._writing.knowledge_ids = set(knowledge_ids)
+        try:
+            yield
+        finally:
+            self._writing.depth = 0
+            self.collection_aliases.end_write(writer_id, self._writing.knowledge_ids)
+
+    @contextmanager
+    def collection_fence(self, holder: str, alias: str = DEFAULT_COLLECTION):
+        """
+        Hold off writes to ``alias`` in every process and wait for the writes
+        in progress to finish, so the collection serving it stays unchanged
+        inside the block. Raises TimeoutError if writers are still busy after
+        ``REINDEX_FENCE_TIMEOUT`` seconds. The fence expires after twice that,
+        so a crashed holder cannot block writers for good.
+        """
+        timeout = getattr(settings, "REINDEX_FENCE_TIMEOUT", 300)
+        poll = getattr(settings, "REINDEX_FENCE_POLL", 0.1)
+        # Writes registered this long ago belong to a process that died mid-write
+        lease = getattr(settings, "REINDEX_WRITER_LEASE", 3600)
+        aliases = self.collection_aliases
+        aliases.raise_fence(alias, holder, 2 * timeout)
+        try:
+            deadline = time.monotonic() + timeout
+            while aliases.count_writers(alias, lease):
+                if time.monotonic() > deadline:
+                    raise TimeoutError(f"Writes to {alias} did not finish within {timeout}s")
+                time.sleep(poll)
+            yield
+        finally:
+            aliases.lift_fence(alias, holder)
+
+    def swap_collection(self, collection_name: str, alias: str = DEFAULT_COLLECTION) -> str:
+        """
+        Make ``collection_name`` serve ``alias`` for every process. Returns the
+        name of the collection it replaces, which is left in place so requests
+        still holding it can finish.
+        """
+        previous = self.collection_aliases.set(alias, collection_name)
+        return previous or alias
+
+    def delete_collection(self, name: str):
+        """Delete a collection from the vector store"""
+        self.forget_collection(name)
+        if self.backend == "numpy":
+            NumpyVectorStore.destroy(os.path.join(self.store_dir, name))
+        else:
+            self.client.delete_collection(name)
+
+
+# Singleton instance of the registry
+vector_store_registry = VectorStoreRegistry()
@@ -0,0 +1,132 @@
+import logging
+from datetime import timedelta
+from typing import Optional
+
+from django.db.models import F, Q
+from django.utils import timezone
+
+from features.knowledge.models import IngestionJob
+from api.utils.interfaces.base_repository import BaseRepository
+
+logger = logging.getLogger(__name__)
+
+
+class IngestionJobRepository(BaseRepository[IngestionJob]):
+    def __init__(self):
+        super().__init__(IngestionJob)
+        self.logger = logger
+
+    def enqueue(self, knowledge, file_path: str, file_name: str, content_type: str, max_attempts: int = 3) -> IngestionJob:
+        """
+        Queue a file for ingestion. A job of the same document still waiting in
+        the queue is superseded: it takes over the new file. While a job of the
+        document runs, the file is queued as a follow-up job, which is only
+        claimed once the running one finishes (see ``claim_next``).
+        """
+        now = timezone.now()
+        for queued in IngestionJob.objects.filter(knowledge=knowledge, status="queued"):
+            # Compare-and-swap, so a job claimed in the meantime keeps its file
+            superseded = IngestionJob.objects.filter(id=queued.id, status="queued").update(
+                file_path=file_path,
+                file_name=file_name,
+                content_type=content_type or "",
+                attempts=0,
+                max_attempts=max_attempts,
+                available_at=now,
+                last_error=None,
+                progress=0.0,
+                progress_message="",
+                updated_at=now,
+            )
+            if superseded:
+                self.logger.info(f"Ingestion job {queued.id} of knowledge {knowledge.id} now ingests {file_name}")
+                return IngestionJob.objects.get(id=queued.id)
+        return IngestionJob.objects.create(
+            knowledge=knowledge,
+            file_path=file_path,
+            file_name=file_name,
+            content_type=content_type or "",
+            max_attempts=max_attempts,
+            available_at=timezone.now(),
+        )
+
+    def claim_next(self, worker_id: str, lease_seconds: int) -> Optional[IngestionJob]:
+        """
+        Atomically claim the next runnable job. Jobs whose worker stopped sending
+        heartbeats for longer than the lease are considered abandoned and reclaimed;
+        the abandoned run counts as a failed attempt, so a job that keeps killing
+        its worker runs out of attempts (see ``IngestionWorker.execute``).
+        """
+        now = timezone.now()
+        stale = now - timedelta(seconds=lease_seconds)
+        runnable = Q(status="queued", available_at__lte=now) | Q(status="running", heartbeat_at__lt=stale)
+        # Follow-up jobs wait until the running job of their document finishes
+        busy = IngestionJob.objects.filter(status="running", heartbeat_at__gte=stale).values("knowledge_id")
+        candidates = IngestionJob.objects.filter(runnable).exclude(
+            status="queued", knowledge_id__in=busy
+        ).order_by("available_at").values_list(
+            "id", "status", "heartbeat_at", "locked_by"
+        )[:10]
+
+        for job_id, status, heartbeat_at, locked_by in candidates:
+            data = {"status": "running", "locked_by": worker_id, "heartbeat_at": now, "updated_at": now}
+            if status == "running":
+                data.update(attempts=F("attempts") + 1, last_error=f"Worker {locked_by} stopped responding")
+            # Compare-and-swap on the state we read, so only one worker wins the job
+            claimed = IngestionJob.objects.filter(
+                id=job_id, status=status, heartbeat_at=heartbeat_at
+            ).update(**data)
+            if claimed:
+                return IngestionJob.objects.select_related("knowledge").get(id=job_id)
+        return None
+
+    def report_progress(self, job: IngestionJob, progress: float, message: str = ""):
+        """Record progress; doubles as the worker heartbeat"""
+        now = timezone.now()
+        job.progress = progress
+        job.progress_message = message[:255]
+        job.heartbeat_at = now
+        IngestionJob.objects.filter(id=job.id).update(
+            progress=progress, progress_message=job.progress_message, heartbeat_at=now, updated_at=now
+        )
+
+    def mark_succeeded(self, job: IngestionJob):
+        self.update(job.id, {
+            "status": "succeeded",
+            "progress": 1.0,
+            "progress_message": "done",
+            "locked_by": None,
+            "last_error": None,
+        })
+
+    def mark_failed(self, job: IngestionJob, error: str, retry_in: Optional[float]):
+        """Record a failed attempt, rescheduling the job after ``retry_in`` seconds if given"""
+        data = {
+            "attempts": job.attempts + 1,
+            "last_error": error,
+            "locked_by": None,
+            "heartbeat_at": None,
+        }
+        if retry_in is not None:
+            data.update({
+                "status": "queued",
+                "available_at": timezone.now() + timedelta(seconds=retry_in),
+                "progress": 0.0,
+                "progress_message": f"retrying in {int(retry_in)}s",
+            })
+        else:
+            data["status"] = "failed"
+        return self.update(job.id, data)
+
+    def active_file_paths(self, knowledge_id) -> set:
+        """Files of the queued and running jobs of a document"""
+        return set(
+            IngestionJob.objects.filter(knowledge_id=knowledge_id, status__in=["queued", "running"])
+            .values_list("file_path", flat=True)
+        )
+
+    def has_queued(self, knowledge_id) -> bool:
+        return IngestionJob.objects.filter(knowledge_id=knowledge_id, status="queued").exists()
+
+    def get_latest_for_knowledge(self, knowledge_id) -> Optional[IngestionJob]:
+        return IngestionJob.objects.filter(knowledge_id=knowledge_id).order_by("-created_at").first()
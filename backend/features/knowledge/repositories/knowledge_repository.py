@@ -1,6 +1,8 @@
 import logging
 from typing import List, Optional
 
+from django.db.models import Q
+
 from features.knowledge.models import Knowledge
 from api.utils.interfaces.base_repository import BaseRepository
 
@@ -101,3 +103,16 @@ class KnowledgeRepository(BaseRepository[Knowledge]):
             return Knowledge.objects.get(identifier=identifier, user_id=user_id)
         except Knowledge.DoesNotExist:
             return None
+
+    def list_page_after(self, created_at=None, knowledge_id=None, limit: int = 100) -> List[Knowledge]:
+        """Get documents in (created_at, id) order, starting after the given position"""
+        queryset = Knowledge.objects.order_by("created_at", "id")
+        if created_at is not None:
+            queryset = queryset.filter(
+                Q(created_at__gt=created_at) | Q(created_at=created_at, id__gt=knowledge_id)
+            )
+        return list(queryset[:limit])
+
+    def list_updated_since(self, since, knowledge_ids=()) -> List[Knowledge]:
+        """Get documents modified at or after ``since``, and the documents in ``knowledge_ids``"""
+        return Knowledge.objects.filter(Q(updated_at__gte=since) | Q(id__in=list(knowledge_ids))).order_by("created_at", "id")
@@ -0,0 +1,86 @@
+import logging
+from datetime import timedelta
+from typing import Optional
+
+from django.db.models import Q
+from django.utils import timezone
+
+from features.knowledge.models import ReindexJob
+from api.utils.interfaces.base_repository import BaseRepository
+
+logger = logging.getLogger(__name__)
+
+
+class ReindexJobRepository(BaseRepository[ReindexJob]):
+    def __init__(self):
+        super().__init__(ReindexJob)
+        self.logger = logger
+
+    def get_unfinished(self) -> Optional[ReindexJob]:
+        """The most recent job that was started but has not finished"""
+        return ReindexJob.objects.filter(status__in=["running", "failed"]).order_by("-created_at").first()
+
+    def start(self, collection_name: str, worker_id: str) -> ReindexJob:
+        now = timezone.now()
+        return ReindexJob.objects.create(
+            collection_name=collection_name, locked_by=worker_id, heartbeat_at=now
+        )
+
+    def claim(self, job: ReindexJob, worker_id: str, lease_seconds: int) -> bool:
+        """
+        Take over an unfinished job. A running job is only taken over when its
+        worker stopped sending heartbeats for longer than the lease.
+        """
+        now = timezone.now()
+        stale = now - timedelta(seconds=lease_seconds)
+        claimable = Q(status="failed") | Q(status="running", heartbeat_at__lt=stale) | Q(heartbeat_at__isnull=True)
+        # Compare-and-swap on the heartbeat we read, so only one worker wins the job
+        claimed = ReindexJob.objects.filter(claimable, id=job.id, heartbeat_at=job.heartbeat_at).update(
+            status="running", locked_by=worker_id, heartbeat_at=now, updated_at=now
+        )
+        if claimed:
+            job.refresh_from_db()
+        return bool(claimed)
+
+    def checkpoint(self, job: ReindexJob, cursor_created_at, cursor_id, processed: int, failed: int, chunks: int):
+        """Save the position after a completed page; doubles as the worker heartbeat"""
+        now = timezone.now()
+        job.cursor_created_at = cursor_created_at
+        job.cursor_id = cursor_id
+        job.processed_documents += processed
+        job.failed_documents += failed
+        job.stored_chunks += chunks
+        job.heartbeat_at = now
+        ReindexJob.objects.filter(id=job.id).update(
+            cursor_created_at=cursor_created_at,
+            cursor_id=cursor_id,
+            processed_documents=job.processed_documents,
+            failed_documents=job.failed_documents,
+            stored_chunks=job.stored_chunks,
+            heartbeat_at=now,
+            updated_at=now,
+        )
+
+    def mark_succeeded(self, job: ReindexJob):
+        return self.update(job.id, {
+            "status": "succeeded",
+            "locked_by": None,
+            "finished_at": timezone.now(),
+            "last_error": None,
+        })
+
+    def mark_failed(self, job: ReindexJob, error: str):
+        return self.update(job.id, {
+            "status": "failed",
+            "locked_by": None,
+            "heartbeat_at": None,
+            "last_error": error,
+        })
+
+    def mark_abandoned(self, job: ReindexJob):
+        """Give up on a job so the next run starts from scratch"""
+        return self.update(job.id, {
+            "status": "abandoned",
+            "locked_by": None,
+            "finished_at": timezone.now(),
+        })
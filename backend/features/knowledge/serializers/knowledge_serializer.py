@@ -4,6 +4,8 @@ from features.knowledge.models import Knowledge
 
 
 class KnowledgeSerializer(serializers.ModelSerializer):
+    ingestion_job = serializers.SerializerMethodField()
+
     class Meta:
         model = Knowledge
         fields = [
@@ -17,8 +19,34 @@ class KnowledgeSerializer(serializers.ModelSerializer):
             "file_size",
             "file_type",
             "status",
+            "ingestion_stats",
+            "ingestion_job",
+        ]
+        read_only_fields = [
+            "id",
+            "created_at",
+            "updated_at",
+            "file_path",
+            "file_size",
+            "file_type",
+            "status",
+            "ingestion_stats",
         ]
-        read_only_fields = ["id", "created_at", "updated_at", "file_path", "file_size", "file_type", "status"]
+
+    def get_ingestion_job(self, obj):
+        """Progress of the most recent ingestion job, if the document came from an upload"""
+        jobs = sorted(obj.ingestion_jobs.all(), key=lambda job: job.created_at, reverse=True)
+        if not jobs:
+            return None
+        job = jobs[0]
+        return {
+            "id": str(job.id),
+            "status": job.status,
+            "progress": job.progress,
+            "message": job.progress_message,
+            "attempts": job.attempts,
+            "last_error": job.last_error,
+        }
 
     def create(self, validated_data):
         user = self.context["request"].user
@@ -0,0 +1,328 @@
+import re
+from collections import deque
+from dataclasses import dataclass
+from functools import partial
+from typing import Callable, Iterable, Iterator, List, Optional, Union
+
+from features.knowledge.services.tokens import Tokenizer
+
+# A sentence ends at whitespace following . ! or ?; a paragraph ends at a run of
+# whitespace holding two or more newlines. Both are found in one pass and told
+# apart by the newlines in the matched run. The pattern starts with a single
+# character class so the regex engine can skip ahead between candidates.
+_BOUNDARY = re.compile(r"[.!?\n](?:(?<=[.!?])(\s+)|(?<=\n)\s*\n)")
+
+
+def simple_chunks(text: str, chunk_size: int = 1000, overlap: int = 100) -> Iterator[str]:
+    """
+    Split ``text`` by character count, breaking at a space or newline in the
+    last 50 characters of a chunk where possible.
+    """
+    start = 0
+    while start < len(text):
+        end = min(start + chunk_size, len(text))
+
+        # If this is not the first chunk and we're not at the end,
+        # try to find a good breaking point (space or newline)
+        if start > 0 and end < len(text):
+            break_point = text.rfind(' ', end - 50, end)
+            if break_point == -1:
+                break_point = text.rfind('\n', end - 50, end)
+
+            if break_point != -1:
+                end = break_point + 1  # Include the space or newline
+
+        yield text[start:end]
+
+        # Move start position for next chunk, considering overlap
+        start = end - overlap if end < len(text) else len(text)
+
+
+class _ChunkBuilder:
+    """
+    Packs sentences into chunks of about ``chunk_size`` units of ``measure``.
+    A new chunk starts with the trailing sentences of the previous one, up to
+    ``overlap`` units. The chunk is kept as a list of parts and the overlap
+    window as a deque with a running size, so each sentence is measured once.
+    Chunks over ``max_size`` are cut with ``split``.
+    """
+
+    def __init__(self, chunk_size: int, overlap: int, measure: Callable[[str], int],
+                 max_size: float, split: Callable[[str], Iterable[str]]):
+        self.chunk_size = chunk_size
+        self.overlap = overlap
+        self.measure = measure
+        self.max_size = max_size
+        self.split = split
+        self.paragraph_break = measure("\n\n")
+        self.parts: List[str] = []
+        self.length = 0
+        self.last_char = ""
+        self.recent = deque()
+        self.recent_length = 0
+        # Chunks completed and not yet handed out
+        self.ready: List[str] = []
+
+    def add_sentence(self, sentence: str):
+        size = self.measure(sentence)
+        if self.length + size + 1 > self.chunk_size and self.length:
+            self._emit()
+
+            # Start the new chunk with the last sentences that fit in the overlap
+            carried = []
+            carried_size = 0
+            for previous, previous_size in reversed(self.recent):
+                if carried_size + previous_size > self.overlap:
+                    break
+                carried.append(previous)
+                carried_size += previous_size + 1
+            carried.reverse()
+
+            self.parts = [" ".join(carried) + " ", sentence] if carried else [sentence]
+            self.length = carried_size + size
+            self.last_char = sentence[-1]
+            self.recent = deque([(sentence, size)])
+            self.recent_length = size + 1
+            return
+
+        if self.length and self.last_char != " ":
+            self.parts.append(" ")
+            self.length += 1
+        self.parts.append(sentence)
+        self.length += size
+        self.last_char = sentence[-1]
+
+        # Only keep enough sentences for overlap
+        recent = self.recent
+        recent.append((sentence, size))
+        self.recent_length += size + 1
+        while recent and self.recent_length > self.overlap * 2:
+            self.recent_length -= recent.popleft()[1] + 1
+
+    def end_paragraph(self):
+        if self.length and self.last_char != "\n":
+            self.parts.append("\n\n")
+            self.length += self.paragraph_break
+            self.last_char = "\n"
+
+    def finish(self):
+        if self.length:
+            self._emit()
+        self.parts = []
+        self.length = 0
+        self.last_char = ""
+
+    def _emit(self):
+        chunk = "".join(self.parts)
+        if self.measure(chunk) > self.max_size:
+            # A single sentence far over the target; fall back to splitting by size
+            self.ready.extend(self.split(chunk))
+        else:
+            self.ready.append(chunk)
+
+
+class SemanticChunker:
+    """
+    Streaming chunker that respects paragraph and sentence boundaries.
+
+    Text is fed in pieces of any size with :meth:`feed`, which returns the
+    chunks completed so far; :meth:`close` returns the rest. Only the sentence
+    in progress and the whitespace at the end of the last piece are buffered,
+    so the work is linear in the length of the text and chunks do not depend
+    on where the pieces were cut.
+
+    Sizes are in characters, or in tokens when a ``tokenizer`` is given. Chunks
+    over ``max_size`` (1.5 x ``chunk_size`` by default) are cut to
+    ``chunk_size``; with a tokenizer, pass the embedding model's window so no
+    chunk exceeds it.
+
+    Example:
+        chunker = SemanticChunker(chunk_size=1000, overlap=100)
+        for block in blocks:
+            store(chunker.feed(block))
+        store(chunker.close())
+    """
+
+    def __init__(self, chunk_size: int = 1000, overlap: int = 100,
+                 tokenizer: Optional[Tokenizer] = None, max_size: Optional[int] = None):
+        if max_size is None:
+            max_size = chunk_size * 1.5
+        if tokenizer is None:
+            measure = len
+            split = partial(simple_chunks, chunk_size=chunk_size, overlap=overlap)
+        else:
+            measure = tokenizer.count
+            split = partial(tokenizer.split, max_tokens=chunk_size, overlap=overlap)
+        self._builder = _ChunkBuilder(chunk_size, overlap, measure, max_size, split)
+        # Pieces of the sentence in progress
+        self._sentence: List[str] = []
+        self._paragraph_has_text = False
+        # Whitespace at the end of the text fed so far, and the character before it.
+        # The run may still grow into a sentence or paragraph break.
+        self._pending = ""
+        self._before_pending = ""
+
+    def feed(self, text: str) -> List[str]:
+        """Add ``text`` and return the chunks it completed"""
+        if text:
+            self._scan(text, final=False)
+        return self._take()
+
+    def close(self) -> List[str]:
+        """Return the remaining chunks; the chunker can be reused afterwards"""
+        self._scan("", final=True)
+        self._end_sentence()
+        if self._paragraph_has_text:
+            self._builder.end_paragraph()
+        self._paragraph_has_text = False
+        self._builder.finish()
+        self._before_pending = ""
+        return self._take()
+
+    def _take(self) -> List[str]:
+        ready = self._builder.ready
+        self._builder.ready = []
+        return ready
+
+    def _scan(self, text: str, final: bool):
+        window = self._before_pending + self._pending + text
+        cursor = len(self._before_pending)
+        end = len(window)
+        if not final:
+            # Whitespace at the end of the window is unfinished; hold it back
+            end = len(window.rstrip())
+            if end == 0:
+                self._pending = window[cursor:]
+                return
+
+        sentence = self._sentence
+        builder = self._builder
+        # Scan from the character before the pending whitespace, so punctuation
+        # that ended the previous piece still ends its sentence
+        for match in _BOUNDARY.finditer(window, 0, end):
+            run_start = match.start(1)
+            if run_start < 0:
+                run_start = match.start()
+            sentence.append(window[cursor:run_start])
+            self._end_sentence()
+
+            cursor = match.end()
+            if window.count("\n", run_start, cursor) >= 2:
+                if self._paragraph_has_text:
+                    builder.end_paragraph()
+                self._paragraph_has_text = False
+                # The next paragraph starts after the last newline of the run
+                sentence.append(window[window.rfind("\n", run_start, cursor) + 1:cursor])
+
+        sentence.append(window[cursor:end])
+        self._before_pending = window[end - 1] if end else ""
+        self._pending = window[end:]
+
+    def _end_sentence(self):
+        text = "".join(self._sentence)
+        self._sentence.clear()
+        # Sentences of only whitespace are dropped, and so are paragraphs without a sentence
+        if text and not text.isspace():
+            self._builder.add_sentence(text)
+            self._paragraph_has_text = True
+
+
+def semantic_chunks(text: Union[str, Iterable[str]], chunk_size: int = 1000, overlap: int = 100,
+                    tokenizer: Optional[Tokenizer] = None, max_size: Optional[int] = None) -> List[str]:
+    """
+    Chunk ``text`` (a string or an iterable of pieces of one text) on
+    paragraph and sentence boundaries with :class:`SemanticChunker`.
+    """
+    chunker = SemanticChunker(chunk_size, overlap, tokenizer, max_size)
+    chunks: List[str] = []
+    for piece in ([text] if isinstance(text, str) else text):
+        chunks.extend(chunker.feed(piece))
+    chunks.extend(chunker.close())
+    return chunks
+
+
+@dataclass
+class RowChunk:
+    """Consecutive table rows rendered under the table's header line"""
+
+    first_row: int
+    last_row: int
+    content: str
+    # Position among the pieces of a single row too large for one chunk
+    part: Optional[int] = None
+
+
+class RowGrouper:
+    """
+    Groups table rows into chunks of about ``chunk_size`` characters, or tokens
+    when a ``tokenizer`` is given. Every chunk starts with ``header`` (the
+    column names) so a group of rows can be read on its own. A row too large
+    for one chunk is cut into pieces, each under the header.
+
+    Example:
+        grouper = RowGrouper("Columns: name, price", chunk_size=256, tokenizer=tokenizer)
+        for number, text in rows:
+            store(grouper.add(number, text))
+        store(grouper.close())
+    """
+
+    def __init__(self, header: str, chunk_size: int = 1000,
+                 tokenizer: Optional[Tokenizer] = None, max_size: Optional[int] = None):
+        self.chunk_size = chunk_size
+        self.max_size = max_size if max_size is not None else chunk_size
+        self._measure = tokenizer.count if tokenizer is not None else len
+        self._tokenizer = tokenizer
+
+        # Keep the header to a quarter of the chunk so rows always have room
+        header_budget = max(chunk_size // 4, 1)
+        if self._measure(header) > header_budget:
+            header = tokenizer.truncate(header, header_budget) if tokenizer else header[:header_budget]
+        self.header = header
+        self._header_size = self._measure(header) + 1
+
+        self._lines: List[str] = []
+        self._size = 0
+        self._first_row = self._last_row = 0
+        self._ready: List[RowChunk] = []
+
+    def add(self, row_number: int, text: str) -> List[RowChunk]:
+        """Add a row and return the chunks it completed"""
+        line = f"Row {row_number}: {text}"
+        size = self._measure(line) + 1
+
+        if self._header_size + size > self.max_size:
+            self._emit()
+            room = max(self.chunk_size - self._header_size, 1)
+            if self._tokenizer is not None:
+                pieces = self._tokenizer.split(line, room)
+            else:
+                pieces = list(simple_chunks(line, room, 0))
+            for part, piece in enumerate(pieces):
+                self._ready.append(RowChunk(row_number, row_number, f"{self.header}\n{piece}", part))
+            return self._take()
+
+        if self._lines and self._header_size + self._size + size > self.chunk_size:
+            self._emit()
+        if not self._lines:
+            self._first_row = row_number
+        self._lines.append(line)
+        self._size += size
+        self._last_row = row_number
+        return self._take()
+
+    def close(self) -> List[RowChunk]:
+        """Return the last chunk"""
+        self._emit()
+        return self._take()
+
+    def _emit(self):
+        if self._lines:
+            content = self.header + "\n" + "\n".join(self._lines)
+            self._ready.append(RowChunk(self._first_row, self._last_row, content))
+        self._lines = []
+        self._size = 0
+
+    def _take(self) -> List[RowChunk]:
+        ready = self._ready
+        self._ready = []
+        return ready
@@ -0,0 +1,121 @@
+import re
+from bisect import bisect_right
+from collections import deque
+from typing import Dict, Iterable, List, Optional
+
+# One pass finds every citation marker: "[3]", or the label after Source/Reference/
+# Citation/Document, bracketed or not. The leading character class lets the regex
+# engine skip ahead to candidate positions, and the label is captured in a lookahead
+# so a label that is itself a keyword ("Reference Document 2") is scanned again.
+_LABEL = r"(?=(\d+|[A-Za-z]+))"
+CITATION_PATTERN = re.compile(
+    r"[\[SRCD](?:(?<=\[)(\d+)\]"
+    rf"|(?<=S)ource\s+{_LABEL}|(?<=R)eference\s+{_LABEL}"
+    rf"|(?<=C)itation\s+{_LABEL}|(?<=D)ocument\s+{_LABEL})"
+)
+
+# Joins sources into one searchable string; labels never contain it
+_SEPARATOR = "\x00"
+
+
+def scan_citations(text: str) -> List[str]:
+    """Citation labels found in ``text``, in order of first appearance"""
+    labels = dict.fromkeys(
+        next(group for group in groups if group) for groups in CITATION_PATTERN.findall(text)
+    )
+    # "[0]", "[00]" and "Source 0" are placeholders models emit when they have no source
+    return [label for label in labels if label.strip("0")]
+
+
+class CitationMatcher:
+    """
+    Finds the first source a citation label refers to: one that contains the
+    label, or one contained in it. Tables are built once per response instead
+    of comparing every label with every source.
+
+    - "label contained in a source" is one ``str.find`` over all sources joined
+      together, with the hit mapped back to its source by bisecting the offsets
+    - "source contained in a label" walks an Aho-Corasick automaton over the
+      sources no longer than the longest label seen so far, which is usually
+      none of them, so it costs next to nothing to build
+    """
+
+    def __init__(self, sources: Iterable[str]):
+        self.sources = list(sources)
+        self._haystack = _SEPARATOR.join(self.sources)
+        self._offsets: List[int] = []
+        offset = 0
+        for source in self.sources:
+            self._offsets.append(offset)
+            offset += len(source) + len(_SEPARATOR)
+        self._automaton_bound = -1
+
+    def match(self, label: str) -> Optional[int]:
+        """Index of the first source matching ``label``, or None"""
+        candidates = [self._first_containing(label), self._first_contained(label)]
+        candidates = [index for index in candidates if index is not None]
+        return min(candidates) if candidates else None
+
+    def _first_containing(self, label: str) -> Optional[int]:
+        if not self.sources:
+            return None
+        if not label:
+            return 0
+        position = self._haystack.find(label)
+        if position < 0:
+            return None
+        return bisect_right(self._offsets, position) - 1
+
+    def _first_contained(self, label: str) -> Optional[int]:
+        if len(label) > self._automaton_bound:
+            self._build_automaton(len(label))
+
+        best = self._output[0]  # an empty source is contained in every label
+        node = 0
+        for char in label:
+            while node and char not in self._goto[node]:
+                node = self._fail[node]
+            node = self._goto[node].get(char, 0)
+            found = self._output[node]
+            if found is not None and (best is None or found < best):
+                best = found
+        return best
+
+    def _build_automaton(self, bound: int):
+        # Node 0 is the root; each node has transitions, a failure link and the
+        # lowest index of a source ending at it or at any of its suffixes. Only
+        # sources of at most ``bound`` characters can be contained in a label.
+        self._automaton_bound = bound
+        self._goto: List[Dict[str, int]] = [{}]
+        self._fail: List[int] = [0]
+        self._output: List[Optional[int]] = [None]
+
+        for index, source in enumerate(self.sources):
+            if len(source) > bound:
+                continue
+            node = 0
+            for char in source:
+                nxt = self._goto[node].get(char)
+                if nxt is None:
+                    nxt = len(self._goto)
+                    self._goto[node][char] = nxt
+                    self._goto.append({})
+                    self._fail.append(0)
+                    self._output.append(None)
+                node = nxt
+            if self._output[node] is None:
+                self._output[node] = index
+
+        queue = deque(self._goto[0].values())
+        while queue:
+            node = queue.popleft()
+            for char, child in self._goto[node].items():
+                queue.append(child)
+                fallback = self._fail[node]
+                while fallback and char not in self._goto[fallback]:
+                    fallback = self._fail[fallback]
+                target = self._goto[fallback].get(char, 0)
+                self._fail[child] = target if target != child else 0
+                inherited = self._output[self._fail[child]]
+                if inherited is not None and (self._output[child] is None or inherited < self._output[child]):
+                    self._output[child] = inherited
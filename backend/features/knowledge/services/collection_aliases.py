@@ -0,0 +1,151 @@
+import sqlite3
+import time
+from typing import Optional, Set
+
+from features.knowledge.services.sqlite_store import SQLiteStore
+
+
+class CollectionAliases(SQLiteStore):
+    """
+    Maps stable collection names to the physical vector store collection that
+    currently serves them. Repointing an alias is a single row write, so a
+    rebuilt collection replaces the old one atomically for every process.
+
+    It also tracks writes in progress on each alias, and fences that hold off
+    new writes while a rebuilt collection catches up and is swapped in. While
+    an alias is tracked, finished writes log the documents they touched, so
+    the rebuild can catch up with them.
+    """
+
+    def _create_schema(self, conn: sqlite3.Connection):
+        conn.execute(
+            """
+            CREATE TABLE IF NOT EXISTS aliases (
+                alias TEXT PRIMARY KEY,
+                collection TEXT NOT NULL,
+                updated_at REAL NOT NULL
+            )
+            """
+        )
+        conn.execute(
+            """
+            CREATE TABLE IF NOT EXISTS writers (
+                id TEXT PRIMARY KEY,
+                alias TEXT NOT NULL,
+                started_at REAL NOT NULL
+            )
+            """
+        )
+        conn.execute(
+            """
+            CREATE TABLE IF NOT EXISTS fences (
+                alias TEXT PRIMARY KEY,
+                holder TEXT NOT NULL,
+                expires_at REAL NOT NULL
+            )
+            """
+        )
+        conn.execute(
+            """
+            CREATE TABLE IF NOT EXISTS tracking (
+                alias TEXT PRIMARY KEY,
+                since REAL NOT NULL
+            )
+            """
+        )
+        conn.execute(
+            """
+            CREATE TABLE IF NOT EXISTS writes (
+                alias TEXT NOT NULL,
+                knowledge_id TEXT NOT NULL,
+                written_at REAL NOT NULL
+            )
+            """
+        )
+        conn.execute("CREATE INDEX IF NOT EXISTS idx_writes_alias ON writes (alias, written_at)")
+
+    def get(self, alias: str) -> Optional[str]:
+        with self._transaction() as conn:
+            row = conn.execute("SELECT collection FROM aliases WHERE alias = ?", (alias,)).fetchone()
+        return row[0] if row else None
+
+    def set(self, alias: str, collection: str) -> Optional[str]:
+        """Point ``alias`` at ``collection`` and return the collection it pointed at before"""
+        with self._transaction() as conn:
+            row = conn.execute("SELECT collection FROM aliases WHERE alias = ?", (alias,)).fetchone()
+            conn.execute(
+                "INSERT OR REPLACE INTO aliases (alias, collection, updated_at) VALUES (?, ?, ?)",
+                (alias, collection, time.time()),
+            )
+        return row[0] if row else None
+
+    def begin_write(self, alias: str, writer_id: str) -> bool:
+        """
+        Register a write on ``alias`` unless a live fence holds it off.
+
+        Returns:
+            True if the write was registered, False if it has to wait
+        """
+        with self._transaction() as conn:
+            fence = conn.execute(
+                "SELECT 1 FROM fences WHERE alias = ? AND expires_at > ?", (alias, time.time())
+            ).fetchone()
+            if fence:
+                return False
+            conn.execute(
+                "INSERT OR REPLACE INTO writers (id, alias, started_at) VALUES (?, ?, ?)",
+                (writer_id, alias, time.time()),
+            )
+        return True
+
+    def end_write(self, writer_id: str, knowledge_ids=()):
+        """Unregister a write, logging the documents it touched if its alias is tracked"""
+        with self._transaction() as conn:
+            row = conn.execute("SELECT alias FROM writers WHERE id = ?", (writer_id,)).fetchone()
+            conn.execute("DELETE FROM writers WHERE id = ?", (writer_id,))
+            if not row or not knowledge_ids:
+                return
+            if conn.execute("SELECT 1 FROM tracking WHERE alias = ?", (row[0],)).fetchone():
+                now = time.time()
+                conn.executemany(
+                    "INSERT INTO writes (alias, knowledge_id, written_at) VALUES (?, ?, ?)",
+                    [(row[0], str(knowledge_id), now) for knowledge_id in knowledge_ids],
+                )
+
+    def count_writers(self, alias: str, lease: float) -> int:
+        """Writes in progress on ``alias``; writes older than ``lease`` seconds count as abandoned"""
+        with self._transaction("DEFERRED") as conn:
+            row = conn.execute(
+                "SELECT COUNT(*) FROM writers WHERE alias = ? AND started_at > ?", (alias, time.time() - lease)
+            ).fetchone()
+        return row[0]
+
+    def raise_fence(self, alias: str, holder: str, ttl: float):
+        """Hold off new writes on ``alias`` for at most ``ttl`` seconds"""
+        with self._transaction() as conn:
+            conn.execute(
+                "INSERT OR REPLACE INTO fences (alias, holder, expires_at) VALUES (?, ?, ?)",
+                (alias, holder, time.time() + ttl),
+            )
+
+    def lift_fence(self, alias: str, holder: str):
+        with self._transaction() as conn:
+            conn.execute("DELETE FROM fences WHERE alias = ? AND holder = ?", (alias, holder))
+
+    def start_tracking(self, alias: str):
+        """Log the documents touched by writes on ``alias``; tracking an alias again keeps its log"""
+        with self._transaction() as conn:
+            conn.execute("INSERT OR IGNORE INTO tracking (alias, since) VALUES (?, ?)", (alias, time.time()))
+
+    def stop_tracking(self, alias: str):
+        with self._transaction() as conn:
+            conn.execute("DELETE FROM tracking WHERE alias = ?", (alias,))
+            conn.execute("DELETE FROM writes WHERE alias = ?", (alias,))
+
+    def written_since(self, alias: str, since: float) -> Set[str]:
+        """IDs of the documents touched by writes on ``alias`` that finished at or after ``since``"""
+        with self._transaction("DEFERRED") as conn:
+            rows = conn.execute(
+                "SELECT DISTINCT knowledge_id FROM writes WHERE alias = ? AND written_at >= ?", (alias, since)
+            ).fetchall()
+        return {row[0] for row in rows}
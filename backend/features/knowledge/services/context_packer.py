@@ -0,0 +1,170 @@
+import logging
+from dataclasses import dataclass, field
+from typing import Dict, List, Optional
+
+from features.knowledge.services.embedding_cache import text_digest
+from features.knowledge.services.tokens import count_tokens
+
+logger = logging.getLogger(__name__)
+
+# Chunkers overlap neighbouring chunks by about 100 characters; shorter matches are coincidence
+MIN_OVERLAP = 20
+MAX_OVERLAP = 2000
+
+# Rough cost of the "SOURCE n / CITATION" lines written before each passage
+PASSAGE_OVERHEAD_TOKENS = 24
+
+
+@dataclass
+class PackedContext:
+    """Passages chosen to fill a token budget, most relevant first"""
+
+    passages: List[dict] = field(default_factory=list)
+    # The chunks the passages were built from, in rank order
+    chunks: List[dict] = field(default_factory=list)
+    tokens: int = 0
+    budget: int = 0
+    candidates: int = 0
+
+    @property
+    def chunk_ids(self) -> List[str]:
+        return [chunk_id for passage in self.passages for chunk_id in passage["chunk_ids"]]
+
+
+def overlap_length(left: str, right: str) -> int:
+    """Length of the longest suffix of ``left`` that is also a prefix of ``right``"""
+    for size in range(min(len(left), len(right), MAX_OVERLAP), MIN_OVERLAP - 1, -1):
+        if left.endswith(right[:size]):
+            return size
+    return 0
+
+
+def _position(chunk: dict) -> Optional[tuple]:
+    """(knowledge_id, part, chunk number) of a chunk, where part names the page, sheet or section it is numbered in"""
+    metadata = chunk.get("metadata", {})
+    index = metadata.get("chunk")
+    if not isinstance(index, int):
+        return None
+    # Chunk numbers restart on every PDF page, spreadsheet sheet and JSON section
+    page = metadata.get("page")
+    part = (page if isinstance(page, int) else 0, str(metadata.get("sheet") or ""), str(metadata.get("section") or ""))
+    return str(metadata.get("knowledge_id", "")), part, index
+
+
+def _neighbour(position: tuple, step: int) -> tuple:
+    knowledge_id, part, index = position
+    return knowledge_id, part, index + step
+
+
+def pack_context(chunks: List[dict], budget_tokens: int) -> PackedContext:
+    """
+    Choose ranked chunks until ``budget_tokens`` is spent.
+
+    ``chunks`` must be ordered best first and carry ``id``, ``content`` and
+    ``metadata`` (with ``knowledge_id`` and the ``chunk`` position, numbered
+    within its page, sheet or section if it has one). Chunks with identical
+    content are taken once. Neighbouring chunks of the same document part are
+    merged into one passage with their shared overlap removed, so the budget is
+    only charged for text the model has not seen yet.
+    """
+    packed = PackedContext(budget=budget_tokens, candidates=len(chunks))
+    seen = set()
+    # (knowledge_id, part, position) -> chunk, for chunks already chosen
+    chosen: Dict[tuple, dict] = {}
+    picked = []
+
+    for rank, chunk in enumerate(chunks):
+        content = chunk.get("content") or ""
+        digest = text_digest(content)
+        if not content.strip() or digest in seen:
+            continue
+
+        position = _position(chunk)
+        new_text = content
+        before = after = None
+        if position is not None:
+            before = chosen.get(_neighbour(position, -1))
+            after = chosen.get(_neighbour(position, 1))
+            if before:
+                new_text = new_text[overlap_length(before["content"], new_text):]
+            if after:
+                new_text = new_text[: len(new_text) - overlap_length(new_text, after["content"])]
+
+        cost = count_tokens(new_text)
+        if not before and not after:
+            cost += PASSAGE_OVERHEAD_TOKENS
+        if packed.tokens + cost > budget_tokens:
+            continue
+
+        seen.add(digest)
+        packed.tokens += cost
+        picked.append((rank, chunk))
+        if position is not None:
+            chosen[position] = chunk
+
+    if not picked and chunks and budget_tokens > PASSAGE_OVERHEAD_TOKENS:
+        # Nothing fits whole; keep the start of the best chunk rather than no context at all
+        best = chunks[0]
+        available = budget_tokens - PASSAGE_OVERHEAD_TOKENS
+        content = best.get("content") or ""
+        total = count_tokens(content)
+        if total:
+            content = content[: int(len(content) * available / total)]
+            picked.append((0, {**best, "content": content}))
+            packed.tokens = count_tokens(content) + PASSAGE_OVERHEAD_TOKENS
+
+    packed.chunks = [chunk for _, chunk in picked]
+    packed.passages = _merge_passages(picked)
+    logger.debug(f"Packed {len(picked)} of {len(chunks)} chunks into {packed.tokens}/{budget_tokens} tokens")
+    return packed
+
+
+def document_order(chunk: dict) -> tuple:
+    """Sort key putting the chunks of each document in reading order, part by part"""
+    position = _position(chunk)
+    if position is None:
+        return str(chunk.get("metadata", {}).get("knowledge_id", "")), (), float("inf")
+    return position
+
+
+def _merge_passages(picked: List[tuple]) -> List[dict]:
+    """Join runs of consecutive chunks from the same document part and order passages by their best rank"""
+    ordered = sorted(picked, key=lambda item: (*document_order(item[1]), item[0]))
+
+    passages = []
+    previous = None
+    for rank, chunk in ordered:
+        metadata = chunk.get("metadata", {})
+        position = _position(chunk)
+        current = passages[-1] if passages else None
+        if (
+            current is not None
+            and previous is not None
+            and position is not None
+            and _position(previous) == _neighbour(position, -1)
+        ):
+            content = chunk["content"]
+            current["content"] += content[overlap_length(current["content"], content):]
+            current["chunk_ids"].append(chunk.get("id"))
+            current["rank"] = min(current["rank"], rank)
+            current["similarity"] = max(current["similarity"], chunk.get("similarity", 0.0))
+            citation = metadata.get("citation")
+            if citation and citation not in current["citations"]:
+                current["citations"].append(citation)
+        else:
+            citation = metadata.get("citation") or metadata.get("source")
+            passages.append({
+                "chunk_ids": [chunk.get("id")],
+                "content": chunk["content"],
+                "metadata": metadata,
+                "citations": [citation] if citation else [],
+                "similarity": chunk.get("similarity", 0.0),
+                "rank": rank,
+            })
+        previous = chunk
+
+    passages.sort(key=lambda passage: passage["rank"])
+    for passage in passages:
+        passage["metadata"] = {**passage["metadata"], "citation": "; ".join(passage.pop("citations"))}
+        del passage["rank"]
+    return passages
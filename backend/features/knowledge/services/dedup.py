@@ -0,0 +1,207 @@
+import hashlib
+import re
+import sqlite3
+from typing import Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+from features.knowledge.services.sqlite_store import SQLiteStore
+
+_WORD = re.compile(r"\w+")
+_BITS = np.arange(64, dtype=np.uint64)
+
+# Words per shingle, and the fewest words a chunk needs for a meaningful
+# fingerprint; shorter chunks are only matched as exact copies
+SHINGLE_WORDS = 3
+MIN_WORDS = 8
+
+# The 64-bit fingerprint is split into 4 bands of 16 bits. Fingerprints within
+# a Hamming distance of 3 agree on at least one band (pigeonhole), so
+# candidates are found with indexed lookups on the bands.
+BANDS = 4
+MAX_DISTANCE = BANDS - 1
+_BAND_BITS = 64 // BANDS
+_BAND_MASK = (1 << _BAND_BITS) - 1
+
+
+def simhash(text: str) -> Optional[int]:
+    """
+    64-bit SimHash of the word shingles of ``text``; near-identical texts get
+    fingerprints a few bits apart. None for texts under ``MIN_WORDS`` words.
+    """
+    words = _WORD.findall(text.lower())
+    if len(words) < MIN_WORDS:
+        return None
+    shingles = {" ".join(words[i:i + SHINGLE_WORDS]) for i in range(len(words) - SHINGLE_WORDS + 1)}
+    hashes = np.fromiter(
+        (int.from_bytes(hashlib.blake2b(shingle.encode("utf-8"), digest_size=8).digest(), "little")
+         for shingle in shingles),
+        dtype=np.uint64,
+        count=len(shingles),
+    )
+    # Each bit of the fingerprint is the majority vote of that bit over the shingle hashes
+    votes = ((hashes[:, None] >> _BITS) & np.uint64(1)).sum(axis=0)
+    bits = np.packbits(votes * 2 > len(hashes), bitorder="little")
+    return int.from_bytes(bits.tobytes(), "little")
+
+
+def hamming(a: int, b: int) -> int:
+    return bin(a ^ b).count("1")
+
+
+def _signed(value: int) -> int:
+    """SQLite integers are signed 64-bit"""
+    return value - (1 << 64) if value >= 1 << 63 else value
+
+
+def _bands(fingerprint: int) -> List[int]:
+    return [(fingerprint >> (band * _BAND_BITS)) & _BAND_MASK for band in range(BANDS)]
+
+
+def duplicate_key(result: dict) -> str:
+    """Identify a search hit by its group of duplicate chunks"""
+    metadata = result.get("metadata") or {}
+    return metadata.get("duplicate_of") or result.get("id") or ""
+
+
+def collapse_duplicates(results: List[dict]) -> List[dict]:
+    """
+    Keep the first (best) hit of each group of duplicate chunks. The kept hit
+    lists the citations of the copies it stands for under ``duplicates``.
+    """
+    kept: Dict[str, dict] = {}
+    for result in results:
+        key = duplicate_key(result)
+        first = kept.get(key)
+        if first is None:
+            kept[key] = result
+            continue
+        citation = (result.get("metadata") or {}).get("citation")
+        duplicates = first.setdefault("duplicates", [])
+        if citation and citation not in duplicates:
+            duplicates.append(citation)
+    return list(kept.values())
+
+
+class DuplicateIndex(SQLiteStore):
+    """
+    Fingerprints of each user's canonical chunks, for near-duplicate detection
+    at ingestion.
+
+    A chunk is a duplicate if a canonical chunk of the same user has the same
+    content hash or a SimHash fingerprint within ``max_distance`` bits.
+    Duplicates are stored as references to their canonical chunk and reuse
+    its embedding; only canonical chunks are kept in the index.
+    """
+
+    def __init__(self, path: str, max_distance: int = MAX_DISTANCE):
+        if not 0 <= max_distance <= MAX_DISTANCE:
+            raise ValueError(f"max_distance must be between 0 and {MAX_DISTANCE}")
+        self.max_distance = max_distance
+        super().__init__(path)
+
+    def _create_schema(self, conn: sqlite3.Connection):
+        conn.execute(
+            f"""
+            CREATE TABLE IF NOT EXISTS fingerprints (
+                chunk_id TEXT PRIMARY KEY,
+                user_id TEXT NOT NULL,
+                knowledge_id TEXT NOT NULL,
+                content_hash TEXT NOT NULL,
+                fingerprint INTEGER,
+                {", ".join(f"band{band} INTEGER" for band in range(BANDS))}
+            )
+            """
+        )
+        conn.execute("CREATE INDEX IF NOT EXISTS fingerprints_hash ON fingerprints (user_id, content_hash)")
+        conn.execute("CREATE INDEX IF NOT EXISTS fingerprints_knowledge ON fingerprints (knowledge_id)")
+        for band in range(BANDS):
+            conn.execute(
+                f"CREATE INDEX IF NOT EXISTS fingerprints_band{band} ON fingerprints (user_id, band{band})"
+            )
+
+    def assign(self, user_id, knowledge_id, chunks: Sequence[Tuple[str, str, str]]) -> Dict[str, str]:
+        """
+        Match chunks against the user's canonical chunks, in order. Chunks
+        without a match become canonical, so later chunks (of this call too)
+        can match them.
+
+        Args:
+            user_id: Owner of the chunks
+            knowledge_id: Document the chunks belong to
+            chunks: Sequence of (chunk_id, content_hash, text) tuples
+
+        Returns:
+            Mapping of duplicate chunk ID to the ID of its canonical chunk
+        """
+        user_id, knowledge_id = str(user_id), str(knowledge_id)
+        fingerprints = [(chunk_id, content_hash, simhash(text)) for chunk_id, content_hash, text in chunks]
+        duplicates = {}
+        with self._transaction() as conn:
+            for chunk_id, content_hash, fingerprint in fingerprints:
+                canonical = self._match(conn, user_id, chunk_id, content_hash, fingerprint)
+                if canonical is not None:
+                    duplicates[chunk_id] = canonical
+                    conn.execute("DELETE FROM fingerprints WHERE chunk_id = ?", (chunk_id,))
+                    continue
+                self._insert(conn, chunk_id, user_id, knowledge_id, content_hash, fingerprint)
+        return duplicates
+
+    def restore(self, chunks: Sequence[Tuple[str, str, str, str, str]]):
+        """
+        Make chunks canonical without matching them, e.g. the duplicate that
+        takes over from a canonical chunk that was deleted.
+
+        Args:
+            chunks: Sequence of (chunk_id, user_id, knowledge_id, content_hash, text) tuples
+        """
+        with self._transaction() as conn:
+            for chunk_id, user_id, knowledge_id, content_hash, text in chunks:
+                self._insert(conn, chunk_id, str(user_id), str(knowledge_id), content_hash, simhash(text))
+
+    @staticmethod
+    def _insert(conn, chunk_id, user_id, knowledge_id, content_hash, fingerprint):
+        bands = _bands(fingerprint) if fingerprint is not None else [None] * BANDS
+        conn.execute(
+            f"INSERT OR REPLACE INTO fingerprints VALUES (?, ?, ?, ?, ?, {', '.join('?' * BANDS)})",
+            (
+                chunk_id, user_id, knowledge_id, content_hash,
+                _signed(fingerprint) if fingerprint is not None else None, *bands,
+            ),
+        )
+
+    def _match(self, conn, user_id, chunk_id, content_hash, fingerprint) -> Optional[str]:
+        row = conn.execute(
+            "SELECT chunk_id FROM fingerprints WHERE user_id = ? AND content_hash = ? AND chunk_id != ? LIMIT 1",
+            (user_id, content_hash, chunk_id),
+        ).fetchone()
+        if row:
+            return row[0]
+        if fingerprint is None or not self.max_distance:
+            return None
+
+        best = None
+        for band, value in enumerate(_bands(fingerprint)):
+            for candidate_id, candidate in conn.execute(
+                f"SELECT chunk_id, fingerprint FROM fingerprints WHERE user_id = ? AND band{band} = ? AND chunk_id != ?",
+                (user_id, value, chunk_id),
+            ):
+                distance = hamming(fingerprint, candidate & ((1 << 64) - 1))
+                if distance <= self.max_distance and (best is None or distance < best[0]):
+                    best = (distance, candidate_id)
+        return best[1] if best else None
+
+    def remove(self, chunk_ids: Sequence[str]):
+        with self._transaction() as conn:
+            for start in range(0, len(chunk_ids), 500):
+                batch = list(chunk_ids[start:start + 500])
+                conn.execute(f"DELETE FROM fingerprints WHERE chunk_id IN ({','.join('?' * len(batch))})", batch)
+
+    def delete_knowledge(self, knowledge_id):
+        """Remove every chunk of a knowledge document from the index"""
+        with self._transaction() as conn:
+            conn.execute("DELETE FROM fingerprints WHERE knowledge_id = ?", (str(knowledge_id),))
+
+    def clear(self):
+        with self._transaction() as conn:
+            conn.execute("DELETE FROM fingerprints")
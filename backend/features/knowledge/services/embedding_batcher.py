@@ -0,0 +1,151 @@
+import bisect
+import logging
+import queue
+import threading
+import time
+from concurrent.futures import Future
+from typing import Callable, Dict, Hashable, List, Sequence
+
+logger = logging.getLogger(__name__)
+
+# Upper bounds of the histogram buckets; the last bucket counts everything larger
+HISTOGRAM_BOUNDS = (1, 2, 4, 8, 16, 32, 64, 128)
+
+EmbedBatch = Callable[[List[str]], List[List[float]]]
+
+
+class Histogram:
+    """Counts of observed values in power-of-two buckets"""
+
+    def __init__(self, bounds: Sequence[int] = HISTOGRAM_BOUNDS):
+        self.bounds = tuple(bounds)
+        self.counts = [0] * (len(self.bounds) + 1)
+        self.total = 0
+        self.observations = 0
+        self.max = 0
+
+    def observe(self, value: int):
+        self.counts[bisect.bisect_left(self.bounds, value)] += 1
+        self.total += value
+        self.observations += 1
+        self.max = max(self.max, value)
+
+    def snapshot(self) -> Dict:
+        buckets = {f"le_{bound}": count for bound, count in zip(self.bounds, self.counts)}
+        buckets["inf"] = self.counts[-1]
+        return {
+            "buckets": buckets,
+            "count": self.observations,
+            "mean": round(self.total / self.observations, 2) if self.observations else 0.0,
+            "max": self.max,
+        }
+
+
+class _Request:
+    __slots__ = ("key", "embed", "text", "future", "queued")
+
+    def __init__(self, key, embed, text):
+        self.key = key
+        self.embed = embed
+        self.text = text
+        self.future = Future()
+        self.queued = time.perf_counter()
+
+
+class EmbeddingBatcher:
+    """
+    Dynamic micro-batching of single-text embedding calls.
+
+    Callers on any thread ``submit`` a text and block on the result while a
+    dispatcher thread collects requests: after the first one arrives it waits
+    up to ``max_wait`` seconds, or until ``max_batch_size`` requests are
+    queued, and embeds them with one model call. While a batch runs the next
+    one accumulates, so batches grow with load and a lone request waits at
+    most ``max_wait``.
+
+    Requests are grouped by ``key`` (the embedding model and version), and
+    each group is embedded with the ``embed`` callable of its first request,
+    so requests from different service instances batch together.
+    """
+
+    def __init__(self, max_wait: float = 0.005, max_batch_size: int = 32):
+        self.max_wait = max_wait
+        self.max_batch_size = max(1, max_batch_size)
+        self._queue: "queue.Queue[_Request]" = queue.Queue()
+        self._lock = threading.Lock()
+        self._batch_sizes = Histogram()
+        self._queue_depths = Histogram()
+        self._requests = 0
+        self._batches = 0
+        self._errors = 0
+        self._wait_seconds = 0.0
+        self._thread = threading.Thread(target=self._run, name="embedding-batcher", daemon=True)
+        self._thread.start()
+
+    def submit(self, key: Hashable, embed: EmbedBatch, text: str) -> Future:
+        """Queue ``text`` for embedding; the future resolves to its embedding"""
+        request = _Request(key, embed, text)
+        self._queue.put(request)
+        return request.future
+
+    def embed(self, key: Hashable, embed: EmbedBatch, text: str, timeout: float = None) -> List[float]:
+        return self.submit(key, embed, text).result(timeout)
+
+    def metrics(self) -> Dict:
+        """Batch size and queue depth histograms, plus request and batch counters"""
+        with self._lock:
+            return {
+                "requests": self._requests,
+                "batches": self._batches,
+                "errors": self._errors,
+                "queue_depth": self._queue.qsize(),
+                "mean_wait_ms": round(self._wait_seconds * 1000 / self._requests, 2) if self._requests else 0.0,
+                "batch_sizes": self._batch_sizes.snapshot(),
+                "queue_depths": self._queue_depths.snapshot(),
+                "max_wait_ms": self.max_wait * 1000,
+                "max_batch_size": self.max_batch_size,
+            }
+
+    def _collect(self) -> List[_Request]:
+        batch = [self._queue.get()]
+        deadline = time.monotonic() + self.max_wait
+        while len(batch) < self.max_batch_size:
+            remaining = deadline - time.monotonic()
+            try:
+                batch.append(self._queue.get(timeout=remaining) if remaining > 0 else self._queue.get_nowait())
+            except queue.Empty:
+                break
+        return batch
+
+    def _run(self):
+        while True:
+            batch = self._collect()
+            # Requests already waiting behind this batch
+            depth = self._queue.qsize()
+            groups: Dict[Hashable, List[_Request]] = {}
+            for request in batch:
+                groups.setdefault(request.key, []).append(request)
+            for requests in groups.values():
+                self._dispatch(requests, depth)
+
+    def _dispatch(self, requests: List[_Request], depth: int):
+        started = time.perf_counter()
+        with self._lock:
+            self._requests += len(requests)
+            self._batches += 1
+            self._batch_sizes.observe(len(requests))
+            self._queue_depths.observe(depth)
+            self._wait_seconds += sum(started - request.queued for request in requests)
+        try:
+            embeddings = requests[0].embed([request.text for request in requests])
+            if len(embeddings) != len(requests):
+                raise RuntimeError(f"Expected {len(requests)} embeddings, got {len(embeddings)}")
+        except Exception as e:
+            with self._lock:
+                self._errors += 1
+            logger.error(f"Embedding batch of {len(requests)} failed: {str(e)}")
+            for request in requests:
+                request.future.set_exception(e)
+            return
+        for request, embedding in zip(requests, embeddings):
+            request.future.set_result(embedding)
@@ -0,0 +1,173 @@
+import hashlib
+import logging
+import re
+import sqlite3
+import time
+import unicodedata
+from typing import Dict, List, Optional, Sequence
+
+from features.knowledge.services.quantization import check_precision, decode, encode
+from features.knowledge.services.sqlite_store import SQLiteStore
+
+logger = logging.getLogger(__name__)
+
+_WHITESPACE = re.compile(r"\s+")
+
+
+def normalize_text(text: str) -> str:
+    """Normalize text before hashing so trivially different copies share an entry"""
+    return _WHITESPACE.sub(" ", unicodedata.normalize("NFC", text)).strip()
+
+
+def text_digest(text: str) -> str:
+    return hashlib.sha256(normalize_text(text).encode("utf-8")).hexdigest()
+
+
+class EmbeddingCache(SQLiteStore):
+    """
+    Persistent, content-addressed embedding cache backed by SQLite.
+
+    Entries are keyed by (model, model version, sha256 of normalized text) and
+    stored as packed blobs of ``precision`` ("float32", "float16" or "int8";
+    see ``quantization``). Each entry records its precision, so changing it
+    only affects new entries. When the total payload exceeds ``max_bytes``
+    the least recently used entries are evicted. The database is safe to share
+    between threads and worker processes.
+    """
+
+    def __init__(self, path: str, max_bytes: int = 512 * 1024 * 1024, precision: str = "float32"):
+        self.max_bytes = max_bytes
+        self.precision = check_precision(precision)
+        self.hits = 0
+        self.misses = 0
+        super().__init__(path)
+
+    def _create_schema(self, conn: sqlite3.Connection):
+        conn.execute(
+            """
+            CREATE TABLE IF NOT EXISTS embeddings (
+                model TEXT NOT NULL,
+                version TEXT NOT NULL,
+                digest TEXT NOT NULL,
+                embedding BLOB NOT NULL,
+                size INTEGER NOT NULL,
+                last_used REAL NOT NULL,
+                PRIMARY KEY (model, version, digest)
+            )
+            """
+        )
+        conn.execute("CREATE INDEX IF NOT EXISTS embeddings_last_used ON embeddings (last_used)")
+        columns = {row[1] for row in conn.execute("PRAGMA table_info(embeddings)")}
+        if "precision" not in columns:
+            conn.execute("ALTER TABLE embeddings ADD COLUMN precision TEXT NOT NULL DEFAULT 'float32'")
+        conn.execute("CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value INTEGER NOT NULL)")
+        conn.execute(
+            "INSERT OR IGNORE INTO meta (key, value) "
+            "SELECT 'total_bytes', COALESCE(SUM(size), 0) FROM embeddings"
+        )
+
+    def get_many(self, model: str, version: str, texts: Sequence[str]) -> List[Optional[List[float]]]:
+        """Look up embeddings for ``texts``; misses are returned as None"""
+        digests = [text_digest(text) for text in texts]
+        found: Dict[str, List[float]] = {}
+        unique = list(dict.fromkeys(digests))
+
+        with self._transaction() as conn:
+            # Stay well below SQLite's bound-parameter limit
+            for start in range(0, len(unique), 500):
+                batch = unique[start : start + 500]
+                placeholders = ",".join("?" * len(batch))
+                rows = conn.execute(
+                    f"SELECT digest, embedding, precision FROM embeddings "
+                    f"WHERE model = ? AND version = ? AND digest IN ({placeholders})",
+                    (model, version, *batch),
+                ).fetchall()
+                for digest, blob, precision in rows:
+                    found[digest] = decode(blob, precision)
+
+            if found:
+                now = time.time()
+                conn.executemany(
+                    "UPDATE embeddings SET last_used = ? WHERE model = ? AND version = ? AND digest = ?",
+                    [(now, model, version, digest) for digest in found],
+                )
+
+        results = [found.get(digest) for digest in digests]
+        hits = sum(1 for result in results if result is not None)
+        self.hits += hits
+        self.misses += len(results) - hits
+        return results
+
+    def get(self, model: str, version: str, text: str) -> Optional[List[float]]:
+        return self.get_many(model, version, [text])[0]
+
+    def put_many(self, model: str, version: str, texts: Sequence[str], embeddings: Sequence[List[float]]):
+        """Store embeddings for ``texts``; empty embeddings are skipped"""
+        now = time.time()
+        rows = []
+        for text, embedding in zip(texts, embeddings):
+            if not embedding:
+                continue
+            blob = encode(embedding, self.precision)
+            rows.append((model, version, text_digest(text), blob, self.precision, len(blob), now))
+        if not rows:
+            return
+
+        with self._transaction() as conn:
+            added = 0
+            for row in rows:
+                cursor = conn.execute(
+                    "INSERT OR IGNORE INTO embeddings (model, version, digest, embedding, precision, size, last_used) "
+                    "VALUES (?, ?, ?, ?, ?, ?, ?)",
+                    row,
+                )
+                if cursor.rowcount == 1:
+                    added += row[5]
+            conn.execute("UPDATE meta SET value = value + ? WHERE key = 'total_bytes'", (added,))
+            self._evict(conn)
+
+    def put(self, model: str, version: str, text: str, embedding: List[float]):
+        self.put_many(model, version, [text], [embedding])
+
+    def _evict(self, conn: sqlite3.Connection):
+        total = conn.execute("SELECT value FROM meta WHERE key = 'total_bytes'").fetchone()[0]
+        if total <= self.max_bytes:
+            return
+
+        # Evict down to 90% of the budget so we don't evict again on the next insert
+        target = int(self.max_bytes * 0.9)
+        while total > target:
+            rows = conn.execute(
+                "SELECT model, version, digest, size FROM embeddings ORDER BY last_used LIMIT 256"
+            ).fetchall()
+            if not rows:
+                total = 0
+                break
+            for model, version, digest, size in rows:
+                conn.execute(
+                    "DELETE FROM embeddings WHERE model = ? AND version = ? AND digest = ?",
+                    (model, version, digest),
+                )
+                total -= size
+                if total <= target:
+                    break
+        conn.execute("UPDATE meta SET value = ? WHERE key = 'total_bytes'", (max(total, 0),))
+
+    def stats(self) -> dict:
+        with self._transaction() as conn:
+            entries = conn.execute("SELECT COUNT(*) FROM embeddings").fetchone()[0]
+            total = conn.execute("SELECT value FROM meta WHERE key = 'total_bytes'").fetchone()[0]
+        return {
+            "entries": entries,
+            "bytes": total,
+            "max_bytes": self.max_bytes,
+            "precision": self.precision,
+            "hits": self.hits,
+            "misses": self.misses,
+        }
+
+    def clear(self):
+        with self._transaction() as conn:
+            conn.execute("DELETE FROM embeddings")
+            conn.execute("UPDATE meta SET value = 0 WHERE key = 'total_bytes'")
+
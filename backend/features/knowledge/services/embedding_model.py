@@ -0,0 +1,139 @@
+import logging
+import os
+import threading
+import time
+from typing import Dict, Optional
+
+from django.conf import settings
+
+logger = logging.getLogger(__name__)
+
+# Holder states
+DISABLED = "disabled"
+NOT_LOADED = "not_loaded"
+LOADING = "loading"
+READY = "ready"
+FAILED = "failed"
+
+
+class EmbeddingModelHolder:
+    """
+    Process-level owner of the local sentence-transformers model used when
+    ``USE_SENTENCE_TRANSFORMERS`` is enabled.
+
+    The model is loaded once per process, or once per server when it is
+    loaded before workers fork (gunicorn ``--preload``): workers then share
+    the parent's weights copy-on-write instead of loading their own. Only
+    weights are loaded before a fork; the first inference of each process,
+    which sets up the thread pools that must not be inherited, happens in
+    ``warm_up``. ``ready`` and ``status`` are the readiness signal served at
+    ``/api/ready/``.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._model = None
+        self._model_name: Optional[str] = None
+        self._state = NOT_LOADED
+        self._error: Optional[str] = None
+        self._load_seconds: Optional[float] = None
+        self._warm_pid: Optional[int] = None
+
+    @property
+    def enabled(self) -> bool:
+        return getattr(settings, "USE_SENTENCE_TRANSFORMERS", False)
+
+    @property
+    def model_name(self) -> str:
+        return getattr(settings, "SENTENCE_TRANSFORMER_MODEL", "all-MiniLM-L6-v2")
+
+    @property
+    def ready(self) -> bool:
+        """
+        Whether startup loading is over: the model is loaded, or failed to
+        load and requests fall back to Ollama, or it is not preloaded at all
+        """
+        if not self.enabled or not getattr(settings, "EMBEDDING_MODEL_PRELOAD", True):
+            return True
+        return self._state in (READY, FAILED)
+
+    def status(self) -> Dict:
+        return {
+            "state": self._state if self.enabled else DISABLED,
+            "model": self._model_name or self.model_name,
+            "load_seconds": self._load_seconds,
+            "warm": self._warm_pid == os.getpid(),
+            "error": self._error,
+        }
+
+    def load(self):
+        """
+        Load the model if it is not loaded yet and return it. Raises
+        ImportError without sentence-transformers installed, and whatever
+        loading raised; a failed load is retried on the next call.
+        """
+        model_name = self.model_name
+        if self._model is not None and self._model_name == model_name:
+            return self._model
+        with self._lock:
+            if self._model is not None and self._model_name == model_name:
+                return self._model
+            self._state = LOADING
+            started = time.perf_counter()
+            try:
+                # Import here to avoid dependency issues if not installed
+                from sentence_transformers import SentenceTransformer
+
+                logger.info(f"Loading sentence-transformer model: {model_name}")
+                self._model = SentenceTransformer(model_name)
+            except Exception as e:
+                self._state = FAILED
+                self._error = str(e)
+                raise
+            self._model_name = model_name
+            self._warm_pid = None
+            self._load_seconds = round(time.perf_counter() - started, 3)
+            self._error = None
+            self._state = READY
+            logger.info(f"Loaded sentence-transformer model {model_name} in {self._load_seconds}s")
+            return self._model
+
+    def warm_up(self):
+        """Load the model and run one inference in this process"""
+        if not self.enabled:
+            return
+        model = self.load()
+        if self._warm_pid != os.getpid():
+            model.encode(["warm up"], convert_to_numpy=True)
+            self._warm_pid = os.getpid()
+
+    def preload(self, warm_up: bool = True) -> bool:
+        """
+        Load the model at server start when ``USE_SENTENCE_TRANSFORMERS`` and
+        ``EMBEDDING_MODEL_PRELOAD`` are enabled. Pass ``warm_up=False`` in a
+        process that forks workers afterwards. Failures are logged; requests
+        load the model on first use instead.
+
+        Returns:
+            ``ready``
+        """
+        if not self.enabled or not getattr(settings, "EMBEDDING_MODEL_PRELOAD", True):
+            return self.ready
+        try:
+            if warm_up:
+                self.warm_up()
+            else:
+                self.load()
+        except Exception as e:
+            logger.error(f"Failed to preload sentence-transformer model {self.model_name}: {str(e)}")
+        return self.ready
+
+    def encode(self, texts):
+        """Embed ``texts`` (a string or a list of strings) with the loaded model"""
+        embeddings = self.load().encode(texts, convert_to_numpy=True)
+        self._warm_pid = os.getpid()
+        return embeddings
+
+
+# Shared by every KnowledgeService in the process and kept across forks
+embedding_model = EmbeddingModelHolder()
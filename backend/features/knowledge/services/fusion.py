@@ -0,0 +1,73 @@
+import hashlib
+from typing import Callable, Dict, List, Optional
+
+FUSION_STRATEGIES = ("rrf", "weighted")
+
+
+def content_key(result: dict) -> str:
+    """Identify a search hit by its content so the same chunk from different legs merges"""
+    return hashlib.sha256(result.get("content", "").encode("utf-8")).hexdigest()
+
+
+def reciprocal_rank_fusion(
+    legs: Dict[str, List[dict]],
+    k: int = 60,
+    key: Callable[[dict], str] = content_key,
+) -> List[dict]:
+    """
+    Fuse ranked lists with reciprocal rank fusion: score = sum(1 / (k + rank)).
+    Only ranks are used, so scores from different retrievers need not be comparable.
+
+    Args:
+        legs: Mapping of leg name to its results, best first
+        k: Damping constant; larger values flatten the contribution of top ranks
+        key: Function identifying the same hit across legs
+
+    Returns:
+        Fused results, best first, each with ``combined_score`` and per-leg ``ranks``
+    """
+    fused: Dict[str, dict] = {}
+    for leg, results in legs.items():
+        for rank, result in enumerate(results, start=1):
+            result_key = key(result)
+            entry = fused.get(result_key)
+            if entry is None:
+                entry = fused[result_key] = {**result, "combined_score": 0.0, "ranks": {}}
+            entry["combined_score"] += 1.0 / (k + rank)
+            entry["ranks"][leg] = rank
+    return sorted(fused.values(), key=lambda x: x["combined_score"], reverse=True)
+
+
+def weighted_fusion(
+    legs: Dict[str, List[dict]],
+    weights: Optional[Dict[str, float]] = None,
+    key: Callable[[dict], str] = content_key,
+) -> List[dict]:
+    """
+    Fuse results by a weighted sum of min-max normalized per-leg scores.
+
+    Args:
+        legs: Mapping of leg name to its results, best first
+        weights: Weight per leg; legs without a weight count fully
+        key: Function identifying the same hit across legs
+
+    Returns:
+        Fused results, best first, each with ``combined_score`` and per-leg ``ranks``
+    """
+    weights = weights or {}
+    fused: Dict[str, dict] = {}
+    for leg, results in legs.items():
+        if not results:
+            continue
+        scores = [result.get("similarity", 0.0) for result in results]
+        low, high = min(scores), max(scores)
+        spread = high - low
+        for rank, (result, score) in enumerate(zip(results, scores), start=1):
+            normalized = (score - low) / spread if spread > 0 else 1.0
+            result_key = key(result)
+            entry = fused.get(result_key)
+            if entry is None:
+                entry = fused[result_key] = {**result, "combined_score": 0.0, "ranks": {}}
+            entry["combined_score"] += weights.get(leg, 1.0) * normalized
+            entry["ranks"][leg] = rank
+    return sorted(fused.values(), key=lambda x: x["combined_score"], reverse=True)
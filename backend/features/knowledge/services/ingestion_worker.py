@@ -0,0 +1,163 @@
+import logging
+import multiprocessing
+import os
+import shutil
+import signal
+import socket
+import threading
+import traceback
+from typing import Optional
+
+from django.conf import settings
+from django.db import close_old_connections, connections
+
+from features.knowledge.registry import vector_store_registry
+from features.knowledge.repositories.ingestion_job_repository import IngestionJobRepository
+from features.knowledge.repositories.knowledge_repository import KnowledgeRepository
+from features.knowledge.services.embedding_model import embedding_model
+
+logger = logging.getLogger(__name__)
+
+
+def retry_delay(attempt: int) -> float:
+    """Exponential backoff in seconds for the given (1-based) failed attempt"""
+    base = getattr(settings, "INGESTION_RETRY_BACKOFF", 30)
+    cap = getattr(settings, "INGESTION_RETRY_BACKOFF_MAX", 3600)
+    return min(cap, base * 2 ** (attempt - 1))
+
+
+class IngestionWorker:
+    """
+    Claims queued ingestion jobs and processes them one at a time.
+    Run several of these in separate processes via ``run_workers``.
+    """
+
+    def __init__(self, worker_id: Optional[str] = None, poll_interval: Optional[float] = None):
+        self.worker_id = worker_id or f"{socket.gethostname()}:{os.getpid()}"
+        self.poll_interval = poll_interval or getattr(settings, "INGESTION_POLL_INTERVAL", 2.0)
+        self.lease_seconds = getattr(settings, "INGESTION_JOB_LEASE", 300)
+        self.job_repository = IngestionJobRepository()
+        self.knowledge_repository = KnowledgeRepository()
+        self._stop = threading.Event()
+
+    def stop(self, *args):
+        self._stop.set()
+
+    def run(self, once: bool = False):
+        """Process jobs until stopped; with ``once``, exit when the queue is empty"""
+        logger.info(f"Ingestion worker {self.worker_id} started")
+        # Load the local embedding model and open the vector store before claiming the first job
+        embedding_model.preload()
+        vector_store_registry.warm_up()
+        while not self._stop.is_set():
+            close_old_connections()
+            if self.run_next():
+                continue
+            if once:
+                break
+            self._stop.wait(self.poll_interval)
+        logger.info(f"Ingestion worker {self.worker_id} stopped")
+
+    def run_next(self) -> bool:
+        """Claim and process a single job; returns False if none was runnable"""
+        job = self.job_repository.claim_next(self.worker_id, self.lease_seconds)
+        if not job:
+            return False
+        self.execute(job)
+        return True
+
+    def execute(self, job):
+        # Imported here so the service (and its vector store) is built in the worker process
+        from features.knowledge.services.knowledge_service import KnowledgeService
+
+        if job.attempts >= job.max_attempts:
+            # Every attempt so far ended with its worker dying (see ``claim_next``)
+            logger.error(f"Job {job.id} failed permanently after {job.attempts} attempts: {job.last_error}")
+            self.job_repository.update(job.id, {"status": "failed", "locked_by": None, "heartbeat_at": None})
+            self._give_up(job, job.last_error)
+            return
+        
+        logger.info(f"Worker {self.worker_id} processing job {job.id} (attempt {job.attempts + 1})")
+        service = KnowledgeService()
+        try:
+            service.process_ingestion_job(
+                job, progress=lambda fraction, message: self.job_repository.report_progress(job, fraction, message)
+            )
+        except Exception as e:
+            traceback.print_exc()
+            attempt = job.attempts + 1
+            if attempt < job.max_attempts:
+                delay = retry_delay(attempt)
+                logger.warning(f"Job {job.id} failed ({str(e)}), retrying in {delay}s")
+                self.job_repository.mark_failed(job, str(e), retry_in=delay)
+            else:
+                logger.error(f"Job {job.id} failed permanently after {attempt} attempts: {str(e)}")
+                self.job_repository.mark_failed(job, str(e), retry_in=None)
+                self._give_up(job, str(e))
+            return
+
+        self.job_repository.mark_succeeded(job)
+        self._remove_upload(job)
+        if self.job_repository.has_queued(job.knowledge_id):
+            # A newer upload of the document is queued behind this job
+            self.knowledge_repository.update(job.knowledge_id, {"status": "processing"})
+
+    def _give_up(self, job, error):
+        self.knowledge_repository.update(job.knowledge_id, {
+            "status": "error",
+            "error_message": error,
+        })
+        self._remove_upload(job)
+
+    def _remove_upload(self, job):
+        try:
+            os.remove(job.file_path)
+            directory = os.path.dirname(job.file_path)
+            if directory and not os.listdir(directory):
+                shutil.rmtree(directory, ignore_errors=True)
+        except FileNotFoundError:
+            pass
+        except OSError as e:
+            logger.warning(f"Could not remove upload for job {job.id}: {str(e)}")
+
+
+def _worker_main(once: bool):
+    import django
+
+    django.setup()
+    worker = IngestionWorker()
+    signal.signal(signal.SIGTERM, worker.stop)
+    signal.signal(signal.SIGINT, worker.stop)
+    worker.run(once=once)
+
+
+def run_workers(count: int, once: bool = False):
+    """Run ``count`` workers; a single worker runs in the current process"""
+    if count <= 1:
+        worker = IngestionWorker()
+        signal.signal(signal.SIGTERM, worker.stop)
+        worker.run(once=once)
+        return
+
+    # Children must not inherit open database connections
+    connections.close_all()
+    processes = [
+        multiprocessing.Process(target=_worker_main, args=(once,), name=f"ingestion-worker-{i}")
+        for i in range(count)
+    ]
+    for process in processes:
+        process.start()
+
+    def _terminate(*args):
+        for process in processes:
+            if process.is_alive():
+                process.terminate()
+
+    signal.signal(signal.SIGTERM, _terminate)
+    try:
+        for process in processes:
+            process.join()
+    except KeyboardInterrupt:
+        _terminate()
+        for process in processes:
+            process.join()
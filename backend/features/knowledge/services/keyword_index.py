@@ -0,0 +1,211 @@
+import logging
+import math
+import re
+import sqlite3
+from collections import Counter
+from typing import Dict, Iterable, List, Sequence, Tuple
+
+from features.knowledge.services.sqlite_store import SQLiteStore
+
+logger = logging.getLogger(__name__)
+
+STOP_WORDS = frozenset({
+    'a', 'an', 'the', 'and', 'or', 'but', 'is', 'are', 'was', 'were',
+    'in', 'on', 'at', 'to', 'for', 'with', 'by', 'about', 'like',
+    'through', 'over', 'before', 'after', 'between', 'under',
+})
+
+_TOKEN = re.compile(r"\w+")
+
+
+def tokenize(text: str) -> List[str]:
+    """Lowercase word tokens with stop words removed"""
+    return [token for token in _TOKEN.findall(text.lower()) if token not in STOP_WORDS]
+
+
+class KeywordIndex(SQLiteStore):
+    """
+    Per-user inverted index with BM25 scoring, stored in SQLite.
+
+    Chunks are added and removed incrementally as they are written to or deleted
+    from the vector store. A query only reads the posting lists of its own terms,
+    so its cost is independent of the size of the user's corpus.
+    """
+
+    def __init__(self, path: str, k1: float = 1.2, b: float = 0.75):
+        self.k1 = k1
+        self.b = b
+        super().__init__(path)
+
+    def _create_schema(self, conn: sqlite3.Connection):
+        conn.execute(
+            """
+            CREATE TABLE IF NOT EXISTS chunks (
+                chunk_id TEXT PRIMARY KEY,
+                user_id TEXT NOT NULL,
+                knowledge_id TEXT NOT NULL,
+                length INTEGER NOT NULL
+            )
+            """
+        )
+        conn.execute("CREATE INDEX IF NOT EXISTS chunks_knowledge ON chunks (knowledge_id)")
+        conn.execute(
+            """
+            CREATE TABLE IF NOT EXISTS postings (
+                user_id TEXT NOT NULL,
+                term TEXT NOT NULL,
+                chunk_id TEXT NOT NULL,
+                tf INTEGER NOT NULL,
+                PRIMARY KEY (user_id, term, chunk_id)
+            ) WITHOUT ROWID
+            """
+        )
+        conn.execute("CREATE INDEX IF NOT EXISTS postings_chunk ON postings (chunk_id)")
+        conn.execute(
+            """
+            CREATE TABLE IF NOT EXISTS users (
+                user_id TEXT PRIMARY KEY,
+                chunk_count INTEGER NOT NULL DEFAULT 0,
+                total_length INTEGER NOT NULL DEFAULT 0,
+                backfilled INTEGER NOT NULL DEFAULT 0
+            )
+            """
+        )
+
+    def add(self, user_id, knowledge_id, chunk_ids: Sequence[str], documents: Sequence[str]):
+        """Index (or re-index) chunks belonging to a knowledge document"""
+        user_id, knowledge_id = str(user_id), str(knowledge_id)
+        with self._transaction() as conn:
+            self._remove(conn, chunk_ids)
+            added_chunks = 0
+            added_length = 0
+            for chunk_id, document in zip(chunk_ids, documents):
+                tokens = tokenize(document or "")
+                conn.execute(
+                    "INSERT INTO chunks (chunk_id, user_id, knowledge_id, length) VALUES (?, ?, ?, ?)",
+                    (chunk_id, user_id, knowledge_id, len(tokens)),
+                )
+                conn.executemany(
+                    "INSERT INTO postings (user_id, term, chunk_id, tf) VALUES (?, ?, ?, ?)",
+                    [(user_id, term, chunk_id, tf) for term, tf in Counter(tokens).items()],
+                )
+                added_chunks += 1
+                added_length += len(tokens)
+            conn.execute("INSERT OR IGNORE INTO users (user_id) VALUES (?)", (user_id,))
+            conn.execute(
+                "UPDATE users SET chunk_count = chunk_count + ?, total_length = total_length + ? "
+                "WHERE user_id = ?",
+                (added_chunks, added_length, user_id),
+            )
+
+    def remove(self, chunk_ids: Sequence[str]):
+        with self._transaction() as conn:
+            self._remove(conn, chunk_ids)
+
+    def delete_knowledge(self, knowledge_id):
+        """Remove every chunk of a knowledge document from the index"""
+        with self._transaction() as conn:
+            rows = conn.execute(
+                "SELECT chunk_id FROM chunks WHERE knowledge_id = ?", (str(knowledge_id),)
+            ).fetchall()
+            self._remove(conn, [row[0] for row in rows])
+
+    def _remove(self, conn: sqlite3.Connection, chunk_ids: Sequence[str]):
+        removed: Dict[str, List[int]] = {}
+        for start in range(0, len(chunk_ids), 500):
+            batch = list(chunk_ids[start : start + 500])
+            placeholders = ",".join("?" * len(batch))
+            rows = conn.execute(
+                f"SELECT user_id, length FROM chunks WHERE chunk_id IN ({placeholders})", batch
+            ).fetchall()
+            if not rows:
+                continue
+            for user_id, length in rows:
+                totals = removed.setdefault(user_id, [0, 0])
+                totals[0] += 1
+                totals[1] += length
+            conn.execute(f"DELETE FROM postings WHERE chunk_id IN ({placeholders})", batch)
+            conn.execute(f"DELETE FROM chunks WHERE chunk_id IN ({placeholders})", batch)
+        for user_id, (count, length) in removed.items():
+            conn.execute(
+                "UPDATE users SET chunk_count = MAX(chunk_count - ?, 0), "
+                "total_length = MAX(total_length - ?, 0) WHERE user_id = ?",
+                (count, length, user_id),
+            )
+
+    def search(self, user_id, query: str, limit: int = 3) -> List[Tuple[str, float]]:
+        """
+        Score the user's chunks against a query with BM25.
+
+        Returns:
+            List of (chunk_id, score) tuples, best first
+        """
+        terms = list(dict.fromkeys(tokenize(query)))
+        if not terms:
+            return []
+
+        user_id = str(user_id)
+        with self._transaction("DEFERRED") as conn:
+            stats = conn.execute(
+                "SELECT chunk_count, total_length FROM users WHERE user_id = ?", (user_id,)
+            ).fetchone()
+            if not stats or not stats[0]:
+                return []
+            placeholders = ",".join("?" * len(terms))
+            rows = conn.execute(
+                f"SELECT p.term, p.chunk_id, p.tf, c.length FROM postings p "
+                f"JOIN chunks c ON c.chunk_id = p.chunk_id "
+                f"WHERE p.user_id = ? AND p.term IN ({placeholders})",
+                (user_id, *terms),
+            ).fetchall()
+
+        chunk_count, total_length = stats
+        avg_length = total_length / chunk_count if chunk_count else 0.0
+        postings: Dict[str, List[Tuple[str, int, int]]] = {}
+        for term, chunk_id, tf, length in rows:
+            postings.setdefault(term, []).append((chunk_id, tf, length))
+
+        scores: Dict[str, float] = {}
+        for term, entries in postings.items():
+            df = len(entries)
+            idf = math.log(1 + (chunk_count - df + 0.5) / (df + 0.5))
+            for chunk_id, tf, length in entries:
+                norm = self.k1 * (1 - self.b + self.b * length / avg_length) if avg_length else self.k1
+                scores[chunk_id] = scores.get(chunk_id, 0.0) + idf * tf * (self.k1 + 1) / (tf + norm)
+
+        ranked = sorted(scores.items(), key=lambda item: item[1], reverse=True)
+        return ranked[:limit]
+
+    def is_backfilled(self, user_id) -> bool:
+        with self._transaction("DEFERRED") as conn:
+            row = conn.execute(
+                "SELECT backfilled FROM users WHERE user_id = ?", (str(user_id),)
+            ).fetchone()
+        return bool(row and row[0])
+
+    def backfill(self, user_id, chunks: Iterable[Tuple[str, str, str]]):
+        """
+        Rebuild a user's postings from existing chunks, e.g. ones stored before
+        the index existed.
+
+        Args:
+            user_id: Owner of the chunks
+            chunks: Iterable of (chunk_id, knowledge_id, document) tuples
+        """
+        by_knowledge: Dict[str, Tuple[List[str], List[str]]] = {}
+        for chunk_id, knowledge_id, document in chunks:
+            ids, documents = by_knowledge.setdefault(str(knowledge_id), ([], []))
+            ids.append(chunk_id)
+            documents.append(document)
+        for knowledge_id, (ids, documents) in by_knowledge.items():
+            self.add(user_id, knowledge_id, ids, documents)
+        with self._transaction() as conn:
+            conn.execute("INSERT OR IGNORE INTO users (user_id) VALUES (?)", (str(user_id),))
+            conn.execute("UPDATE users SET backfilled = 1 WHERE user_id = ?", (str(user_id),))
+        logger.info(f"Backfilled keyword index for user {user_id}")
+
+    def clear(self):
+        with self._transaction() as conn:
+            conn.execute("DELETE FROM postings")
+            conn.execute("DELETE FROM chunks")
+            conn.execute("DELETE FROM users")
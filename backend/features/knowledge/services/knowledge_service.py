@@ -1,72 +1,115 @@
 import logging
 from typing import List, Dict, Any, Optional
 import os
-import tempfile
+import queue
 import uuid
-import asyncio
 from concurrent.futures import ThreadPoolExecutor
 import traceback
 import time
-import re
+import socket
+from collections import deque
+from contextlib import contextmanager
+from datetime import timedelta
+from itertools import islice
 
-import chromadb
-from chromadb.config import Settings
 from django.conf import settings
-from ollama import Client
+from django.utils import timezone
 
+from features.knowledge.registry import DEFAULT_COLLECTION, vector_store_registry
+from features.knowledge.services.chunking import RowGrouper, SemanticChunker, semantic_chunks, simple_chunks
+from features.knowledge.services.context_packer import document_order
+from features.knowledge.services.citation_scanner import CitationMatcher, scan_citations
+from features.knowledge.services.dedup import collapse_duplicates, duplicate_key
+from features.knowledge.services.embedding_cache import text_digest
+from features.knowledge.services.embedding_model import embedding_model
+from features.knowledge.services import parse_pool
+from features.knowledge.services.fusion import reciprocal_rank_fusion, weighted_fusion
+from features.knowledge.services.quantization import fit_dimensions
+from features.knowledge.services.retrieval import RetrievalResult
+from features.knowledge.services.tokens import embedding_max_tokens, embedding_tokenizer
+from features.knowledge.repositories.ingestion_job_repository import IngestionJobRepository
 from features.knowledge.repositories.knowledge_repository import KnowledgeRepository
+from features.knowledge.repositories.reindex_job_repository import ReindexJobRepository
+from api.services.cache_service import CacheService
 from api.utils.exceptions import NotFoundException
 
 
 class KnowledgeService:
     def __init__(self):
         self.repository = KnowledgeRepository()
+        self.job_repository = IngestionJobRepository()
+        self.reindex_repository = ReindexJobRepository()
         self.logger = logging.getLogger(__name__)
-        self.ollama_client = Client(host=settings.OLLAMA_ENDPOINT)
-
-        # Initialize ChromaDB with new client configuration
-        self.chroma_client = chromadb.PersistentClient(
-            path=settings.CHROMA_PERSIST_DIR,
-            settings=Settings(anonymized_telemetry=False, allow_reset=False, is_persistent=True),
-        )
-
-        # Create or get collection with updated configuration
-        self.collection = self.chroma_client.get_or_create_collection(
-            name="knowledge_embeddings",
-            metadata={"hnsw:space": "cosine"},
-            embedding_function=None,  # We're using Ollama for embeddings
-        )
         
-        # Create executor for background processing
-        self.executor = ThreadPoolExecutor(max_workers=2)
+        # Clients and collections are shared process-wide
+        self.ollama_client = vector_store_registry.ollama_client
+        self._collection = None
+        self._collection_name = None
         
         # Initialize caches
         self._init_caches()
 
+    @property
+    def collection(self):
+        """The active collection, opened on first use so parse workers never open it"""
+        if self._collection is None:
+            self._collection_name = vector_store_registry.active_collection_name()
+            self._collection = vector_store_registry.get_collection(self._collection_name)
+        return self._collection
+
+    @collection.setter
+    def collection(self, collection):
+        self._collection = collection
+        self._collection_name = None
+
+    @contextmanager
+    def _collection_writes(self, collection=None, knowledge_ids=()):
+        """
+        Write a batch to ``collection``, or to the active collection if it is
+        None. Writes to the active collection are registered and wait while a
+        reindex swaps in a new collection, see ``VectorStoreRegistry.collection_writes``.
+        
+        Args:
+            collection: Collection to write to, e.g. one being rebuilt; the active one by default
+            knowledge_ids: IDs of the documents written
+            
+        Yields:
+            The collection to write to
+        """
+        if collection is not None:
+            yield collection
+            return
+        with vector_store_registry.collection_writes(knowledge_ids=[str(knowledge_id) for knowledge_id in knowledge_ids]):
+            # Reopen the active collection if a reindex swapped it since it was opened
+            if self._collection_name and self._collection_name != vector_store_registry.active_collection_name():
+                self._collection = None
+            yield self.collection
+
     def _init_caches(self):
         """Initialize caches for better performance"""
-        # Cache for embeddings
-        self._embedding_cache = {}
-        self._embedding_cache_max_size = getattr(settings, 'EMBEDDING_CACHE_MAX_SIZE', 1000)
+        # Persistent cache for embeddings, shared by all workers
+        self.embedding_cache = vector_store_registry.embedding_cache
         
-        # Cache for search results
-        self._search_results_cache = {}
-        self._search_results_cache_max_size = getattr(settings, 'SEARCH_RESULTS_CACHE_MAX_SIZE', 100)
-        self._search_results_cache_ttl = getattr(settings, 'SEARCH_RESULTS_CACHE_TTL', 300)  # 5 minutes
+        # Inverted index for keyword search
+        self.keyword_index = vector_store_registry.keyword_index
         
-        # Cache for chunks
-        self._chunks_cache = {}
-        self._chunks_cache_max_size = getattr(settings, 'CHUNKS_CACHE_MAX_SIZE', 50)
+        # Fingerprints of canonical chunks, for near-duplicate detection at ingestion
+        self.duplicate_index = vector_store_registry.duplicate_index
+        
+        # Caches for search results and chunks, shared by all workers
+        self._search_results_cache = vector_store_registry.search_cache
+        self._chunks_cache = vector_store_registry.chunks_cache
         
         # Track cache stats
-        self._cache_hits = {'embedding': 0, 'search': 0, 'chunks': 0}
-        self._cache_misses = {'embedding': 0, 'search': 0, 'chunks': 0}
+        self._cache_hits = {'embedding': 0}
+        self._cache_misses = {'embedding': 0}
 
     def create_knowledge_with_file(self, data: dict, user, file) -> Any:
         """
         Create a new knowledge document from a file.
-        This method handles the initial creation with processing status,
-        then processes the file in the background.
+        The document is created with processing status and the upload is saved
+        to disk and queued for ingestion; a `process_ingestion_jobs` worker
+        parses and indexes it.
         
         Args:
             data: The knowledge document data
@@ -82,217 +125,402 @@ class KnowledgeService:
             data["status"] = "processing"  # Explicitly set status to processing
             knowledge = self.repository.create(data)
             
-            # Use a unique task ID to prevent duplicate processing
-            task_id = f"process_file_{knowledge.id}"
-            
-            # Check if this task is already running
-            if not hasattr(self, '_processing_tasks'):
-                self._processing_tasks = set()
-            
-            if task_id in self._processing_tasks:
-                self.logger.warning(f"File processing for knowledge {knowledge.id} is already in progress")
-            else:
-                # Mark this task as running
-                self._processing_tasks.add(task_id)
-                
-                # Create a file-like object with the file content to avoid closed file issues
-                file_info = {
-                    'name': file.name,
-                    'content_type': file.content_type,
-                    'size': file.size
-                }
-                
-                # Read the file content into memory first
-                try:
-                    if hasattr(file, 'read'):
-                        file_content = file.read()
-                        file_info['content'] = file_content
-                    else:
-                        # If file is already closed, try to open it from the path
-                        try:
-                            with open(file.temporary_file_path(), 'rb') as f:
-                                file_content = f.read()
-                                file_info['content'] = file_content
-                        except (AttributeError, FileNotFoundError):
-                            # If we can't get the file content, raise an error
-                            raise ValueError(f"Could not read file content for {file.name}")
-                except Exception as e:
-                    self.logger.error(f"Error reading file content: {str(e)}")
-                    raise
-                
-                # Process the file in the background with the file info instead of the file object
-                future = self.executor.submit(self._process_file_with_content, knowledge, file_info)
-                
-                # Add a callback to remove the task ID when done
-                def _task_done_callback(future):
-                    try:
-                        self._processing_tasks.remove(task_id)
-                    except KeyError:
-                        pass
-                
-                future.add_done_callback(_task_done_callback)
-            
+            self._queue_upload(knowledge, file)
             return knowledge
         except Exception as e:
             self.logger.error(f"Error creating knowledge with file: {str(e)}")
             raise
     
-    def _process_file_with_content(self, knowledge, file_info):
+    def replace_knowledge_file(self, knowledge_id, user, file) -> Any:
         """
-        Process a file using its content that was already read into memory.
+        Replace the file of an existing knowledge document and queue it for
+        re-ingestion. Only chunks whose content changed are embedded again.
         
         Args:
-            knowledge: The knowledge document to update
-            file_info: Dictionary containing file information and content
+            knowledge_id: ID of the knowledge document
+            user: The user owning the document
+            file: The uploaded file object
+            
+        Returns:
+            The updated knowledge document
         """
+        knowledge = self.get_knowledge(knowledge_id, user.id)
+        if not knowledge:
+            raise NotFoundException("Knowledge document not found")
+        
         try:
-            self.logger.info(f"Processing file {file_info['name']} for knowledge {knowledge.id}")
-            
-            # Create a temporary file to store the file content
-            with tempfile.NamedTemporaryFile(delete=False) as temp_file:
-                # Write the content to the temporary file
-                temp_file.write(file_info['content'])
-                temp_file_path = temp_file.name
-            
+            knowledge = self.repository.update(knowledge.id, {
+                "file_path": file.name,
+                "file_size": file.size,
+                "file_type": file.content_type,
+                "status": "processing",
+                "error_message": None,
+            })
+            self._queue_upload(knowledge, file)
+            return knowledge
+        except Exception as e:
+            self.logger.error(f"Error replacing file of knowledge {knowledge_id}: {str(e)}")
+            raise
+    
+    def _queue_upload(self, knowledge, file):
+        """
+        Save an uploaded file to the upload directory and queue an ingestion job
+        for it. Every upload gets its own path, so a file being parsed is never
+        overwritten; a job still waiting in the queue switches to the new file,
+        and a running one is followed by a job for it (see ``IngestionJobRepository.enqueue``).
+        """
+        # Persist the upload so the job survives restarts and can run in another process
+        upload_dir = os.path.join(
+            getattr(settings, 'INGESTION_UPLOAD_DIR', 'data/uploads'), str(knowledge.id)
+        )
+        os.makedirs(upload_dir, exist_ok=True)
+        file_path = os.path.join(
+            upload_dir, f"{uuid.uuid4().hex[:12]}-{os.path.basename(file.name) or 'upload'}"
+        )
+        with open(file_path, 'wb') as destination:
+            for chunk in file.chunks():
+                destination.write(chunk)
+        
+        job = self.job_repository.enqueue(
+            knowledge,
+            file_path=file_path,
+            file_name=file.name,
+            content_type=file.content_type,
+            max_attempts=getattr(settings, 'INGESTION_MAX_ATTEMPTS', 3),
+        )
+        self.logger.info(f"Queued ingestion job {job.id} for knowledge {knowledge.id}")
+        
+        # Drop uploads no job refers to anymore, such as the file of a superseded job
+        active = {os.path.abspath(path) for path in self.job_repository.active_file_paths(knowledge.id)}
+        for name in os.listdir(upload_dir):
+            path = os.path.join(upload_dir, name)
+            if os.path.abspath(path) not in active:
+                try:
+                    os.remove(path)
+                except OSError as e:
+                    self.logger.warning(f"Could not remove stale upload {path}: {str(e)}")
+        return job
+    
+    def process_ingestion_job(self, job, progress=None):
+        """
+        Parse and index the file of a queued ingestion job. Errors propagate so
+        the worker can retry the job.
+        
+        Args:
+            job: The IngestionJob to process
+            progress: Optional callable taking (fraction, message)
+        """
+        self.ingest_file(job.knowledge, job.file_path, job.file_name, job.content_type, progress=progress)
+    
+    def ingest_file(self, knowledge, file_path, file_name, content_type, progress=None):
+        """
+        Parse a file on disk, store its chunks and mark the document ready.
+        
+        Ingestion runs as a pipeline of stages joined by bounded queues:
+        
+        1. parse: the file is parsed section by section (page, sheet, slide or
+           block of text) in a ``parse_executor`` process, see ``_parse_in_pool``
+        2. embed: changed chunks are embedded in batches, with
+           ``EMBEDDING_CONCURRENCY`` batches in flight
+        3. write: a writer thread stores embedded batches in the vector store
+        
+        Only a few sections and batches are held in memory at any time. The
+        seconds each stage was busy are reported in ``ingestion_stats["stages"]``.
+        
+        Args:
+            knowledge: The knowledge document to update
+            file_path: Path to the file
+            file_name: Original name of the uploaded file
+            content_type: MIME type reported for the upload
+            progress: Optional callable taking (fraction, message)
+        """
+        self.logger.info(f"Processing file {file_name} for knowledge {knowledge.id}")
+        report = progress or (lambda fraction, message: None)
+        
+        report(0.0, "parsing")
+        timings = {}
+        if getattr(settings, 'INGESTION_PARSE_WORKERS', 2) > 0:
+            metadata, sections = self._parse_in_pool(file_path, file_name, content_type or "", knowledge.name, timings)
+        else:
+            metadata, sections = self._parse_file(file_path, file_name, content_type or "", knowledge.name)
+            sections = self._timed_sections(sections, timings)
+        content_parts = []
+        
+        def _chunks():
+            for position, (section_text, section_chunks) in enumerate(sections, start=1):
+                content_parts.append(section_text)
+                total = metadata.get("total_sections")
+                fraction = min(position / total, 1.0) if total else 0.0
+                report(0.95 * fraction, f"indexing section {position}" + (f"/{total}" if total else ""))
+                yield from section_chunks
+        
+        # Store chunks in ChromaDB with metadata for citation
+        ingestion_stats = self._store_chunks_in_chroma(knowledge.id, _chunks(), metadata, knowledge.user_id)
+        if ingestion_stats:
+            ingestion_stats["stages"]["parse_seconds"] = round(timings.get("parse_seconds", 0.0), 3)
+            self.logger.info(f"Ingestion stages for knowledge {knowledge.id}: {ingestion_stats['stages']}")
+        
+        # Update the knowledge document with the processed content
+        self.repository.update(knowledge.id, {
+            "content": "".join(content_parts),
+            "status": "ready",
+            "ingestion_stats": ingestion_stats,
+        })
+        
+        self.logger.info(f"Successfully processed file for knowledge {knowledge.id}")
+
+    def _parse_in_pool(self, file_path, file_name, content_type, document_name, timings):
+        """
+        Run ``_parse_file`` in the registry's ``parse_executor`` and stream its
+        sections back through a queue of at most ``INGESTION_PARSE_QUEUE_SIZE``
+        sections, so the parser never runs far ahead of embedding.
+        
+        Args:
+            file_path: Path to the file
+            file_name: Original name of the uploaded file
+            content_type: MIME type reported for the upload
+            document_name: Name of the knowledge document
+            timings: Dictionary that receives ``parse_seconds`` once parsing ends
+        
+        Returns:
+            Tuple of (metadata, sections) as returned by ``_parse_file``;
+            ``metadata`` is updated as sections arrive
+        """
+        metadata = {"source": file_name}
+        
+        def _sections():
+            manager = vector_store_registry.parse_manager
+            section_queue = manager.Queue(maxsize=max(1, getattr(settings, 'INGESTION_PARSE_QUEUE_SIZE', 4)))
+            stop = manager.Event()
+            future = vector_store_registry.parse_executor.submit(
+                parse_pool.parse_file, section_queue, stop,
+                file_path, file_name, content_type, document_name, parse_pool.parse_settings(),
+            )
             try:
-                # Process the file based on its type
-                content = ""
-                chunks = []
-                metadata = {"source": file_info['name']}
-                
-                file_type = file_info['content_type'].lower()
-                file_name = file_info['name'].lower()
-                
-                # PDF processing
-                if "pdf" in file_type or file_name.endswith('.pdf'):
-                    content, chunks, metadata = self._process_pdf(temp_file_path, knowledge.name)
-                
-                # Word document processing
-                elif "word" in file_type or file_name.endswith(('.docx', '.doc')):
-                    content, chunks, metadata = self._process_docx(temp_file_path, knowledge.name)
-                
-                # PowerPoint processing
-                elif "presentation" in file_type or file_name.endswith(('.pptx', '.ppt')):
-                    content, chunks, metadata = self._process_pptx(temp_file_path, knowledge.name)
-                
-                # Excel processing
-                elif "excel" in file_type or "spreadsheet" in file_type or file_name.endswith(('.xlsx', '.xls')):
-                    content, chunks, metadata = self._process_excel(temp_file_path, knowledge.name)
-                
-                # Markdown processing
-                elif "markdown" in file_type or file_name.endswith('.md'):
-                    content, chunks, metadata = self._process_markdown(temp_file_path, knowledge.name)
-                
-                # HTML processing
-                elif "html" in file_type or file_name.endswith(('.html', '.htm')):
-                    content, chunks, metadata = self._process_html(temp_file_path, knowledge.name)
-                
-                # JSON processing
-                elif "json" in file_type or file_name.endswith('.json'):
-                    content, chunks, metadata = self._process_json(temp_file_path, knowledge.name)
-                
-                # CSV processing
-                elif "csv" in file_type or file_name.endswith('.csv'):
-                    content, chunks, metadata = self._process_csv(temp_file_path)
-                
-                # Plain text processing
-                elif "text" in file_type or file_name.endswith('.txt'):
-                    with open(temp_file_path, 'r', encoding='utf-8', errors='ignore') as f:
-                        content = f.read()
-                    text_chunks = self._chunk_text(content)
-                    # Convert text chunks to the expected dictionary format
-                    chunks = []
-                    for i, chunk_text in enumerate(text_chunks):
-                        chunk_id = f"{file_info['name']}_c{i}"
-                        chunks.append({
-                            "id": chunk_id,
-                            "content": chunk_text,
-                            "metadata": {
-                                "source": file_info['name'],
-                                "chunk": i,
-                                "citation": file_info['name']
-                            }
-                        })
-                
-                # Default processing for other file types
-                else:
-                    with open(temp_file_path, 'rb') as f:
-                        binary_content = f.read()
+                while True:
                     try:
-                        content = binary_content.decode('utf-8', errors='ignore')
-                    except:
-                        content = f"Binary file content could not be processed: {file_info['name']}"
-                    text_chunks = self._chunk_text(content)
-                    # Convert text chunks to the expected dictionary format
-                    chunks = []
-                    for i, chunk_text in enumerate(text_chunks):
-                        chunk_id = f"{file_info['name']}_c{i}"
-                        chunks.append({
-                            "id": chunk_id,
-                            "content": chunk_text,
-                            "metadata": {
-                                "source": file_info['name'],
-                                "chunk": i,
-                                "citation": file_info['name']
-                            }
-                        })
-                
-                # Update the knowledge document with the processed content
-                self.repository.update(knowledge.id, {
-                    "content": content,
-                    "status": "ready",
-                })
-                
-                # Store chunks in ChromaDB with metadata for citation
-                self._store_chunks_in_chroma(knowledge.id, chunks, metadata, knowledge.user_id)
-                
-                self.logger.info(f"Successfully processed file for knowledge {knowledge.id}")
+                        kind, payload, extra = section_queue.get(timeout=1.0)
+                    except queue.Empty:
+                        if future.done():
+                            # The worker died or returned without a final message
+                            future.result()
+                            raise RuntimeError(f"Parser of {file_name} stopped without finishing")
+                        continue
+                    if kind == "section":
+                        metadata.update(extra)
+                        yield payload
+                    elif kind == "done":
+                        metadata.update(payload)
+                        timings["parse_seconds"] = extra
+                        return
+                    else:
+                        timings["parse_seconds"] = extra
+                        # Raises the parser's exception
+                        future.result()
+                        raise RuntimeError(f"Parser of {file_name} failed")
             finally:
-                # Clean up the temporary file
-                os.unlink(temp_file_path)
-                
-        except Exception as e:
-            self.logger.error(f"Error processing file: {str(e)}")
-            traceback.print_exc()
-            # Update knowledge document with error status
-            self.repository.update(knowledge.id, {
-                "status": "error",
-                "error_message": str(e),
-            })
-    
-    def _process_pdf(self, file_path, document_name):
+                stop.set()
+        
+        return metadata, _sections()
+
+    def _timed_sections(self, sections, timings):
+        """Pass sections through, adding the time spent producing them to ``timings["parse_seconds"]``"""
+        timings.setdefault("parse_seconds", 0.0)
+        sections = iter(sections)
+        while True:
+            started = time.perf_counter()
+            try:
+                section = next(sections)
+            except StopIteration:
+                timings["parse_seconds"] += time.perf_counter() - started
+                return
+            timings["parse_seconds"] += time.perf_counter() - started
+            yield section
+
+    def _parse_file(self, file_path, file_name, content_type, document_name):
         """
-        Process a PDF file and extract its content with page information.
+        Pick the parser for a file based on its type.
+        
+        Args:
+            file_path: Path to the file
+            file_name: Original name of the uploaded file
+            content_type: MIME type reported for the upload
+            document_name: Name of the knowledge document
+        
+        Returns:
+            Tuple of (metadata, sections). ``sections`` is a generator of
+            (section_text, chunks) tuples; parsers fill in ``metadata`` as they go.
+        """
+        metadata = {"source": file_name}
+        
+        file_type = content_type.lower()
+        lower_name = file_name.lower()
+        
+        # PDF processing
+        if "pdf" in file_type or lower_name.endswith('.pdf'):
+            sections = self._process_pdf(file_path, document_name, metadata)
+        
+        # Word document processing
+        elif "word" in file_type or lower_name.endswith(('.docx', '.doc')):
+            sections = self._process_docx(file_path, document_name, metadata)
+        
+        # PowerPoint processing
+        elif "presentation" in file_type or lower_name.endswith(('.pptx', '.ppt')):
+            sections = self._process_pptx(file_path, document_name, metadata)
+        
+        # Excel processing
+        elif "excel" in file_type or "spreadsheet" in file_type or lower_name.endswith(('.xlsx', '.xls')):
+            sections = self._process_excel(file_path, document_name, metadata)
+        
+        # Markdown processing
+        elif "markdown" in file_type or lower_name.endswith('.md'):
+            sections = self._process_markdown(file_path, document_name, metadata)
+        
+        # HTML processing
+        elif "html" in file_type or lower_name.endswith(('.html', '.htm')):
+            sections = self._process_html(file_path, document_name, metadata)
+        
+        # JSON processing
+        elif "json" in file_type or lower_name.endswith('.json'):
+            sections = self._process_json(file_path, document_name, metadata)
+        
+        # CSV processing
+        elif "csv" in file_type or lower_name.endswith('.csv'):
+            sections = self._process_csv(file_path, file_name, metadata)
+        
+        # Plain text and any other file type, decoded as UTF-8
+        else:
+            sections = self._text_sections(self._read_text_blocks(file_path), file_name, file_name, file_name)
+        
+        return metadata, sections
+
+    def _read_text_blocks(self, file_path):
+        """
+        Read a text file in blocks of about ``INGESTION_TEXT_BLOCK_SIZE`` characters.
+        Blocks end at a blank line where possible so paragraphs stay together.
+        
+        Args:
+            file_path: Path to the file
+        
+        Yields:
+            Consecutive blocks of the file's text
+        """
+        block_size = getattr(settings, 'INGESTION_TEXT_BLOCK_SIZE', 64 * 1024)
+        block = []
+        size = 0
+        with open(file_path, 'r', encoding='utf-8', errors='ignore') as f:
+            for line in f:
+                block.append(line)
+                size += len(line)
+                if size >= block_size and (not line.strip() or size >= 2 * block_size):
+                    yield "".join(block)
+                    block = []
+                    size = 0
+        if block:
+            yield "".join(block)
+
+    def _join_blocks(self, pieces, separator="\n\n"):
+        """
+        Group short pieces of text (paragraphs, lines) into blocks of about
+        ``INGESTION_TEXT_BLOCK_SIZE`` characters.
+        
+        Args:
+            pieces: Iterable of text pieces
+            separator: Separator placed after each piece
+        
+        Yields:
+            Blocks of joined pieces
+        """
+        block_size = getattr(settings, 'INGESTION_TEXT_BLOCK_SIZE', 64 * 1024)
+        block = []
+        size = 0
+        for piece in pieces:
+            block.append(piece)
+            size += len(piece) + len(separator)
+            if size >= block_size:
+                yield separator.join(block) + separator
+                block = []
+                size = 0
+        if block:
+            yield separator.join(block) + separator
+
+    def _text_sections(self, blocks, id_prefix, source, citation):
+        """
+        Chunk blocks of text, numbering chunks consecutively across blocks.
+        
+        With the semantic strategy the blocks are streamed through one
+        ``SemanticChunker``, so chunks run on across block boundaries and each
+        block yields the chunks it completed; the last chunks are yielded with
+        an empty block.
+        
+        Args:
+            blocks: Iterable of text blocks
+            id_prefix: Prefix of the chunk ids
+            source: Source recorded in the chunk metadata
+            citation: Citation recorded in the chunk metadata
+        
+        Yields:
+            Tuples of (block, chunks)
+        """
+        index = 0
+        
+        def _records(texts):
+            nonlocal index
+            chunks = []
+            for chunk in texts:
+                chunks.append({
+                    "id": f"{id_prefix}_c{index}",
+                    "content": chunk,
+                    "metadata": {
+                        "source": source,
+                        "chunk": index,
+                        "citation": citation
+                    }
+                })
+                index += 1
+            return chunks
+        
+        if getattr(settings, 'CHUNKING_STRATEGY', 'semantic') == 'simple':
+            for block in blocks:
+                yield block, _records(self._chunk_text(block))
+            return
+        
+        chunker = self._chunker()
+        for block in blocks:
+            yield block, _records(chunker.feed(block))
+        remaining = chunker.close()
+        if remaining:
+            yield "", _records(remaining)
+
+    def _process_pdf(self, file_path, document_name, metadata):
+        """
+        Process a PDF file page by page, keeping page information for citations.
         
         Args:
             file_path: Path to the PDF file
             document_name: Name of the document
-            
-        Returns:
-            Tuple of (full_content, chunks, metadata)
+            metadata: Document metadata, updated in place
+        
+        Yields:
+            Tuples of (page_content, chunks)
         """
         try:
             # Import PyPDF2 here to avoid dependency issues
             import PyPDF2
             
-            full_content = ""
-            chunks = []
-            metadata = {"source": document_name, "type": "pdf"}
+            metadata.update({"source": document_name, "type": "pdf"})
             
             with open(file_path, 'rb') as file:
                 pdf_reader = PyPDF2.PdfReader(file)
-                metadata["total_pages"] = len(pdf_reader.pages)
+                metadata["total_pages"] = metadata["total_sections"] = len(pdf_reader.pages)
                 
                 for i, page in enumerate(pdf_reader.pages):
                     page_num = i + 1
                     page_text = page.extract_text()
                     
                     if page_text:
-                        # Add page number to the content
-                        page_content = f"Page {page_num}:\n{page_text}\n\n"
-                        full_content += page_content
-                        
                         # Create chunks from the page with citation metadata
+                        chunks = []
                         page_chunks = self._chunk_text(page_text)
                         for j, chunk in enumerate(page_chunks):
                             chunk_id = f"{document_name}_p{page_num}_c{j}"
@@ -306,314 +534,355 @@ class KnowledgeService:
                                     "citation": f"{document_name}, Page {page_num}"
                                 }
                             })
-            
-            return full_content, chunks, metadata
+                        
+                        # Add page number to the content
+                        yield f"Page {page_num}:\n{page_text}\n\n", chunks
         except ImportError:
             self.logger.error("PyPDF2 is not installed. Please install it to process PDF files.")
             raise Exception("PDF processing library not available")
         except Exception as e:
             self.logger.error(f"Error processing PDF: {str(e)}")
             raise
-    
-    def _process_csv(self, file_path):
+
+    def _process_csv(self, file_path, file_name, metadata):
         """
-        Process a CSV file and extract its content.
+        Process a CSV file as a stream of rows, grouped into chunks under the
+        header row.
         
         Args:
             file_path: Path to the CSV file
-            
-        Returns:
-            Tuple of (full_content, chunks, metadata)
+            file_name: Original name of the uploaded file, used in chunk ids and citations
+            metadata: Document metadata, updated in place
+        
+        Yields:
+            Tuples of (rows_content, chunks) for groups of rows
         """
         try:
             import csv
             
-            full_content = ""
-            chunks = []
-            metadata = {"source": os.path.basename(file_path), "type": "csv"}
+            source = file_name
+            metadata.update({"source": source, "type": "csv"})
             
-            with open(file_path, 'r', encoding='utf-8', errors='ignore') as file:
+            with open(file_path, 'r', encoding='utf-8', errors='ignore', newline='') as file:
                 csv_reader = csv.reader(file)
-                rows = list(csv_reader)
-                
-                # Get headers if available
-                headers = rows[0] if rows else []
+                headers = next(csv_reader, None)
+                if headers is None:
+                    return
                 metadata["headers"] = headers
                 
-                # Convert CSV to text format
-                for i, row in enumerate(rows):
-                    row_text = ", ".join(row)
-                    full_content += f"Row {i+1}: {row_text}\n"
-                    
-                    # Create chunk for each row with citation metadata
-                    chunk_id = f"{metadata['source']}_r{i+1}"
-                    chunks.append({
-                        "id": chunk_id,
-                        "content": row_text,
-                        "metadata": {
-                            "source": metadata['source'],
-                            "row": i+1,
-                            "citation": f"{metadata['source']}, Row {i+1}"
-                        }
-                    })
-            
-            return full_content, chunks, metadata
+                # Row numbers match the file, with the header as row 1
+                yield from self._row_sections(
+                    enumerate(csv_reader, start=2), headers, source, source, source, {}
+                )
         except Exception as e:
             self.logger.error(f"Error processing CSV: {str(e)}")
             raise
-    
-    def _process_docx(self, file_path, document_name):
+
+    def _row_sections(self, rows, headers, id_prefix, source, citation, extra_metadata, title=None):
+        """
+        Group table rows into chunks sized like text chunks, each repeating the
+        column names, and cite them by row range ("Rows 120–180").
+        
+        Args:
+            rows: Iterable of (row_number, values)
+            headers: Column names
+            id_prefix: Prefix of the chunk ids
+            source: Source recorded in the chunk metadata
+            citation: Citation the row range is appended to
+            extra_metadata: Fields added to every chunk's metadata (e.g. the sheet)
+            title: Optional line (e.g. the sheet name) placed before the column names
+        
+        Yields:
+            Tuples of (rows_content, chunks) for blocks of about ``INGESTION_TEXT_BLOCK_SIZE`` characters
         """
-        Process a Word document (DOCX/DOC) and extract its content.
+        block_size = getattr(settings, 'INGESTION_TEXT_BLOCK_SIZE', 64 * 1024)
+        chunk_size, _, tokenizer, max_size = self._chunk_sizing()
+        header = "Columns: " + ", ".join(str(name) for name in headers)
+        if title:
+            header = f"{title}\n{header}"
+        grouper = RowGrouper(header, chunk_size, tokenizer, max_size)
+        
+        index = 0
+        
+        def _records(row_chunks):
+            nonlocal index
+            records = []
+            for row_chunk in row_chunks:
+                first, last = row_chunk.first_row, row_chunk.last_row
+                rows_label = f"Row {first}" if first == last else f"Rows {first}\u2013{last}"
+                chunk_id = f"{id_prefix}_r{first}"
+                if row_chunk.part is not None:
+                    chunk_id += f"_p{row_chunk.part}"
+                records.append({
+                    "id": chunk_id,
+                    "content": row_chunk.content,
+                    "metadata": {
+                        "source": source,
+                        **extra_metadata,
+                        "row_start": first,
+                        "row_end": last,
+                        "chunk": index,
+                        "citation": f"{citation}, {rows_label}"
+                    }
+                })
+                index += 1
+            return records
+        
+        lines = [f"{header}\n"]
+        chunks = []
+        size = len(lines[0])
+        for row_number, values in rows:
+            row_text = ", ".join(values)
+            if not row_text.strip(", "):
+                continue
+            line = f"Row {row_number}: {row_text}\n"
+            lines.append(line)
+            size += len(line)
+            chunks.extend(_records(grouper.add(row_number, row_text)))
+            
+            if size >= block_size:
+                yield "".join(lines), chunks
+                lines = []
+                chunks = []
+                size = 0
+        
+        chunks.extend(_records(grouper.close()))
+        if lines or chunks:
+            yield "".join(lines), chunks
+
+    def _process_docx(self, file_path, document_name, metadata):
+        """
+        Process a Word document (DOCX/DOC) in blocks of paragraphs.
         
         Args:
             file_path: Path to the Word document
             document_name: Name of the document
-            
-        Returns:
-            Tuple of (full_content, chunks, metadata)
+            metadata: Document metadata, updated in place
+        
+        Yields:
+            Tuples of (block_content, chunks)
         """
         try:
             # Import docx library here to avoid dependency issues
             import docx
             
-            full_content = ""
-            chunks = []
-            metadata = {"source": document_name, "type": "docx"}
+            metadata.update({"source": document_name, "type": "docx"})
             
             # Open the document
             doc = docx.Document(file_path)
             
-            # Extract text from paragraphs
-            paragraphs = []
-            for para in doc.paragraphs:
-                if para.text.strip():  # Skip empty paragraphs
-                    paragraphs.append(para.text)
-            
-            # Extract text from tables
-            for table in doc.tables:
-                for row in table.rows:
-                    row_text = " | ".join([cell.text for cell in row.cells if cell.text.strip()])
-                    if row_text.strip():
-                        paragraphs.append(row_text)
-            
-            # Combine all paragraphs
-            full_content = "\n\n".join(paragraphs)
-            
-            # Create chunks with citation metadata
-            text_chunks = self._chunk_text(full_content)
-            for i, chunk in enumerate(text_chunks):
-                chunk_id = f"{document_name}_c{i}"
-                chunks.append({
-                    "id": chunk_id,
-                    "content": chunk,
-                    "metadata": {
-                        "source": document_name,
-                        "chunk": i,
-                        "citation": document_name
-                    }
-                })
-            
-            return full_content, chunks, metadata
+            def _paragraphs():
+                # Text from paragraphs, skipping empty ones
+                for para in doc.paragraphs:
+                    if para.text.strip():
+                        yield para.text
+                
+                # Text from tables
+                for table in doc.tables:
+                    for row in table.rows:
+                        row_text = " | ".join([cell.text for cell in row.cells if cell.text.strip()])
+                        if row_text.strip():
+                            yield row_text
+            
+            yield from self._text_sections(
+                self._join_blocks(_paragraphs()), document_name, document_name, document_name
+            )
         except ImportError:
             self.logger.error("python-docx is not installed. Please install it to process DOCX files.")
             raise Exception("DOCX processing library not available")
         except Exception as e:
             self.logger.error(f"Error processing DOCX: {str(e)}")
             raise
-    
-    def _process_excel(self, file_path, document_name):
+
+    def _process_excel(self, file_path, document_name, metadata):
         """
-        Process an Excel file (XLSX/XLS) and extract its content.
+        Process an Excel file one sheet at a time, streaming rows with
+        openpyxl's read-only mode and grouping them into chunks under each
+        sheet's header row. Legacy .xls files, which openpyxl cannot read, are
+        loaded one sheet at a time with pandas.
         
         Args:
             file_path: Path to the Excel file
             document_name: Name of the document
-            
-        Returns:
-            Tuple of (full_content, chunks, metadata)
+            metadata: Document metadata, updated in place
+        
+        Yields:
+            Tuples of (rows_content, chunks) for groups of rows
         """
+        metadata.update({"source": document_name, "type": "excel"})
         try:
-            # Import pandas and openpyxl here to avoid dependency issues
-            import pandas as pd
-            
-            full_content = ""
-            chunks = []
-            metadata = {"source": document_name, "type": "excel"}
-            
-            # Read all sheets from the Excel file
-            excel_file = pd.ExcelFile(file_path)
-            sheet_names = excel_file.sheet_names
-            metadata["sheets"] = sheet_names
-            
-            # Process each sheet
-            for sheet_name in sheet_names:
-                df = pd.read_excel(excel_file, sheet_name=sheet_name)
-                
-                # Convert sheet to text
-                sheet_content = f"Sheet: {sheet_name}\n"
-                sheet_content += df.to_string(index=False) + "\n\n"
-                full_content += sheet_content
+            for sheet_name, rows in self._excel_sheets(file_path, metadata):
+                # The first non-empty row holds the column names
+                headers = None
+                for row_number, values in rows:
+                    if any(values):
+                        headers = values
+                        break
+                if headers is None:
+                    continue
                 
-                # Create chunks for each sheet with citation metadata
-                sheet_chunks = self._chunk_text(sheet_content)
-                for i, chunk in enumerate(sheet_chunks):
-                    chunk_id = f"{document_name}_{sheet_name}_c{i}"
-                    chunks.append({
-                        "id": chunk_id,
-                        "content": chunk,
-                        "metadata": {
-                            "source": document_name,
-                            "sheet": sheet_name,
-                            "chunk": i,
-                            "citation": f"{document_name}, Sheet: {sheet_name}"
-                        }
-                    })
-            
-            return full_content, chunks, metadata
+                yield from self._row_sections(
+                    rows,
+                    headers,
+                    f"{document_name}_{sheet_name}",
+                    document_name,
+                    f"{document_name}, Sheet: {sheet_name}",
+                    {"sheet": sheet_name},
+                    title=f"Sheet: {sheet_name}",
+                )
         except ImportError:
             self.logger.error("pandas or openpyxl is not installed. Please install them to process Excel files.")
             raise Exception("Excel processing libraries not available")
         except Exception as e:
             self.logger.error(f"Error processing Excel: {str(e)}")
             raise
-    
-    def _process_markdown(self, file_path, document_name):
+
+    def _excel_sheets(self, file_path, metadata):
+        """
+        Stream the rows of each sheet of a workbook.
+        
+        Yields:
+            Tuples of (sheet_name, rows), where ``rows`` is an iterator of
+            (row_number, values) with cells rendered as strings
         """
-        Process a Markdown file and extract its content.
+        def _cells(row):
+            values = ["" if value is None else str(value) for value in row]
+            while values and not values[-1]:
+                values.pop()
+            return values
+        
+        try:
+            import openpyxl
+            from openpyxl.utils.exceptions import InvalidFileException
+            
+            workbook = openpyxl.load_workbook(file_path, read_only=True, data_only=True)
+        except (ImportError, InvalidFileException):
+            workbook = None
+        
+        if workbook is not None:
+            try:
+                metadata["sheets"] = workbook.sheetnames
+                for sheet in workbook.worksheets:
+                    rows = (
+                        (row_number, _cells(row))
+                        for row_number, row in enumerate(sheet.iter_rows(values_only=True), start=1)
+                    )
+                    yield sheet.title, rows
+            finally:
+                workbook.close()
+            return
+        
+        import pandas as pd
+        
+        with pd.ExcelFile(file_path) as excel_file:
+            metadata["sheets"] = excel_file.sheet_names
+            for sheet_name in excel_file.sheet_names:
+                df = pd.read_excel(excel_file, sheet_name=sheet_name, header=None, dtype=str)
+                rows = (
+                    (row_number, _cells(None if pd.isna(value) else value for value in row))
+                    for row_number, row in enumerate(df.itertuples(index=False, name=None), start=1)
+                )
+                yield sheet_name, rows
+                del df
+
+    def _process_markdown(self, file_path, document_name, metadata):
+        """
+        Process a Markdown file in blocks of text.
         
         Args:
             file_path: Path to the Markdown file
             document_name: Name of the document
-            
-        Returns:
-            Tuple of (full_content, chunks, metadata)
+            metadata: Document metadata, updated in place
+        
+        Yields:
+            Tuples of (block_content, chunks)
         """
         try:
-            full_content = ""
-            chunks = []
-            metadata = {"source": document_name, "type": "markdown"}
-            
-            # Read the markdown file
-            with open(file_path, 'r', encoding='utf-8', errors='ignore') as f:
-                full_content = f.read()
-            
-            # Create chunks with citation metadata
-            text_chunks = self._chunk_text(full_content)
-            for i, chunk in enumerate(text_chunks):
-                chunk_id = f"{document_name}_c{i}"
-                chunks.append({
-                    "id": chunk_id,
-                    "content": chunk,
-                    "metadata": {
-                        "source": document_name,
-                        "chunk": i,
-                        "citation": document_name
-                    }
-                })
-            
-            return full_content, chunks, metadata
+            metadata.update({"source": document_name, "type": "markdown"})
+            yield from self._text_sections(
+                self._read_text_blocks(file_path), document_name, document_name, document_name
+            )
         except Exception as e:
             self.logger.error(f"Error processing Markdown: {str(e)}")
             raise
-    
-    def _process_html(self, file_path, document_name):
+
+    def _process_html(self, file_path, document_name, metadata):
         """
-        Process an HTML file and extract its content.
+        Process an HTML file and extract its text.
         
         Args:
             file_path: Path to the HTML file
             document_name: Name of the document
-            
-        Returns:
-            Tuple of (full_content, chunks, metadata)
+            metadata: Document metadata, updated in place
+        
+        Yields:
+            Tuples of (block_content, chunks)
         """
         try:
             # Import BeautifulSoup here to avoid dependency issues
             from bs4 import BeautifulSoup
             
-            full_content = ""
-            chunks = []
-            metadata = {"source": document_name, "type": "html"}
+            metadata.update({"source": document_name, "type": "html"})
             
-            # Read the HTML file
+            # Parse HTML straight from the file
             with open(file_path, 'r', encoding='utf-8', errors='ignore') as f:
-                html_content = f.read()
-            
-            # Parse HTML
-            soup = BeautifulSoup(html_content, 'html.parser')
+                soup = BeautifulSoup(f, 'html.parser')
             
             # Remove script and style elements
             for script in soup(["script", "style"]):
                 script.extract()
             
-            # Extract text
-            text = soup.get_text()
-            
-            # Clean up text (remove extra whitespace)
-            lines = (line.strip() for line in text.splitlines())
-            chunks_of_lines = (phrase.strip() for line in lines for phrase in line.split("  "))
-            full_content = '\n'.join(chunk for chunk in chunks_of_lines if chunk)
-            
             # Extract title if available
             title_tag = soup.find('title')
             if title_tag:
                 metadata["title"] = title_tag.string
             
-            # Create chunks with citation metadata
-            text_chunks = self._chunk_text(full_content)
-            for i, chunk in enumerate(text_chunks):
-                chunk_id = f"{document_name}_c{i}"
-                chunks.append({
-                    "id": chunk_id,
-                    "content": chunk,
-                    "metadata": {
-                        "source": document_name,
-                        "chunk": i,
-                        "citation": metadata.get("title", document_name)
-                    }
-                })
-            
-            return full_content, chunks, metadata
+            # Clean up text (remove extra whitespace)
+            lines = (line.strip() for line in soup.get_text().splitlines())
+            phrases = (phrase.strip() for line in lines for phrase in line.split("  "))
+            
+            yield from self._text_sections(
+                self._join_blocks((phrase for phrase in phrases if phrase), separator="\n"),
+                document_name,
+                document_name,
+                metadata.get("title", document_name),
+            )
         except ImportError:
             self.logger.error("BeautifulSoup is not installed. Please install it to process HTML files.")
             raise Exception("HTML processing library not available")
         except Exception as e:
             self.logger.error(f"Error processing HTML: {str(e)}")
             raise
-            
-    def _process_json(self, file_path, document_name):
+
+    def _process_json(self, file_path, document_name, metadata):
         """
-        Process a JSON file and extract its content.
+        Process a JSON file, section by section for large objects.
         
         Args:
             file_path: Path to the JSON file
             document_name: Name of the document
-            
-        Returns:
-            Tuple of (full_content, chunks, metadata)
+            metadata: Document metadata, updated in place
+        
+        Yields:
+            Tuples of (section_content, chunks)
         """
         try:
             import json
             
-            full_content = ""
-            chunks = []
-            metadata = {"source": document_name, "type": "json"}
+            metadata.update({"source": document_name, "type": "json"})
             
             # Read the JSON file
             with open(file_path, 'r', encoding='utf-8', errors='ignore') as f:
                 json_data = json.load(f)
             
-            # Convert JSON to formatted string
-            full_content = json.dumps(json_data, indent=2)
-            
-            # For large JSON files, process by sections
-            if len(full_content) > 10000:  # If JSON is large
-                # Process by top-level keys
+            # For large JSON objects, process by top-level keys
+            if isinstance(json_data, dict) and os.path.getsize(file_path) > 10000:
+                metadata["total_sections"] = len(json_data)
                 for key, value in json_data.items():
                     section = f"{key}:\n{json.dumps(value, indent=2)}"
-                    section_chunks = self._chunk_text(section)
                     
+                    chunks = []
+                    section_chunks = self._chunk_text(section)
                     for i, chunk in enumerate(section_chunks):
                         chunk_id = f"{document_name}_{key}_c{i}"
                         chunks.append({
@@ -626,50 +895,66 @@ class KnowledgeService:
                                 "citation": f"{document_name}, Section: {key}"
                             }
                         })
+                    
+                    yield section + "\n\n", chunks
             else:
                 # For smaller JSON, just chunk the whole thing
-                text_chunks = self._chunk_text(full_content)
-                for i, chunk in enumerate(text_chunks):
-                    chunk_id = f"{document_name}_c{i}"
-                    chunks.append({
-                        "id": chunk_id,
-                        "content": chunk,
-                        "metadata": {
-                            "source": document_name,
-                            "chunk": i,
-                            "citation": document_name
-                        }
-                    })
-            
-            return full_content, chunks, metadata
+                yield from self._text_sections(
+                    [json.dumps(json_data, indent=2)], document_name, document_name, document_name
+                )
         except Exception as e:
             self.logger.error(f"Error processing JSON: {str(e)}")
             raise
-    
-    def _chunk_text(self, text, chunk_size=1000, overlap=100):
+
+    def _chunk_sizing(self):
+        """
+        Chunk sizes from the settings. With ``CHUNK_SIZE_UNIT = "tokens"`` (the
+        default) chunks are measured with the embedding model's tokenizer:
+        ``CHUNK_SIZE_TOKENS`` and ``CHUNK_OVERLAP_TOKENS``, capped so that no
+        chunk exceeds the model's window. With ``"characters"`` they are
+        ``CHUNK_SIZE`` and ``CHUNK_OVERLAP`` characters.
+        
+        Returns:
+            Tuple of (chunk_size, overlap, tokenizer or None, max_size)
+        """
+        if getattr(settings, 'CHUNK_SIZE_UNIT', 'tokens') == 'characters':
+            chunk_size = getattr(settings, 'CHUNK_SIZE', 1000)
+            return chunk_size, getattr(settings, 'CHUNK_OVERLAP', 100), None, chunk_size * 1.5
+        
+        max_tokens = embedding_max_tokens()
+        chunk_size = min(getattr(settings, 'CHUNK_SIZE_TOKENS', 256), max_tokens)
+        overlap = min(getattr(settings, 'CHUNK_OVERLAP_TOKENS', 32), chunk_size // 2)
+        return chunk_size, overlap, embedding_tokenizer(), min(int(chunk_size * 1.5), max_tokens)
+
+    def _chunker(self):
+        """A streaming ``SemanticChunker`` sized from the settings"""
+        return SemanticChunker(*self._chunk_sizing())
+
+    def _chunk_text(self, text):
         """
         Split text into overlapping chunks based on semantic boundaries.
         This improved chunking strategy respects paragraph and sentence boundaries
-        for more coherent chunks.
+        for more coherent chunks. Sizes come from ``_chunk_sizing``.
         
         Args:
             text: The text to chunk
-            chunk_size: Maximum size of each chunk
-            overlap: Number of characters to overlap between chunks
             
         Returns:
             List of text chunks
         """
         if not text:
             return []
-            
+        
+        chunk_size, overlap, tokenizer, max_size = self._chunk_sizing()
+        
         # Use semantic chunking strategy based on settings
         chunking_strategy = getattr(settings, 'CHUNKING_STRATEGY', 'semantic')
         
         if chunking_strategy == 'simple':
+            if tokenizer is not None:
+                return tokenizer.split(text, chunk_size, overlap)
             return self._chunk_text_simple(text, chunk_size, overlap)
-        else:
-            return self._chunk_text_semantic(text, chunk_size, overlap)
+        return semantic_chunks(text, chunk_size, overlap, tokenizer, max_size)
             
     def _chunk_text_simple(self, text, chunk_size=1000, overlap=100):
         """
@@ -683,223 +968,387 @@ class KnowledgeService:
         Returns:
             List of text chunks
         """
-        chunks = []
-        
-        # Simple chunking with overlap
-        start = 0
-        while start < len(text):
-            end = min(start + chunk_size, len(text))
-            
-            # If this is not the first chunk and we're not at the end, 
-            # try to find a good breaking point (space or newline)
-            if start > 0 and end < len(text):
-                # Look for a space or newline to break at
-                break_point = text.rfind(' ', end - 50, end)
-                if break_point == -1:
-                    break_point = text.rfind('\n', end - 50, end)
-                
-                if break_point != -1:
-                    end = break_point + 1  # Include the space or newline
-            
-            # Add the chunk
-            chunks.append(text[start:end])
+        return list(simple_chunks(text, chunk_size, overlap))
             
-            # Move start position for next chunk, considering overlap
-            start = end - overlap if end < len(text) else len(text)
+    def _iter_chunk_records(self, knowledge_id, chunks, metadata, user_id):
+        """
+        Normalize chunks into (id, document, metadata) records for ChromaDB,
+        skipping empty ones.
         
-        return chunks
+        Args:
+            knowledge_id: ID of the knowledge document
+            chunks: Iterable of chunks with content and metadata
+            metadata: General metadata for the document
+            user_id: ID of the user who owns the document
+        
+        Yields:
+            Tuples of (chunk_id, document, chunk_metadata)
+        """
+        for i, chunk in enumerate(chunks):
+            # Handle case where chunk might be a string instead of a dictionary
+            if isinstance(chunk, str):
+                self.logger.warning(f"Found string chunk instead of dictionary. Converting to proper format.")
+                chunk = {
+                    "id": f"auto_{i}",
+                    "content": chunk,
+                    "metadata": {
+                        "source": metadata.get("source", "unknown"),
+                        "chunk": i,
+                        "citation": metadata.get("source", "unknown")
+                    }
+                }
             
-    def _chunk_text_semantic(self, text, chunk_size=1000, overlap=100):
+            if not chunk.get("content", "").strip():
+                continue
+            
+            # Create a unique ID for this chunk
+            chunk_id = f"{knowledge_id}_{chunk['id']}" if 'id' in chunk else f"{knowledge_id}_{uuid.uuid4()}"
+            
+            # Combine chunk metadata with document metadata; the content hash lets
+            # re-ingestion skip chunks that did not change
+            yield chunk_id, chunk["content"], {
+                "user_id": str(user_id),
+                "knowledge_id": str(knowledge_id),
+                "source": metadata.get("source", ""),
+                **chunk.get("metadata", {}),
+                "content_hash": text_digest(chunk["content"]),
+            }
+    
+    def _existing_chunks(self, knowledge_id, collection):
         """
-        Advanced chunking strategy that respects semantic boundaries like
-        paragraphs, sentences, and sections.
+        Get the chunks currently stored for a knowledge document.
         
         Args:
-            text: The text to chunk
-            chunk_size: Maximum size of each chunk
-            overlap: Number of characters to overlap between chunks
+            knowledge_id: ID of the knowledge document
+            collection: Collection to look in
             
         Returns:
-            List of text chunks
+            Dictionary mapping chunk ID to its stored metadata
         """
-        chunks = []
+        result = collection.get(where={"knowledge_id": str(knowledge_id)}, include=["metadatas"])
+        return dict(zip(result.get("ids") or [], result.get("metadatas") or []))
+
+    def _store_chunks_in_chroma(self, knowledge_id, chunks, metadata, user_id, collection=None):
+        """
+        Store document chunks in ChromaDB with metadata for retrieval and citation.
         
-        # First split by paragraphs (double newlines)
-        paragraphs = re.split(r'\n\s*\n', text)
+        Storage is incremental: each chunk carries a hash of its content, and a
+        chunk whose ID and hash match what is already stored is not embedded
+        again. Chunks that are no longer produced are deleted once all chunks
+        have been processed.
         
-        # Then split paragraphs into sentences
-        sentence_pattern = r'(?<=[.!?])\s+'
+        With ``DEDUP_ENABLED`` (the default), a changed chunk that duplicates or
+        nearly duplicates another chunk of the same user (see ``DuplicateIndex``)
+        is not embedded: it is stored with the embedding of that canonical chunk,
+        its own text and citation metadata, and ``duplicate_of`` naming the
+        canonical chunk. Searches collapse each group to its best hit.
         
-        current_chunk = ""
-        last_sentences = []  # Keep track of recent sentences for overlap
+        ``chunks`` may be any iterable, including a generator fed by a parser.
+        It is consumed in batches of ``EMBEDDING_BATCH_SIZE`` with at most
+        ``EMBEDDING_CONCURRENCY`` batches in flight, so memory use does not
+        grow with the size of the document.
         
-        for paragraph in paragraphs:
-            # Skip empty paragraphs
-            if not paragraph.strip():
-                continue
-                
-            # Split paragraph into sentences
-            sentences = re.split(sentence_pattern, paragraph)
+        Args:
+            knowledge_id: ID of the knowledge document
+            chunks: Iterable of chunks with content and metadata
+            metadata: General metadata for the document
+            user_id: ID of the user who owns the document
+            collection: Collection to write to, the active one by default
             
-            for sentence in sentences:
-                # Skip empty sentences
-                if not sentence.strip():
-                    continue
-                    
-                # If adding this sentence would exceed chunk size, save current chunk and start a new one
-                if len(current_chunk) + len(sentence) + 1 > chunk_size and current_chunk:
-                    chunks.append(current_chunk)
-                    
-                    # Start new chunk with overlap from the end of the previous chunk
-                    # Use the last few sentences for overlap
-                    overlap_text = ""
-                    overlap_size = 0
-                    
-                    # Add sentences from the end until we reach desired overlap
-                    for prev_sentence in reversed(last_sentences):
-                        if overlap_size + len(prev_sentence) > overlap:
-                            break
-                        overlap_text = prev_sentence + " " + overlap_text
-                        overlap_size += len(prev_sentence) + 1
-                    
-                    current_chunk = overlap_text + sentence
-                    # Reset last_sentences but keep the current sentence
-                    last_sentences = [sentence]
-                else:
-                    # Add sentence to current chunk with a space if needed
-                    if current_chunk and not current_chunk.endswith(" "):
-                        current_chunk += " "
-                    current_chunk += sentence
-                    
-                    # Keep track of recent sentences for overlap
-                    last_sentences.append(sentence)
-                    # Only keep enough sentences for overlap
-                    while sum(len(s) + 1 for s in last_sentences) > overlap * 2:
-                        last_sentences.pop(0)
-            
-            # Add paragraph break if not at the end of a chunk
-            if current_chunk and not current_chunk.endswith("\n"):
-                current_chunk += "\n\n"
-        
-        # Add the last chunk if it's not empty
-        if current_chunk:
-            chunks.append(current_chunk)
-            
-        # Handle case where chunks are still too large (fallback)
-        final_chunks = []
-        for chunk in chunks:
-            if len(chunk) > chunk_size * 1.5:  # If chunk is significantly larger than target
-                # Fall back to simple chunking for this large chunk
-                sub_chunks = self._chunk_text_simple(chunk, chunk_size, overlap)
-                final_chunks.extend(sub_chunks)
-            else:
-                final_chunks.append(chunk)
-                
-        return final_chunks
-    
-    def _store_chunks_in_chroma(self, knowledge_id, chunks, metadata, user_id):
+        Returns:
+            Dictionary of ingestion statistics, or None if the document has no chunks
         """
-        Store document chunks in ChromaDB with metadata for retrieval and citation.
+        records = self._iter_chunk_records(knowledge_id, chunks, metadata, user_id)
+        return self._store_records(knowledge_id, records, user_id, collection)
+
+    def _store_records(self, knowledge_id, records, user_id, collection=None):
+        """
+        Store (chunk_id, document, metadata) records of a knowledge document.
+        See ``_store_chunks_in_chroma``.
         
         Args:
             knowledge_id: ID of the knowledge document
-            chunks: List of chunks with content and metadata
-            metadata: General metadata for the document
+            records: Iterable of (chunk_id, document, metadata) tuples; metadata includes ``content_hash``
             user_id: ID of the user who owns the document
+            collection: Collection to write to, the active one by default
+            
+        Returns:
+            Dictionary of ingestion statistics, or None if the document has no chunks
         """
+        # Writes to the active collection are registered a batch at a time, so a
+        # reindex can swap collections between batches of a long ingestion
         try:
-            if not chunks:
-                self.logger.warning(f"No chunks to store for knowledge {knowledge_id}")
-                return
-                
-            # Log chunk information for debugging
-            self.logger.debug(f"Storing {len(chunks)} chunks for knowledge {knowledge_id}")
-            if chunks and isinstance(chunks[0], str):
-                self.logger.warning(f"Chunks are strings, not dictionaries. Converting to proper format.")
-                formatted_chunks = []
-                for i, chunk_text in enumerate(chunks):
-                    chunk_id = f"auto_{i}"
-                    formatted_chunks.append({
-                        "id": chunk_id,
-                        "content": chunk_text,
-                        "metadata": {
-                            "source": metadata.get("source", "unknown"),
-                            "chunk": i,
-                            "citation": metadata.get("source", "unknown")
-                        }
-                    })
-                chunks = formatted_chunks
-                self.logger.debug(f"Converted {len(chunks)} string chunks to dictionary format")
-            
-            # Generate embeddings for all chunks
-            embeddings = []
-            ids = []
-            documents = []
-            metadatas = []
-            
-            for chunk in chunks:
-                # Create a unique ID for this chunk
+            existing = self._existing_chunks(knowledge_id, collection if collection is not None else self.collection)
+            records = iter(records)
+            
+            # Embed batches concurrently on threads and hand each batch to a single
+            # writer thread, which stores batches in order as their embeddings arrive,
+            # so storage overlaps with parsing and embedding of the next batches
+            batch_size = max(1, getattr(settings, 'EMBEDDING_BATCH_SIZE', 32))
+            concurrency = max(1, getattr(settings, 'EMBEDDING_CONCURRENCY', 2))
+            started = time.perf_counter()
+            seen = set()
+            # Canonical chunks whose content changed, and duplicates whose content changed
+            rewritten = []
+            demoted = set()
+            total = 0
+            unchanged = 0
+            embedded = 0
+            stored = 0
+            duplicates = 0
+            dedup = getattr(settings, 'DEDUP_ENABLED', True)
+            # Batches handed to the writer and not yet stored; bounds the batches in memory
+            pending_writes = deque()
+            # Busy time of each embedding and write call; list appends are thread-safe
+            stage_seconds = {"embed": [], "write": []}
+            
+            def _embed(texts):
+                embed_started = time.perf_counter()
                 try:
-                    # Handle case where chunk might be a string instead of a dictionary
-                    if isinstance(chunk, str):
-                        self.logger.warning(f"Found string chunk instead of dictionary. Converting to proper format.")
-                        chunk_text = chunk
-                        chunk = {
-                            "id": f"auto_{uuid.uuid4()}",
-                            "content": chunk_text,
-                            "metadata": {
-                                "source": metadata.get("source", "unknown"),
-                                "citation": metadata.get("source", "unknown")
-                            }
-                        }
-                    
-                    chunk_id = f"{knowledge_id}_{chunk['id']}" if 'id' in chunk else f"{knowledge_id}_{uuid.uuid4()}"
+                    return self._generate_embeddings(texts)
+                finally:
+                    stage_seconds["embed"].append(time.perf_counter() - embed_started)
+            
+            def _write(future, batch, references):
+                batch_embeddings = future.result() if future is not None else []
+                write_started = time.perf_counter()
+                keep = [j for j, embedding in enumerate(batch_embeddings) if embedding]
+                if len(keep) < len(batch):
+                    self.logger.error(f"Failed to embed {len(batch) - len(keep)} chunks for knowledge {knowledge_id}")
+                    # Chunks that were not stored cannot serve as canonical chunks
+                    kept = set(keep)
+                    self.duplicate_index.remove([record[0] for j, record in enumerate(batch) if j not in kept])
+                
+                rows = [(batch[j], batch_embeddings[j]) for j in keep]
+                with self._collection_writes(collection, [knowledge_id]) as target:
+                    if references:
+                        rows.extend(self._reference_rows(target, references, {
+                            record[0]: embedding for record, embedding in rows
+                        }))
+                    if not rows:
+                        return 0
+                    batch_ids = [record[0] for record, _ in rows]
+                    batch_documents = [record[1] for record, _ in rows]
+                    # Chroma merges the metadata of an upsert into the stored one, so a
+                    # former duplicate stored as canonical has to drop ``duplicate_of`` first
+                    canonical_again = [
+                        record[0] for record, _ in rows if record[0] in demoted and "duplicate_of" not in record[2]
+                    ]
+                    if canonical_again:
+                        target.delete(ids=canonical_again)
+                    target.upsert(
+                        ids=batch_ids,
+                        embeddings=[embedding for _, embedding in rows],
+                        documents=batch_documents,
+                        metadatas=[record[2] for record, _ in rows],
+                    )
+                    self.keyword_index.add(user_id, knowledge_id, batch_ids, batch_documents)
+                stage_seconds["write"].append(time.perf_counter() - write_started)
+                return len(rows)
+            
+            with ThreadPoolExecutor(max_workers=concurrency, thread_name_prefix="knowledge-embed") as embed_executor, \
+                    ThreadPoolExecutor(max_workers=1, thread_name_prefix="knowledge-write") as write_executor:
+                while True:
+                    batch = list(islice(records, batch_size))
+                    if not batch:
+                        break
+                    total += len(batch)
                     
-                    # Log chunk information for debugging
-                    self.logger.debug(f"Processing chunk: {chunk_id}")
-                    self.logger.debug(f"Chunk type: {type(chunk)}")
-                    self.logger.debug(f"Chunk keys: {chunk.keys() if isinstance(chunk, dict) else 'Not a dictionary'}")
+                    changed = []
+                    relabeled = []
+                    for record in batch:
+                        chunk_id, _, chunk_metadata = record
+                        seen.add(chunk_id)
+                        previous = existing.get(chunk_id)
+                        if not previous or previous.get("content_hash") != chunk_metadata["content_hash"]:
+                            changed.append(record)
+                            if previous and "duplicate_of" not in previous:
+                                # Its duplicates no longer match it
+                                rewritten.append(chunk_id)
+                            elif previous:
+                                demoted.add(chunk_id)
+                        elif "duplicate_of" in previous:
+                            # A stored duplicate keeps pointing at its canonical chunk
+                            if previous != {**chunk_metadata, "duplicate_of": previous["duplicate_of"]}:
+                                relabeled.append((chunk_id, record[1], {**chunk_metadata, "duplicate_of": previous["duplicate_of"]}))
+                        elif previous != chunk_metadata:
+                            relabeled.append(record)
                     
-                    chunk_embedding = self._generate_embedding(chunk["content"])
+                    # Same content under new metadata (e.g. a renamed document) needs no embedding
+                    if relabeled:
+                        with self._collection_writes(collection, [knowledge_id]) as target:
+                            target.update(
+                                ids=[record[0] for record in relabeled],
+                                metadatas=[record[2] for record in relabeled],
+                            )
+                    unchanged += len(batch) - len(changed)
+                    if not changed:
+                        continue
                     
-                    # Combine chunk metadata with document metadata
-                    chunk_metadata = chunk.get("metadata", {})
-                    combined_metadata = {
-                        "user_id": str(user_id),
-                        "knowledge_id": str(knowledge_id),
-                        "source": metadata.get("source", ""),
-                        **chunk_metadata
-                    }
+                    # Duplicates of stored (or earlier) chunks reuse their embedding
+                    canonical = {}
+                    if dedup:
+                        canonical = self.duplicate_index.assign(
+                            user_id, knowledge_id, [(record[0], record[2]["content_hash"], record[1]) for record in changed]
+                        )
+                    references = [(record, canonical[record[0]]) for record in changed if record[0] in canonical]
+                    changed = [record for record in changed if record[0] not in canonical]
+                    duplicates += len(references)
                     
-                    embeddings.append(chunk_embedding)
-                    ids.append(chunk_id)
-                    documents.append(chunk["content"])
-                    metadatas.append(combined_metadata)
-                except Exception as e:
-                    self.logger.error(f"Error generating embedding for chunk: {str(e)}")
-                    self.logger.error(f"Chunk data: {chunk}")
-                    traceback.print_exc()
-                    continue
+                    embedded += len(changed)
+                    future = embed_executor.submit(_embed, [record[1] for record in changed]) if changed else None
+                    pending_writes.append(write_executor.submit(_write, future, changed, references))
+                    # Wait for the oldest batch to be stored before reading more
+                    if len(pending_writes) > concurrency:
+                        stored += pending_writes.popleft().result()
+                while pending_writes:
+                    stored += pending_writes.popleft().result()
+            
+            # Drop chunks that the new version of the document no longer has
+            removed = [chunk_id for chunk_id in existing if chunk_id not in seen]
+            if removed:
+                with self._collection_writes(collection, [knowledge_id]) as target:
+                    target.delete(ids=removed)
+                    self.keyword_index.remove(removed)
+                    self.duplicate_index.remove(removed)
+            self._release_duplicates(
+                collection, rewritten + [chunk_id for chunk_id in removed if "duplicate_of" not in existing[chunk_id]]
+            )
+            self._chunks_cache.delete(str(knowledge_id))
+            self._invalidate_searches(user_id)
             
-            if not embeddings:
-                self.logger.warning(f"No valid embeddings generated for knowledge {knowledge_id}")
-                return
-                
-            # Store in ChromaDB in batches to avoid memory issues
-            batch_size = 50
-            for i in range(0, len(embeddings), batch_size):
-                end_idx = min(i + batch_size, len(embeddings))
-                self.collection.add(
-                    ids=ids[i:end_idx],
-                    embeddings=embeddings[i:end_idx],
-                    documents=documents[i:end_idx],
-                    metadatas=metadatas[i:end_idx],
-                )
+            if not total:
+                self.logger.warning(f"No chunks to store for knowledge {knowledge_id}")
+                return None
+            
+            elapsed = time.perf_counter() - started
+            stats = {
+                "chunks": total,
+                "stored": stored,
+                "unchanged": unchanged,
+                "duplicates": duplicates,
+                "deleted": len(removed),
+                "batch_size": batch_size,
+                "seconds": round(elapsed, 3),
+                "chunks_per_second": round(stored / elapsed, 2) if elapsed > 0 else float(stored),
+                # Seconds each stage was busy; stages overlap, so they can add up to more than ``seconds``
+                "stages": {
+                    "embed_seconds": round(sum(stage_seconds["embed"]), 3),
+                    "write_seconds": round(sum(stage_seconds["write"]), 3),
+                },
+            }
+            
+            if embedded and not stored:
+                # Usually means the embedding model is unreachable; let the caller retry
+                raise RuntimeError(f"No valid embeddings generated for knowledge {knowledge_id}")
             
-            self.logger.info(f"Stored {len(chunks)} chunks for knowledge {knowledge_id} in ChromaDB")
+            self.logger.info(
+                f"Stored {stored} chunks for knowledge {knowledge_id} in ChromaDB, "
+                f"{unchanged} unchanged, {duplicates} duplicates, {len(removed)} deleted "
+                f"({stats['chunks_per_second']} chunks/sec)"
+            )
+            return stats
         except Exception as e:
             self.logger.error(f"Error storing chunks in ChromaDB: {str(e)}")
-            traceback.print_exc()
+            # Some batches may have been written already
+            self._invalidate_searches(user_id)
+            raise
+    
+    def _reference_rows(self, collection, references, known):
+        """
+        Records of duplicate chunks with the embeddings of their canonical chunks.
+        
+        Args:
+            collection: Collection the canonical chunks are stored in
+            references: List of (record, canonical chunk ID) tuples
+            known: Embeddings by chunk ID already at hand, e.g. from the same batch
+            
+        Returns:
+            List of (record, embedding) tuples; records carry ``duplicate_of``
+        """
+        missing = list(dict.fromkeys(
+            canonical for _, canonical in references if canonical not in known
+        ))
+        if missing:
+            stored = collection.get(ids=missing, include=["embeddings"])
+            embeddings = stored.get("embeddings")
+            for chunk_id, embedding in zip(stored.get("ids") or [], embeddings if embeddings is not None else []):
+                known[chunk_id] = embedding.tolist() if hasattr(embedding, "tolist") else embedding
+        
+        rows = []
+        orphaned = []
+        for (chunk_id, document, chunk_metadata), canonical in references:
+            embedding = known.get(canonical)
+            if embedding is not None and len(embedding):
+                rows.append(((chunk_id, document, {**chunk_metadata, "duplicate_of": canonical}), embedding))
+            else:
+                orphaned.append((chunk_id, document, chunk_metadata))
+        
+        # The canonical chunk is gone (e.g. its document was deleted meanwhile); embed the copy itself
+        if orphaned:
+            embeddings = self._generate_embeddings([record[1] for record in orphaned])
+            rows.extend((record, embedding) for record, embedding in zip(orphaned, embeddings) if embedding)
+        return rows
+
+    def _release_duplicates(self, collection, canonical_ids):
+        """
+        Re-point the duplicates of canonical chunks that were deleted or whose
+        content changed. The first duplicate of each group becomes canonical:
+        it is embedded from its own text, loses ``duplicate_of`` and takes over
+        the fingerprint in the DuplicateIndex. The rest of the group points at it.
+        
+        Args:
+            collection: Collection the chunks are stored in, the active one if None
+            canonical_ids: IDs of the canonical chunks that went away
+        """
+        if not canonical_ids:
+            return
+        with self._collection_writes(collection) as target:
+            groups = {}
+            for start in range(0, len(canonical_ids), 500):
+                result = target.get(
+                    where={"duplicate_of": {"$in": list(canonical_ids[start:start + 500])}},
+                    include=["documents", "metadatas", "embeddings"],
+                )
+                for chunk_id, document, chunk_metadata, embedding in zip(
+                    result.get("ids") or [], result.get("documents") or [],
+                    result.get("metadatas") or [], result.get("embeddings") if result.get("embeddings") is not None else [],
+                ):
+                    groups.setdefault(chunk_metadata["duplicate_of"], []).append([chunk_id, document, chunk_metadata, embedding])
+            if not groups:
+                return
+            
+            successors = [group[0] for group in groups.values()]
+            fresh = self._generate_embeddings([document for _, document, _, _ in successors])
+            for successor, embedding in zip(successors, fresh):
+                successor[2] = {key: value for key, value in successor[2].items() if key != "duplicate_of"}
+                if embedding:
+                    successor[3] = embedding
+            for group in groups.values():
+                for row in group[1:]:
+                    row[2] = {**row[2], "duplicate_of": group[0][0]}
+            
+            rows = [row for group in groups.values() for row in group]
+            # The duplicates belong to other documents, which a reindex has to catch up with too
+            with self._collection_writes(collection, {row[2].get("knowledge_id") for row in rows}):
+                # Chroma merges upserted metadata into the stored one; see ``_store_records``
+                target.delete(ids=[row[0] for row in successors])
+                target.upsert(
+                    ids=[row[0] for row in rows],
+                    embeddings=[row[3].tolist() if hasattr(row[3], "tolist") else row[3] for row in rows],
+                    documents=[row[1] for row in rows],
+                    metadatas=[row[2] for row in rows],
+                )
+                self.duplicate_index.restore([
+                    (chunk_id, chunk_metadata.get("user_id"), chunk_metadata.get("knowledge_id"),
+                     chunk_metadata.get("content_hash") or text_digest(document), document)
+                    for chunk_id, document, chunk_metadata, _ in successors
+                ])
+        for user_id in {row[2].get("user_id") for row in rows}:
+            self._invalidate_searches(user_id)
+        for knowledge_id in {row[2].get("knowledge_id") for row in rows}:
+            self._chunks_cache.delete(str(knowledge_id))
+        self.logger.info(f"Re-pointed {len(rows)} duplicates of {len(groups)} replaced canonical chunks")
 
     def create_knowledge(self, data: dict, user):
         """Create a new knowledge document"""
@@ -908,29 +1357,41 @@ class KnowledgeService:
             data["user"] = user
             knowledge = self.repository.create(data)
 
-            # Generate embedding and store in ChromaDB
-            embedding = self._generate_embedding(data["content"])
-            
-            # Store in ChromaDB
-            self.collection.add(
-                ids=[str(knowledge.id)],
-                embeddings=[embedding],
-                documents=[data["content"]],
-                metadatas=[
-                    {
-                        "user_id": str(user.id),
-                        "knowledge_id": str(knowledge.id),
-                        "name": data["name"],
-                        "identifier": data["identifier"],
-                        "citation": data["name"]
-                    }
-                ],
-            )
+            # Chunk, embed and store in ChromaDB
+            ingestion_stats = self._index_content(knowledge, data["content"])
+            if ingestion_stats:
+                knowledge = self.repository.update(knowledge.id, {"ingestion_stats": ingestion_stats})
             return knowledge
         except Exception as e:
             self.logger.error(f"Error creating knowledge: {str(e)}")
             raise
 
+    def _index_content(self, knowledge, content, collection=None):
+        """
+        Chunk the text content of a knowledge document and store it in ChromaDB.
+        Only chunks that changed since the last call are embedded again.
+        
+        Args:
+            knowledge: The knowledge document
+            content: The document text
+            collection: Collection to write to, the active one by default
+            
+        Returns:
+            Dictionary of ingestion statistics, or None if there was nothing to store
+        """
+        chunks = (
+            chunk
+            for _, section_chunks in self._text_sections([content], "content", knowledge.name, knowledge.name)
+            for chunk in section_chunks
+        )
+        return self._store_chunks_in_chroma(
+            knowledge.id,
+            chunks,
+            {"source": knowledge.name},
+            knowledge.user_id,
+            collection,
+        )
+
     def get_knowledge(self, knowledge_id, user_id=None):
         """
         Get knowledge by ID.
@@ -965,7 +1426,7 @@ class KnowledgeService:
 
     def list_knowledge(self, user_id: int):
         """List knowledge documents"""
-        return self.repository.get_user_knowledge(user_id)
+        return self.repository.get_user_knowledge(user_id).prefetch_related("ingestion_jobs")
 
     def update_knowledge(self, knowledge_id: int, data: dict, user_id: int):
         """Update knowledge document and its embedding"""
@@ -976,30 +1437,12 @@ class KnowledgeService:
             # Update Django model
             updated = self.repository.update(knowledge.id, data)
 
-            # Update ChromaDB if content changed
+            # Update ChromaDB if content changed; unchanged chunks keep their embeddings
             if "content" in data:
-                embedding = self._generate_embedding(data["content"])
-                
-                # First delete existing entries for this knowledge document
-                self.collection.delete(
-                    where={"knowledge_id": str(knowledge_id)}
-                )
-                
-                # Then add the updated content
-                self.collection.add(
-                    ids=[str(knowledge_id)],
-                    embeddings=[embedding],
-                    documents=[data["content"]],
-                    metadatas=[
-                        {
-                            "user_id": str(user_id),
-                            "knowledge_id": str(knowledge_id),
-                            "name": data.get("name", knowledge.name),
-                            "identifier": data.get("identifier", knowledge.identifier),
-                            "citation": data.get("name", knowledge.name)
-                        }
-                    ],
-                )
+                ingestion_stats = self._index_content(updated, data["content"])
+                updated = self.repository.update(knowledge.id, {"ingestion_stats": ingestion_stats})
+            # Names and other fields show up in results too
+            self._invalidate_searches(user_id)
 
             return updated
         except Exception as e:
@@ -1016,19 +1459,46 @@ class KnowledgeService:
             self.repository.delete(knowledge.id)
             
             # Delete all chunks associated with this knowledge document
-            self.collection.delete(
-                where={"knowledge_id": str(knowledge_id)}
-            )
+            with self._collection_writes(knowledge_ids=[knowledge_id]) as collection:
+                existing = self._existing_chunks(knowledge_id, collection)
+                collection.delete(
+                    where={"knowledge_id": str(knowledge_id)}
+                )
+                self.keyword_index.delete_knowledge(knowledge_id)
+                self.duplicate_index.delete_knowledge(knowledge_id)
+                # Copies in other documents took their embedding from this one's chunks
+                self._release_duplicates(
+                    None,
+                    [chunk_id for chunk_id, chunk_metadata in existing.items() if "duplicate_of" not in (chunk_metadata or {})],
+                )
+            self._chunks_cache.delete(str(knowledge_id))
+            self._invalidate_searches(user_id)
             
             return True
         except Exception as e:
             self.logger.error(f"Error deleting knowledge: {str(e)}")
             raise
 
+    def _embedding_model_key(self):
+        """
+        Identify the embedding model for cache keys.
+        
+        Returns:
+            Tuple of (model name, model version)
+        """
+        if getattr(settings, 'USE_SENTENCE_TRANSFORMERS', False):
+            model_name = getattr(settings, 'SENTENCE_TRANSFORMER_MODEL', 'all-MiniLM-L6-v2')
+            return f"sentence-transformers/{model_name}", getattr(settings, 'EMBEDDING_MODEL_VERSION', None) or "local"
+        embedding_model = getattr(settings, 'EMBEDDING_MODEL', 'nomic-embed-text')
+        return embedding_model, vector_store_registry.resolve_model_version(embedding_model)
+
     def _generate_embedding(self, text: str) -> List[float]:
         """
         Generate an embedding for the given text using either Ollama or sentence-transformers.
-        Uses caching to avoid regenerating embeddings for the same text.
+        Embeddings are cached on disk by model and content hash, so the same text is
+        only ever embedded once per model version. Misses from concurrent callers
+        are collected by the registry's ``embedding_batcher`` and embedded together
+        (``EMBEDDING_MICROBATCH_ENABLED``).
         
         Args:
             text: The text to generate an embedding for
@@ -1041,48 +1511,74 @@ class KnowledgeService:
             return []
             
         try:
-            # Check cache first
-            # Use a hash of the text as the cache key to avoid storing large strings
-            cache_key = hash(text)
-            if cache_key in self._embedding_cache:
-                self._cache_hits['embedding'] += 1
-                return self._embedding_cache[cache_key]
-            
-            self._cache_misses['embedding'] += 1
-            
-            # Truncate text if it's too long to avoid token limits
-            # Most embedding models have limits around 8192 tokens
-            max_chars = 8000  # Approximate character limit
-            if len(text) > max_chars:
-                self.logger.info(f"Truncating text from {len(text)} to {max_chars} characters for embedding")
-                text = text[:max_chars]
+            # Check cache first
+            model, version = self._embedding_model_key()
+            cached = self.embedding_cache.get(model, version, text)
+            if cached is not None:
+                self._cache_hits['embedding'] += 1
+                return self._fit_dimensions(cached)
+            
+            self._cache_misses['embedding'] += 1
+            if getattr(settings, 'EMBEDDING_MICROBATCH_ENABLED', True):
+                embedding = vector_store_registry.embedding_batcher.embed(
+                    (model, version), self._embed_batch_uncached, text
+                )
+            else:
+                embedding = self._embed_uncached(text)
+            
+            # Cache the result
+            if embedding:
+                self.embedding_cache.put(model, version, text, embedding)
+            
+            return self._fit_dimensions(embedding)
+        except Exception as e:
+            self.logger.error(f"Error generating embedding: {str(e)}")
+            traceback.print_exc()
+            return []
+
+    def _fit_dimensions(self, embedding: List[float]) -> List[float]:
+        """
+        Shorten an embedding to ``EMBEDDING_DIMENSIONS`` for Matryoshka-style
+        models. The cache keeps full vectors, so the setting can change without
+        re-embedding, but the vector store must then be rebuilt with the
+        ``reindex_knowledge`` command.
+        """
+        dimensions = getattr(settings, 'EMBEDDING_DIMENSIONS', None)
+        if not embedding or not dimensions or dimensions >= len(embedding):
+            return embedding
+        return fit_dimensions(embedding, dimensions).tolist()
+
+    def _fit_embedding_window(self, text: str) -> str:
+        """
+        Cut ``text`` to the embedding model's token window. Chunks are sized to
+        fit, so this only trims queries and chunks made with character sizing;
+        every cut is logged with the counts.
+        """
+        tokenizer = embedding_tokenizer()
+        max_tokens = embedding_max_tokens()
+        tokens = tokenizer.count(text)
+        if tokens <= max_tokens:
+            return text
+        truncated = tokenizer.truncate(text, max_tokens)
+        self.logger.warning(
+            f"Truncating text from {tokens} to {max_tokens} tokens ({len(text)} -> {len(truncated)} characters) "
+            f"for embedding model window"
+        )
+        return truncated
+
+    def _embed_uncached(self, text: str) -> List[float]:
+        """Call the embedding model for a single text, bypassing the cache"""
+        try:
+            text = self._fit_embedding_window(text)
             
             # Check if we should use sentence-transformers (if available)
             use_sentence_transformers = getattr(settings, 'USE_SENTENCE_TRANSFORMERS', False)
             
             if use_sentence_transformers:
                 try:
-                    # Import here to avoid dependency issues if not installed
-                    from sentence_transformers import SentenceTransformer
-                    
-                    # Use a singleton pattern for the model to avoid reloading
-                    if not hasattr(self, '_sentence_transformer_model'):
-                        model_name = getattr(settings, 'SENTENCE_TRANSFORMER_MODEL', 'all-MiniLM-L6-v2')
-                        self.logger.info(f"Loading sentence-transformer model: {model_name}")
-                        self._sentence_transformer_model = SentenceTransformer(model_name)
-                    
-                    # Generate embedding
-                    embedding = self._sentence_transformer_model.encode(text, convert_to_numpy=True).tolist()
+                    # The process-wide model, loaded at server start (see embedding_model)
+                    embedding = embedding_model.encode(text).tolist()
                     self.logger.debug(f"Generated embedding with sentence-transformers, dimension: {len(embedding)}")
-                    
-                    # Cache the result
-                    self._embedding_cache[cache_key] = embedding
-                    
-                    # Manage cache size
-                    if len(self._embedding_cache) > self._embedding_cache_max_size:
-                        # Remove a random key to avoid complex LRU logic
-                        self._embedding_cache.pop(next(iter(self._embedding_cache)))
-                        
                     return embedding
                 except ImportError:
                     self.logger.warning("sentence-transformers not available, falling back to Ollama")
@@ -1091,9 +1587,9 @@ class KnowledgeService:
                     self.logger.warning("Falling back to Ollama for embeddings")
             
             # Use Ollama's embedding endpoint as fallback
-            embedding_model = getattr(settings, 'EMBEDDING_MODEL', 'nomic-embed-text')
+            ollama_model = getattr(settings, 'EMBEDDING_MODEL', 'nomic-embed-text')
             response = self.ollama_client.embeddings(
-                model=embedding_model,
+                model=ollama_model,
                 prompt=text,
             )
             
@@ -1112,20 +1608,83 @@ class KnowledgeService:
             if all(abs(v) < 1e-6 for v in embedding):
                 self.logger.warning("Embedding contains all zeros or very small values")
             
-            # Cache the result
-            self._embedding_cache[cache_key] = embedding
-            
-            # Manage cache size
-            if len(self._embedding_cache) > self._embedding_cache_max_size:
-                # Remove a random key to avoid complex LRU logic
-                self._embedding_cache.pop(next(iter(self._embedding_cache)))
-            
             return embedding
         except Exception as e:
             self.logger.error(f"Error generating embedding: {str(e)}")
             traceback.print_exc()
             return []
 
+    def _generate_embeddings(self, texts: List[str]) -> List[List[float]]:
+        """
+        Generate embeddings for a batch of texts with a single model call.
+        Uses Ollama's multi-input embed endpoint (or sentence-transformers when
+        enabled) and falls back to one request per text if the batch call fails.
+        
+        Args:
+            texts: The texts to generate embeddings for
+            
+        Returns:
+            List of embeddings aligned with ``texts``; failed entries are empty lists
+        """
+        embeddings = [[] for _ in texts]
+        valid = [i for i, text in enumerate(texts) if text and len(text.strip()) > 0]
+        if not valid:
+            return embeddings
+        
+        model, version = self._embedding_model_key()
+        cached = self.embedding_cache.get_many(model, version, [texts[i] for i in valid])
+        pending = []
+        for i, embedding in zip(valid, cached):
+            if embedding is not None:
+                self._cache_hits['embedding'] += 1
+                embeddings[i] = embedding
+            else:
+                self._cache_misses['embedding'] += 1
+                pending.append(i)
+        
+        if not pending:
+            return [self._fit_dimensions(embedding) for embedding in embeddings]
+        
+        batch_embeddings = self._embed_batch_uncached([texts[i] for i in pending])
+        for i, embedding in zip(pending, batch_embeddings):
+            embeddings[i] = list(embedding)
+        
+        # Cache the results
+        self.embedding_cache.put_many(model, version, [texts[i] for i in pending], [embeddings[i] for i in pending])
+        
+        return [self._fit_dimensions(embedding) for embedding in embeddings]
+
+    def _embed_batch_uncached(self, texts: List[str]) -> List[List[float]]:
+        """
+        Call the embedding model once for several texts, bypassing the cache.
+        Falls back to one call per text if the batch call fails; failed
+        entries are empty lists.
+        """
+        batch = [self._fit_embedding_window(text) for text in texts]
+        batch_embeddings = None
+        
+        if getattr(settings, 'USE_SENTENCE_TRANSFORMERS', False):
+            try:
+                batch_embeddings = embedding_model.encode(batch).tolist()
+            except ImportError:
+                self.logger.warning("sentence-transformers not available, falling back to Ollama")
+            except Exception as e:
+                self.logger.error(f"Error using sentence-transformers: {str(e)}")
+                self.logger.warning("Falling back to Ollama for embeddings")
+        
+        if batch_embeddings is None:
+            try:
+                ollama_model = getattr(settings, 'EMBEDDING_MODEL', 'nomic-embed-text')
+                response = self.ollama_client.embed(model=ollama_model, input=batch)
+                batch_embeddings = response.get("embeddings") if response else None
+            except Exception as e:
+                self.logger.warning(f"Batch embedding failed, embedding texts one at a time: {str(e)}")
+        
+        if not batch_embeddings or len(batch_embeddings) != len(batch):
+            batch_embeddings = [self._embed_uncached(text) for text in texts]
+        
+        return [list(embedding) for embedding in batch_embeddings]
+
     def find_relevant_context(self, query: str, user_id: int, max_results: int = 3) -> List[dict]:
         """Find relevant knowledge documents using hybrid search (semantic + keyword)"""
         try:
@@ -1153,6 +1712,50 @@ class KnowledgeService:
             traceback.print_exc()
             return []
             
+    def rank_document_chunks(self, query: str, user_id: int, knowledge_ids, limit: Optional[int] = None) -> List[dict]:
+        """
+        Rank the chunks of specific knowledge documents against a query.
+        
+        Args:
+            query: The query text
+            user_id: ID of the user owning the documents
+            knowledge_ids: IDs of the documents to rank chunks from
+            limit: Maximum number of chunks, ``RAG_MAX_CANDIDATE_CHUNKS`` by default
+            
+        Returns:
+            Chunks with id, content, metadata and similarity, best first. If the
+            query cannot be embedded the chunks are returned in stored order.
+            Duplicate chunks are collapsed into the first of their group.
+        """
+        limit = limit or getattr(settings, 'RAG_MAX_CANDIDATE_CHUNKS', 200)
+        where = {"$and": [
+            {"user_id": str(user_id)},
+            {"knowledge_id": {"$in": [str(knowledge_id) for knowledge_id in knowledge_ids]}},
+        ]}
+        
+        query_embedding = self._generate_embedding(query) if query else None
+        if query_embedding and any(query_embedding):
+            results = self.collection.query(
+                query_embeddings=[query_embedding],
+                n_results=limit,
+                where=where,
+                include=["documents", "metadatas", "distances"],
+            )
+            rows = zip(results["ids"][0], results["documents"][0], results["metadatas"][0], results["distances"][0])
+            return collapse_duplicates([
+                {"id": chunk_id, "content": doc, "metadata": meta, "similarity": 1 - dist}
+                for chunk_id, doc, meta, dist in rows
+            ])
+        
+        self.logger.warning("Could not embed query, ranking document chunks in stored order")
+        results = self.collection.get(where=where, limit=limit, include=["documents", "metadatas"])
+        chunks = [
+            {"id": chunk_id, "content": doc, "metadata": meta, "similarity": 0.0}
+            for chunk_id, doc, meta in zip(results["ids"], results["documents"], results["metadatas"])
+        ]
+        chunks.sort(key=document_order)
+        return collapse_duplicates(chunks)
+
     def _semantic_search(self, query: str, user_id: int, max_results: int = 3) -> List[dict]:
         """Find relevant knowledge documents using semantic search"""
         try:
@@ -1178,18 +1781,16 @@ class KnowledgeService:
                 return []
 
             # Process and format results
+            threshold = getattr(settings, 'RAG_SIMILARITY_THRESHOLD', 0.5)
             formatted_results = []
-            for i, (doc, meta, dist) in enumerate(zip(
-                results["documents"][0], results["metadatas"][0], results["distances"][0]
-            )):
-                # Generate a unique ID for the chunk
-                chunk_id = f"chunk_{meta.get('knowledge_id', '')}_{i}"
-                
+            for chunk_id, doc, meta, dist in zip(
+                results["ids"][0], results["documents"][0], results["metadatas"][0], results["distances"][0]
+            ):
                 # Calculate similarity score (1 - distance)
                 similarity = 1 - dist
                 
                 # Only include results with reasonable similarity
-                if similarity > 0.5:  # Adjust threshold as needed
+                if similarity > threshold:
                     formatted_results.append({
                         "id": chunk_id,  # Include the chunk ID
                         "content": doc,
@@ -1201,8 +1802,10 @@ class KnowledgeService:
                         "search_type": "semantic"
                     })
             
-            # Sort by similarity and limit to max_results
+            # Sort by similarity, keep the best hit of each group of duplicates
+            # and limit to max_results
             formatted_results.sort(key=lambda x: x["similarity"], reverse=True)
+            formatted_results = collapse_duplicates(formatted_results)
             result_count = len(formatted_results[:max_results])
             self.logger.info(f"Found {result_count} relevant documents with semantic search")
             
@@ -1213,144 +1816,137 @@ class KnowledgeService:
             return []
             
     def _keyword_search(self, query: str, user_id: int, max_results: int = 3) -> List[dict]:
-        """Find relevant knowledge documents using keyword search"""
+        """Find relevant knowledge chunks using BM25 over the user's inverted index"""
         try:
-            # Get all knowledge documents for the user
-            user_knowledge = self.repository.get_user_knowledge(user_id)
-            if not user_knowledge:
+            # Chunks stored before the index existed are indexed once per user
+            if not self.keyword_index.is_backfilled(user_id):
+                self._backfill_keyword_index(user_id)
+            
+            # Over-fetch so collapsing duplicates still leaves max_results hits
+            ranked = self.keyword_index.search(user_id, query, limit=max_results * 3)
+            if not ranked:
                 return []
-                
-            # Extract keywords from query (simple approach)
-            # Remove common stop words and split by spaces
-            stop_words = {'a', 'an', 'the', 'and', 'or', 'but', 'is', 'are', 'was', 'were', 
-                         'in', 'on', 'at', 'to', 'for', 'with', 'by', 'about', 'like', 
-                         'through', 'over', 'before', 'after', 'between', 'under'}
-            
-            # Convert query to lowercase and tokenize
-            query_lower = query.lower()
-            query_tokens = [token.strip() for token in query_lower.split() if token.strip() and token.strip().lower() not in stop_words]
-            
-            # Get chunks for all knowledge documents
-            all_chunks = []
-            for knowledge in user_knowledge:
-                chunks = self.get_chunks_for_knowledge(knowledge.id)
-                all_chunks.extend(chunks)
-                
-            # Score chunks based on keyword matches
-            scored_chunks = []
-            for chunk in all_chunks:
-                content = chunk.get('content', '').lower()
-                metadata = chunk.get('metadata', {})
-                
-                # Count keyword occurrences
-                keyword_count = sum(content.count(keyword) for keyword in query_tokens)
-                
-                # Calculate a simple TF score
-                score = keyword_count / (len(content.split()) + 1) if content else 0
-                
-                # Only include chunks with at least one keyword match
-                if score > 0:
-                    scored_chunks.append({
-                        "id": chunk.get('id', f"chunk_{len(scored_chunks)}"),
-                        "content": chunk.get('content', ''),
-                        "metadata": metadata,
-                        "similarity": score,
-                        "search_type": "keyword"
-                    })
             
-            # Sort by score and limit results
-            scored_chunks.sort(key=lambda x: x["similarity"], reverse=True)
-            result_count = len(scored_chunks[:max_results])
-            self.logger.info(f"Found {result_count} relevant documents with keyword search")
+            # Fetch content and metadata for the top hits only
+            results = self.collection.get(
+                ids=[chunk_id for chunk_id, _ in ranked],
+                include=["documents", "metadatas"],
+            )
+            found = {
+                chunk_id: (doc, meta)
+                for chunk_id, doc, meta in zip(results["ids"], results["documents"], results["metadatas"])
+            }
+            
+            # Scale scores to (0, 1] relative to the best hit
+            top_score = ranked[0][1]
+            scored_chunks = []
+            for chunk_id, score in ranked:
+                if chunk_id not in found:
+                    continue
+                doc, meta = found[chunk_id]
+                scored_chunks.append({
+                    "id": chunk_id,
+                    "content": doc,
+                    "metadata": meta,
+                    "similarity": score / top_score if top_score > 0 else 0,
+                    "bm25_score": score,
+                    "search_type": "keyword"
+                })
+            scored_chunks = collapse_duplicates(scored_chunks)[:max_results]
             
-            return scored_chunks[:max_results]
+            self.logger.info(f"Found {len(scored_chunks)} relevant documents with keyword search")
+            return scored_chunks
         except Exception as e:
             self.logger.error(f"Error in keyword search: {str(e)}")
             traceback.print_exc()
             return []
             
+    def _backfill_keyword_index(self, user_id: int):
+        """Index all of a user's stored chunks in the keyword index"""
+        results = self.collection.get(
+            where={"user_id": str(user_id)},
+            include=["documents", "metadatas"],
+        )
+        self.keyword_index.backfill(
+            user_id,
+            (
+                (chunk_id, (meta or {}).get("knowledge_id", ""), doc)
+                for chunk_id, doc, meta in zip(results["ids"], results["documents"], results["metadatas"])
+            ),
+        )
+            
     def _hybrid_search(self, query: str, user_id: int, max_results: int = 3) -> List[dict]:
         """
         Combine semantic and keyword search results for better retrieval.
-        Uses caching to improve performance for repeated queries.
+        Both legs run concurrently and are fused with the ``HYBRID_FUSION``
+        strategy ("rrf" or "weighted"). Each result carries per-leg timings.
+        Results are cached in the registry's two-tier ``search_cache`` under
+        the user's corpus generation, which every change to their knowledge
+        bumps, and concurrent identical searches run only once.
         """
         try:
-            # Generate cache key
-            cache_key = f"search_{hash(query)}_{user_id}_{max_results}"
-            
-            # Check if we have a cached result that's still valid
-            if cache_key in self._search_results_cache:
-                cache_entry = self._search_results_cache[cache_key]
-                cache_time = cache_entry.get('time', 0)
-                current_time = time.time()
-                
-                # Check if the cache entry is still valid
-                if current_time - cache_time < self._search_results_cache_ttl:
-                    self._cache_hits['search'] += 1
-                    return cache_entry.get('results', [])
-            
-            self._cache_misses['search'] += 1
-            
-            # Get results from both search methods
-            semantic_results = self._semantic_search(query, user_id, max_results)
-            keyword_results = self._keyword_search(query, user_id, max_results)
-            
-            # Combine results, avoiding duplicates
-            combined_results = []
-            seen_content = set()
-            
-            # First add semantic results (they usually have higher quality)
-            for result in semantic_results:
-                content_hash = hash(result["content"])
-                if content_hash not in seen_content:
-                    seen_content.add(content_hash)
-                    combined_results.append(result)
-            
-            # Then add keyword results that aren't duplicates
-            for result in keyword_results:
-                content_hash = hash(result["content"])
-                if content_hash not in seen_content:
-                    seen_content.add(content_hash)
-                    combined_results.append(result)
-            
-            # Re-rank combined results
-            # For simplicity, we'll normalize scores and use a weighted combination
-            # Semantic search gets higher weight (0.7) than keyword search (0.3)
-            for result in combined_results:
-                if result["search_type"] == "semantic":
-                    result["combined_score"] = result["similarity"] * 0.7
-                else:
-                    result["combined_score"] = result["similarity"] * 0.3
-            
-            # Sort by combined score
-            combined_results.sort(key=lambda x: x["combined_score"], reverse=True)
-            
-            # Limit to max_results
-            final_results = combined_results[:max_results]
-            self.logger.info(f"Hybrid search returned {len(final_results)} results")
-            
-            # Cache the results
-            self._search_results_cache[cache_key] = {
-                'results': final_results,
-                'time': time.time()
-            }
-            
-            # Manage cache size
-            if len(self._search_results_cache) > self._search_results_cache_max_size:
-                # Find and remove the oldest entry
-                oldest_key = min(
-                    self._search_results_cache.keys(),
-                    key=lambda k: self._search_results_cache[k].get('time', 0)
-                )
-                self._search_results_cache.pop(oldest_key)
-            
-            return final_results
+            generation = self._search_results_cache.generation(f"user:{user_id}")
+            cache_key = CacheService.cache_key("search", query, user_id, max_results, generation)
+            return self._search_results_cache.get_or_set(
+                cache_key, lambda: self._fused_search(query, user_id, max_results)
+            )
         except Exception as e:
             self.logger.error(f"Error in hybrid search: {str(e)}")
             traceback.print_exc()
             # Fall back to semantic search if hybrid fails
             return self._semantic_search(query, user_id, max_results)
 
+    def _invalidate_searches(self, user_id):
+        """Bump the user's corpus generation so none of their cached search results are used again"""
+        self._search_results_cache.bump_generation(f"user:{user_id}")
+
+    def _fused_search(self, query: str, user_id: int, max_results: int = 3) -> List[dict]:
+        """Run the legs of a hybrid search and fuse them, bypassing the cache"""
+        # Run both retrieval legs concurrently: semantic search on the search
+        # executor, keyword search on this thread. Each leg returns a deeper
+        # candidate list than requested so fusion has something to work with.
+        candidates = max_results * 3
+        started = time.perf_counter()
+        timings = {}
+        
+        def _timed(leg, search):
+            leg_started = time.perf_counter()
+            try:
+                return search(query, user_id, candidates)
+            finally:
+                timings[f"{leg}_ms"] = round((time.perf_counter() - leg_started) * 1000, 2)
+        
+        semantic_future = vector_store_registry.search_executor.submit(_timed, "semantic", self._semantic_search)
+        keyword_results = _timed("keyword", self._keyword_search)
+        semantic_results = semantic_future.result()
+        timings["total_ms"] = round((time.perf_counter() - started) * 1000, 2)
+        
+        # Fuse the ranked lists; RRF only looks at ranks, so the incomparable
+        # cosine and BM25 scores never have to be blended directly
+        legs = {"semantic": semantic_results, "keyword": keyword_results}
+        fusion_strategy = getattr(settings, 'HYBRID_FUSION', 'rrf')
+        if fusion_strategy == 'weighted':
+            combined_results = weighted_fusion(legs, weights={
+                "semantic": getattr(settings, 'HYBRID_SEMANTIC_WEIGHT', 0.7),
+                "keyword": getattr(settings, 'HYBRID_KEYWORD_WEIGHT', 0.3),
+            }, key=duplicate_key)
+        else:
+            combined_results = reciprocal_rank_fusion(
+                legs, k=getattr(settings, 'HYBRID_RRF_K', 60), key=duplicate_key
+            )
+        
+        for result in combined_results:
+            result["fusion"] = fusion_strategy
+            result["timings"] = timings
+        
+        # Limit to max_results
+        final_results = combined_results[:max_results]
+        self.logger.info(
+            f"Hybrid search returned {len(final_results)} results "
+            f"(semantic {timings['semantic_ms']}ms, keyword {timings['keyword_ms']}ms, total {timings['total_ms']}ms)"
+        )
+        return final_results
+
     def bulk_create_knowledge(self, data_list: List[dict], user):
         """Bulk create knowledge documents"""
         try:
@@ -1365,70 +1961,229 @@ class KnowledgeService:
             for i, (knowledge, data) in enumerate(zip(knowledge_docs, data_list)):
                 try:
                     embedding = self._generate_embedding(data["content"])
-                    
-                    self.collection.add(
-                        ids=[str(knowledge.id)],
-                        embeddings=[embedding],
-                        documents=[data["content"]],
-                        metadatas=[
-                            {
-                                "user_id": str(user.id),
-                                "knowledge_id": str(knowledge.id),
-                                "name": data["name"],
-                                "identifier": data["identifier"],
-                                "citation": data["name"]
-                            }
-                        ],
-                    )
-                except Exception as e:
-                    self.logger.error(f"Error processing document {i} in bulk create: {str(e)}")
-                    # Continue with other documents
-
-            return knowledge_docs
-        except Exception as e:
-            self.logger.error(f"Error in bulk create knowledge: {str(e)}")
-            raise
-
-    async def reindex_all_knowledge(self):
-        """Reindex all knowledge documents in ChromaDB"""
-        try:
-            # Clear the collection
-            self.collection.delete(where={})
-
-            # Get all knowledge documents
-            all_knowledge = self.repository.list()
-
-            # Batch process to avoid memory issues
-            batch_size = 50
-            for i in range(0, len(all_knowledge), batch_size):
-                batch = all_knowledge[i : i + batch_size]
                 
-                for knowledge in batch:
-                    try:
-                        embedding = self._generate_embedding(knowledge.content)
-                        
-                        self.collection.add(
+                    with self._collection_writes(knowledge_ids=[knowledge.id]) as collection:
+                        collection.add(
                             ids=[str(knowledge.id)],
                             embeddings=[embedding],
-                            documents=[knowledge.content],
+                            documents=[data["content"]],
                             metadatas=[
                                 {
-                                    "user_id": str(knowledge.user_id),
+                                    "user_id": str(user.id),
                                     "knowledge_id": str(knowledge.id),
-                                    "name": knowledge.name,
-                                    "identifier": knowledge.identifier,
-                                    "citation": knowledge.name
+                                    "name": data["name"],
+                                    "identifier": data["identifier"],
+                                    "citation": data["name"]
                                 }
                             ],
                         )
-                    except Exception as e:
-                        self.logger.error(f"Error reindexing knowledge {knowledge.id}: {str(e)}")
-                        continue
+                        self.keyword_index.add(user.id, knowledge.id, [str(knowledge.id)], [data["content"]])
+                except Exception as e:
+                    self.logger.error(f"Error processing document {i} in bulk create: {str(e)}")
+                    # Continue with other documents
 
-            return True
+            self._invalidate_searches(user.id)
+            return knowledge_docs
+        except Exception as e:
+            self.logger.error(f"Error in bulk create knowledge: {str(e)}")
+            raise
+
+    def reindex_all_knowledge(self, progress=None, restart=False):
+        """
+        Rebuild the vector index of every knowledge document.
+        
+        Chunks are re-embedded into a new shadow collection while searches keep
+        using the active one, and the shadow collection is swapped in atomically
+        once it is complete. For the final catch-up and the swap, writes to the
+        active collection are held off in every process, so no edit lands in
+        the replaced collection after it was copied. Documents are processed a page at a time
+        (``REINDEX_PAGE_SIZE``) with ``REINDEX_CONCURRENCY`` documents in parallel,
+        and the position is checkpointed after every page so an interrupted run
+        resumes where it stopped.
+        
+        Args:
+            progress: Optional callable taking (fraction, message); the message includes an ETA
+            restart: Abandon an unfinished run and start from scratch
+            
+        Returns:
+            The finished ReindexJob
+        """
+        worker_id = f"{socket.gethostname()}:{os.getpid()}"
+        report = progress or (lambda fraction, message: None)
+        
+        job = self.reindex_repository.get_unfinished()
+        aliases = vector_store_registry.collection_aliases
+        if job and restart:
+            self._drop_collection(job.collection_name)
+            self.reindex_repository.mark_abandoned(job)
+            aliases.stop_tracking(DEFAULT_COLLECTION)
+            job = None
+        if job:
+            if not self.reindex_repository.claim(job, worker_id, getattr(settings, 'REINDEX_JOB_LEASE', 600)):
+                raise RuntimeError(f"Reindex job {job.id} is already running")
+            self.logger.info(f"Resuming reindex job {job.id} after {job.processed_documents} documents")
+        else:
+            job = self.reindex_repository.start(f"{DEFAULT_COLLECTION}_{uuid.uuid4().hex[:12]}", worker_id)
+            self.logger.info(f"Started reindex job {job.id} into collection {job.collection_name}")
+        # Log the documents written to the active collection until the swap, for the catch-up
+        aliases.start_tracking(DEFAULT_COLLECTION)
+        
+        try:
+            shadow = vector_store_registry.get_collection(job.collection_name)
+            self._build_shadow_collection(job, self.collection, shadow, report)
+            
+            # Catch up with documents edited while the build was running. The bulk
+            # of it happens while writes continue; the last pass runs with writes
+            # held off, so nothing is written to the active collection before the swap,
+            # and only has to cover the writes since the first pass started
+            report(0.95, "catching up with recent changes")
+            caught_up = timezone.now()
+            self._catch_up_shadow_collection(self.collection, shadow, job.created_at)
+            with vector_store_registry.collection_fence(holder=str(job.id)):
+                self._catch_up_shadow_collection(vector_store_registry.get_active_collection(), shadow, caught_up)
+                previous = vector_store_registry.swap_collection(job.collection_name)
+            aliases.stop_tracking(DEFAULT_COLLECTION)
+            self.collection = shadow
+            for owner_id in self.repository.list().order_by().values_list("user_id", flat=True).distinct():
+                self._invalidate_searches(owner_id)
+            job = self.reindex_repository.mark_succeeded(job)
+            self.logger.info(f"Reindex job {job.id} finished, {job.collection_name} replaced {previous}")
+            
+            # Keep the replaced collection for requests still using it; drop older generations
+            keep = {job.collection_name, previous}
+            unfinished = self.reindex_repository.get_unfinished()
+            if unfinished:
+                keep.add(unfinished.collection_name)
+            for name in vector_store_registry.list_collections():
+                if name.startswith(DEFAULT_COLLECTION) and name not in keep:
+                    self._drop_collection(name)
+            
+            report(1.0, "done")
+            return job
         except Exception as e:
             self.logger.error(f"Error reindexing knowledge: {str(e)}")
+            self.reindex_repository.mark_failed(job, str(e))
             raise
+    
+    def _build_shadow_collection(self, job, source, shadow, report):
+        """
+        Copy every knowledge document from ``source`` into ``shadow`` with fresh
+        embeddings, starting at the job's checkpoint.
+        
+        Args:
+            job: The ReindexJob being run
+            source: The active collection
+            shadow: The collection being built
+            report: Callable taking (fraction, message)
+        """
+        page_size = max(1, getattr(settings, 'REINDEX_PAGE_SIZE', 20))
+        concurrency = max(1, getattr(settings, 'REINDEX_CONCURRENCY', 4))
+        total = self.repository.list().count()
+        self.reindex_repository.update(job.id, {"total_documents": total})
+        started = time.perf_counter()
+        processed = 0
+        
+        with ThreadPoolExecutor(max_workers=concurrency, thread_name_prefix="knowledge-reindex") as executor:
+            while True:
+                page = self.repository.list_page_after(job.cursor_created_at, job.cursor_id, page_size)
+                if not page:
+                    break
+                
+                results = list(executor.map(lambda knowledge: self._reindex_document(knowledge, source, shadow), page))
+                failed = sum(1 for stored in results if stored is None)
+                self.reindex_repository.checkpoint(
+                    job,
+                    page[-1].created_at,
+                    page[-1].id,
+                    processed=len(page) - failed,
+                    failed=failed,
+                    chunks=sum(stored for stored in results if stored),
+                )
+                
+                processed += len(page)
+                done = job.processed_documents + job.failed_documents
+                rate = processed / (time.perf_counter() - started)
+                eta = timedelta(seconds=int(max(total - done, 0) / rate)) if rate else "unknown"
+                report(0.95 * min(done / total, 1.0) if total else 0.0, f"{done}/{total} documents, ETA {eta}")
+    
+    def _catch_up_shadow_collection(self, source, shadow, since):
+        """
+        Sync ``shadow`` with documents edited or deleted since ``since``: the
+        documents modified since then and those written to the active collection
+        since then, e.g. by an ingestion still in progress. Unchanged chunks are
+        skipped, so this only costs the edits themselves.
+        
+        Args:
+            source: The active collection
+            shadow: The collection being built
+            since: Datetime the edits to catch up with started at
+        """
+        concurrency = max(1, getattr(settings, 'REINDEX_CONCURRENCY', 4))
+        written = vector_store_registry.collection_aliases.written_since(DEFAULT_COLLECTION, since.timestamp())
+        updated = list(self.repository.list_updated_since(since, written))
+        with ThreadPoolExecutor(max_workers=concurrency, thread_name_prefix="knowledge-reindex") as executor:
+            list(executor.map(lambda knowledge: self._reindex_document(knowledge, source, shadow), updated))
+        
+        # Drop chunks of documents deleted while the build was running
+        live = {str(knowledge_id) for knowledge_id in self.repository.list().values_list("id", flat=True)}
+        stale = []
+        offset = 0
+        while True:
+            result = shadow.get(include=["metadatas"], limit=1000, offset=offset)
+            ids = result.get("ids") or []
+            if not ids:
+                break
+            stale.extend(
+                chunk_id for chunk_id, chunk_metadata in zip(ids, result.get("metadatas") or [])
+                if (chunk_metadata or {}).get("knowledge_id") not in live
+            )
+            offset += len(ids)
+        if stale:
+            shadow.delete(ids=stale)
+            self.keyword_index.remove(stale)
+            self.duplicate_index.remove(stale)
+            self._release_duplicates(shadow, stale)
+    
+    def _reindex_document(self, knowledge, source, shadow):
+        """
+        Re-embed the chunks of one knowledge document into ``shadow``. Stored
+        chunks are copied with their citation metadata; documents without any
+        are chunked again from their content.
+        
+        Args:
+            knowledge: The knowledge document
+            source: The active collection
+            shadow: The collection being built
+            
+        Returns:
+            Number of chunks embedded, or None if the document failed
+        """
+        try:
+            result = source.get(
+                where={"knowledge_id": str(knowledge.id)}, include=["documents", "metadatas"]
+            )
+            if result.get("ids"):
+                records = (
+                    (chunk_id, document, {**(chunk_metadata or {}), "content_hash": text_digest(document)})
+                    for chunk_id, document, chunk_metadata in zip(
+                        result["ids"], result.get("documents") or [], result.get("metadatas") or []
+                    )
+                    if document and document.strip()
+                )
+                stats = self._store_records(knowledge.id, records, knowledge.user_id, shadow)
+            else:
+                stats = self._index_content(knowledge, knowledge.content or "", shadow)
+            return stats["stored"] if stats else 0
+        except Exception as e:
+            self.logger.error(f"Error reindexing knowledge {knowledge.id}: {str(e)}")
+            return None
+    
+    def _drop_collection(self, name):
+        """Delete a vector store collection, ignoring one that does not exist"""
+        try:
+            vector_store_registry.delete_collection(name)
+        except Exception as e:
+            self.logger.warning(f"Could not delete collection {name}: {str(e)}")
 
     def get_embeddings(self, knowledge_id: int, user_id: int) -> List[float]:
         """Get embeddings for a specific knowledge document"""
@@ -1455,20 +2210,23 @@ class KnowledgeService:
             embedding = self._generate_embedding(knowledge.content)
 
             # Store in ChromaDB
-            self.collection.upsert(
-                ids=[str(knowledge_id)],
-                embeddings=[embedding],
-                documents=[knowledge.content],
-                metadatas=[
-                    {
-                        "user_id": str(user_id),
-                        "knowledge_id": str(knowledge_id),
-                        "name": knowledge.name,
-                        "identifier": knowledge.identifier,
-                        "citation": knowledge.name
-                    }
-                ],
-            )
+            with self._collection_writes(knowledge_ids=[knowledge_id]) as collection:
+                collection.upsert(
+                    ids=[str(knowledge_id)],
+                    embeddings=[embedding],
+                    documents=[knowledge.content],
+                    metadatas=[
+                        {
+                            "user_id": str(user_id),
+                            "knowledge_id": str(knowledge_id),
+                            "name": knowledge.name,
+                            "identifier": knowledge.identifier,
+                            "citation": knowledge.name
+                        }
+                    ],
+                )
+                self.keyword_index.add(user_id, knowledge_id, [str(knowledge_id)], [knowledge.content])
+            self._invalidate_searches(user_id)
 
             return embedding
 
@@ -1489,12 +2247,10 @@ class KnowledgeService:
         """
         try:
             # Check cache first
-            cache_key = f"chunks_{knowledge_id}"
-            if cache_key in self._chunks_cache:
-                self._cache_hits['chunks'] += 1
-                return self._chunks_cache[cache_key]
-                
-            self._cache_misses['chunks'] += 1
+            cache_key = str(knowledge_id)
+            cached = self._chunks_cache.get(cache_key)
+            if cached is not None:
+                return cached
             
             # Query ChromaDB for chunks with this knowledge_id
             results = self.collection.get(
@@ -1516,13 +2272,7 @@ class KnowledgeService:
                 })
                 
             # Cache the results
-            self._chunks_cache[cache_key] = chunks
-            
-            # Manage cache size
-            if len(self._chunks_cache) > self._chunks_cache_max_size:
-                # Remove a random key
-                self._chunks_cache.pop(next(iter(self._chunks_cache)))
-                
+            self._chunks_cache.set(cache_key, chunks)
             return chunks
         except Exception as e:
             self.logger.error(f"Error getting chunks for knowledge {knowledge_id}: {str(e)}")
@@ -1530,7 +2280,7 @@ class KnowledgeService:
 
     def get_citations_for_chunks(self, chunk_ids):
         """
-        Get citation information for specific chunks.
+        Get citation information for specific chunks with one batched lookup by chunk ID.
         
         Args:
             chunk_ids: List of chunk IDs to retrieve citations for
@@ -1539,86 +2289,41 @@ class KnowledgeService:
             Dictionary mapping chunk IDs to citation information
         """
         try:
+            chunk_ids = list(dict.fromkeys(chunk_id for chunk_id in chunk_ids or [] if chunk_id))
             if not chunk_ids:
                 self.logger.warning("No chunk IDs provided for citation retrieval")
                 return {}
-                
-            self.logger.info(f"Retrieving citations for {len(chunk_ids)} chunks")
-            print(f"DEBUG: Retrieving citations for chunks: {chunk_ids}")
-            
-            # Extract knowledge IDs from chunk IDs (format: chunk_knowledge_id_index)
-            knowledge_ids = set()
-            chunk_to_knowledge_map = {}
-            
-            for chunk_id in chunk_ids:
-                # Try to extract knowledge_id from chunk_id
-                try:
-                    if chunk_id.startswith("chunk_"):
-                        parts = chunk_id.split("_")
-                        if len(parts) >= 2:
-                            knowledge_id = parts[1]
-                            knowledge_ids.add(knowledge_id)
-                            chunk_to_knowledge_map[chunk_id] = knowledge_id
-                    else:
-                        # For other formats, just use the chunk_id as is
-                        chunk_to_knowledge_map[chunk_id] = chunk_id
-                except Exception as e:
-                    self.logger.warning(f"Could not parse knowledge_id from chunk_id {chunk_id}: {str(e)}")
-                    continue
-            
-            print(f"DEBUG: Extracted knowledge IDs: {knowledge_ids}")
-            
-            # If we couldn't extract any knowledge IDs, return empty
-            if not knowledge_ids:
-                return {}
             
-            # Query ChromaDB for chunks with these knowledge IDs
-            citations = {}
-            
-            for knowledge_id in knowledge_ids:
-                try:
-                    # Query by knowledge_id
-                    results = self.collection.get(
-                        where={"knowledge_id": knowledge_id},
-                        include=["metadatas"]
-                    )
-                    
-                    if results and "metadatas" in results and results["metadatas"]:
-                        # Use the first metadata entry for this knowledge_id
-                        meta = results["metadatas"][0]
-                        
-                        # Extract citation information from metadata
-                        citation_info = {
-                            "source": meta.get("source", "Unknown Source"),
-                            "citation": meta.get("citation", "Unknown Source"),
-                            "knowledge_id": knowledge_id,
-                        }
-                        
-                        # Add page/row information if available
-                        if "page" in meta:
-                            citation_info["page"] = meta["page"]
-                        if "row" in meta:
-                            citation_info["row"] = meta["row"]
-                        
-                        print(f"DEBUG: Found citation info for knowledge_id {knowledge_id}: {citation_info}")
-                        
-                        # Add this citation info to all chunks with this knowledge_id
-                        for chunk_id, mapped_knowledge_id in chunk_to_knowledge_map.items():
-                            if mapped_knowledge_id == knowledge_id:
-                                citations[chunk_id] = citation_info
-                                print(f"DEBUG: Added citation info for chunk {chunk_id}")
-                except Exception as e:
-                    self.logger.error(f"Error retrieving citation for knowledge_id {knowledge_id}: {str(e)}")
-                    continue
+            results = self.collection.get(ids=chunk_ids, include=["metadatas"])
+            citations = {
+                chunk_id: self._citation_info(meta or {})
+                for chunk_id, meta in zip(results.get("ids") or [], results.get("metadatas") or [])
+            }
             
-            self.logger.info(f"Retrieved citation information for {len(citations)} chunks")
-            print(f"DEBUG: Retrieved citation information for {len(citations)} chunks")
+            self.logger.info(f"Retrieved citation information for {len(citations)} of {len(chunk_ids)} chunks")
             return citations
         except Exception as e:
             self.logger.error(f"Error retrieving citations: {str(e)}")
-            print(f"DEBUG: Error retrieving citations: {str(e)}")
             traceback.print_exc()
             return {}
+    
+    def _citation_info(self, meta):
+        """Extract the citation fields from chunk metadata"""
+        citation_info = {
+            "source": meta.get("source", "Unknown Source"),
+            "citation": meta.get("citation", meta.get("source", "Unknown Source")),
+            "knowledge_id": meta.get("knowledge_id", ""),
+        }
+        
+        # Add page/row information if available
+        if "page" in meta:
+            citation_info["page"] = meta["page"]
+        if "row" in meta:
+            citation_info["row"] = meta["row"]
+        if "row_start" in meta:
+            citation_info["row_start"] = meta["row_start"]
+            citation_info["row_end"] = meta.get("row_end", meta["row_start"])
+        return citation_info
             
     def format_citation(self, citation_info):
         """
@@ -1656,12 +2361,16 @@ class KnowledgeService:
         
         Args:
             response_text: The generated response text
-            relevant_chunks: List of chunks used to generate the response
+            relevant_chunks: The RetrievalResult of the turn, or a list of chunks
+                used to generate the response
             
         Returns:
             Dictionary with citation information
         """
         try:
+            if isinstance(relevant_chunks, RetrievalResult):
+                relevant_chunks = relevant_chunks.chunks
+            
             self.logger.info(f"get_citations_for_response called with {len(relevant_chunks) if relevant_chunks else 0} chunks")
             
             if not relevant_chunks:
@@ -1693,71 +2402,43 @@ class KnowledgeService:
                     if "metadata" in chunk and isinstance(chunk["metadata"], dict):
                         chunk_metadata[chunk_id] = chunk["metadata"]
             
-            # Get citation information for chunks
-            citations_from_db = self.get_citations_for_chunks(chunk_ids)
+            # Chunks retrieved from the vector store already carry their citation
+            # metadata; only look up the ones that do not, in a single batch
+            missing = [
+                chunk_id for chunk_id in chunk_ids
+                if not chunk_metadata.get(chunk_id, {}).get("knowledge_id")
+            ]
+            citations_from_db = self.get_citations_for_chunks(missing) if missing else {}
             
-            # Combine with direct metadata
             all_citations = {}
             for chunk_id in chunk_ids:
                 if chunk_id in citations_from_db:
                     all_citations[chunk_id] = citations_from_db[chunk_id]
                 elif chunk_id in chunk_metadata:
-                    all_citations[chunk_id] = chunk_metadata[chunk_id]
-            
-            # Look for citation patterns in the response text
-            # Use more specific patterns to avoid matching non-citation text
-            citation_patterns = [
-                r'\[(\d+)\]',  # [1], [2], etc.
-                r'\[(Source|Reference|Citation|Document)\s+(\d+|[A-Za-z]+)\]',  # [Source 1], [Reference A]
-                r'Source\s+(\d+|[A-Za-z]+)',  # Source 1 or Source A
-                r'Reference\s+(\d+|[A-Za-z]+)',  # Reference 1
-                r'Citation\s+(\d+|[A-Za-z]+)',  # Citation 1
-                r'Document\s+(\d+|[A-Za-z]+)'   # Document 1
-            ]
+                    all_citations[chunk_id] = self._citation_info(chunk_metadata[chunk_id])
             
-            # Clean the response text first - remove any sequences of [?] or [0]
-            cleaned_response = re.sub(r'(\[\?+\]|\[0+\])+', '', response_text)
-            
-            found_citations = set()
-            for pattern in citation_patterns:
-                matches = re.finditer(pattern, cleaned_response)
-                for match in matches:
-                    # For patterns with multiple capture groups, use the last non-empty group
-                    citation_text = None
-                    if match.groups():
-                        for group in match.groups():
-                            if group:
-                                citation_text = group
-                    else:
-                        citation_text = match.group(0)
-                    
-                    # Skip citations that are just question marks or zeros
-                    if citation_text and not re.match(r'^[\?\[\]0]+$', citation_text):
-                        found_citations.add(citation_text.strip())
+            # Scan the response for citation markers in a single pass
+            found_citations = scan_citations(response_text)
             
-            # Format the citations
+            # Format the citations, matching each one to the first chunk whose
+            # citation contains it or is contained in it
             formatted_citations = []
+            cited_chunks = list(all_citations.items())
+            matcher = CitationMatcher(citation_info.get("citation", "") for _, citation_info in cited_chunks)
             
-            # First add citations found in the text
             for citation_text in found_citations:
-                # Try to match citation text with our chunks
-                matched = False
-                for chunk_id, citation_info in all_citations.items():
-                    citation_source = citation_info.get("citation", "")
-                    if citation_text in citation_source or citation_source in citation_text:
-                        formatted_citation = self.format_citation(citation_info)
-                        formatted_citations.append({
-                            "text": citation_text,
-                            "source": formatted_citation,
-                            "chunk_id": chunk_id,
-                            "knowledge_id": citation_info.get("knowledge_id", ""),
-                            "metadata": citation_info
-                        })
-                        matched = True
-                        break
-                
-                # If no match, add as is
-                if not matched:
+                index = matcher.match(citation_text)
+                if index is not None:
+                    chunk_id, citation_info = cited_chunks[index]
+                    formatted_citations.append({
+                        "text": citation_text,
+                        "source": self.format_citation(citation_info),
+                        "chunk_id": chunk_id,
+                        "knowledge_id": citation_info.get("knowledge_id", ""),
+                        "metadata": citation_info
+                    })
+                else:
+                    # If no match, add as is
                     formatted_citations.append({
                         "text": citation_text,
                         "source": citation_text,
@@ -1787,101 +2468,52 @@ class KnowledgeService:
             traceback.print_exc()
             return {"citations": [], "has_citations": False}
 
-    def _process_file(self, knowledge, file):
-        """
-        Process a file and update the knowledge document with its content.
-        Handles different file types and creates embeddings.
-        
-        Args:
-            knowledge: The knowledge document to update
-            file: The file to process
-        """
-        try:
-            self.logger.info(f"Processing file {file.name} for knowledge {knowledge.id}")
-            
-            # Create a file-like object with the file content to avoid closed file issues
-            file_info = {
-                'name': file.name,
-                'content_type': file.content_type,
-                'size': file.size
-            }
-            
-            # Read the file content into memory first
-            try:
-                if hasattr(file, 'read'):
-                    file_content = file.read()
-                    file_info['content'] = file_content
-                else:
-                    # If file is already closed, try to open it from the path
-                    try:
-                        with open(file.temporary_file_path(), 'rb') as f:
-                            file_content = f.read()
-                            file_info['content'] = file_content
-                    except (AttributeError, FileNotFoundError):
-                        # If we can't get the file content, raise an error
-                        raise ValueError(f"Could not read file content for {file.name}")
-            except Exception as e:
-                self.logger.error(f"Error reading file content: {str(e)}")
-                raise
-            
-            # Delegate to the content-based processing method
-            return self._process_file_with_content(knowledge, file_info)
-                
-        except Exception as e:
-            self.logger.error(f"Error processing file: {str(e)}")
-            traceback.print_exc()
-            # Update knowledge document with error status
-            self.repository.update(knowledge.id, {
-                "status": "error",
-                "error_message": str(e),
-            })
-
     def get_cache_stats(self):
         """Get statistics about cache performance"""
         stats = {
-            'hits': self._cache_hits,
-            'misses': self._cache_misses,
-            'sizes': {
-                'embedding': len(self._embedding_cache),
-                'search': len(self._search_results_cache),
-                'chunks': len(self._chunks_cache)
-            }
+            'hits': dict(self._cache_hits),
+            'misses': dict(self._cache_misses),
+            'sizes': {'embedding': self.embedding_cache.stats()['entries']},
         }
+        stats['embedding_batches'] = vector_store_registry.embedding_batcher.metrics()
+        for cache_type, cache in (('search', self._search_results_cache), ('chunks', self._chunks_cache)):
+            metrics = cache.metrics()
+            stats['hits'][cache_type] = metrics['l1_hits'] + metrics['l2_hits'] + metrics['stale_hits']
+            stats['misses'][cache_type] = metrics['misses']
+            stats['sizes'][cache_type] = metrics['l1_entries']
         
         # Calculate hit rates
         hit_rates = {}
-        for cache_type in self._cache_hits.keys():
-            total = self._cache_hits[cache_type] + self._cache_misses[cache_type]
-            hit_rates[cache_type] = self._cache_hits[cache_type] / total if total > 0 else 0
+        for cache_type in stats['hits'].keys():
+            total = stats['hits'][cache_type] + stats['misses'][cache_type]
+            hit_rates[cache_type] = stats['hits'][cache_type] / total if total > 0 else 0
             
         stats['hit_rates'] = hit_rates
         return stats
 
-    def _process_pptx(self, file_path, document_name):
+    def _process_pptx(self, file_path, document_name, metadata):
         """
-        Process a PowerPoint presentation (PPTX/PPT) and extract its content.
+        Process a PowerPoint presentation (PPTX/PPT) slide by slide.
         
         Args:
             file_path: Path to the PowerPoint presentation
             document_name: Name of the document
-            
-        Returns:
-            Tuple of (full_content, chunks, metadata)
+            metadata: Document metadata, updated in place
+        
+        Yields:
+            Tuples of (slide_content, chunks)
         """
         try:
             # Import pptx library here to avoid dependency issues
             from pptx import Presentation
             
-            full_content = ""
-            chunks = []
-            metadata = {"source": document_name, "type": "pptx"}
+            metadata.update({"source": document_name, "type": "pptx"})
             
             # Open the presentation
             presentation = Presentation(file_path)
+            metadata["total_sections"] = len(presentation.slides)
             
             # Extract text from slides
-            slides_content = []
-            
             for slide_index, slide in enumerate(presentation.slides):
                 slide_text = []
                 slide_number = slide_index + 1
@@ -1911,11 +2543,10 @@ class KnowledgeService:
                 
                 # Combine all text from this slide
                 slide_content = "\n".join(slide_text)
-                slides_content.append(slide_content)
                 
                 # Create a chunk for each slide with citation metadata
                 chunk_id = f"{document_name}_slide{slide_number}"
-                chunks.append({
+                yield slide_content + "\n\n", [{
                     "id": chunk_id,
                     "content": slide_content,
                     "metadata": {
@@ -1923,12 +2554,7 @@ class KnowledgeService:
                         "slide": slide_number,
                         "citation": f"{document_name}, Slide {slide_number}"
                     }
-                })
-            
-            # Combine all slides
-            full_content = "\n\n".join(slides_content)
-            
-            return full_content, chunks, metadata
+                }]
         except ImportError:
             self.logger.error("python-pptx is not installed. Please install it to process PPTX files.")
             raise Exception("PPTX processing library not available")
@@ -0,0 +1,93 @@
+import queue
+import time
+from typing import Dict
+
+from django.conf import settings
+
+# Settings the parsers and chunkers read. They are copied into every task so a
+# parse worker chunks exactly as the process that submitted the file would.
+PARSE_SETTINGS = (
+    "CHUNKING_STRATEGY",
+    "CHUNK_SIZE_UNIT",
+    "CHUNK_SIZE_TOKENS",
+    "CHUNK_OVERLAP_TOKENS",
+    "CHUNK_SIZE",
+    "CHUNK_OVERLAP",
+    "INGESTION_TEXT_BLOCK_SIZE",
+    "EMBEDDING_TOKENIZER",
+    "EMBEDDING_MAX_TOKENS",
+    "EMBEDDING_MODEL",
+    "USE_SENTENCE_TRANSFORMERS",
+    "SENTENCE_TRANSFORMER_MODEL",
+)
+
+# Seconds between checks of the stop flag while the section queue is full
+_PUT_TIMEOUT = 1.0
+
+# Service used by the parsers of this worker process
+_service = None
+
+
+def init_worker():
+    """Set up Django in a freshly spawned parse worker"""
+    import django
+
+    django.setup()
+
+
+def parse_settings() -> Dict[str, object]:
+    """The parse settings of this process, to pass to ``parse_file``"""
+    return {name: getattr(settings, name) for name in PARSE_SETTINGS if hasattr(settings, name)}
+
+
+def _apply_settings(overrides: Dict[str, object]):
+    for name in PARSE_SETTINGS:
+        if name in overrides:
+            setattr(settings, name, overrides[name])
+        elif hasattr(settings, name):
+            delattr(settings, name)
+
+
+def _put(sections, stop, message) -> bool:
+    """Put ``message`` on the bounded queue, giving up once the consumer has stopped"""
+    while not stop.is_set():
+        try:
+            sections.put(message, timeout=_PUT_TIMEOUT)
+            return True
+        except queue.Full:
+            continue
+    return False
+
+
+def parse_file(sections, stop, file_path, file_name, content_type, document_name, overrides):
+    """
+    Parse a file in a pool worker with ``KnowledgeService._parse_file``.
+
+    Messages are put on the bounded ``sections`` queue as the parser produces
+    them: ``("section", (section_text, chunks), metadata)`` for each section,
+    then ``("done", metadata, parse_seconds)``, or ``("error", None,
+    parse_seconds)`` before the parser's exception is raised to the future.
+    ``parse_seconds`` excludes time spent waiting for room on the queue.
+    Setting ``stop`` makes the worker abandon the file.
+    """
+    global _service
+    from features.knowledge.services.knowledge_service import KnowledgeService
+
+    _apply_settings(overrides)
+    if _service is None:
+        _service = KnowledgeService()
+
+    busy = 0.0
+    started = time.perf_counter()
+    try:
+        metadata, parsed = _service._parse_file(file_path, file_name, content_type, document_name)
+        for section in parsed:
+            busy += time.perf_counter() - started
+            if not _put(sections, stop, ("section", section, dict(metadata))):
+                return
+            started = time.perf_counter()
+        busy += time.perf_counter() - started
+        _put(sections, stop, ("done", dict(metadata), busy))
+    except Exception:
+        _put(sections, stop, ("error", None, busy + time.perf_counter() - started))
+        raise
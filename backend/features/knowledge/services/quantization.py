@@ -0,0 +1,138 @@
+import struct
+from typing import Callable, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+# Storage precisions, from exact to smallest:
+# - float32: 4 bytes per dimension
+# - float16: 2 bytes per dimension, relative error around 1e-3
+# - int8: 1 byte per dimension plus a float32 scale per vector (symmetric scalar
+#   quantization); scores are approximate, so searches rescore the best candidates
+PRECISIONS = ("float32", "float16", "int8")
+
+_SCALE = struct.Struct("<f")
+
+# Rows widened to float32 at a time when scoring float16 or int8 storage
+_BLOCK_ROWS = 1024
+
+
+def check_precision(precision: str) -> str:
+    if precision not in PRECISIONS:
+        raise ValueError(f"Unknown embedding precision {precision!r}; expected one of {', '.join(PRECISIONS)}")
+    return precision
+
+
+def fit_dimensions(vectors, dimensions: Optional[int]) -> np.ndarray:
+    """
+    Keep the first ``dimensions`` components of each vector and re-normalize,
+    as Matryoshka-trained models (nomic-embed-text v1.5, mxbai, OpenAI v3)
+    expect. Vectors already that short are returned unchanged.
+    """
+    array = np.asarray(vectors, dtype=np.float32)
+    if not dimensions or dimensions >= array.shape[-1]:
+        return array
+    array = array[..., :dimensions]
+    norms = np.linalg.norm(array, axis=-1, keepdims=True)
+    return array / np.where(norms == 0, 1, norms)
+
+
+def quantize_int8(vectors) -> Tuple[np.ndarray, np.ndarray]:
+    """Symmetric per-vector int8 codes and the scale that maps them back"""
+    array = np.atleast_2d(np.asarray(vectors, dtype=np.float32))
+    scales = np.abs(array).max(axis=1) / 127.0
+    scales[scales == 0] = 1.0
+    codes = np.clip(np.rint(array / scales[:, None]), -127, 127).astype(np.int8)
+    return codes, scales.astype(np.float32)
+
+
+def encode(vector: Sequence[float], precision: str = "float32") -> bytes:
+    """Pack one vector into a blob of the given precision"""
+    if precision == "int8":
+        codes, scales = quantize_int8(vector)
+        return _SCALE.pack(float(scales[0])) + codes[0].tobytes()
+    return np.asarray(vector, dtype=check_precision(precision)).tobytes()
+
+
+def decode(blob: bytes, precision: str = "float32") -> List[float]:
+    """Unpack a blob written by ``encode``"""
+    if precision == "int8":
+        (scale,) = _SCALE.unpack_from(blob)
+        codes = np.frombuffer(blob, dtype=np.int8, offset=_SCALE.size)
+        return (codes.astype(np.float32) * scale).tolist()
+    return np.frombuffer(blob, dtype=check_precision(precision)).astype(np.float32).tolist()
+
+
+class QuantizedMatrix:
+    """
+    Vectors held at a reduced precision for brute-force similarity search.
+
+    Scores are inner products, i.e. cosine similarity for normalized vectors.
+    ``search`` ranks by these scores; given ``rescore`` (a callable returning
+    exact scores for an array of row numbers, e.g. from full-precision or
+    full-dimension vectors on disk), it re-ranks the best ``k * oversample``
+    candidates by the exact scores instead. ``NumpyVectorStore`` scans a copy
+    of each user's matrix held this way and rescores from the float32 file.
+    """
+
+    def __init__(self, dimensions: int, precision: str = "float32"):
+        self.dimensions = dimensions
+        self.precision = check_precision(precision)
+        storage = np.int8 if precision == "int8" else precision
+        self.codes = np.empty((0, dimensions), dtype=storage)
+        self.scales = np.empty(0, dtype=np.float32)
+
+    def __len__(self) -> int:
+        return self.codes.shape[0]
+
+    @property
+    def nbytes(self) -> int:
+        return self.codes.nbytes + (self.scales.nbytes if self.precision == "int8" else 0)
+
+    def add(self, vectors):
+        array = np.atleast_2d(np.asarray(vectors, dtype=np.float32))
+        if self.precision == "int8":
+            codes, scales = quantize_int8(array)
+            self.codes = np.concatenate([self.codes, codes])
+            self.scales = np.concatenate([self.scales, scales])
+        else:
+            self.codes = np.concatenate([self.codes, array.astype(self.codes.dtype)])
+
+    def scores(self, query, rows: Optional[np.ndarray] = None) -> np.ndarray:
+        """Approximate inner product of ``query`` with every row, or with ``rows``"""
+        query = np.asarray(query, dtype=np.float32)
+        codes = self.codes if rows is None else self.codes[rows]
+        if self.precision == "float32":
+            return codes @ query
+        # BLAS has no float16 or int8 kernels; widen a block of rows at a time
+        # so the float32 copy stays in cache instead of doubling the matrix
+        scores = np.empty(len(codes), dtype=np.float32)
+        for start in range(0, len(codes), _BLOCK_ROWS):
+            block = codes[start:start + _BLOCK_ROWS].astype(np.float32)
+            scores[start:start + _BLOCK_ROWS] = block @ query
+        if self.precision == "int8":
+            scores *= self.scales if rows is None else self.scales[rows]
+        return scores
+
+    def search(self, query, k: int, rescore: Optional[Callable[[np.ndarray], Sequence[float]]] = None,
+               oversample: int = 4, rows: Optional[np.ndarray] = None) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Best ``k`` rows for ``query``, among ``rows`` (row numbers or a slice) if given.
+
+        Returns:
+            Tuple of (row numbers, scores), best first
+        """
+        if rows is None:
+            rows = np.arange(len(self))
+        elif isinstance(rows, slice):
+            rows = np.arange(*rows.indices(len(self)))
+        else:
+            rows = np.asarray(rows, dtype=np.int64)
+        if not len(rows) or k <= 0:
+            return np.empty(0, dtype=np.int64), np.empty(0, dtype=np.float32)
+        scores = self.scores(query, rows)
+        wanted = min(k * oversample if rescore is not None else k, len(scores))
+        picked = np.argpartition(-scores, wanted - 1)[:wanted]
+        candidates = rows[picked]
+        scores = np.asarray(rescore(candidates), dtype=np.float32) if rescore is not None else scores[picked]
+        best = np.argsort(-scores, kind="stable")[:k]
+        return candidates[best], scores[best]
@@ -0,0 +1,25 @@
+from dataclasses import dataclass, field
+from typing import List
+
+
+@dataclass
+class RetrievalResult:
+    """
+    Knowledge retrieved for one chat turn. It is produced once and feeds both
+    the prompt (``context``) and citation resolution (``chunks``).
+    """
+
+    query: str
+    # Chunks placed in the prompt, best first, each with id, content, metadata and similarity
+    chunks: List[dict] = field(default_factory=list)
+    context: str = ""
+    context_tokens: int = 0
+    budget: int = 0
+
+    @property
+    def chunk_ids(self) -> List[str]:
+        return [chunk.get("id") for chunk in self.chunks]
+
+    @property
+    def scores(self) -> dict:
+        return {chunk.get("id"): chunk.get("similarity", 0.0) for chunk in self.chunks}
@@ -0,0 +1,55 @@
+import os
+import sqlite3
+import threading
+
+
+class SQLiteStore:
+    """
+    Base class for small on-disk stores shared between threads and worker
+    processes. Each thread gets its own connection, reopened after a fork,
+    and statements run inside IMMEDIATE transactions. Read-only work can use
+    a DEFERRED transaction, which reads a snapshot without blocking writers.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self._local = threading.local()
+
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+
+        with self._transaction() as conn:
+            self._create_schema(conn)
+
+    def _create_schema(self, conn: sqlite3.Connection):
+        raise NotImplementedError
+
+    def _transaction(self, mode: str = "IMMEDIATE") -> "_Transaction":
+        conn = getattr(self._local, "conn", None)
+        if conn is None or getattr(self._local, "pid", None) != os.getpid():
+            conn = sqlite3.connect(self.path, timeout=30, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+            self._local.pid = os.getpid()
+        return _Transaction(conn, mode)
+
+
+class _Transaction:
+    """Runs a block of statements in one IMMEDIATE (or DEFERRED) transaction"""
+
+    def __init__(self, conn: sqlite3.Connection, mode: str = "IMMEDIATE"):
+        self.conn = conn
+        self.mode = mode
+
+    def __enter__(self) -> sqlite3.Connection:
+        self.conn.execute(f"BEGIN {self.mode}")
+        return self.conn
+
+    def __exit__(self, exc_type, exc, tb):
+        if exc_type is None:
+            self.conn.execute("COMMIT")
+        else:
+            self.conn.execute("ROLLBACK")
+        return False
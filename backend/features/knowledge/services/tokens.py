@@ -0,0 +1,254 @@
+import importlib
+import math
+import re
+import threading
+from functools import lru_cache
+from typing import Callable, Dict, List
+
+from django.conf import settings
+
+try:
+    import tiktoken  # noqa: F401
+
+    DEFAULT_TOKENIZER = "tiktoken:cl100k_base"
+except ImportError:  # tiktoken is optional
+    DEFAULT_TOKENIZER = "estimate"
+
+_PIECES = re.compile(r"\w+|[^\w\s]")
+
+# Token windows of common embedding models, by name without the ":tag" or "org/" prefix,
+# as served by default. For Ollama models the window the server reports takes precedence
+# (see VectorStoreRegistry.resolve_context_length), and EMBEDDING_MAX_TOKENS overrides both.
+EMBEDDING_MODEL_LIMITS = {
+    "nomic-embed-text": 2048,
+    "mxbai-embed-large": 512,
+    "snowflake-arctic-embed": 512,
+    "snowflake-arctic-embed2": 8192,
+    "bge-m3": 8192,
+    "bge-large": 512,
+    "all-minilm": 256,
+    "all-MiniLM-L6-v2": 256,
+    "all-MiniLM-L12-v2": 256,
+    "all-mpnet-base-v2": 384,
+    "paraphrase-multilingual": 128,
+    "granite-embedding": 512,
+}
+DEFAULT_EMBEDDING_MAX_TOKENS = 512
+
+# Share of the window left unused when tokens are counted with a stand-in tokenizer
+# (cl100k or the estimate) rather than the model's own, which may count more tokens
+DEFAULT_EMBEDDING_TOKEN_MARGIN = 0.15
+
+
+class Tokenizer:
+    """
+    Counts and cuts text in the tokens of one model. Subclasses implement
+    ``_count`` and ``truncate``; counts are memoized per tokenizer, since the
+    same chunks are counted when they are sized, embedded and packed.
+    """
+
+    name = "tokenizer"
+
+    def __init__(self, cache_size: int = 4096):
+        self._cached_count = lru_cache(maxsize=cache_size)(self._count)
+
+    def count(self, text: str) -> int:
+        """Number of tokens in ``text``"""
+        if not text:
+            return 0
+        return self._cached_count(text)
+
+    def _count(self, text: str) -> int:
+        raise NotImplementedError
+
+    def truncate(self, text: str, max_tokens: int) -> str:
+        """Longest prefix of ``text`` with at most ``max_tokens`` tokens"""
+        raise NotImplementedError
+
+    def split(self, text: str, max_tokens: int, overlap: int = 0) -> List[str]:
+        """
+        Cut ``text`` into pieces of at most ``max_tokens`` tokens, each starting
+        about ``overlap`` tokens before the end of the previous one.
+        """
+        pieces = []
+        start = 0
+        while start < len(text):
+            piece = self.truncate(text[start:], max_tokens) or text[start:start + 1]
+            pieces.append(piece)
+            if start + len(piece) >= len(text):
+                break
+            step = len(piece)
+            if overlap and overlap < max_tokens:
+                # Step back by the share of characters that makes up the overlap
+                step -= int(len(piece) * overlap / max(self.count(piece), 1))
+            start += max(step, 1)
+        return pieces
+
+
+class EstimateTokenizer(Tokenizer):
+    """
+    Dependency-free estimate that errs on the high side for prose and code:
+    the larger of one token per 4 characters and one per word or symbol.
+    """
+
+    name = "estimate"
+
+    def _count(self, text: str) -> int:
+        return max(math.ceil(len(text) / 4), len(_PIECES.findall(text)))
+
+    def truncate(self, text: str, max_tokens: int) -> str:
+        if self.count(text) <= max_tokens:
+            return text
+        limit = min(len(text), max_tokens * 4)
+        for index, match in enumerate(_PIECES.finditer(text, 0, limit)):
+            if index == max_tokens:
+                limit = match.start()
+                break
+        return text[:limit]
+
+
+class TiktokenTokenizer(Tokenizer):
+    """Exact counts for one of tiktoken's encodings"""
+
+    def __init__(self, encoding: str = "cl100k_base", cache_size: int = 4096):
+        import tiktoken
+
+        super().__init__(cache_size)
+        self.name = f"tiktoken:{encoding}"
+        self._encoding = tiktoken.get_encoding(encoding)
+
+    def _count(self, text: str) -> int:
+        return len(self._encoding.encode(text, disallowed_special=()))
+
+    def truncate(self, text: str, max_tokens: int) -> str:
+        tokens = self._encoding.encode(text, disallowed_special=())
+        if len(tokens) <= max_tokens:
+            return text
+        return self._encoding.decode(tokens[:max_tokens])
+
+
+class HuggingFaceTokenizer(Tokenizer):
+    """The model's own tokenizer, loaded with ``transformers``"""
+
+    def __init__(self, model_name: str, cache_size: int = 4096):
+        from transformers import AutoTokenizer
+
+        super().__init__(cache_size)
+        self.name = f"huggingface:{model_name}"
+        self._tokenizer = AutoTokenizer.from_pretrained(model_name)
+
+    def _encode(self, text: str):
+        return self._tokenizer(text, add_special_tokens=True, return_offsets_mapping=True, verbose=False)
+
+    def _count(self, text: str) -> int:
+        return len(self._encode(text)["input_ids"])
+
+    def truncate(self, text: str, max_tokens: int) -> str:
+        encoded = self._encode(text)
+        if len(encoded["input_ids"]) <= max_tokens:
+            return text
+        # Cut after the last text token that fits, leaving room for the special tokens
+        special = len(encoded["input_ids"]) - sum(1 for start, end in encoded["offset_mapping"] if end > start)
+        ends = [end for start, end in encoded["offset_mapping"] if end > start]
+        keep = max(max_tokens - special, 0)
+        return text[:ends[keep - 1]] if keep else ""
+
+
+# Tokenizer factories by prefix; "name:argument" passes the argument to the factory
+_FACTORIES: Dict[str, Callable[..., Tokenizer]] = {
+    "estimate": EstimateTokenizer,
+    "tiktoken": TiktokenTokenizer,
+    "huggingface": HuggingFaceTokenizer,
+}
+_lock = threading.Lock()
+_tokenizers: Dict[str, Tokenizer] = {}
+
+
+def register_tokenizer(prefix: str, factory: Callable[..., Tokenizer]):
+    """Make ``factory`` available to ``get_tokenizer`` and the EMBEDDING_TOKENIZER setting"""
+    _FACTORIES[prefix] = factory
+
+
+def get_tokenizer(spec: str) -> Tokenizer:
+    """
+    Tokenizer for ``spec``: "estimate", "tiktoken:<encoding>",
+    "huggingface:<model>", a prefix added with ``register_tokenizer``, or the
+    dotted path of a Tokenizer class. Instances are shared per spec. Falls back
+    to the estimate when the tokenizer's package is not installed.
+    """
+    tokenizer = _tokenizers.get(spec)
+    if tokenizer is None:
+        with _lock:
+            tokenizer = _tokenizers.get(spec)
+            if tokenizer is None:
+                tokenizer = _tokenizers[spec] = _load(spec)
+    return tokenizer
+
+
+def _load(spec: str) -> Tokenizer:
+    prefix, _, argument = spec.partition(":")
+    try:
+        factory = _FACTORIES.get(prefix)
+        if factory is None:
+            module_name, _, class_name = spec.rpartition(".")
+            return getattr(importlib.import_module(module_name), class_name)()
+        return factory(argument) if argument else factory()
+    except ImportError:
+        return EstimateTokenizer()
+
+
+def count_tokens(text: str) -> int:
+    """
+    Count the tokens of ``text``. Uses tiktoken's cl100k encoding when it is
+    installed, otherwise an estimate that errs on the high side for prose and
+    code: the larger of one token per 4 characters and one per word or symbol.
+    """
+    return get_tokenizer(DEFAULT_TOKENIZER).count(text)
+
+
+def _model_key(model_name: str) -> str:
+    return model_name.split("/")[-1].split(":")[0]
+
+
+def _embedding_tokenizer_spec() -> str:
+    """EMBEDDING_TOKENIZER, else the model's own tokenizer for sentence-transformers, else None"""
+    spec = getattr(settings, "EMBEDDING_TOKENIZER", None)
+    if not spec and getattr(settings, "USE_SENTENCE_TRANSFORMERS", False):
+        model_name = getattr(settings, "SENTENCE_TRANSFORMER_MODEL", "all-MiniLM-L6-v2")
+        spec = f"huggingface:{model_name if '/' in model_name else 'sentence-transformers/' + model_name}"
+    return spec
+
+
+def embedding_tokenizer() -> Tokenizer:
+    """
+    Tokenizer of the configured embedding model: EMBEDDING_TOKENIZER if set,
+    the model's own tokenizer for sentence-transformers, otherwise cl100k (or
+    the estimate) as a stand-in for Ollama models.
+    """
+    return get_tokenizer(_embedding_tokenizer_spec() or DEFAULT_TOKENIZER)
+
+
+def embedding_max_tokens() -> int:
+    """
+    Tokens of input to give the configured embedding model: EMBEDDING_MAX_TOKENS
+    if set, otherwise the window the model is served with, less
+    EMBEDDING_TOKEN_MARGIN when counts come from a stand-in tokenizer, so
+    chunks sized to it are not cut by the model.
+    """
+    configured = getattr(settings, "EMBEDDING_MAX_TOKENS", None)
+    if configured:
+        window = int(configured)
+    elif getattr(settings, "USE_SENTENCE_TRANSFORMERS", False):
+        model_name = getattr(settings, "SENTENCE_TRANSFORMER_MODEL", "all-MiniLM-L6-v2")
+        window = EMBEDDING_MODEL_LIMITS.get(_model_key(model_name), DEFAULT_EMBEDDING_MAX_TOKENS)
+    else:
+        from features.knowledge.registry import vector_store_registry
+
+        model_name = getattr(settings, "EMBEDDING_MODEL", "nomic-embed-text")
+        window = vector_store_registry.resolve_context_length(model_name) or EMBEDDING_MODEL_LIMITS.get(
+            _model_key(model_name), DEFAULT_EMBEDDING_MAX_TOKENS
+        )
+    if _embedding_tokenizer_spec():
+        return window
+    margin = getattr(settings, "EMBEDDING_TOKEN_MARGIN", DEFAULT_EMBEDDING_TOKEN_MARGIN)
+    return max(1, int(window * (1 - margin)))
@@ -0,0 +1,650 @@
+import json
+import os
+import shutil
+import sqlite3
+import threading
+from typing import Any, Dict, Iterable, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+from features.knowledge.services.quantization import QuantizedMatrix, check_precision
+from features.knowledge.services.sqlite_store import SQLiteStore
+
+# Metadata fields copied into columns of the chunk table, so filters on them
+# run as indexed SQL instead of being evaluated against every chunk
+_COLUMNS = ("user_id", "knowledge_id")
+
+_COMPARISONS = {
+    "$eq": lambda value, operand: value == operand,
+    "$ne": lambda value, operand: value != operand,
+    "$gt": lambda value, operand: value is not None and value > operand,
+    "$gte": lambda value, operand: value is not None and value >= operand,
+    "$lt": lambda value, operand: value is not None and value < operand,
+    "$lte": lambda value, operand: value is not None and value <= operand,
+    "$in": lambda value, operand: value in operand,
+    "$nin": lambda value, operand: value not in operand,
+}
+
+# SQLite limits the number of parameters in one statement
+_SQL_BATCH = 500
+
+# Rows allocated for a new matrix file; files double in size as they fill up
+_INITIAL_CAPACITY = 1024
+
+# Rows quantized at a time when a reduced-precision copy of a matrix is built
+_QUANTIZE_ROWS = 16384
+
+
+def matches(where: Optional[dict], metadata: dict) -> bool:
+    """Evaluate a Chroma ``where`` filter against the metadata of one chunk"""
+    if not where:
+        return True
+    for key, condition in where.items():
+        if key == "$and":
+            if not all(matches(clause, metadata) for clause in condition):
+                return False
+        elif key == "$or":
+            if not any(matches(clause, metadata) for clause in condition):
+                return False
+        else:
+            value = metadata.get(key)
+            if not isinstance(condition, dict):
+                condition = {"$eq": condition}
+            for operator, operand in condition.items():
+                try:
+                    if not _COMPARISONS[operator](value, operand):
+                        return False
+                except KeyError:
+                    raise ValueError(f"Unsupported where operator {operator!r}")
+                except TypeError:
+                    return False
+    return True
+
+
+def _batched(items: Sequence, size: int = _SQL_BATCH) -> Iterable[Sequence]:
+    for start in range(0, len(items), size):
+        yield items[start:start + size]
+
+
+def _result(include: Sequence[str], nested: bool, **fields) -> Dict[str, Any]:
+    """Chroma-shaped result: every field is present, those not included are None"""
+    result = {"ids": fields["ids"], "included": list(include)}
+    for field in ("documents", "metadatas", "distances", "embeddings"):
+        if field in include:
+            result[field] = fields.get(field, [[] for _ in fields["ids"]] if nested else [])
+        else:
+            result[field] = None
+    return result
+
+
+class VectorStore:
+    """
+    A collection of chunks with embeddings, documents and metadata.
+
+    The interface follows the Chroma collection API the knowledge service was
+    written against: results are dictionaries of parallel lists (nested per
+    query embedding for ``query``), distances are cosine distances, and
+    filters use Chroma's ``where`` syntax ($and, $or, $eq, $ne, $gt, $gte,
+    $lt, $lte, $in, $nin).
+    """
+
+    name = "vector_store"
+
+    def add(self, ids, embeddings, documents=None, metadatas=None):
+        """Insert chunks, skipping IDs that are already stored"""
+        raise NotImplementedError
+
+    def upsert(self, ids, embeddings, documents=None, metadatas=None):
+        """Insert chunks or replace the stored ones with the same IDs"""
+        raise NotImplementedError
+
+    def update(self, ids, embeddings=None, documents=None, metadatas=None):
+        """Change fields of stored chunks; metadata is merged into the stored metadata"""
+        raise NotImplementedError
+
+    def query(self, query_embeddings, n_results: int = 10, where: Optional[dict] = None,
+              include: Sequence[str] = ("documents", "metadatas", "distances")) -> Dict[str, Any]:
+        """Nearest ``n_results`` chunks to each query embedding, closest first"""
+        raise NotImplementedError
+
+    def get(self, ids=None, where: Optional[dict] = None, limit: Optional[int] = None,
+            offset: Optional[int] = None, include: Sequence[str] = ("documents", "metadatas")) -> Dict[str, Any]:
+        """Chunks by ID and/or filter"""
+        raise NotImplementedError
+
+    def delete(self, ids=None, where: Optional[dict] = None):
+        """Delete chunks by ID and/or filter"""
+        raise NotImplementedError
+
+    def count(self) -> int:
+        """Number of chunks stored"""
+        raise NotImplementedError
+
+
+class ChromaVectorStore(VectorStore):
+    """A Chroma collection; HNSW index, kept by Chroma"""
+
+    def __init__(self, collection):
+        self.collection = collection
+        self.name = collection.name
+
+    def add(self, ids, embeddings, documents=None, metadatas=None):
+        self.collection.add(ids=ids, embeddings=embeddings, documents=documents, metadatas=metadatas)
+
+    def upsert(self, ids, embeddings, documents=None, metadatas=None):
+        self.collection.upsert(ids=ids, embeddings=embeddings, documents=documents, metadatas=metadatas)
+
+    def update(self, ids, embeddings=None, documents=None, metadatas=None):
+        self.collection.update(ids=ids, embeddings=embeddings, documents=documents, metadatas=metadatas)
+
+    def query(self, query_embeddings, n_results=10, where=None,
+              include=("documents", "metadatas", "distances")):
+        return self.collection.query(
+            query_embeddings=query_embeddings, n_results=n_results, where=where, include=list(include)
+        )
+
+    def get(self, ids=None, where=None, limit=None, offset=None, include=("documents", "metadatas")):
+        return self.collection.get(ids=ids, where=where, limit=limit, offset=offset, include=list(include))
+
+    def delete(self, ids=None, where=None):
+        self.collection.delete(ids=ids, where=where)
+
+    def count(self) -> int:
+        return self.collection.count()
+
+
+class NumpyVectorStore(VectorStore, SQLiteStore):
+    """
+    Exact cosine search over one memory-mapped float32 matrix per user.
+
+    A collection is a directory holding a SQLite table of chunks (ID, owner,
+    row, document, metadata) and one ``.f32`` file per user with a normalized
+    embedding per row. A query scores every row of the user's matrix (or the
+    rows its filter selects) with one matrix-vector product and picks the top
+    ``n_results`` with ``argpartition``. There is no index to build or keep in
+    memory: the operating system pages the matrix in and shares it between
+    worker processes, and up to ~100k chunks per user a scan is faster than
+    an HNSW lookup.
+
+    With a ``precision`` of float16 or int8, queries scan a copy of each
+    matrix held in memory at that precision (a ``QuantizedMatrix``) and
+    rescore the best ``n_results * oversample`` rows from the float32 file,
+    so only those rows of the file are paged in. The copy is rebuilt when
+    the matrix changed since it was made.
+
+    Writes run inside a SQLite transaction, which serializes writers across
+    processes. Rows of deleted chunks are zeroed and reused; files grow by
+    doubling.
+    """
+
+    def __init__(self, path: str, precision: str = "float32", oversample: int = 4):
+        self.directory = path
+        self.name = os.path.basename(os.path.normpath(path))
+        self.precision = check_precision(precision)
+        self.oversample = max(1, oversample)
+        self._matrices: Dict[str, Tuple[int, np.memmap]] = {}
+        self._quantized: Dict[str, Tuple[int, QuantizedMatrix]] = {}
+        self._matrices_lock = threading.Lock()
+        os.makedirs(path, exist_ok=True)
+        super().__init__(os.path.join(path, "chunks.sqlite3"))
+
+    def _create_schema(self, conn: sqlite3.Connection):
+        # user_id and knowledge_id keep their metadata types (no column affinity)
+        # so filters compare them as strictly as Chroma does
+        conn.execute(
+            """
+            CREATE TABLE IF NOT EXISTS chunks (
+                id TEXT PRIMARY KEY,
+                owner TEXT NOT NULL,
+                row INTEGER NOT NULL,
+                norm REAL NOT NULL,
+                user_id,
+                knowledge_id,
+                document TEXT,
+                metadata TEXT NOT NULL
+            )
+            """
+        )
+        conn.execute("CREATE UNIQUE INDEX IF NOT EXISTS chunks_row ON chunks (owner, row)")
+        conn.execute("CREATE INDEX IF NOT EXISTS chunks_user ON chunks (user_id, knowledge_id)")
+        conn.execute("CREATE INDEX IF NOT EXISTS chunks_knowledge ON chunks (knowledge_id)")
+        conn.execute(
+            """
+            CREATE TABLE IF NOT EXISTS matrices (
+                owner TEXT PRIMARY KEY,
+                file TEXT NOT NULL,
+                dimensions INTEGER NOT NULL,
+                rows INTEGER NOT NULL DEFAULT 0,
+                capacity INTEGER NOT NULL,
+                version INTEGER NOT NULL DEFAULT 0
+            )
+            """
+        )
+        # Collections created before matrices were versioned
+        if "version" not in {column[1] for column in conn.execute("PRAGMA table_info(matrices)")}:
+            conn.execute("ALTER TABLE matrices ADD COLUMN version INTEGER NOT NULL DEFAULT 0")
+        conn.execute(
+            """
+            CREATE TABLE IF NOT EXISTS free_rows (
+                owner TEXT NOT NULL,
+                row INTEGER NOT NULL,
+                PRIMARY KEY (owner, row)
+            ) WITHOUT ROWID
+            """
+        )
+
+    @staticmethod
+    def destroy(path: str):
+        """Delete the collection stored at ``path``"""
+        shutil.rmtree(path)
+
+    # Matrix files
+
+    def _matrix(self, owner: str, file: str, dimensions: int, capacity: int) -> np.memmap:
+        """Mapping of an owner's matrix file, reopened when another process grew it"""
+        cached = self._matrices.get(owner)
+        if cached is not None and cached[0] == capacity:
+            return cached[1]
+        with self._matrices_lock:
+            matrix = np.memmap(
+                os.path.join(self.directory, file), dtype=np.float32, mode="r+", shape=(capacity, dimensions)
+            )
+            self._matrices[owner] = (capacity, matrix)
+        return matrix
+
+    def _writable_matrix(self, conn, owner: str, dimensions: int, needed: int):
+        """Create or grow an owner's matrix so it holds ``needed`` rows"""
+        row = conn.execute(
+            "SELECT file, dimensions, rows, capacity FROM matrices WHERE owner = ?", (owner,)
+        ).fetchone()
+        if row is None:
+            file = f"{len(self._owners(conn))}.f32"
+            while os.path.exists(os.path.join(self.directory, file)):
+                file = f"{int(file.split('.')[0]) + 1}.f32"
+            row = (file, dimensions, 0, 0)
+            conn.execute(
+                "INSERT INTO matrices (owner, file, dimensions, rows, capacity) VALUES (?, ?, ?, 0, 0)",
+                (owner, file, dimensions),
+            )
+        file, stored_dimensions, rows, capacity = row
+        if stored_dimensions != dimensions:
+            raise ValueError(
+                f"Embedding dimension {dimensions} does not match collection dimensionality {stored_dimensions}"
+            )
+        if needed > capacity:
+            capacity = max(capacity * 2, needed, _INITIAL_CAPACITY)
+            with open(os.path.join(self.directory, file), "ab") as handle:
+                handle.truncate(capacity * dimensions * 4)
+            conn.execute("UPDATE matrices SET capacity = ? WHERE owner = ?", (capacity, owner))
+        return self._matrix(owner, file, dimensions, capacity), rows
+
+    def _quantized_matrix(self, owner: str, matrix: np.memmap, rows: int, version: int) -> Optional[QuantizedMatrix]:
+        """
+        Copy of the first ``rows`` rows of an owner's matrix at ``precision``, as
+        of ``version``; None at float32 precision, where the file is scanned directly
+        """
+        if self.precision == "float32":
+            return None
+        cached = self._quantized.get(owner)
+        if cached is not None and cached[0] == version:
+            return cached[1]
+        quantized = QuantizedMatrix(matrix.shape[1], self.precision)
+        for start in range(0, rows, _QUANTIZE_ROWS):
+            quantized.add(matrix[start:min(start + _QUANTIZE_ROWS, rows)])
+        with self._matrices_lock:
+            self._quantized[owner] = (version, quantized)
+        return quantized
+
+    @staticmethod
+    def _owners(conn) -> List[str]:
+        return [owner for (owner,) in conn.execute("SELECT owner FROM matrices")]
+
+    # Writes
+
+    def add(self, ids, embeddings, documents=None, metadatas=None):
+        self._write(ids, embeddings, documents, metadatas, replace=False)
+
+    def upsert(self, ids, embeddings, documents=None, metadatas=None):
+        self._write(ids, embeddings, documents, metadatas, replace=True)
+
+    def update(self, ids, embeddings=None, documents=None, metadatas=None):
+        ids = list(ids)
+        stored = self.get(ids=ids, include=["documents", "metadatas", "embeddings"])
+        position = {chunk_id: i for i, chunk_id in enumerate(stored["ids"])}
+        keep = [i for i, chunk_id in enumerate(ids) if chunk_id in position]
+        if not keep:
+            return
+        records = [position[ids[i]] for i in keep]
+        self._write(
+            [ids[i] for i in keep],
+            [embeddings[i] for i in keep] if embeddings is not None
+            else [stored["embeddings"][j] for j in records],
+            [documents[i] for i in keep] if documents is not None
+            else [stored["documents"][j] for j in records],
+            [{**stored["metadatas"][j], **metadatas[i]} for i, j in zip(keep, records)] if metadatas is not None
+            else [stored["metadatas"][j] for j in records],
+            replace=True,
+        )
+
+    def _write(self, ids, embeddings, documents, metadatas, replace: bool):
+        ids = list(ids)
+        if not ids:
+            return
+        vectors = np.atleast_2d(np.asarray(embeddings, dtype=np.float32))
+        if len(vectors) != len(ids):
+            raise ValueError(f"Got {len(vectors)} embeddings for {len(ids)} IDs")
+        norms = np.linalg.norm(vectors, axis=1)
+        vectors = vectors / np.where(norms == 0, 1, norms)[:, None]
+        documents = list(documents) if documents is not None else [None] * len(ids)
+        metadatas = [dict(metadata or {}) for metadata in metadatas] if metadatas is not None else [{}] * len(ids)
+
+        # The last occurrence of a repeated ID wins
+        last = {chunk_id: i for i, chunk_id in enumerate(ids)}
+
+        with self._transaction() as conn:
+            existing = self._locate(conn, list(last))
+            by_owner: Dict[str, List[int]] = {}
+            for chunk_id, i in last.items():
+                if chunk_id in existing and not replace:
+                    continue
+                user_id = metadatas[i].get("user_id")
+                by_owner.setdefault("" if user_id is None else str(user_id), []).append(i)
+
+            # Chunks that moved to another owner leave their old row
+            moved = [
+                ids[i] for owner, indexes in by_owner.items() for i in indexes
+                if ids[i] in existing and existing[ids[i]][0] != owner
+            ]
+            self._release(conn, {chunk_id: existing.pop(chunk_id) for chunk_id in moved})
+            for batch in _batched(moved):
+                conn.execute(f"DELETE FROM chunks WHERE id IN ({','.join('?' * len(batch))})", batch)
+
+            for owner, indexes in by_owner.items():
+                new = [i for i in indexes if ids[i] not in existing]
+                free = [
+                    row for (row,) in conn.execute(
+                        "SELECT row FROM free_rows WHERE owner = ? ORDER BY row LIMIT ?", (owner, len(new))
+                    )
+                ]
+                high = conn.execute("SELECT rows FROM matrices WHERE owner = ?", (owner,)).fetchone()
+                high = high[0] if high else 0
+                fresh = list(range(high, high + len(new) - len(free)))
+                matrix, _ = self._writable_matrix(conn, owner, vectors.shape[1], high + len(fresh))
+
+                rows = dict(zip(new, free + fresh))
+                rows.update((i, existing[ids[i]][1]) for i in indexes if ids[i] in existing)
+                for row_batch in _batched(free):
+                    conn.execute(
+                        f"DELETE FROM free_rows WHERE owner = ? AND row IN ({','.join('?' * len(row_batch))})",
+                        (owner, *row_batch),
+                    )
+                if fresh:
+                    conn.execute("UPDATE matrices SET rows = ? WHERE owner = ?", (high + len(fresh), owner))
+
+                order = np.fromiter((rows[i] for i in indexes), dtype=np.int64, count=len(indexes))
+                matrix[order] = vectors[indexes]
+                matrix.flush()
+                conn.execute("UPDATE matrices SET version = version + 1 WHERE owner = ?", (owner,))
+                conn.executemany(
+                    """
+                    INSERT INTO chunks (id, owner, row, norm, user_id, knowledge_id, document, metadata)
+                    VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+                    ON CONFLICT (id) DO UPDATE SET
+                        owner = excluded.owner, row = excluded.row, norm = excluded.norm,
+                        user_id = excluded.user_id, knowledge_id = excluded.knowledge_id,
+                        document = excluded.document, metadata = excluded.metadata
+                    """,
+                    [
+                        (
+                            ids[i], owner, rows[i], float(norms[i]),
+                            metadatas[i].get("user_id"), metadatas[i].get("knowledge_id"),
+                            documents[i], json.dumps(metadatas[i]),
+                        )
+                        for i in indexes
+                    ],
+                )
+
+    def delete(self, ids=None, where=None):
+        with self._transaction() as conn:
+            located = {
+                chunk_id: (owner, row)
+                for chunk_id, owner, row, _ in self._select(conn, "id, owner, row", ids, where)
+            }
+            self._release(conn, located)
+            for batch in _batched(list(located)):
+                conn.execute(f"DELETE FROM chunks WHERE id IN ({','.join('?' * len(batch))})", batch)
+
+    def _release(self, conn, located: Dict[str, Tuple[str, int]]):
+        """Zero the rows of chunks and make them available for reuse"""
+        by_owner: Dict[str, List[int]] = {}
+        for owner, row in located.values():
+            by_owner.setdefault(owner, []).append(row)
+        for owner, rows in by_owner.items():
+            file, dimensions, capacity = conn.execute(
+                "SELECT file, dimensions, capacity FROM matrices WHERE owner = ?", (owner,)
+            ).fetchone()
+            matrix = self._matrix(owner, file, dimensions, capacity)
+            matrix[np.asarray(rows, dtype=np.int64)] = 0
+            matrix.flush()
+            conn.execute("UPDATE matrices SET version = version + 1 WHERE owner = ?", (owner,))
+            conn.executemany(
+                "INSERT OR IGNORE INTO free_rows (owner, row) VALUES (?, ?)", [(owner, row) for row in rows]
+            )
+
+    def _locate(self, conn, ids: List[str]) -> Dict[str, Tuple[str, int]]:
+        located = {}
+        for batch in _batched(ids):
+            located.update(
+                (chunk_id, (owner, row)) for chunk_id, owner, row in conn.execute(
+                    f"SELECT id, owner, row FROM chunks WHERE id IN ({','.join('?' * len(batch))})", batch
+                )
+            )
+        return located
+
+    # Reads
+
+    def _select(self, conn, columns: str, ids=None, where=None, order: bool = False):
+        """
+        Rows of the chunk table selected by ``ids`` and ``where``, as tuples of
+        ``columns`` followed by the parsed metadata (None when no filter needs it).
+        Conditions on the indexed columns run in SQL, the rest in Python.
+        """
+        clauses, params, residual = self._compile(where)
+        if residual:
+            columns += ", metadata"
+        id_batches = _batched(list(ids)) if ids is not None else [None]
+        for batch in id_batches:
+            batch_clauses = list(clauses)
+            batch_params = list(params)
+            if batch is not None:
+                batch_clauses.append(f"id IN ({','.join('?' * len(batch))})")
+                batch_params.extend(batch)
+            sql = f"SELECT {columns} FROM chunks"
+            if batch_clauses:
+                sql += " WHERE " + " AND ".join(batch_clauses)
+            if order:
+                sql += " ORDER BY rowid"
+            for record in conn.execute(sql, batch_params):
+                if residual:
+                    metadata = json.loads(record[-1])
+                    if matches(residual, metadata):
+                        yield (*record[:-1], metadata)
+                else:
+                    yield (*record, None)
+
+    @staticmethod
+    def _compile(where: Optional[dict]) -> Tuple[List[str], List[Any], Optional[dict]]:
+        """Split ``where`` into SQL clauses on the indexed columns and a residual filter"""
+        if not where:
+            return [], [], None
+        if list(where) == ["$and"]:
+            conditions = where["$and"]
+        else:
+            conditions = [{key: value} for key, value in where.items()]
+
+        clauses, params, residual = [], [], []
+        for condition in conditions:
+            key, value = next(iter(condition.items())) if len(condition) == 1 else (None, None)
+            if key in _COLUMNS:
+                operator, operand = next(iter(value.items())) if isinstance(value, dict) else ("$eq", value)
+                if isinstance(value, dict) and len(value) != 1:
+                    operator = None
+                if operator in ("$eq", "$ne") and isinstance(operand, (str, int, float)):
+                    clauses.append(f"{key} {'IS' if operator == '$eq' else 'IS NOT'} ?")
+                    params.append(operand)
+                    continue
+                if operator in ("$in", "$nin") and operand and len(operand) <= _SQL_BATCH:
+                    placeholders = ",".join("?" * len(operand))
+                    clauses.append(f"{key} {'IN' if operator == '$in' else 'NOT IN'} ({placeholders})")
+                    params.extend(operand)
+                    continue
+            residual.append(condition)
+
+        if not residual:
+            return clauses, params, None
+        return clauses, params, residual[0] if len(residual) == 1 else {"$and": residual}
+
+    def get(self, ids=None, where=None, limit=None, offset=None, include=("documents", "metadatas")):
+        include = list(include)
+        records = []
+        with self._transaction("DEFERRED") as conn:
+            selected = self._select(conn, "id, owner, row, norm, document, metadata", ids, where, order=True)
+            for index, record in enumerate(selected):
+                if offset and index < offset:
+                    continue
+                if limit is not None and len(records) >= limit:
+                    break
+                records.append(record)
+            if "embeddings" in include:
+                embeddings = self._embeddings(conn, [(owner, row, norm) for _, owner, row, norm, *_ in records])
+
+        fields = {"ids": [record[0] for record in records]}
+        if "documents" in include:
+            fields["documents"] = [record[4] for record in records]
+        if "metadatas" in include:
+            fields["metadatas"] = [record[6] if record[6] is not None else json.loads(record[5]) for record in records]
+        if "embeddings" in include:
+            fields["embeddings"] = embeddings
+        return _result(include, nested=False, **fields)
+
+    def _embeddings(self, conn, locations) -> List[List[float]]:
+        """Stored embeddings of (owner, row, norm) locations, scaled back to their original length"""
+        matrices = {
+            owner: self._matrix(owner, file, dimensions, capacity)
+            for owner, file, dimensions, capacity in conn.execute(
+                "SELECT owner, file, dimensions, capacity FROM matrices"
+            )
+        }
+        return [(matrices[owner][row] * norm).tolist() for owner, row, norm in locations]
+
+    def query(self, query_embeddings, n_results=10, where=None,
+              include=("documents", "metadatas", "distances")):
+        include = list(include)
+        queries = np.atleast_2d(np.asarray(query_embeddings, dtype=np.float32))
+        norms = np.linalg.norm(queries, axis=1, keepdims=True)
+        queries = queries / np.where(norms == 0, 1, norms)
+
+        results = {field: [] for field in ("ids", "documents", "metadatas", "distances", "embeddings")}
+        with self._transaction("DEFERRED") as conn:
+            candidates = self._candidates(conn, where)
+            for query in queries:
+                located = self._top_k(candidates, query, n_results)
+                records = self._records(conn, [(owner, row) for owner, row, _ in located])
+                hits = [(records[(owner, row)], score) for owner, row, score in located if (owner, row) in records]
+                results["ids"].append([record[0] for record, _ in hits])
+                results["documents"].append([record[3] for record, _ in hits])
+                results["metadatas"].append([json.loads(record[4]) for record, _ in hits])
+                results["distances"].append([1.0 - score for _, score in hits])
+                if "embeddings" in include:
+                    results["embeddings"].append(
+                        self._embeddings(conn, [(record[1], record[2], record[5]) for record, _ in hits])
+                    )
+        return _result(include, nested=True, **results)
+
+    def _candidates(self, conn, where) -> List[Tuple[str, np.ndarray, np.ndarray, Optional[QuantizedMatrix]]]:
+        """
+        (owner, matrix, rows, quantized copy) for every owner with chunks
+        matching ``where``; the copy is None at float32 precision. A filter on
+        ``user_id`` alone selects one owner's whole matrix, less its free rows;
+        other filters select rows through the chunk table.
+        """
+        owners = {}
+        for owner, file, dimensions, rows, capacity, version in conn.execute(
+            "SELECT owner, file, dimensions, rows, capacity, version FROM matrices WHERE rows > 0"
+        ):
+            matrix = self._matrix(owner, file, dimensions, capacity)
+            owners[owner] = (matrix, rows, version)
+        clauses, params, residual = self._compile(where)
+
+        if residual or (clauses and clauses != ["user_id IS ?"]):
+            selected: Dict[str, List[int]] = {}
+            for owner, row, _ in self._select(conn, "owner, row", where=where):
+                selected.setdefault(owner, []).append(row)
+            return [
+                (owner, owners[owner][0], np.asarray(rows, dtype=np.int64), self._quantized_matrix(owner, *owners[owner]))
+                for owner, rows in selected.items() if owner in owners
+            ]
+
+        if clauses:
+            # Chunks live in the matrix of their user
+            owners = {owner: owners[owner] for owner in (str(params[0]),) if owner in owners}
+        candidates = []
+        for owner, (matrix, rows, version) in owners.items():
+            live = np.ones(rows, dtype=bool)
+            free = [row for (row,) in conn.execute("SELECT row FROM free_rows WHERE owner = ?", (owner,))]
+            live[free] = False
+            candidates.append((
+                owner, matrix, np.flatnonzero(live) if free else slice(0, rows),
+                self._quantized_matrix(owner, matrix, rows, version),
+            ))
+        return candidates
+
+    def _top_k(self, candidates, query: np.ndarray, k: int) -> List[Tuple[str, int, float]]:
+        """Best ``k`` (owner, row, score) over all candidate rows"""
+        if not candidates or k <= 0:
+            return []
+        groups, rows, scores = [], [], []
+        for group, (_, matrix, selected, quantized) in enumerate(candidates):
+            if quantized is not None:
+                # Approximate scan of the copy, exact scores of the best rows from the file
+                selected, owner_scores = quantized.search(
+                    query, k, rescore=lambda best: matrix[best] @ query, oversample=self.oversample, rows=selected
+                )
+            else:
+                # A slice of the mapping is multiplied in place; row numbers are gathered
+                owner_scores = np.asarray(matrix[selected] @ query)
+            if isinstance(selected, slice):
+                selected = np.arange(selected.start, selected.stop)
+            groups.append(np.full(len(selected), group, dtype=np.int32))
+            rows.append(selected)
+            scores.append(owner_scores)
+        groups = np.concatenate(groups)
+        rows = np.concatenate(rows)
+        scores = np.concatenate(scores)
+        if not len(scores):
+            return []
+        k = min(k, len(scores))
+        best = np.argpartition(-scores, k - 1)[:k]
+        best = best[np.argsort(-scores[best], kind="stable")]
+        return [(candidates[groups[i]][0], int(rows[i]), float(scores[i])) for i in best]
+
+    @staticmethod
+    def _records(conn, locations: List[Tuple[str, int]]) -> Dict[Tuple[str, int], tuple]:
+        """Chunk rows by (owner, row)"""
+        by_owner: Dict[str, List[int]] = {}
+        for owner, row in locations:
+            by_owner.setdefault(owner, []).append(row)
+        records = {}
+        for owner, rows in by_owner.items():
+            for batch in _batched(rows):
+                for record in conn.execute(
+                    f"SELECT id, owner, row, document, metadata, norm FROM chunks "
+                    f"WHERE owner = ? AND row IN ({','.join('?' * len(batch))})",
+                    (owner, *batch),
+                ):
+                    records[(record[1], record[2])] = record
+        return records
+
+    def count(self) -> int:
+        with self._transaction("DEFERRED") as conn:
+            return conn.execute("SELECT COUNT(*) FROM chunks").fetchone()[0]
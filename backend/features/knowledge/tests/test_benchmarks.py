@@ -0,0 +1,63 @@
+import json
+
+import numpy as np
+import pytest
+from django.core.management import call_command
+
+from features.knowledge.benchmarks.retrieval import HashingEmbedder, run, score, synthetic_corpus
+
+
+def test_hashing_embedder_is_deterministic_and_lexical():
+    embedder = HashingEmbedder(dimensions=64, baseline=0.4)
+    query = np.array(embedder.vector("reset the router"))
+    related = np.array(embedder.vector("Hold the reset button to restart the router"))
+    unrelated = np.array(embedder.vector("Bake the loaf for twenty minutes"))
+
+    assert embedder.vector("reset the router") == query.tolist()
+    assert np.linalg.norm(query) == pytest.approx(1.0, abs=1e-6)
+    assert query @ related > query @ unrelated
+    assert query @ unrelated == pytest.approx(0.4, abs=1e-6)
+
+
+def test_synthetic_corpus_queries_are_answered_by_their_document():
+    corpus = synthetic_corpus(documents=5, facts=4, queries=10, seed=3)
+
+    assert corpus == synthetic_corpus(documents=5, facts=4, queries=10, seed=3)
+    assert len(corpus["documents"]) == 5 and len(corpus["queries"]) == 10
+    texts = {document["id"]: document["text"] for document in corpus["documents"]}
+    for query in corpus["queries"]:
+        entity = query["query"].rstrip("?").split()[-1]
+        assert [document_id for document_id, text in texts.items() if entity in text.split()] == query["relevant"]
+
+
+def test_score_counts_documents_not_chunks():
+    metrics = score(["b", "b", "a", "c"], ["a", "c"], ks=(1, 3, 4))
+
+    assert metrics == {"recall@1": 0.0, "recall@3": 0.5, "recall@4": 1.0, "reciprocal_rank": 1 / 3}
+
+
+def test_run_reports_quality_latency_and_memory():
+    report = run(corpus="synthetic", documents=6, facts=6, queries=12, ks=(1, 5))
+
+    assert report["corpus"]["documents"] == 6
+    assert report["ingestion"]["chunks"] > 0
+    assert report["ingestion"]["chunks_per_second"] > 0
+    assert report["settings"]["RAG_SIMILARITY_THRESHOLD"] == 0.5
+    assert set(report["search"]) == {"semantic", "keyword", "hybrid"}
+    keyword = report["search"]["keyword"]
+    assert keyword["recall@5"] == 1.0
+    assert keyword["p95_ms"] >= keyword["p50_ms"] > 0
+    assert "peak_rss_mb" in report["memory"]
+
+
+def test_command_writes_json_report(tmp_path):
+    output = tmp_path / "report.json"
+
+    call_command("benchmark_knowledge", "--modes", "keyword", "--k", "3", "--set", "CHUNK_SIZE_TOKENS=128",
+                 "--output", str(output))
+
+    report = json.loads(output.read_text())
+    assert report["corpus"]["name"] == "labeled"
+    assert report["settings"]["CHUNK_SIZE_TOKENS"] == 128
+    assert list(report["search"]) == ["keyword"]
+    assert report["search"]["keyword"]["mrr"] > 0.5
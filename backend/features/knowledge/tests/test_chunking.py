@@ -0,0 +1,79 @@
+import random
+
+import pytest
+
+from features.knowledge.benchmarks.chunking import legacy_chunks, make_text
+from features.knowledge.services.chunking import SemanticChunker, semantic_chunks
+from features.knowledge.services.knowledge_service import KnowledgeService
+from features.knowledge.services.tokens import get_tokenizer
+
+
+def feed_in_pieces(text, rng, chunk_size, overlap):
+    chunker = SemanticChunker(chunk_size, overlap)
+    chunks = []
+    position = 0
+    while position < len(text):
+        size = rng.randint(1, 300)
+        chunks.extend(chunker.feed(text[position:position + size]))
+        position += size
+    return chunks + chunker.close()
+
+
+@pytest.mark.parametrize("chunk_size,overlap", [(1000, 100), (200, 60), (80, 0)])
+def test_semantic_chunks_match_previous_implementation(chunk_size, overlap):
+    rng = random.Random(chunk_size)
+    for _ in range(5):
+        text = make_text(20_000, rng)
+        assert semantic_chunks(text, chunk_size, overlap) == legacy_chunks(text, chunk_size, overlap)
+
+
+def test_chunks_do_not_depend_on_where_pieces_are_cut():
+    rng = random.Random(1)
+    text = make_text(50_000, rng)
+
+    assert feed_in_pieces(text, rng, 500, 100) == legacy_chunks(text, 500, 100)
+
+
+@pytest.mark.parametrize("text", [
+    "", "   \n\n  ", "One.", "One. Two!\n\n\n  Three? Four", "Ends with a break.\n \n",
+    "No punctuation at all\n\nbut paragraphs", "Spaces before break  \n\n  after.", "x" * 5000,
+])
+def test_semantic_chunks_edge_cases(text):
+    expected = legacy_chunks(text, 100, 20)
+
+    assert semantic_chunks(text, 100, 20) == expected
+    assert feed_in_pieces(text, random.Random(2), 100, 20) == expected
+
+
+def test_text_sections_chunk_across_block_boundaries():
+    text = "".join(f"Sentence {i} of a document split into blocks. " for i in range(200))
+    blocks = [text[i:i + 1500] for i in range(0, len(text), 1500)]
+
+    service = KnowledgeService()
+    sections = list(service._text_sections(blocks, "doc", "doc.txt", "doc.txt"))
+    chunks = [chunk for _, section_chunks in sections for chunk in section_chunks]
+
+    assert "".join(block for block, _ in sections) == text
+    assert [chunk["content"] for chunk in chunks] == service._chunk_text(text)
+    assert [chunk["metadata"]["chunk"] for chunk in chunks] == list(range(len(chunks)))
+
+
+def test_token_sized_chunks_fit_the_embedding_window(settings):
+    settings.EMBEDDING_TOKENIZER = "estimate"
+    settings.EMBEDDING_MAX_TOKENS = 64
+    settings.CHUNK_SIZE_TOKENS = 48
+    settings.CHUNK_OVERLAP_TOKENS = 8
+    tokenizer = get_tokenizer("estimate")
+    text = make_text(30_000, random.Random(4))
+
+    chunks = KnowledgeService()._chunk_text(text)
+
+    assert max(tokenizer.count(chunk) for chunk in chunks) <= 64
+    assert sum(tokenizer.count(chunk) for chunk in chunks) / len(chunks) > 24
+
+
+def test_character_sizing_keeps_previous_chunks(settings):
+    settings.CHUNK_SIZE_UNIT = "characters"
+    text = make_text(20_000, random.Random(6))
+
+    assert KnowledgeService()._chunk_text(text) == legacy_chunks(text, 1000, 100)
@@ -0,0 +1,37 @@
+import random
+
+from features.knowledge.benchmarks.citations import legacy_match, legacy_scan, make_response, make_sources
+from features.knowledge.services.citation_scanner import CitationMatcher, scan_citations
+
+
+def test_scan_matches_legacy_patterns_on_generated_responses():
+    rng = random.Random(3)
+    for _ in range(5):
+        text = make_response(50, rng)
+        assert set(scan_citations(text)) == legacy_scan(text)
+
+
+def test_scan_keeps_first_appearance_order_and_drops_placeholders():
+    text = "See [2] and Source 1, then [0] [00] [??] Source 0, again [2] and Reference Document 7."
+
+    assert scan_citations(text) == ["2", "1", "Document", "7"]
+
+
+def test_matcher_agrees_with_pairwise_substring_match():
+    rng = random.Random(5)
+    sources = make_sources(60, rng) + ["Page", "", "notes.md"]
+    labels = ["1", "12", "Page", "handbook", "notes.md, Page 3", "missing", "Page 400 extra", "x"]
+
+    matcher = CitationMatcher(sources)
+
+    for label in labels:
+        assert matcher.match(label) == legacy_match(label, sources), label
+
+
+def test_matcher_finds_sources_contained_in_the_label():
+    matcher = CitationMatcher(["handbook.pdf, Page 3", "faq", "ref"])
+
+    assert matcher.match("Reference") is None
+    assert matcher.match("faqs") == 1
+    assert matcher.match("preferred") == 2
+    assert CitationMatcher([]).match("1") is None
@@ -0,0 +1,69 @@
+import pytest
+
+from features.knowledge.services.knowledge_service import KnowledgeService
+from features.knowledge.services.retrieval import RetrievalResult
+
+
+@pytest.fixture
+def service():
+    return KnowledgeService()
+
+
+def test_citations_resolve_against_retrieval_result(service):
+    retrieval = RetrievalResult(
+        query="what is the refund window?",
+        chunks=[{
+            "id": "k1_policy.pdf_p2_c0",
+            "content": "Refunds are accepted within 30 days.",
+            "metadata": {"knowledge_id": "k1", "source": "policy.pdf", "citation": "policy.pdf, Page 2", "page": 2},
+            "similarity": 0.82,
+        }],
+        context="...",
+    )
+
+    citations = service.get_citations_for_response("Refunds are accepted for 30 days.", retrieval)
+
+    assert retrieval.chunk_ids == ["k1_policy.pdf_p2_c0"]
+    assert retrieval.scores == {"k1_policy.pdf_p2_c0": 0.82}
+    assert citations["has_citations"]
+    assert [(c["chunk_id"], c["knowledge_id"]) for c in citations["citations"]] == [("k1_policy.pdf_p2_c0", "k1")]
+
+
+class RecordingCollection:
+    """Chroma collection stand-in that serves metadata by chunk id and records get calls"""
+    def __init__(self, metadatas):
+        self.metadatas = metadatas
+        self.gets = []
+
+    def get(self, ids=None, where=None, include=None):
+        self.gets.append({"ids": ids, "where": where})
+        found = [chunk_id for chunk_id in ids if chunk_id in self.metadatas]
+        return {"ids": found, "metadatas": [self.metadatas[chunk_id] for chunk_id in found]}
+
+
+def test_citations_for_chunks_use_one_batched_lookup(service):
+    service.collection = RecordingCollection({
+        f"k{i}_c{j}": {"knowledge_id": f"k{i}", "source": f"doc{i}.pdf", "citation": f"doc{i}.pdf", "page": j}
+        for i in range(3) for j in range(50)
+    })
+
+    citations = service.get_citations_for_chunks(["k0_c3", "k2_c7", "k2_c7", "missing"])
+
+    assert service.collection.gets == [{"ids": ["k0_c3", "k2_c7", "missing"], "where": None}]
+    assert citations == {
+        "k0_c3": {"source": "doc0.pdf", "citation": "doc0.pdf", "knowledge_id": "k0", "page": 3},
+        "k2_c7": {"source": "doc2.pdf", "citation": "doc2.pdf", "knowledge_id": "k2", "page": 7},
+    }
+
+
+def test_citations_skip_lookup_for_chunks_with_metadata(service):
+    service.collection = RecordingCollection({"k1_c0": {"knowledge_id": "k1", "citation": "notes.txt"}})
+    chunks = [
+        {"id": "k1_c1", "content": "a", "metadata": {"knowledge_id": "k1", "citation": "notes.txt"}},
+        {"id": "k1_c0", "content": "b"},
+    ]
+
+    citations = service.get_citations_for_response("No explicit markers here.", chunks)
+
+    assert service.collection.gets == [{"ids": ["k1_c0"], "where": None}]
+    assert {c["chunk_id"] for c in citations["citations"]} == {"k1_c0", "k1_c1"}
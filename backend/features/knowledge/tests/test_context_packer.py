@@ -0,0 +1,86 @@
+from features.knowledge.services.context_packer import PASSAGE_OVERHEAD_TOKENS, overlap_length, pack_context
+from features.knowledge.services.tokens import count_tokens
+
+
+def make_chunk(knowledge_id, position, content, similarity):
+    return {
+        "id": f"{knowledge_id}_c{position}",
+        "content": content,
+        "metadata": {"knowledge_id": knowledge_id, "chunk": position, "citation": f"{knowledge_id} p{position}"},
+        "similarity": similarity,
+    }
+
+
+def test_pack_context_fills_budget_best_first():
+    chunks = [make_chunk("k1", i, f"Sentence number {i} about a topic. " * 10, 1.0 - i / 10) for i in range(0, 10, 2)]
+    per_chunk = count_tokens(chunks[0]["content"]) + PASSAGE_OVERHEAD_TOKENS
+
+    packed = pack_context(chunks, budget_tokens=per_chunk * 2 + 5)
+
+    assert packed.chunk_ids == ["k1_c0", "k1_c2"]
+    assert packed.tokens <= packed.budget
+    assert packed.candidates == 5
+
+
+def test_pack_context_skips_duplicate_content():
+    chunks = [make_chunk("k1", 0, "Same text in two documents.", 0.9), make_chunk("k2", 0, "Same  text in two documents.", 0.8)]
+
+    packed = pack_context(chunks, budget_tokens=1000)
+
+    assert packed.chunk_ids == ["k1_c0"]
+
+
+def test_pack_context_merges_overlapping_neighbours():
+    text = "".join(f"Paragraph {i} explains part {i} of the design in some detail. " for i in range(12))
+    first, second = text[:500], text[400:]
+    chunks = [make_chunk("k1", 1, second, 0.9), make_chunk("k1", 0, first, 0.8)]
+
+    packed = pack_context(chunks, budget_tokens=1000)
+
+    assert len(packed.passages) == 1
+    assert packed.passages[0]["content"] == text
+    assert packed.passages[0]["chunk_ids"] == ["k1_c0", "k1_c1"]
+    assert packed.passages[0]["metadata"]["citation"] == "k1 p0; k1 p1"
+    assert packed.tokens < count_tokens(first) + count_tokens(second) + 2 * PASSAGE_OVERHEAD_TOKENS
+
+
+def test_pack_context_keeps_pages_apart():
+    # PDF chunks are numbered per page, so page 2 chunk 0 is not the neighbour of page 1 chunk 1
+    text = "".join(f"Paragraph {i} explains part {i} of the design in some detail. " for i in range(12))
+    chunks = [
+        {
+            "id": f"k1_p{page}_c{position}",
+            "content": content,
+            "metadata": {"knowledge_id": "k1", "page": page, "chunk": position, "citation": f"k1, Page {page}"},
+            "similarity": similarity,
+        }
+        for page, position, content, similarity in [
+            (2, 0, text[400:], 0.9),
+            (1, 1, text[:500], 0.8),
+            (10, 0, "The appendix lists the parts.", 0.7),
+            (1, 0, "The introduction names the design.", 0.6),
+        ]
+    ]
+
+    packed = pack_context(chunks, budget_tokens=1000)
+
+    # Nothing was trimmed as overlap with a chunk of another page
+    assert [passage["content"] for passage in packed.passages] == [
+        text[400:], "The introduction names the design." + text[:500], "The appendix lists the parts."
+    ]
+    assert [passage["chunk_ids"] for passage in packed.passages] == [["k1_p2_c0"], ["k1_p1_c0", "k1_p1_c1"], ["k1_p10_c0"]]
+    assert packed.tokens == sum(count_tokens(chunk["content"]) for chunk in chunks) + 3 * PASSAGE_OVERHEAD_TOKENS
+
+
+def test_pack_context_truncates_when_nothing_fits():
+    chunks = [make_chunk("k1", 0, "word " * 2000, 0.9)]
+
+    packed = pack_context(chunks, budget_tokens=200)
+
+    assert packed.chunk_ids == ["k1_c0"]
+    assert 0 < packed.tokens <= 200
+
+
+def test_overlap_length_ignores_short_coincidences():
+    assert overlap_length("the end of the", "the start") == 0
+    assert overlap_length("x" * 10 + "a shared overlap of some length", "a shared overlap of some length and more") == 31
@@ -0,0 +1,143 @@
+import pytest
+
+from features.authentication.models import CustomUser
+from features.knowledge.registry import VectorStoreRegistry
+from features.knowledge.services import knowledge_service
+from features.knowledge.services.dedup import DuplicateIndex, collapse_duplicates, hamming, simhash
+from features.knowledge.services.knowledge_service import KnowledgeService
+
+MANUAL = (
+    "To reset the router hold the power button for ten seconds until the status light "
+    "blinks amber, then release it and wait for the device to restart with factory settings"
+)
+
+
+class FakeOllamaClient:
+    """Ollama client stand-in that records embed calls"""
+    def __init__(self):
+        self.embed_calls = []
+
+    def embed(self, model, input):
+        self.embed_calls.append(list(input))
+        return {"embeddings": [[float(len(text)), 1.0] for text in input]}
+
+
+@pytest.fixture
+def index(tmp_path):
+    return DuplicateIndex(str(tmp_path / "duplicates.sqlite3"))
+
+
+@pytest.fixture(params=["chroma", "numpy"])
+def service(request, db, settings, tmp_path, monkeypatch):
+    settings.VECTOR_STORE_BACKEND = request.param
+    settings.CHROMA_PERSIST_DIR = str(tmp_path / "chroma")
+    settings.EMBEDDING_MODEL_VERSION = "test"
+    monkeypatch.setattr(knowledge_service, "vector_store_registry", VectorStoreRegistry())
+    service = KnowledgeService()
+    service.ollama_client = FakeOllamaClient()
+    return service
+
+
+@pytest.fixture
+def user(db):
+    return CustomUser.objects.create_user(
+        username="dedup", email="dedup@example.com", password="password123", name="Dedup"
+    )
+
+
+def _chunk(service, knowledge):
+    result = service.collection.get(where={"knowledge_id": str(knowledge.id)}, include=["metadatas"])
+    return result["ids"][0], result["metadatas"][0]
+
+
+def test_simhash_is_close_for_near_identical_text():
+    revised = MANUAL.replace("ten seconds", "10 seconds")
+    other = "Quarterly revenue grew across every region while operating costs stayed flat year over year"
+
+    assert hamming(simhash(MANUAL), simhash(MANUAL.upper() + " ")) == 0
+    assert hamming(simhash(MANUAL), simhash(revised)) < hamming(simhash(MANUAL), simhash(other))
+    assert simhash("too short to fingerprint") is None
+
+
+def test_assign_matches_exact_and_near_duplicates_of_the_same_user(index):
+    assert index.assign(1, "k1", [("k1_c0", "h0", MANUAL), ("k1_c1", "h1", "short text")]) == {}
+
+    duplicates = index.assign(1, "k2", [
+        ("k2_c0", "other-hash", MANUAL + "."),
+        ("k2_c1", "h1", "short text"),
+        ("k2_c2", "h2", "Quarterly revenue grew across every region while operating costs stayed flat"),
+    ])
+
+    assert duplicates == {"k2_c0": "k1_c0", "k2_c1": "k1_c1"}
+    assert index.assign(2, "k3", [("k3_c0", "h0", MANUAL)]) == {}
+
+
+def test_assign_matches_within_one_call(index):
+    duplicates = index.assign(1, "k1", [("c0", "h0", MANUAL), ("c1", "h0", MANUAL)])
+
+    assert duplicates == {"c1": "c0"}
+
+
+def test_removed_chunks_are_no_longer_canonical(index):
+    index.assign(1, "k1", [("k1_c0", "h0", MANUAL)])
+    index.delete_knowledge("k1")
+
+    assert index.assign(1, "k2", [("k2_c0", "h0", MANUAL)]) == {}
+    index.remove(["k2_c0"])
+    assert index.assign(1, "k3", [("k3_c0", "h0", MANUAL)]) == {}
+
+
+def test_collapse_duplicates_keeps_the_best_hit_and_lists_copies():
+    results = [
+        {"id": "k2_c0", "metadata": {"duplicate_of": "k1_c0", "citation": "v2, page 1"}},
+        {"id": "k3_c4", "metadata": {"citation": "other"}},
+        {"id": "k1_c0", "metadata": {"citation": "v1, page 1"}},
+        {"id": "k4_c0", "metadata": {"duplicate_of": "k1_c0", "citation": "v3, page 1"}},
+    ]
+
+    collapsed = collapse_duplicates(results)
+
+    assert [result["id"] for result in collapsed] == ["k2_c0", "k3_c4"]
+    assert collapsed[0]["duplicates"] == ["v1, page 1", "v3, page 1"]
+
+
+def test_duplicates_take_over_when_the_canonical_document_is_deleted(service, user):
+    original, first_copy, second_copy = (
+        service.create_knowledge({"name": name, "identifier": name, "content": MANUAL}, user)
+        for name in ("v1", "v2", "v3")
+    )
+    original_id, _ = _chunk(service, original)
+    assert _chunk(service, first_copy)[1]["duplicate_of"] == original_id
+    assert _chunk(service, second_copy)[1]["duplicate_of"] == original_id
+
+    service.delete_knowledge(original.id, user.id)
+
+    successor_id, successor = _chunk(service, first_copy)
+    assert "duplicate_of" not in successor
+    assert _chunk(service, second_copy)[1]["duplicate_of"] == successor_id
+    # The successor's fingerprint replaces the deleted one
+    later = service.create_knowledge({"name": "v4", "identifier": "v4", "content": MANUAL}, user)
+    assert _chunk(service, later)[1]["duplicate_of"] == successor_id
+
+
+def test_duplicates_take_over_when_the_canonical_chunk_changes(service, user):
+    original, copy = (
+        service.create_knowledge({"name": name, "identifier": name, "content": MANUAL}, user)
+        for name in ("v1", "v2")
+    )
+
+    service.update_knowledge(original.id, {"content": "Quarterly revenue grew across every region this year."}, user.id)
+
+    assert "duplicate_of" not in _chunk(service, copy)[1]
+
+
+def test_edited_duplicate_is_stored_as_canonical(service, user):
+    original, copy = (
+        service.create_knowledge({"name": name, "identifier": name, "content": MANUAL}, user)
+        for name in ("v1", "v2")
+    )
+
+    service.update_knowledge(copy.id, {"content": "Quarterly revenue grew across every region this year."}, user.id)
+
+    assert "duplicate_of" not in _chunk(service, copy)[1]
+    assert "duplicate_of" not in _chunk(service, original)[1]
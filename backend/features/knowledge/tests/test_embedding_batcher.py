@@ -0,0 +1,83 @@
+import threading
+import time
+
+import pytest
+
+from features.knowledge.services.embedding_batcher import EmbeddingBatcher, Histogram
+
+
+class RecordingEmbedder:
+    def __init__(self, delay=0.0):
+        self.delay = delay
+        self.batches = []
+
+    def __call__(self, texts):
+        self.batches.append(list(texts))
+        time.sleep(self.delay)
+        return [[float(len(text))] for text in texts]
+
+
+def embed_concurrently(batcher, embedder, texts, key="model"):
+    results = {}
+
+    def embed(text):
+        results[text] = batcher.embed(key, embedder, text, timeout=5)
+
+    threads = [threading.Thread(target=embed, args=(text,)) for text in texts]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return results
+
+
+def test_concurrent_requests_share_a_model_call():
+    batcher = EmbeddingBatcher(max_wait=0.05, max_batch_size=32)
+    embedder = RecordingEmbedder()
+    texts = [f"query {'x' * i}" for i in range(10)]
+
+    results = embed_concurrently(batcher, embedder, texts)
+
+    assert results == {text: [float(len(text))] for text in texts}
+    assert len(embedder.batches) < len(texts)
+    metrics = batcher.metrics()
+    assert metrics["requests"] == 10
+    assert metrics["batches"] == len(embedder.batches)
+    assert metrics["batch_sizes"]["max"] == max(len(batch) for batch in embedder.batches)
+
+
+def test_batches_are_capped_and_grouped_by_model():
+    batcher = EmbeddingBatcher(max_wait=0.05, max_batch_size=3)
+    embedder = RecordingEmbedder(delay=0.01)
+
+    embed_concurrently(batcher, embedder, [f"a{i}" for i in range(7)], key="a")
+    assert max(len(batch) for batch in embedder.batches) <= 3
+
+    other = RecordingEmbedder()
+    first = batcher.submit("a", embedder, "same model")
+    second = batcher.submit("b", other, "other model")
+    assert first.result(5) == [10.0] and second.result(5) == [11.0]
+    assert other.batches == [["other model"]]
+
+
+def test_failed_batch_fails_each_request():
+    batcher = EmbeddingBatcher(max_wait=0.001)
+
+    def failing(texts):
+        raise ConnectionError("model unreachable")
+
+    with pytest.raises(ConnectionError):
+        batcher.embed("model", failing, "query", timeout=5)
+    assert batcher.metrics()["errors"] == 1
+    assert batcher.embed("model", RecordingEmbedder(), "again", timeout=5) == [5.0]
+
+
+def test_histogram_buckets():
+    histogram = Histogram(bounds=(1, 2, 4))
+    for value in (1, 2, 3, 4, 9):
+        histogram.observe(value)
+
+    snapshot = histogram.snapshot()
+    assert snapshot["buckets"] == {"le_1": 1, "le_2": 1, "le_4": 2, "inf": 1}
+    assert snapshot["count"] == 5 and snapshot["max"] == 9
+    assert snapshot["mean"] == pytest.approx(3.8)
@@ -0,0 +1,32 @@
+from features.knowledge.services.embedding_cache import EmbeddingCache
+
+
+def test_round_trip_and_normalized_keys(tmp_path):
+    cache = EmbeddingCache(str(tmp_path / "cache.sqlite3"))
+    cache.put("nomic-embed-text", "v1", "hello   world", [0.5, 0.25])
+
+    assert cache.get("nomic-embed-text", "v1", " hello world\n") == [0.5, 0.25]
+    assert cache.get("nomic-embed-text", "v2", "hello world") is None
+    assert cache.get("other-model", "v1", "hello world") is None
+
+
+def test_persists_across_instances(tmp_path):
+    path = str(tmp_path / "cache.sqlite3")
+    EmbeddingCache(path).put_many("m", "v", ["a", "b"], [[1.0], [2.0]])
+
+    assert EmbeddingCache(path).get_many("m", "v", ["b", "c", "a"]) == [[2.0], None, [1.0]]
+
+
+def test_evicts_least_recently_used(tmp_path):
+    # Each 4-dimensional float32 embedding is 16 bytes
+    cache = EmbeddingCache(str(tmp_path / "cache.sqlite3"), max_bytes=48)
+    cache.put("m", "v", "first", [1.0] * 4)
+    cache.put("m", "v", "second", [2.0] * 4)
+    cache.put("m", "v", "third", [3.0] * 4)
+    cache.get("m", "v", "first")
+
+    cache.put("m", "v", "fourth", [4.0] * 4)
+
+    assert cache.get("m", "v", "second") is None
+    assert cache.get("m", "v", "first") == [1.0] * 4
+    assert cache.stats()["bytes"] <= 48
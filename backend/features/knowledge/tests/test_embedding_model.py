@@ -0,0 +1,102 @@
+import sys
+import types
+
+import numpy as np
+import pytest
+
+from features.knowledge.services.embedding_model import FAILED, READY, EmbeddingModelHolder
+
+
+class FakeSentenceTransformer:
+    loads = 0
+
+    def __init__(self, name):
+        FakeSentenceTransformer.loads += 1
+        self.name = name
+        self.encoded = []
+
+    def encode(self, texts, convert_to_numpy=True):
+        self.encoded.append(texts)
+        if isinstance(texts, str):
+            return np.ones(3)
+        return np.ones((len(texts), 3))
+
+
+@pytest.fixture
+def sentence_transformers(monkeypatch, settings):
+    settings.USE_SENTENCE_TRANSFORMERS = True
+    settings.SENTENCE_TRANSFORMER_MODEL = "tiny-model"
+    FakeSentenceTransformer.loads = 0
+    module = types.ModuleType("sentence_transformers")
+    module.SentenceTransformer = FakeSentenceTransformer
+    monkeypatch.setitem(sys.modules, "sentence_transformers", module)
+    return module
+
+
+def test_model_is_loaded_once_and_warmed_up(sentence_transformers):
+    holder = EmbeddingModelHolder()
+    assert not holder.ready
+
+    assert holder.preload()
+    holder.encode("query")
+    holder.encode(["a", "b"])
+
+    assert FakeSentenceTransformer.loads == 1
+    assert holder.load().encoded[0] == ["warm up"]
+    status = holder.status()
+    assert status["state"] == READY and status["model"] == "tiny-model" and status["warm"]
+
+
+def test_preload_without_warm_up_only_loads_weights(sentence_transformers):
+    holder = EmbeddingModelHolder()
+
+    assert holder.preload(warm_up=False)
+    assert holder.load().encoded == []
+    assert not holder.status()["warm"]
+
+
+def test_failed_preload_is_reported_and_retried(sentence_transformers):
+    def unavailable(name):
+        raise OSError(f"Can't load {name}")
+
+    sentence_transformers.SentenceTransformer = unavailable
+    holder = EmbeddingModelHolder()
+
+    assert holder.preload()
+    assert holder.status()["state"] == FAILED and "tiny-model" in holder.status()["error"]
+
+    sentence_transformers.SentenceTransformer = FakeSentenceTransformer
+    holder.encode("query")
+    assert holder.status()["state"] == READY and holder.status()["error"] is None
+
+
+def test_disabled_model_is_always_ready(settings):
+    settings.USE_SENTENCE_TRANSFORMERS = False
+    holder = EmbeddingModelHolder()
+
+    assert holder.ready and holder.preload()
+    assert holder.status()["state"] == "disabled"
+
+
+
+def test_knowledge_service_embeds_with_the_shared_model(sentence_transformers, monkeypatch):
+    from features.knowledge.services import knowledge_service
+    from features.knowledge.services.knowledge_service import KnowledgeService
+
+    holder = EmbeddingModelHolder()
+    monkeypatch.setattr(knowledge_service, "embedding_model", holder)
+    service = KnowledgeService()
+
+    class NoOllama:
+        def embeddings(self, **kwargs):
+            raise AssertionError("fell back to Ollama")
+
+        def embed(self, **kwargs):
+            raise AssertionError("fell back to Ollama")
+
+    service.ollama_client = NoOllama()
+
+    assert service._embed_uncached("query") == [1.0, 1.0, 1.0]
+    assert service._embed_batch_uncached(["a", "b"]) == [[1.0, 1.0, 1.0]] * 2
+    assert holder.load().encoded == ["query", ["a", "b"]]
+    assert FakeSentenceTransformer.loads == 1
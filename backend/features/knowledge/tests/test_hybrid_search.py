@@ -0,0 +1,77 @@
+import time
+
+import pytest
+
+from api.services.cache_service import CacheService
+from features.knowledge.services.fusion import reciprocal_rank_fusion, weighted_fusion
+from features.knowledge.services.knowledge_service import KnowledgeService
+
+
+def _hit(content, similarity, search_type):
+    return {"id": content, "content": content, "metadata": {}, "similarity": similarity, "search_type": search_type}
+
+
+SEMANTIC = [_hit("a", 0.9, "semantic"), _hit("b", 0.8, "semantic"), _hit("c", 0.7, "semantic")]
+KEYWORD = [_hit("c", 1.0, "keyword"), _hit("d", 0.6, "keyword")]
+
+
+def test_rrf_rewards_agreement_between_legs():
+    fused = reciprocal_rank_fusion({"semantic": SEMANTIC, "keyword": KEYWORD}, k=60)
+
+    assert [result["content"] for result in fused] == ["c", "a", "b", "d"]
+    assert fused[0]["ranks"] == {"semantic": 3, "keyword": 1}
+    assert fused[0]["combined_score"] == pytest.approx(1 / 63 + 1 / 61)
+
+
+def test_weighted_fusion_normalizes_each_leg():
+    fused = weighted_fusion({"semantic": SEMANTIC, "keyword": KEYWORD}, weights={"semantic": 0.7, "keyword": 0.3})
+
+    assert [result["content"] for result in fused] == ["a", "b", "c", "d"]
+    assert fused[0]["combined_score"] == pytest.approx(0.7)
+
+
+def test_hybrid_search_runs_legs_concurrently(settings):
+    settings.HYBRID_FUSION = "rrf"
+    service = KnowledgeService()
+
+    def slow(results):
+        def search(query, user_id, max_results):
+            time.sleep(0.2)
+            return results
+        return search
+
+    service._semantic_search = slow(SEMANTIC)
+    service._keyword_search = slow(KEYWORD)
+
+    started = time.perf_counter()
+    results = service._hybrid_search("query", user_id=1, max_results=2)
+    elapsed = time.perf_counter() - started
+
+    assert elapsed < 0.35
+    assert [result["content"] for result in results] == ["c", "a"]
+    assert set(results[0]["timings"]) == {"semantic_ms", "keyword_ms", "total_ms"}
+    assert results[0]["fusion"] == "rrf"
+
+
+def test_cached_results_are_dropped_when_the_users_corpus_changes(settings):
+    settings.HYBRID_FUSION = "rrf"
+    service = KnowledgeService()
+    service._search_results_cache = CacheService("test_knowledge_search", backend=None)
+    calls = []
+
+    def search(query, user_id, max_results):
+        calls.append(user_id)
+        return SEMANTIC
+
+    service._semantic_search = search
+    service._keyword_search = lambda query, user_id, max_results: []
+
+    service._hybrid_search("query", user_id=1, max_results=2)
+    service._hybrid_search("query", user_id=2, max_results=2)
+    service._hybrid_search("query", user_id=1, max_results=2)
+    assert calls == [1, 2]
+
+    service._invalidate_searches(1)
+    service._hybrid_search("query", user_id=1, max_results=2)
+    service._hybrid_search("query", user_id=2, max_results=2)
+    assert calls == [1, 2, 1]
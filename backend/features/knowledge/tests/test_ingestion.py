@@ -0,0 +1,283 @@
+from types import SimpleNamespace
+
+import pytest
+
+from features.knowledge.services.dedup import DuplicateIndex
+from features.knowledge.services.embedding_cache import EmbeddingCache
+from features.knowledge.services.keyword_index import KeywordIndex
+from features.knowledge.services.knowledge_service import KnowledgeService
+
+
+class FakeOllamaClient:
+    """Ollama client stand-in that records embed calls"""
+    def __init__(self):
+        self.embed_calls = []
+
+    def embed(self, model, input):
+        self.embed_calls.append(list(input))
+        return {"embeddings": [[float(len(text)), 1.0] for text in input]}
+
+
+class FakeCollection:
+    """Chroma collection stand-in that keeps records in memory and records upsert calls"""
+    def __init__(self):
+        self.added = []
+        self.records = {}
+
+    def upsert(self, ids, embeddings, documents, metadatas):
+        self.added.append(ids)
+        for chunk_id, embedding, document, metadata in zip(ids, embeddings, documents, metadatas):
+            self.records[chunk_id] = {"embedding": embedding, "document": document, "metadata": dict(metadata)}
+
+    def update(self, ids, metadatas):
+        for chunk_id, metadata in zip(ids, metadatas):
+            self.records[chunk_id]["metadata"] = dict(metadata)
+
+    def get(self, where=None, include=None, ids=None):
+        if ids is not None:
+            ids = [chunk_id for chunk_id in ids if chunk_id in self.records]
+        else:
+            ids = [
+                chunk_id for chunk_id, record in self.records.items()
+                if all(record["metadata"].get(key) == value for key, value in where.items())
+            ]
+        return {
+            "ids": ids,
+            "metadatas": [dict(self.records[chunk_id]["metadata"]) for chunk_id in ids],
+            "embeddings": [self.records[chunk_id]["embedding"] for chunk_id in ids],
+        }
+
+    def delete(self, ids):
+        for chunk_id in ids:
+            self.records.pop(chunk_id, None)
+
+
+@pytest.fixture
+def service(settings, tmp_path):
+    settings.EMBEDDING_BATCH_SIZE = 4
+    settings.EMBEDDING_CONCURRENCY = 2
+    settings.EMBEDDING_MODEL_VERSION = "test"
+    service = KnowledgeService()
+    service.embedding_cache = EmbeddingCache(str(tmp_path / "embeddings.sqlite3"))
+    service.keyword_index = KeywordIndex(str(tmp_path / "keywords.sqlite3"))
+    service.duplicate_index = DuplicateIndex(str(tmp_path / "duplicates.sqlite3"))
+    service.ollama_client = FakeOllamaClient()
+    service.collection = FakeCollection()
+    return service
+
+
+def test_store_chunks_embeds_in_batches(service):
+    chunks = [{"id": f"c{i}", "content": f"chunk number {i}", "metadata": {"chunk": i}} for i in range(10)]
+
+    stats = service._store_chunks_in_chroma("k1", chunks, {"source": "doc.txt"}, user_id=1)
+
+    assert sorted(len(call) for call in service.ollama_client.embed_calls) == [2, 4, 4]
+    assert [len(ids) for ids in service.collection.added] == [4, 4, 2]
+    assert service.collection.added[0][0] == "k1_c0"
+    assert stats["chunks"] == 10
+    assert stats["stored"] == 10
+    assert stats["chunks_per_second"] > 0
+
+
+def test_generate_embeddings_uses_cache(service):
+    service._generate_embeddings(["alpha", "beta"])
+    embeddings = service._generate_embeddings(["alpha", "gamma", ""])
+
+    assert service.ollama_client.embed_calls == [["alpha", "beta"], ["gamma"]]
+    assert embeddings[0] == [5.0, 1.0]
+    assert embeddings[2] == []
+
+
+def test_store_chunks_consumes_generator_lazily(service):
+    produced = []
+
+    def chunks():
+        for i in range(10):
+            produced.append(i)
+            yield {"id": f"c{i}", "content": f"chunk number {i}", "metadata": {"chunk": i}}
+
+    stats = service._store_chunks_in_chroma("k1", chunks(), {"source": "doc.txt"}, user_id=1)
+
+    assert produced == list(range(10))
+    assert stats["chunks"] == 10
+    assert [len(ids) for ids in service.collection.added] == [4, 4, 2]
+
+
+def test_reingestion_only_embeds_changed_chunks(service):
+    chunks = [{"id": f"c{i}", "content": f"chunk number {i}", "metadata": {"chunk": i}} for i in range(10)]
+    service._store_chunks_in_chroma("k1", chunks, {"source": "doc.txt"}, user_id=1)
+    service.collection.added.clear()
+    service.ollama_client.embed_calls.clear()
+
+    edited = chunks[:8]
+    edited[3] = {"id": "c3", "content": "an edited paragraph", "metadata": {"chunk": 3}}
+    stats = service._store_chunks_in_chroma("k1", edited, {"source": "doc.txt"}, user_id=1)
+
+    assert service.ollama_client.embed_calls == [["an edited paragraph"]]
+    assert service.collection.added == [["k1_c3"]]
+    assert sorted(service.collection.records) == sorted(f"k1_c{i}" for i in range(8))
+    assert stats["stored"] == 1
+    assert stats["unchanged"] == 7
+    assert stats["deleted"] == 2
+    assert "k1_c9" not in [chunk_id for chunk_id, _ in service.keyword_index.search(1, "chunk number 9", limit=10)]
+
+
+def test_reingestion_relabels_unchanged_chunks_without_embedding(service):
+    chunks = [{"id": f"c{i}", "content": f"chunk number {i}", "metadata": {"chunk": i}} for i in range(3)]
+    service._store_chunks_in_chroma("k1", chunks, {"source": "old.txt"}, user_id=1)
+    service.ollama_client.embed_calls.clear()
+
+    stats = service._store_chunks_in_chroma("k1", chunks, {"source": "new.txt"}, user_id=1)
+
+    assert service.ollama_client.embed_calls == []
+    assert stats["unchanged"] == 3
+    assert service.collection.records["k1_c0"]["metadata"]["source"] == "new.txt"
+
+
+def test_text_file_is_parsed_in_blocks(service, settings, tmp_path):
+    settings.INGESTION_TEXT_BLOCK_SIZE = 200
+    path = tmp_path / "notes.txt"
+    paragraphs = [f"Paragraph {i} talks about topic {i}." for i in range(30)]
+    path.write_text("\n\n".join(paragraphs))
+
+    metadata, sections = service._parse_file(str(path), "notes.txt", "text/plain", "Notes")
+    sections = list(sections)
+
+    assert len(sections) > 1
+    assert "".join(text for text, _ in sections) == path.read_text()
+    chunk_ids = [chunk["id"] for _, chunks in sections for chunk in chunks]
+    assert chunk_ids == [f"notes.txt_c{i}" for i in range(len(chunk_ids))]
+
+
+def test_csv_rows_stream_in_groups(service, settings, tmp_path):
+    settings.INGESTION_TEXT_BLOCK_SIZE = 50
+    settings.EMBEDDING_TOKENIZER = "estimate"
+    settings.CHUNK_SIZE_TOKENS = 40
+    # Uploads are stored under a unique name; chunks are named after the original one
+    path = tmp_path / "3f2a9c1d0e4b-table.csv"
+    path.write_text("name,value\n" + "".join(f"row{i},{i}\n" for i in range(20)))
+
+    metadata, sections = service._parse_file(str(path), "table.csv", "text/csv", "Table")
+    sections = list(sections)
+    chunks = [chunk for _, section_chunks in sections for chunk in section_chunks]
+
+    assert metadata["headers"] == ["name", "value"]
+    assert len(sections) > 1
+    assert 1 < len(chunks) < 20
+    assert all(chunk["content"].startswith("Columns: name, value\nRow ") for chunk in chunks)
+    first = chunks[0]["metadata"]
+    assert first["row_start"] == 2
+    assert first["citation"] == f"table.csv, Rows 2\u2013{first['row_end']}"
+    assert chunks[1]["metadata"]["row_start"] == first["row_end"] + 1
+    assert chunks[-1]["metadata"]["row_end"] == 21
+    assert [chunk["id"] for chunk in chunks][:2] == ["table.csv_r2", f"table.csv_r{first['row_end'] + 1}"]
+
+
+def test_csv_row_too_large_for_a_chunk_is_split_under_the_header(service, settings, tmp_path):
+    settings.EMBEDDING_TOKENIZER = "estimate"
+    settings.CHUNK_SIZE_TOKENS = 40
+    settings.EMBEDDING_MAX_TOKENS = 60
+    path = tmp_path / "wide.csv"
+    path.write_text("id,notes\n1,short\n2," + "word " * 200 + "\n3,short\n")
+
+    _, sections = service._parse_file(str(path), "wide.csv", "text/csv", "Wide")
+    chunks = [chunk for _, section_chunks in sections for chunk in section_chunks]
+    parts = [chunk for chunk in chunks if chunk["metadata"]["row_start"] == 3]
+
+    assert len(parts) > 1
+    assert [chunk["id"] for chunk in parts] == [f"wide.csv_r3_p{i}" for i in range(len(parts))]
+    assert all(chunk["content"].startswith("Columns: id, notes\n") for chunk in parts)
+    assert all(chunk["metadata"]["citation"] == "wide.csv, Row 3" for chunk in parts)
+
+
+def test_xlsx_sheets_stream_rows_in_read_only_mode(service, settings, tmp_path):
+    openpyxl = pytest.importorskip("openpyxl")
+    settings.EMBEDDING_TOKENIZER = "estimate"
+    settings.CHUNK_SIZE_TOKENS = 60
+    workbook = openpyxl.Workbook()
+    sheet = workbook.active
+    sheet.title = "Prices"
+    sheet.append(["item", "price", None])
+    for i in range(30):
+        sheet.append([f"item {i}", i * 1.5])
+    workbook.create_sheet("Empty")
+    path = tmp_path / "book.xlsx"
+    workbook.save(path)
+
+    metadata, sections = service._parse_file(str(path), "book.xlsx", "", "Book")
+    chunks = [chunk for _, section_chunks in sections for chunk in section_chunks]
+
+    assert metadata["sheets"] == ["Prices", "Empty"]
+    assert len(chunks) > 1
+    assert chunks[0]["content"].startswith("Sheet: Prices\nColumns: item, price\nRow 2: item 0, 0")
+    assert chunks[0]["metadata"]["sheet"] == "Prices"
+    assert chunks[0]["metadata"]["citation"].startswith("Book, Sheet: Prices, Rows 2\u2013")
+    assert chunks[-1]["metadata"]["row_end"] == 31
+
+
+def _ingest(service, monkeypatch, path, file_name):
+    updates = {}
+    monkeypatch.setattr(service.repository, "update", lambda knowledge_id, data: updates.update(data))
+    knowledge = SimpleNamespace(id="k1", name="Notes", user_id=1)
+    service.ingest_file(knowledge, str(path), file_name, "text/plain")
+    return updates
+
+
+def test_file_is_parsed_in_a_worker_process(service, settings, tmp_path, monkeypatch):
+    settings.INGESTION_TEXT_BLOCK_SIZE = 200
+    settings.CHUNK_SIZE_UNIT = "characters"
+    settings.CHUNK_SIZE = 150
+    settings.CHUNK_OVERLAP = 20
+    path = tmp_path / "notes.txt"
+    path.write_text("\n\n".join(f"Paragraph {i} talks about topic {i}." for i in range(40)))
+
+    settings.INGESTION_PARSE_WORKERS = 0
+    inline = _ingest(service, monkeypatch, path, "notes.txt")
+    inline_records = dict(service.collection.records)
+    service.collection = FakeCollection()
+
+    settings.INGESTION_PARSE_WORKERS = 1
+    pooled = _ingest(service, monkeypatch, path, "notes.txt")
+
+    assert pooled["content"] == inline["content"] == path.read_text()
+    assert service.collection.records == inline_records
+    assert set(pooled["ingestion_stats"]["stages"]) == {"parse_seconds", "embed_seconds", "write_seconds"}
+
+
+def test_parse_errors_in_a_worker_process_reach_the_caller(service, settings, tmp_path, monkeypatch):
+    settings.INGESTION_PARSE_WORKERS = 1
+
+    with pytest.raises(FileNotFoundError):
+        _ingest(service, monkeypatch, tmp_path / "missing.txt", "missing.txt")
+
+
+def test_near_duplicate_chunks_reuse_the_stored_embedding(service):
+    manual = "To reset the router hold the power button for ten seconds until the light blinks"
+    service._store_chunks_in_chroma("k1", [{"id": "c0", "content": manual, "metadata": {"chunk": 0}}],
+                                    {"source": "manual-v1.txt", "citation": "manual-v1.txt"}, user_id=1)
+    service.ollama_client.embed_calls.clear()
+
+    stats = service._store_chunks_in_chroma("k2", [
+        {"id": "c0", "content": manual + ".", "metadata": {"chunk": 0}},
+        {"id": "c1", "content": "Warranty terms changed in this edition of the manual", "metadata": {"chunk": 1}},
+    ], {"source": "manual-v2.txt", "citation": "manual-v2.txt"}, user_id=1)
+
+    assert service.ollama_client.embed_calls == [["Warranty terms changed in this edition of the manual"]]
+    assert stats["duplicates"] == 1
+    assert stats["stored"] == 2
+    copy = service.collection.records["k2_c0"]
+    assert copy["metadata"]["duplicate_of"] == "k1_c0"
+    assert copy["metadata"]["source"] == "manual-v2.txt"
+    assert copy["embedding"] == service.collection.records["k1_c0"]["embedding"]
+    assert "duplicate_of" not in service.collection.records["k2_c1"]["metadata"]
+
+
+def test_dedup_can_be_disabled(service, settings):
+    settings.DEDUP_ENABLED = False
+    chunks = [{"id": "c0", "content": "the same words in the same order in two documents", "metadata": {"chunk": 0}}]
+
+    service._store_chunks_in_chroma("k1", chunks, {"source": "a.txt"}, user_id=1)
+    stats = service._store_chunks_in_chroma("k2", chunks, {"source": "b.txt"}, user_id=1)
+
+    assert stats["duplicates"] == 0
+    assert "duplicate_of" not in service.collection.records["k2_c0"]["metadata"]
@@ -0,0 +1,183 @@
+import os
+from datetime import timedelta
+
+import pytest
+from django.utils import timezone
+
+from features.authentication.models import CustomUser
+from features.knowledge.models import IngestionJob, Knowledge
+from features.knowledge.repositories.ingestion_job_repository import IngestionJobRepository
+from features.knowledge.services.ingestion_worker import IngestionWorker, retry_delay
+
+
+@pytest.fixture
+def knowledge(db):
+    user = CustomUser.objects.create_user(
+        username="ingest", email="ingest@example.com", password="password123", name="Ingest"
+    )
+    return Knowledge.objects.create(
+        name="doc", identifier="doc", content="", user=user, status="processing"
+    )
+
+
+@pytest.fixture
+def upload(tmp_path):
+    path = tmp_path / "1" / "doc.txt"
+    path.parent.mkdir()
+    path.write_text("hello")
+    return path
+
+
+def test_enqueue_supersedes_queued_job(knowledge, upload):
+    repository = IngestionJobRepository()
+    newer = upload.parent / "newer.txt"
+    newer.write_text("hello again")
+
+    first = repository.enqueue(knowledge, str(upload), "doc.txt", "text/plain")
+    second = repository.enqueue(knowledge, str(newer), "newer.txt", "text/plain")
+
+    assert first.id == second.id
+    assert IngestionJob.objects.count() == 1
+    assert IngestionJob.objects.get().file_path == str(newer)
+
+
+def test_enqueue_follows_up_running_job(knowledge, upload):
+    repository = IngestionJobRepository()
+    newer = upload.parent / "newer.txt"
+    newer.write_text("hello again")
+    repository.enqueue(knowledge, str(upload), "doc.txt", "text/plain")
+    running = repository.claim_next("worker-a", lease_seconds=60)
+
+    follow_up = repository.enqueue(knowledge, str(newer), "newer.txt", "text/plain")
+
+    assert follow_up.id != running.id
+    assert IngestionJob.objects.get(id=running.id).file_path == str(upload)
+    # Not claimable while the first upload is being ingested
+    assert repository.claim_next("worker-b", lease_seconds=60) is None
+    repository.mark_succeeded(running)
+    assert repository.claim_next("worker-b", lease_seconds=60).id == follow_up.id
+
+
+def test_replacing_a_file_keeps_the_upload_being_parsed(settings, tmp_path, knowledge):
+    from django.core.files.uploadedfile import SimpleUploadedFile
+    from features.knowledge.services.knowledge_service import KnowledgeService
+
+    settings.INGESTION_UPLOAD_DIR = str(tmp_path / "uploads")
+    service = KnowledgeService()
+    first = service._queue_upload(knowledge, SimpleUploadedFile("doc.txt", b"first"))
+    IngestionJobRepository().claim_next("worker-a", lease_seconds=60)
+    second = service._queue_upload(knowledge, SimpleUploadedFile("doc.txt", b"second"))
+    third = service._queue_upload(knowledge, SimpleUploadedFile("doc.txt", b"third"))
+
+    assert first.file_path != second.file_path
+    assert second.id == third.id
+    with open(first.file_path, "rb") as f:
+        assert f.read() == b"first"
+    with open(IngestionJob.objects.get(id=third.id).file_path, "rb") as f:
+        assert f.read() == b"third"
+    # The file of the superseded upload is gone
+    assert not os.path.exists(second.file_path)
+
+
+def test_claim_next_is_exclusive(knowledge, upload):
+    repository = IngestionJobRepository()
+    repository.enqueue(knowledge, str(upload), "doc.txt", "text/plain")
+
+    job = repository.claim_next("worker-a", lease_seconds=60)
+
+    assert job.status == "running"
+    assert job.locked_by == "worker-a"
+    assert repository.claim_next("worker-b", lease_seconds=60) is None
+
+
+def test_claim_next_reclaims_abandoned_job(knowledge, upload):
+    repository = IngestionJobRepository()
+    repository.enqueue(knowledge, str(upload), "doc.txt", "text/plain")
+    job = repository.claim_next("worker-a", lease_seconds=60)
+    IngestionJob.objects.filter(id=job.id).update(heartbeat_at=timezone.now() - timedelta(seconds=120))
+
+    reclaimed = repository.claim_next("worker-b", lease_seconds=60)
+
+    assert reclaimed.id == job.id
+    assert reclaimed.locked_by == "worker-b"
+    assert reclaimed.attempts == 1
+
+
+def test_job_that_keeps_killing_its_worker_fails(settings, knowledge, upload, monkeypatch):
+    settings.INGESTION_JOB_LEASE = 60
+    repository = IngestionJobRepository()
+    repository.enqueue(knowledge, str(upload), "doc.txt", "text/plain", max_attempts=2)
+    processed = []
+    monkeypatch.setattr(
+        "features.knowledge.services.knowledge_service.KnowledgeService.process_ingestion_job",
+        lambda self, job, progress=None: processed.append(job.id),
+    )
+
+    for worker_id in ("worker-a", "worker-b"):
+        job = repository.claim_next(worker_id, lease_seconds=60)
+        IngestionJob.objects.filter(id=job.id).update(heartbeat_at=timezone.now() - timedelta(seconds=120))
+    IngestionWorker(worker_id="worker-c").run(once=True)
+
+    job = IngestionJob.objects.get()
+    knowledge.refresh_from_db()
+    assert job.status == "failed"
+    assert job.attempts == 2
+    assert job.last_error == "Worker worker-b stopped responding"
+    assert knowledge.status == "error"
+    assert not processed
+    assert not upload.exists()
+
+
+def test_failed_job_is_retried_with_backoff(settings, knowledge, upload, monkeypatch):
+    settings.INGESTION_RETRY_BACKOFF = 10
+    repository = IngestionJobRepository()
+    repository.enqueue(knowledge, str(upload), "doc.txt", "text/plain", max_attempts=2)
+
+    def fail(self, job, progress=None):
+        raise RuntimeError("embedding backend down")
+
+    monkeypatch.setattr(
+        "features.knowledge.services.knowledge_service.KnowledgeService.process_ingestion_job", fail
+    )
+    worker = IngestionWorker(worker_id="worker-a")
+
+    assert worker.run_next()
+    job = IngestionJob.objects.get()
+    assert job.status == "queued"
+    assert job.attempts == 1
+    assert job.available_at > timezone.now() + timedelta(seconds=5)
+    assert upload.exists()
+
+    IngestionJob.objects.filter(id=job.id).update(available_at=timezone.now())
+    assert worker.run_next()
+    job.refresh_from_db()
+    knowledge.refresh_from_db()
+    assert job.status == "failed"
+    assert job.last_error == "embedding backend down"
+    assert knowledge.status == "error"
+    assert not upload.exists()
+
+
+def test_successful_job_removes_upload(knowledge, upload, monkeypatch):
+    repository = IngestionJobRepository()
+    repository.enqueue(knowledge, str(upload), "doc.txt", "text/plain")
+
+    def succeed(self, job, progress=None):
+        progress(0.5, "halfway")
+
+    monkeypatch.setattr(
+        "features.knowledge.services.knowledge_service.KnowledgeService.process_ingestion_job", succeed
+    )
+    IngestionWorker(worker_id="worker-a").run(once=True)
+
+    job = IngestionJob.objects.get()
+    assert job.status == "succeeded"
+    assert job.progress == 1.0
+    assert not upload.parent.exists()
+
+
+def test_retry_delay_is_capped(settings):
+    settings.INGESTION_RETRY_BACKOFF = 30
+    settings.INGESTION_RETRY_BACKOFF_MAX = 100
+
+    assert [retry_delay(attempt) for attempt in (1, 2, 3)] == [30, 60, 100]
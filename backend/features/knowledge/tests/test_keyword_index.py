@@ -0,0 +1,68 @@
+import sqlite3
+
+import pytest
+
+from features.knowledge.services.keyword_index import KeywordIndex, tokenize
+
+
+@pytest.fixture
+def index(tmp_path):
+    index = KeywordIndex(str(tmp_path / "keywords.sqlite3"))
+    index.add(1, "k1", ["k1_c0", "k1_c1"], [
+        "Ollama serves embedding models over HTTP.",
+        "The quarterly report covers revenue and revenue growth.",
+    ])
+    index.add(1, "k2", ["k2_c0"], ["Revenue was flat in the previous quarter."])
+    index.add(2, "k3", ["k3_c0"], ["Revenue figures for another user."])
+    return index
+
+
+def test_tokenize_drops_stop_words():
+    assert tokenize("The Revenue, and the GROWTH!") == ["revenue", "growth"]
+
+
+def test_search_ranks_by_bm25(index):
+    ranked = index.search(1, "revenue growth", limit=5)
+
+    assert [chunk_id for chunk_id, _ in ranked] == ["k1_c1", "k2_c0"]
+    assert ranked[0][1] > ranked[1][1] > 0
+
+
+def test_search_is_scoped_to_user(index):
+    assert [chunk_id for chunk_id, _ in index.search(2, "revenue")] == ["k3_c0"]
+    assert index.search(3, "revenue") == []
+
+
+def test_delete_knowledge_removes_postings(index):
+    index.delete_knowledge("k1")
+
+    assert [chunk_id for chunk_id, _ in index.search(1, "revenue")] == ["k2_c0"]
+    assert index.search(1, "ollama") == []
+
+
+def test_readding_a_chunk_replaces_it(index):
+    index.add(1, "k2", ["k2_c0"], ["Nothing relevant here."])
+
+    assert [chunk_id for chunk_id, _ in index.search(1, "revenue")] == ["k1_c1"]
+
+
+def test_backfill_marks_user(index):
+    assert not index.is_backfilled(3)
+
+    index.backfill(3, [("k4_c0", "k4", "Backfilled revenue chunk")])
+
+    assert index.is_backfilled(3)
+    assert [chunk_id for chunk_id, _ in index.search(3, "revenue")] == ["k4_c0"]
+
+
+def test_searches_do_not_wait_for_a_writer(index):
+    writer = sqlite3.connect(index.path, timeout=0, isolation_level=None)
+    writer.execute("BEGIN IMMEDIATE")
+    try:
+        # Read-only calls of another connection must not need the write lock
+        index._local.conn.execute("PRAGMA busy_timeout = 0")
+        assert index.search(1, "revenue", limit=1)
+        assert not index.is_backfilled(1)
+    finally:
+        writer.execute("ROLLBACK")
+        writer.close()
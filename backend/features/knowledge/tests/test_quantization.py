@@ -0,0 +1,71 @@
+import numpy as np
+import pytest
+
+from features.knowledge.services.embedding_cache import EmbeddingCache
+from features.knowledge.services.knowledge_service import KnowledgeService
+from features.knowledge.services.quantization import QuantizedMatrix, decode, encode, fit_dimensions
+
+
+@pytest.mark.parametrize("precision,size,tolerance", [("float32", 64, 0), ("float16", 32, 1e-3), ("int8", 20, 1e-2)])
+def test_encode_round_trip(precision, size, tolerance):
+    vector = np.linspace(-1, 1, 16).tolist()
+
+    blob = encode(vector, precision)
+
+    assert len(blob) == size
+    assert np.allclose(decode(blob, precision), vector, atol=tolerance)
+
+
+def test_fit_dimensions_truncates_and_renormalizes():
+    vectors = np.array([[3.0, 4.0, 12.0], [0.0, 0.0, 1.0]])
+
+    fitted = fit_dimensions(vectors, 2)
+
+    assert fitted.shape == (2, 2)
+    assert np.allclose(fitted[0], [0.6, 0.8])
+    assert np.allclose(fitted[1], [0.0, 0.0])
+    assert fit_dimensions(vectors, 8).shape == (2, 3)
+
+
+def test_int8_search_with_rescoring_matches_exact_search():
+    rng = np.random.default_rng(0)
+    corpus = rng.normal(size=(2000, 64)).astype(np.float32)
+    corpus /= np.linalg.norm(corpus, axis=1, keepdims=True)
+    query = corpus[7] + 0.1 * rng.normal(size=64).astype(np.float32)
+    matrix = QuantizedMatrix(64, "int8")
+    matrix.add(corpus[:1000])
+    matrix.add(corpus[1000:])
+
+    rows, scores = matrix.search(query, 10, rescore=lambda candidates: corpus[candidates] @ query)
+
+    assert list(rows) == list(np.argsort(-(corpus @ query))[:10])
+    assert np.allclose(scores, (corpus @ query)[rows])
+    assert matrix.nbytes == 2000 * 64 + 2000 * 4
+
+
+def test_search_is_limited_to_selected_rows():
+    matrix = QuantizedMatrix(2, "float16")
+    matrix.add([[1.0, 0.0], [0.8, 0.6], [0.0, 1.0]])
+
+    rows, _ = matrix.search([1.0, 0.0], 2, rows=np.array([1, 2]))
+
+    assert list(rows) == [1, 2]
+    assert list(matrix.search([1.0, 0.0], 1, rows=slice(0, 3))[0]) == [0]
+
+
+def test_cache_stores_new_entries_at_its_precision(tmp_path):
+    path = str(tmp_path / "cache.sqlite3")
+    EmbeddingCache(path).put("m", "v", "old", [0.5] * 8)
+    cache = EmbeddingCache(path, precision="float16")
+    cache.put("m", "v", "new", [0.25] * 8)
+
+    assert cache.get_many("m", "v", ["old", "new"]) == [[0.5] * 8, [0.25] * 8]
+    assert cache.stats()["bytes"] == 8 * 4 + 8 * 2
+
+
+def test_embeddings_are_cut_to_configured_dimensions(settings):
+    settings.EMBEDDING_DIMENSIONS = 2
+    service = KnowledgeService()
+
+    assert np.allclose(service._fit_dimensions([3.0, 4.0, 5.0]), [0.6, 0.8])
+    assert service._fit_dimensions([]) == []
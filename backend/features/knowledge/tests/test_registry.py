@@ -0,0 +1,51 @@
+from features.knowledge.registry import DEFAULT_COLLECTION, VectorStoreRegistry, vector_store_registry
+from features.knowledge.services.knowledge_service import KnowledgeService
+
+
+def test_services_share_registry_resources():
+    first = KnowledgeService()
+    second = KnowledgeService()
+
+    assert first.collection is second.collection
+    assert first.collection is vector_store_registry.get_collection(DEFAULT_COLLECTION)
+    assert first.ollama_client is second.ollama_client
+
+
+def test_registry_rebuilds_state_after_fork():
+    registry = VectorStoreRegistry()
+    executor = registry.search_executor
+    assert registry.search_executor is executor
+
+    # Simulate running in a child process forked from this one
+    registry._pid = -1
+
+    assert registry.search_executor is not executor
+    executor.shutdown()
+
+
+def test_search_cache_is_local_and_short_lived_without_a_shared_cache():
+    registry = VectorStoreRegistry()
+
+    cache = registry.search_cache
+
+    assert cache.backend is None
+    assert cache.ttl == 300
+
+
+def test_setup_does_not_open_the_vector_store(monkeypatch):
+    from django.apps import apps
+
+    from features.knowledge.services.parse_pool import init_worker
+
+    opened = []
+    monkeypatch.setattr(vector_store_registry, "initialize", lambda: opened.append(True))
+
+    # Management commands, tests and spawned parse workers run every app's ready()
+    for config in apps.get_app_configs():
+        config.ready()
+    monkeypatch.setattr("django.setup", lambda: None)
+    init_worker()
+    assert opened == []
+
+    vector_store_registry.warm_up()
+    assert opened == [True]
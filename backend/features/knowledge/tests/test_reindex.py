@@ -0,0 +1,244 @@
+import pytest
+
+from features.authentication.models import CustomUser
+from features.knowledge.models import Knowledge, ReindexJob
+from features.knowledge.registry import DEFAULT_COLLECTION, VectorStoreRegistry
+from features.knowledge.services import knowledge_service
+from features.knowledge.services.embedding_cache import text_digest
+from features.knowledge.services.knowledge_service import KnowledgeService
+
+
+class FakeOllamaClient:
+    """Ollama client stand-in that records embed calls"""
+    def __init__(self):
+        self.embed_calls = []
+
+    def embed(self, model, input):
+        self.embed_calls.append(list(input))
+        return {"embeddings": [[float(len(text)), 1.0] for text in input]}
+
+
+@pytest.fixture(params=["chroma", "numpy"])
+def registry(request, settings, tmp_path, monkeypatch):
+    settings.VECTOR_STORE_BACKEND = request.param
+    settings.CHROMA_PERSIST_DIR = str(tmp_path / "chroma")
+    settings.EMBEDDING_MODEL_VERSION = "test"
+    settings.REINDEX_PAGE_SIZE = 2
+    registry = VectorStoreRegistry()
+    monkeypatch.setattr(knowledge_service, "vector_store_registry", registry)
+    return registry
+
+
+@pytest.fixture
+def service(registry):
+    service = KnowledgeService()
+    service.ollama_client = FakeOllamaClient()
+    return service
+
+
+@pytest.fixture
+def documents(db, service):
+    user = CustomUser.objects.create_user(
+        username="reindex", email="reindex@example.com", password="password123", name="Reindex"
+    )
+    documents = []
+    for i in range(5):
+        knowledge = Knowledge.objects.create(
+            name=f"doc {i}", identifier=f"doc-{i}", content=f"Document {i} is about topic {i}.", user=user
+        )
+        service._index_content(knowledge, knowledge.content)
+        documents.append(knowledge)
+    return documents
+
+
+def test_reindex_builds_shadow_collection_and_swaps(service, registry, documents):
+    before = service.collection.count()
+
+    job = service.reindex_all_knowledge()
+
+    assert job.status == "succeeded"
+    assert job.processed_documents == 5
+    assert registry.active_collection_name() == job.collection_name
+    assert KnowledgeService().collection.count() == before
+    # The replaced collection is kept for requests that still use it
+    assert registry.get_collection(DEFAULT_COLLECTION).count() == before
+
+
+def test_interrupted_reindex_resumes_from_checkpoint(service, registry, documents, monkeypatch):
+    checkpoint = service.reindex_repository.checkpoint
+    calls = []
+
+    def crash_after_first_page(job, *args, **kwargs):
+        checkpoint(job, *args, **kwargs)
+        calls.append(job.cursor_id)
+        if len(calls) == 1:
+            raise RuntimeError("worker died")
+
+    monkeypatch.setattr(service.reindex_repository, "checkpoint", crash_after_first_page)
+    with pytest.raises(RuntimeError):
+        service.reindex_all_knowledge()
+
+    assert registry.active_collection_name() == DEFAULT_COLLECTION
+    assert ReindexJob.objects.get().processed_documents == 2
+
+    reindexed = []
+    reindex_document = service._reindex_document
+    monkeypatch.setattr(
+        service, "_reindex_document",
+        lambda knowledge, source, shadow: reindexed.append(knowledge.id) or reindex_document(knowledge, source, shadow),
+    )
+    job = service.reindex_all_knowledge()
+
+    assert reindexed == [knowledge.id for knowledge in documents[2:]]
+    assert job.processed_documents == 5
+    assert registry.active_collection_name() == job.collection_name
+
+
+def test_reindex_drops_documents_deleted_during_build(service, registry, documents, monkeypatch):
+    checkpoint = service.reindex_repository.checkpoint
+
+    def delete_after_first_page(job, *args, **kwargs):
+        checkpoint(job, *args, **kwargs)
+        Knowledge.objects.filter(id=documents[0].id).delete()
+
+    monkeypatch.setattr(service.reindex_repository, "checkpoint", delete_after_first_page)
+    job = service.reindex_all_knowledge()
+
+    shadow = registry.get_collection(job.collection_name)
+    assert not shadow.get(where={"knowledge_id": str(documents[0].id)})["ids"]
+    assert shadow.get(where={"knowledge_id": str(documents[1].id)})["ids"]
+
+
+def test_reindex_keeps_edits_made_before_the_swap(service, registry, documents, monkeypatch):
+    writer = KnowledgeService()
+    writer.ollama_client = FakeOllamaClient()
+    # Opened before the swap, like a request that is already running
+    writer.collection.count()
+    catch_up = service._catch_up_shadow_collection
+    calls = []
+
+    def edit_after_first_catch_up(source, shadow, since):
+        catch_up(source, shadow, since)
+        calls.append(since)
+        if len(calls) == 1:
+            writer.update_knowledge(documents[0].id, {"content": "Document 0 now covers gardening."}, documents[0].user_id)
+
+    monkeypatch.setattr(service, "_catch_up_shadow_collection", edit_after_first_catch_up)
+    job = service.reindex_all_knowledge()
+    writer.update_knowledge(documents[1].id, {"content": "Document 1 now covers cooking."}, documents[1].user_id)
+
+    active = registry.get_active_collection()
+    assert registry.active_collection_name() == job.collection_name
+    assert [text.strip() for text in active.get(where={"knowledge_id": str(documents[0].id)})["documents"]] == [
+        "Document 0 now covers gardening."
+    ]
+    # Writers opened before the swap write to the new collection afterwards
+    assert [text.strip() for text in active.get(where={"knowledge_id": str(documents[1].id)})["documents"]] == [
+        "Document 1 now covers cooking."
+    ]
+
+
+def _parts(knowledge, count, before=None):
+    """Chunk records of ``knowledge``, calling ``before(i)`` ahead of each"""
+    for i in range(count):
+        if before:
+            before(i)
+        text = f"Part {i} of {knowledge.name}."
+        yield (
+            f"{knowledge.id}_part_{i}",
+            text,
+            {"knowledge_id": str(knowledge.id), "user_id": str(knowledge.user_id), "content_hash": text_digest(text)},
+        )
+
+
+def test_reindex_catches_up_with_writes_of_an_unfinished_ingestion(service, registry, documents, monkeypatch):
+    writer = KnowledgeService()
+    writer.ollama_client = FakeOllamaClient()
+    build = service._build_shadow_collection
+
+    def ingest_after_build(*args):
+        build(*args)
+        # Leaves the document's updated_at alone, like an ingestion that has not finished yet
+        writer._store_records(documents[0].id, _parts(documents[0], 2), documents[0].user_id)
+
+    monkeypatch.setattr(service, "_build_shadow_collection", ingest_after_build)
+    job = service.reindex_all_knowledge()
+
+    active = registry.get_active_collection()
+    assert registry.active_collection_name() == job.collection_name
+    assert sorted(active.get(where={"knowledge_id": str(documents[0].id)})["documents"]) == [
+        "Part 0 of doc 0.", "Part 1 of doc 0."
+    ]
+
+
+def test_ingestion_in_progress_does_not_hold_off_the_swap(settings, service, registry, documents):
+    settings.EMBEDDING_BATCH_SIZE = 2
+    settings.REINDEX_FENCE_TIMEOUT = 5
+    writer = KnowledgeService()
+    writer.ollama_client = FakeOllamaClient()
+    jobs = []
+
+    def reindex_midway(i):
+        if i == 2:
+            jobs.append(service.reindex_all_knowledge())
+
+    writer._store_records(documents[0].id, _parts(documents[0], 4, reindex_midway), documents[0].user_id)
+
+    assert jobs[0].status == "succeeded"
+    active = registry.get_active_collection()
+    assert registry.active_collection_name() == jobs[0].collection_name
+    # Batches written after the swap land in the new collection
+    assert sorted(active.get(where={"knowledge_id": str(documents[0].id)})["documents"]) == [
+        f"Part {i} of doc 0." for i in range(4)
+    ]
+
+
+def test_fenced_catch_up_covers_only_the_latest_edits(service, registry, documents, monkeypatch):
+    writer = KnowledgeService()
+    writer.ollama_client = FakeOllamaClient()
+    checkpoint = service.reindex_repository.checkpoint
+    passes = []
+
+    def edit_during_build(job, *args, **kwargs):
+        checkpoint(job, *args, **kwargs)
+        writer.update_knowledge(documents[4].id, {"content": "Document 4 now covers sailing."}, documents[4].user_id)
+
+    catch_up = service._catch_up_shadow_collection
+
+    def record_pass(source, shadow, since):
+        passes.append([])
+        catch_up(source, shadow, since)
+
+    reindex_document = service._reindex_document
+
+    def record_document(knowledge, source, shadow):
+        if passes:
+            passes[-1].append(knowledge.id)
+        return reindex_document(knowledge, source, shadow)
+
+    monkeypatch.setattr(service.reindex_repository, "checkpoint", edit_during_build)
+    monkeypatch.setattr(service, "_catch_up_shadow_collection", record_pass)
+    monkeypatch.setattr(service, "_reindex_document", record_document)
+    service.reindex_all_knowledge()
+
+    assert passes == [[documents[4].id], []]
+
+
+def test_swap_waits_for_writes_in_progress(settings, service, registry, documents):
+    settings.REINDEX_FENCE_TIMEOUT = 0.2
+    settings.REINDEX_FENCE_POLL = 0.01
+
+    with registry.collection_writes():
+        with pytest.raises(TimeoutError):
+            service.reindex_all_knowledge()
+
+    assert registry.active_collection_name() == DEFAULT_COLLECTION
+    assert ReindexJob.objects.get().status == "failed"
+    # The fence is lifted, so writers go ahead again
+    assert registry.collection_aliases.begin_write(DEFAULT_COLLECTION, "writer")
+
+
+def test_fence_holds_off_new_writes(registry, db):
+    with registry.collection_fence(holder="reindex"):
+        assert not registry.collection_aliases.begin_write(DEFAULT_COLLECTION, "writer")
+    assert registry.collection_aliases.begin_write(DEFAULT_COLLECTION, "writer")
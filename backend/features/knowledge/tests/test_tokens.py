@@ -0,0 +1,112 @@
+import logging
+
+from features.knowledge.registry import VectorStoreRegistry
+from features.knowledge.services.knowledge_service import KnowledgeService
+from features.knowledge.services.tokens import (
+    EstimateTokenizer,
+    embedding_max_tokens,
+    embedding_tokenizer,
+    get_tokenizer,
+    register_tokenizer,
+)
+
+
+class WordTokenizer(EstimateTokenizer):
+    """One token per whitespace-separated word"""
+    name = "words"
+
+    def _count(self, text):
+        return len(text.split())
+
+    def truncate(self, text, max_tokens):
+        words = text.split()
+        if len(words) <= max_tokens:
+            return text
+        return text[:text.index(words[max_tokens])]
+
+
+def test_estimate_truncate_stays_within_budget():
+    tokenizer = EstimateTokenizer()
+    text = "alpha, beta; gamma delta " * 200
+
+    truncated = tokenizer.truncate(text, 50)
+
+    assert text.startswith(truncated)
+    assert 40 < tokenizer.count(truncated) <= 50
+
+
+def test_split_covers_text_with_overlap():
+    tokenizer = get_tokenizer("estimate")
+    text = " ".join(f"word{i}" for i in range(500))
+
+    pieces = tokenizer.split(text, 40, overlap=10)
+
+    assert all(tokenizer.count(piece) <= 40 for piece in pieces)
+    assert pieces[0] == text[:len(pieces[0])]
+    assert pieces[-1].endswith("word499")
+    assert pieces[1].split()[0] in pieces[0]
+
+
+def test_counts_are_cached():
+    tokenizer = EstimateTokenizer(cache_size=8)
+    tokenizer.count("some text to count")
+    tokenizer.count("some text to count")
+
+    assert tokenizer._cached_count.cache_info().hits == 1
+
+
+def test_registered_tokenizer_and_model_limits(settings):
+    register_tokenizer("words", WordTokenizer)
+    settings.EMBEDDING_TOKENIZER = "words"
+    settings.EMBEDDING_MODEL = "mxbai-embed-large:latest"
+
+    assert isinstance(embedding_tokenizer(), WordTokenizer)
+    assert embedding_max_tokens() == 512
+
+    settings.EMBEDDING_MAX_TOKENS = 100
+    assert embedding_max_tokens() == 100
+
+
+def test_embedding_input_is_cut_to_the_window_with_a_warning(settings, caplog):
+    settings.EMBEDDING_TOKENIZER = "features.knowledge.tests.test_tokens.WordTokenizer"
+    settings.EMBEDDING_MAX_TOKENS = 5
+
+    with caplog.at_level(logging.WARNING):
+        fitted = KnowledgeService()._fit_embedding_window("one two three four five six seven")
+
+    assert fitted == "one two three four five "
+    assert "from 7 to 5 tokens" in caplog.text
+
+
+class FakeOllama:
+    def __init__(self, parameters=""):
+        self.parameters = parameters
+        self.calls = 0
+
+    def show(self, model):
+        self.calls += 1
+        return {"parameters": self.parameters, "model_info": {"nomic-bert.context_length": 2048}}
+
+
+def test_ollama_window_is_the_served_context_less_a_margin(settings, monkeypatch):
+    settings.EMBEDDING_MODEL = "nomic-embed-text"
+    settings.EMBEDDING_TOKEN_MARGIN = 0.1
+    for name in ("EMBEDDING_TOKENIZER", "EMBEDDING_MAX_TOKENS", "USE_SENTENCE_TRANSFORMERS"):
+        if hasattr(settings, name):
+            delattr(settings, name)
+    registry = VectorStoreRegistry()
+    registry._ollama_client = FakeOllama(parameters="num_ctx 8192\nstop <eos>")
+    monkeypatch.setattr("features.knowledge.registry.vector_store_registry", registry)
+
+    # num_ctx is capped by the trained context; counts come from a stand-in tokenizer
+    assert embedding_max_tokens() == 1843
+    assert registry.ollama_client.calls == 1
+
+    settings.OLLAMA_DEFAULT_NUM_CTX = 1024
+    other = VectorStoreRegistry()
+    other._ollama_client = FakeOllama()
+    assert other.resolve_context_length("nomic-embed-text") == 1024
+
+    settings.EMBEDDING_TOKENIZER = "words"
+    register_tokenizer("words", WordTokenizer)
+    assert embedding_max_tokens() == 2048
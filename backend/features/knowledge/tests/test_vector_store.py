@@ -0,0 +1,177 @@
+import numpy as np
+import pytest
+
+from features.knowledge.registry import VectorStoreRegistry
+from features.knowledge.services.vector_store import NumpyVectorStore, matches
+
+
+def _chunk(user_id, knowledge_id, chunk):
+    return {"user_id": str(user_id), "knowledge_id": str(knowledge_id), "chunk": chunk}
+
+
+@pytest.fixture
+def store(tmp_path):
+    store = NumpyVectorStore(str(tmp_path / "collection"))
+    store.upsert(
+        ids=["a", "b", "c", "d"],
+        embeddings=[[1.0, 0.0, 0.0], [0.0, 2.0, 0.0], [1.0, 1.0, 0.0], [0.0, 0.0, 3.0]],
+        documents=["alpha", "beta", "gamma", "delta"],
+        metadatas=[_chunk(1, 10, 0), _chunk(1, 10, 1), _chunk(1, 11, 0), _chunk(2, 20, 0)],
+    )
+    return store
+
+
+def test_query_returns_nearest_chunks_of_the_user(store):
+    results = store.query(query_embeddings=[[1.0, 0.1, 0.0]], n_results=2, where={"user_id": "1"})
+
+    assert results["ids"] == [["a", "c"]]
+    assert results["documents"] == [["alpha", "gamma"]]
+    assert results["metadatas"][0][0] == _chunk(1, 10, 0)
+    expected = 1 - np.dot([1.0, 0.1, 0.0], [1.0, 0.0, 0.0]) / np.linalg.norm([1.0, 0.1, 0.0])
+    assert results["distances"][0][0] == pytest.approx(expected, abs=1e-6)
+
+
+def test_query_never_returns_other_users_chunks(store):
+    results = store.query(query_embeddings=[[0.0, 0.0, 1.0]], n_results=10, where={"user_id": "1"})
+
+    assert set(results["ids"][0]) == {"a", "b", "c"}
+    assert store.query(query_embeddings=[[0.0, 0.0, 1.0]], n_results=1)["ids"] == [["d"]]
+
+
+def test_query_with_filter_scores_only_selected_rows(store):
+    where = {"$and": [{"user_id": "1"}, {"knowledge_id": {"$in": ["10"]}}]}
+
+    results = store.query(query_embeddings=[[1.0, 0.5, 0.0]], n_results=5, where=where)
+
+    assert results["ids"] == [["a", "b"]]
+    assert store.query(query_embeddings=[[1.0, 0.0, 0.0]], n_results=5, where={"chunk": {"$gt": 0}})["ids"] == [["b"]]
+
+
+def test_get_by_ids_and_filter(store):
+    by_ids = store.get(ids=["c", "missing", "a"], include=["metadatas", "embeddings"])
+    assert sorted(by_ids["ids"]) == ["a", "c"]
+    embeddings = dict(zip(by_ids["ids"], by_ids["embeddings"]))
+    assert embeddings["c"] == pytest.approx([1.0, 1.0, 0.0])
+
+    by_filter = store.get(where={"knowledge_id": "10"}, include=["documents"])
+    assert by_filter["ids"] == ["a", "b"]
+    assert by_filter["documents"] == ["alpha", "beta"]
+    assert by_filter["metadatas"] is None
+
+    page = store.get(limit=2, offset=1)
+    assert page["ids"] == ["b", "c"]
+
+
+def test_delete_by_filter_frees_rows_for_reuse(store):
+    store.delete(where={"knowledge_id": "10"})
+
+    assert store.count() == 2
+    assert store.query(query_embeddings=[[1.0, 0.0, 0.0]], n_results=5, where={"user_id": "1"})["ids"] == [["c"]]
+
+    store.add(ids=["e"], embeddings=[[0.0, 1.0, 0.0]], documents=["epsilon"], metadatas=[_chunk(1, 12, 0)])
+    assert store.query(query_embeddings=[[0.0, 1.0, 0.0]], n_results=1, where={"user_id": "1"})["ids"] == [["e"]]
+    assert store.count() == 3
+
+
+def test_upsert_replaces_and_update_merges_metadata(store):
+    store.upsert(ids=["a"], embeddings=[[0.0, 0.0, 1.0]], documents=["alpha 2"], metadatas=[_chunk(2, 10, 0)])
+    store.update(ids=["b"], metadatas=[{"citation": "Page 2"}])
+
+    assert store.count() == 4
+    # "a" moved to user 2's matrix
+    assert "a" not in store.query(query_embeddings=[[1.0, 0.0, 0.0]], n_results=5, where={"user_id": "1"})["ids"][0]
+    assert set(store.query(query_embeddings=[[0.0, 0.0, 1.0]], n_results=5, where={"user_id": "2"})["ids"][0]) == {"a", "d"}
+    assert store.get(ids=["b"])["metadatas"] == [{**_chunk(1, 10, 1), "citation": "Page 2"}]
+
+
+def test_add_skips_existing_ids(store):
+    store.add(ids=["a"], embeddings=[[0.0, 1.0, 0.0]], documents=["other"], metadatas=[_chunk(1, 10, 0)])
+
+    assert store.get(ids=["a"])["documents"] == ["alpha"]
+
+
+def test_store_persists_and_grows(tmp_path):
+    path = str(tmp_path / "collection")
+    store = NumpyVectorStore(path)
+    rng = np.random.default_rng(3)
+    vectors = rng.normal(size=(2500, 8)).astype(np.float32)
+    ids = [f"c{i}" for i in range(len(vectors))]
+    for start in range(0, len(ids), 1000):
+        store.upsert(
+            ids=ids[start:start + 1000],
+            embeddings=vectors[start:start + 1000].tolist(),
+            documents=ids[start:start + 1000],
+            metadatas=[_chunk(1, 1, i) for i in range(start, min(start + 1000, len(ids)))],
+        )
+
+    reopened = NumpyVectorStore(path)
+    results = reopened.query(query_embeddings=[vectors[1234].tolist()], n_results=3, where={"user_id": "1"})
+
+    assert reopened.count() == 2500
+    assert results["ids"][0][0] == "c1234"
+    assert results["distances"][0][0] == pytest.approx(0.0, abs=1e-5)
+
+
+@pytest.mark.parametrize("precision", ["float16", "int8"])
+def test_reduced_precision_search_rescores_at_full_precision(tmp_path, precision):
+    rng = np.random.default_rng(5)
+    vectors = rng.normal(size=(3000, 32)).astype(np.float32)
+    exact = NumpyVectorStore(str(tmp_path / "exact"))
+    store = NumpyVectorStore(str(tmp_path / precision), precision=precision)
+    for collection in (exact, store):
+        collection.upsert(
+            ids=[f"c{i}" for i in range(len(vectors))],
+            embeddings=vectors.tolist(),
+            documents=[f"c{i}" for i in range(len(vectors))],
+            metadatas=[_chunk(i % 2, 1, i) for i in range(len(vectors))],
+        )
+    query = (vectors[42] + 0.3 * rng.normal(size=32)).tolist()
+
+    expected = exact.query(query_embeddings=[query], n_results=10, where={"user_id": "0"})
+    results = store.query(query_embeddings=[query], n_results=10, where={"user_id": "0"})
+
+    assert results["ids"] == expected["ids"]
+    assert results["distances"][0] == pytest.approx(expected["distances"][0], abs=1e-6)
+
+
+def test_reduced_precision_copy_follows_writes_of_other_processes(tmp_path):
+    path = str(tmp_path / "collection")
+    store = NumpyVectorStore(path, precision="int8", oversample=1)
+    store.upsert(ids=["a", "b"], embeddings=[[1.0, 0.0], [0.0, 1.0]], documents=["a", "b"],
+                 metadatas=[_chunk(1, 1, 0), _chunk(1, 1, 1)])
+    assert store.query(query_embeddings=[[1.0, 0.2]], n_results=1)["ids"] == [["a"]]
+
+    # Another handle stands in for another worker process
+    other = NumpyVectorStore(path)
+    other.upsert(ids=["a"], embeddings=[[0.0, -1.0]], documents=["a"], metadatas=[_chunk(1, 1, 0)])
+    other.upsert(ids=["c"], embeddings=[[0.9, 0.1]], documents=["c"], metadatas=[_chunk(1, 1, 2)])
+
+    assert store.query(query_embeddings=[[1.0, 0.2]], n_results=1)["ids"] == [["c"]]
+
+
+def test_mismatched_dimensions_are_rejected(store):
+    with pytest.raises(ValueError):
+        store.upsert(ids=["x"], embeddings=[[1.0, 0.0]], documents=["x"], metadatas=[_chunk(1, 1, 0)])
+
+
+def test_matches_supports_chroma_operators():
+    metadata = {"user_id": "1", "page": 3}
+
+    assert matches({"$and": [{"user_id": "1"}, {"page": {"$gte": 3}}]}, metadata)
+    assert matches({"$or": [{"user_id": "2"}, {"page": {"$in": [1, 3]}}]}, metadata)
+    assert not matches({"page": {"$ne": 3}}, metadata)
+    assert not matches({"user_id": 1}, metadata)
+
+
+def test_registry_opens_and_deletes_numpy_collections(settings, tmp_path):
+    settings.VECTOR_STORE_BACKEND = "numpy"
+    settings.VECTOR_STORE_DIR = str(tmp_path / "vectors")
+    registry = VectorStoreRegistry()
+
+    collection = registry.get_collection("shadow")
+    collection.upsert(ids=["a"], embeddings=[[1.0, 0.0]], documents=["a"], metadatas=[_chunk(1, 1, 0)])
+
+    assert isinstance(collection, NumpyVectorStore)
+    assert registry.list_collections() == ["shadow"]
+    registry.delete_collection("shadow")
+    assert registry.list_collections() == []
@@ -266,3 +266,34 @@ class KnowledgeViewSet(viewsets.ModelViewSet):
                 status=status.HTTP_500_INTERNAL_SERVER_ERROR,
                 request=request,
             )
+
+    @action(detail=True, methods=["post"], parser_classes=[MultiPartParser, FormParser])
+    def reupload(self, request, pk=None):
+        """Replace the file of a knowledge document; only changed chunks are re-embedded"""
+        if "file" not in request.FILES:
+            return api_response(
+                error={"code": "VALIDATION_ERROR", "message": "File is required"},
+                status=status.HTTP_400_BAD_REQUEST,
+                request=request,
+            )
+
+        try:
+            knowledge = self.service.replace_knowledge_file(pk, request.user, request.FILES["file"])
+            serializer = self.get_serializer(knowledge)
+            return api_response(data=serializer.data, request=request)
+        except NotFoundException as e:
+            return api_response(
+                error={"code": "KNOWLEDGE_NOT_FOUND", "message": str(e)},
+                status=status.HTTP_404_NOT_FOUND,
+                request=request,
+            )
+        except Exception as e:
+            return api_response(
+                error={
+                    "code": "UPLOAD_ERROR",
+                    "message": "Failed to replace file",
+                    "details": str(e),
+                },
+                status=status.HTTP_500_INTERNAL_SERVER_ERROR,
+                request=request,
+            )
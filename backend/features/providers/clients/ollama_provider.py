@@ -2,7 +2,6 @@ import json
 import logging
 from timeit import default_timer as timer
 from typing import AnyStr, Dict, List, Union, Generator
-import time
 
 from ollama import Client as OllamaClient
 
@@ -11,9 +10,13 @@ from features.providers.clients.base_provider import BaseProvider
 from api.utils.exceptions.exceptions import ServiceError
 from features.tools.models import Tool
 from features.tools.services.tool_service import ToolService
+from api.services.cache_service import CacheService
 
 logger = logging.getLogger(__name__)
 
+# Model lists, shared by all provider instances and workers
+_models_cache = CacheService("ollama_models", ttl=300, stale_ttl=3600)
+
 
 def normalize_endpoint(endpoint: str) -> str:
     """
@@ -46,10 +49,6 @@ class OllamaProvider(BaseProvider):
         self._cancel_event = None
         self.logger = logger
         self.tool_service = ToolService()
-        # Add caching for models
-        self._models_cache = None
-        self._models_cache_time = 0
-        self._models_cache_ttl = 300  # 5 minutes
         super().__init__(analytics_service=AnalyticsEventService())
 
     def update_config(self, config: Dict) -> None:
@@ -307,42 +306,39 @@ class OllamaProvider(BaseProvider):
             self.logger.info("Ollama provider is not enabled; skipping model loading.")
             return []
             
-        # Check cache first
-        current_time = time.time()
-        if self._models_cache is not None and current_time - self._models_cache_time < self._models_cache_ttl:
-            self.logger.info("Using cached Ollama models")
-            return self._models_cache
-            
         try:
-            model_list = self._client.list()
-            models = []
-            
-            for model in model_list.get("models", []):
-                model_name = model.get("name")
-                # Dynamically check if the model supports tools
-                tools_enabled = self.supports_tools(model_name)
-                
-                models.append({
-                    "id": f"{model_name}-{model.get('digest')}",
-                    "name": model_name,
-                    "model": model.get("model"),
-                    "max_input_tokens": 2048,
-                    "max_output_tokens": 2048,
-                    "vision_enabled": False,
-                    "embedding_enabled": False,
-                    "tools_enabled": tools_enabled,
-                    "provider": "ollama",
-                })
-            
-            # Update cache
-            self._models_cache = models
-            self._models_cache_time = current_time
-            
-            return models
+            return _models_cache.get_or_set(
+                CacheService.cache_key("models", self.config["endpoint"]),
+                self._fetch_models,
+            )
         except Exception as e:
             self.logger.error(f"Error fetching models: {str(e)}")
             return []
 
+    def _fetch_models(self) -> List[Dict]:
+        """Fetch the model list from Ollama, bypassing the cache"""
+        model_list = self._client.list()
+        models = []
+        
+        for model in model_list.get("models", []):
+            model_name = model.get("name")
+            # Dynamically check if the model supports tools
+            tools_enabled = self.supports_tools(model_name)
+            
+            models.append({
+                "id": f"{model_name}-{model.get('digest')}",
+                "name": model_name,
+                "model": model.get("model"),
+                "max_input_tokens": 2048,
+                "max_output_tokens": 2048,
+                "vision_enabled": False,
+                "embedding_enabled": False,
+                "tools_enabled": tools_enabled,
+                "provider": "ollama",
+            })
+        
+        return models
+
     def calculate_cost(self, tokens: Dict[str, int], model: str) -> float:
         """
         Calculate the cost for a request.
@@ -2,7 +2,6 @@ import base64
 import logging
 from typing import AnyStr, Dict, List, Optional, Union
 from timeit import default_timer as timer
-import time
 
 from django.conf import settings
 from openai import Client
@@ -10,9 +9,13 @@ import json
 
 from features.providers.clients.base_provider import BaseProvider
 from features.analytics.services.analytics_service import AnalyticsEventService
+from api.services.cache_service import CacheService
 
 logger = logging.getLogger(__name__)
 
+# Model lists, shared by all provider instances and workers
+_models_cache = CacheService("openai_models", ttl=300, stale_ttl=3600)
+
 
 class OpenAiProvider(BaseProvider):
     def __init__(self, config: dict) -> None:
@@ -28,10 +31,6 @@ class OpenAiProvider(BaseProvider):
         self._client = Client(api_key=_api_key)
         # Optionally store the complete configuration for future reference.
         self.config = config.copy()
-        # Add caching for models
-        self._models_cache = None
-        self._models_cache_time = 0
-        self._models_cache_ttl = 300  # 5 minutes
         super().__init__(analytics_service=AnalyticsEventService())
 
     def chat(self, model: str, messages: Union[List, AnyStr]):
@@ -197,51 +196,48 @@ class OpenAiProvider(BaseProvider):
             self.logger.info("OpenAI provider is not enabled; skipping model loading.")
             return []
             
-        # Check cache first
-        current_time = time.time()
-        if self._models_cache is not None and current_time - self._models_cache_time < self._models_cache_ttl:
-            self.logger.info("Using cached OpenAI models")
-            return self._models_cache
-            
         try:
-            model_list = self._client.models.list()
-            models = []
-            
-            # Predefined lists for model capabilities
-            vision_models = ["gpt-4-vision", "gpt-4-turbo-vision", "gpt-4o", "gpt-4o-mini"]
-            embedding_models = ["text-embedding", "text-embedding-ada", "text-embedding-3"]
-            
-            for model in model_list:
-                # Check if the model supports tools using our optimized method
-                tools_enabled = self.supports_tools(model.id)
-                
-                # Check if the model supports vision using our predefined list
-                vision_enabled = any(vm in model.id for vm in vision_models)
-                
-                # Check if the model is for embeddings
-                embedding_enabled = any(em in model.id for em in embedding_models)
-                
-                models.append({
-                    "id": f"{model.id}-openai",
-                    "name": model.id,
-                    "model": model.id,
-                    "max_input_tokens": getattr(model, "max_input_tokens", 2048),
-                    "max_output_tokens": getattr(model, "max_output_tokens", 2048),
-                    "vision_enabled": vision_enabled,
-                    "embedding_enabled": embedding_enabled,
-                    "tools_enabled": tools_enabled,
-                    "provider": "openai",
-                })
-            
-            # Update cache
-            self._models_cache = models
-            self._models_cache_time = current_time
-            
-            return models
+            return _models_cache.get_or_set(
+                CacheService.cache_key("models", self.config.get("endpoint"), self.config.get("api_key")),
+                self._fetch_models,
+            )
         except Exception as e:
             self.logger.error(f"Error fetching models: {str(e)}")
             return []
 
+    def _fetch_models(self) -> List[Dict]:
+        """Fetch the model list from OpenAI, bypassing the cache"""
+        model_list = self._client.models.list()
+        models = []
+        
+        # Predefined lists for model capabilities
+        vision_models = ["gpt-4-vision", "gpt-4-turbo-vision", "gpt-4o", "gpt-4o-mini"]
+        embedding_models = ["text-embedding", "text-embedding-ada", "text-embedding-3"]
+        
+        for model in model_list:
+            # Check if the model supports tools using our optimized method
+            tools_enabled = self.supports_tools(model.id)
+            
+            # Check if the model supports vision using our predefined list
+            vision_enabled = any(vm in model.id for vm in vision_models)
+            
+            # Check if the model is for embeddings
+            embedding_enabled = any(em in model.id for em in embedding_models)
+            
+            models.append({
+                "id": f"{model.id}-openai",
+                "name": model.id,
+                "model": model.id,
+                "max_input_tokens": getattr(model, "max_input_tokens", 2048),
+                "max_output_tokens": getattr(model, "max_output_tokens", 2048),
+                "vision_enabled": vision_enabled,
+                "embedding_enabled": embedding_enabled,
+                "tools_enabled": tools_enabled,
+                "provider": "openai",
+            })
+        
+        return models
+
     def model(self): ...
 
     def generate(self): ...
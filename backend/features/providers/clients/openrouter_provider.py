@@ -2,7 +2,6 @@ import base64
 import logging
 from typing import AnyStr, Dict, List, Optional, Union
 from timeit import default_timer as timer
-import time
 import json
 
 from django.conf import settings
@@ -10,9 +9,13 @@ from openai import Client
 
 from features.providers.clients.base_provider import BaseProvider
 from features.analytics.services.analytics_service import AnalyticsEventService
+from api.services.cache_service import CacheService
 
 logger = logging.getLogger(__name__)
 
+# Model lists, shared by all provider instances and workers
+_models_cache = CacheService("openrouter_models", ttl=300, stale_ttl=3600)
+
 
 class OpenRouterProvider(BaseProvider):
     def __init__(self, config: dict) -> None:
@@ -32,9 +35,6 @@ class OpenRouterProvider(BaseProvider):
         )
         
         self.config = config.copy()
-        self._models_cache = None
-        self._models_cache_time = 0
-        self._models_cache_ttl = 300  # 5 minutes
         super().__init__(analytics_service=AnalyticsEventService())
 
     def update_config(self, config: Dict) -> None:
@@ -178,85 +178,84 @@ class OpenRouterProvider(BaseProvider):
             self.logger.info("OpenRouter provider is not enabled; skipping model loading.")
             return []
             
-        current_time = time.time()
-        if self._models_cache is not None and current_time - self._models_cache_time < self._models_cache_ttl:
-            self.logger.info("Using cached OpenRouter models")
-            return self._models_cache
-            
         try:
-            # OpenRouter model list is available at /models
-            response = self._client.models.list()
-            model_list = response.data
-            
-            models = []
-            for model in model_list:
-                # Parse the actual provider from the model ID
-                provider_name = self._extract_provider_from_model_id(model.id)
-                
-                # Extract architecture information
-                architecture = getattr(model, 'architecture', {})
-                input_modalities = architecture.get('input_modalities', ['text'])
-                output_modalities = architecture.get('output_modalities', ['text'])
-                
-                # Check capabilities
-                vision_enabled = (
-                    'image' in input_modalities or 
-                    'vision' in model.id.lower() or 
-                    'gpt-4o' in model.id.lower() or 
-                    'claude-3' in model.id.lower() or
-                    '#multimodal' in getattr(model, 'description', '').lower()
-                )
-                
-                # Check for tools support
-                supported_parameters = getattr(model, 'supported_parameters', [])
-                tools_enabled = 'tools' in supported_parameters or 'tool_choice' in supported_parameters
-                
-                # Get pricing information
-                pricing = getattr(model, 'pricing', {})
-                
-                # Get top provider info for max tokens
-                top_provider = getattr(model, 'top_provider', {})
-                max_completion_tokens = top_provider.get('max_completion_tokens', 4096)
-                
-                models.append({
-                    "id": f"{model.id}-openrouter", # Unique ID for our system
-                    "name": getattr(model, 'name', model.id),
-                    "model": model.id,
-                    "description": getattr(model, 'description', ''),
-                    "max_input_tokens": getattr(model, 'context_length', 4096),
-                    "max_output_tokens": max_completion_tokens if max_completion_tokens else 4096,
-                    "vision_enabled": vision_enabled,
-                    "embedding_enabled": "embed" in model.id.lower(),
-                    "tools_enabled": tools_enabled,
-                    "provider": provider_name,  # Use the extracted provider name
-                    "via_openrouter": True,  # Flag to indicate this model is accessed via OpenRouter
-                    
-                    # Additional rich metadata
-                    "context_length": getattr(model, 'context_length', 4096),
-                    "pricing": {
-                        "prompt": float(pricing.get('prompt', '0')),
-                        "completion": float(pricing.get('completion', '0')),
-                        "image": float(pricing.get('image', '0')) if pricing.get('image') else None,
-                    },
-                    "architecture": {
-                        "modality": architecture.get('modality', 'text->text'),
-                        "input_modalities": input_modalities,
-                        "output_modalities": output_modalities,
-                        "tokenizer": architecture.get('tokenizer', 'Unknown'),
-                    },
-                    "supported_parameters": supported_parameters,
-                    "is_moderated": top_provider.get('is_moderated', False),
-                    "canonical_slug": getattr(model, 'canonical_slug', model.id),
-                })
-            
-            self._models_cache = models
-            self._models_cache_time = current_time
-            
-            return models
+            return _models_cache.get_or_set(
+                CacheService.cache_key("models", self.config.get("api_key")),
+                self._fetch_models,
+            )
         except Exception as e:
             self.logger.error(f"Error fetching OpenRouter models: {str(e)}")
             return []
 
+    def _fetch_models(self) -> List[Dict]:
+        """Fetch the model list from OpenRouter, bypassing the cache"""
+        # OpenRouter model list is available at /models
+        response = self._client.models.list()
+        model_list = response.data
+        
+        models = []
+        for model in model_list:
+            # Parse the actual provider from the model ID
+            provider_name = self._extract_provider_from_model_id(model.id)
+            
+            # Extract architecture information
+            architecture = getattr(model, 'architecture', {})
+            input_modalities = architecture.get('input_modalities', ['text'])
+            output_modalities = architecture.get('output_modalities', ['text'])
+            
+            # Check capabilities
+            vision_enabled = (
+                'image' in input_modalities or 
+                'vision' in model.id.lower() or 
+                'gpt-4o' in model.id.lower() or 
+                'claude-3' in model.id.lower() or
+                '#multimodal' in getattr(model, 'description', '').lower()
+            )
+            
+            # Check for tools support
+            supported_parameters = getattr(model, 'supported_parameters', [])
+            tools_enabled = 'tools' in supported_parameters or 'tool_choice' in supported_parameters
+            
+            # Get pricing information
+            pricing = getattr(model, 'pricing', {})
+            
+            # Get top provider info for max tokens
+            top_provider = getattr(model, 'top_provider', {})
+            max_completion_tokens = top_provider.get('max_completion_tokens', 4096)
+            
+            models.append({
+                "id": f"{model.id}-openrouter", # Unique ID for our system
+                "name": getattr(model, 'name', model.id),
+                "model": model.id,
+                "description": getattr(model, 'description', ''),
+                "max_input_tokens": getattr(model, 'context_length', 4096),
+                "max_output_tokens": max_completion_tokens if max_completion_tokens else 4096,
+                "vision_enabled": vision_enabled,
+                "embedding_enabled": "embed" in model.id.lower(),
+                "tools_enabled": tools_enabled,
+                "provider": provider_name,  # Use the extracted provider name
+                "via_openrouter": True,  # Flag to indicate this model is accessed via OpenRouter
+                
+                # Additional rich metadata
+                "context_length": getattr(model, 'context_length', 4096),
+                "pricing": {
+                    "prompt": float(pricing.get('prompt', '0')),
+                    "completion": float(pricing.get('completion', '0')),
+                    "image": float(pricing.get('image', '0')) if pricing.get('image') else None,
+                },
+                "architecture": {
+                    "modality": architecture.get('modality', 'text->text'),
+                    "input_modalities": input_modalities,
+                    "output_modalities": output_modalities,
+                    "tokenizer": architecture.get('tokenizer', 'Unknown'),
+                },
+                "supported_parameters": supported_parameters,
+                "is_moderated": top_provider.get('is_moderated', False),
+                "canonical_slug": getattr(model, 'canonical_slug', model.id),
+            })
+        
+        return models
+
     def _extract_provider_from_model_id(self, model_id: str) -> str:
         """
         Extract the actual provider name from the OpenRouter model ID.
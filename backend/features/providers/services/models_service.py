@@ -9,6 +9,7 @@ import os
 from concurrent.futures import ThreadPoolExecutor, as_completed
 
 from features.providers.clients.provider_factory import provider_factory
+from api.services.cache_service import CacheService
 from api.utils.exceptions import ServiceError
 
 logger = logging.getLogger(__name__)
@@ -16,6 +17,9 @@ logger = logging.getLogger(__name__)
 # Dictionary to store download tasks and their status
 download_tasks = {}
 
+# Models of each provider per user, shared by all workers
+_models_cache = CacheService("provider_models", ttl=300, stale_ttl=3600)
+
 class DownloadTask:
     def __init__(self, model_name, user_id):
         self.id = uuid.uuid4()
@@ -33,9 +37,7 @@ class ModelsService:
     def __init__(self):
         self.logger = logging.getLogger(__name__)
         # Cache for models to avoid repeated API calls
-        self._models_cache = {}
-        self._cache_timestamp = {}
-        self._cache_ttl = 300  # 5 minutes cache TTL
+        self._models_cache = _models_cache
 
     def get_provider_models(self, user_id: int, provider_type: str = None) -> Dict[str, List[str]]:
         """
@@ -57,17 +59,13 @@ class ModelsService:
                 providers = ["ollama", "openai", "google", "anthropic", "openrouter"]
             
             # Check cache first
-            current_time = time.time()
             models = {}
             providers_to_fetch = []
             
             for provider_name in providers:
-                cache_key = f"{provider_name}_{user_id}"
-                if (cache_key in self._models_cache and 
-                    current_time - self._cache_timestamp.get(cache_key, 0) < self._cache_ttl):
-                    # Use cached models if available and not expired
-                    self.logger.info(f"Using cached models for {provider_name}")
-                    models[provider_name] = self._models_cache[cache_key]
+                cached = self._models_cache.get(f"{provider_name}:{user_id}")
+                if cached is not None:
+                    models[provider_name] = cached
                 else:
                     # Need to fetch this provider
                     providers_to_fetch.append(provider_name)
@@ -76,23 +74,22 @@ class ModelsService:
             if providers_to_fetch:
                 self.logger.info(f"Fetching models for providers: {providers_to_fetch}")
                 
-                # Use ThreadPoolExecutor to fetch models in parallel
+                # Use ThreadPoolExecutor to fetch models in parallel; concurrent
+                # requests for the same provider and user share one fetch
                 with ThreadPoolExecutor(max_workers=len(providers_to_fetch)) as executor:
                     future_to_provider = {
-                        executor.submit(self._fetch_provider_models, provider_name, user_id): provider_name
+                        executor.submit(
+                            self._models_cache.get_or_set,
+                            f"{provider_name}:{user_id}",
+                            lambda provider_name=provider_name: self._fetch_provider_models(provider_name, user_id),
+                        ): provider_name
                         for provider_name in providers_to_fetch
                     }
                     
                     for future in as_completed(future_to_provider):
                         provider_name = future_to_provider[future]
                         try:
-                            provider_models = future.result()
-                            models[provider_name] = provider_models
-                            
-                            # Update cache
-                            cache_key = f"{provider_name}_{user_id}"
-                            self._models_cache[cache_key] = provider_models
-                            self._cache_timestamp[cache_key] = current_time
+                            models[provider_name] = future.result()
                         except Exception as e:
                             self.logger.warning(f"Failed to fetch models for {provider_name}: {str(e)}")
                             models[provider_name] = []
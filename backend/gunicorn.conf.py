@@ -0,0 +1,21 @@
+# Gunicorn settings, read from the working directory on startup; command-line
+# flags still take precedence.
+import os
+
+# Import the app once in the master so workers share its memory copy-on-write,
+# notably the weights of the local embedding model (USE_SENTENCE_TRANSFORMERS).
+# Set GUNICORN_PRELOAD=0 to import it in each worker instead.
+preload_app = os.environ.get("GUNICORN_PRELOAD", "1") == "1"
+
+if preload_app:
+    # Tells settings.asgi not to run inference before the fork
+    os.environ["SERVER_PRELOAD"] = "1"
+
+
+def post_fork(server, worker):
+    # Run the first inference and open the vector store in the worker before it accepts requests
+    from features.knowledge.registry import vector_store_registry
+    from features.knowledge.services.embedding_model import embedding_model
+
+    embedding_model.preload()
+    vector_store_registry.warm_up()
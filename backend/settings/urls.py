@@ -1,6 +1,7 @@
 from django.contrib import admin
 from django.urls import include, path
 
+from api.views import health, ready
 from features.agents.urls import router as agents_router
 from features.authentication.urls import router as auth_router
 from features.completions.urls import router as completions_router
@@ -28,5 +29,7 @@ api_v1_patterns = [
 
 urlpatterns = [
     path("admin/", admin.site.urls),
+    path("api/health/", health, name="health"),
+    path("api/ready/", ready, name="ready"),
     path("api/v1/", include(api_v1_patterns)),
 ]
@@ -14,3 +14,14 @@ from django.core.wsgi import get_wsgi_application
 os.environ.setdefault("DJANGO_SETTINGS_MODULE", "settings.settings")
 
 application = get_wsgi_application()
+
+# Load the local embedding model before serving. Under gunicorn --preload this
+# runs once in the master and workers share the weights; gunicorn.conf.py warms
+# each worker up after the fork and opens its vector store.
+from features.knowledge.registry import vector_store_registry  # noqa: E402
+from features.knowledge.services.embedding_model import embedding_model  # noqa: E402
+
+preloading = os.environ.get("SERVER_PRELOAD") == "1"
+embedding_model.preload(warm_up=not preloading)
+if not preloading:
+    vector_store_registry.warm_up()
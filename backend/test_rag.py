@@ -168,17 +168,7 @@ def test_rag_functionality():
         try:
             print(f"\nProcessing {file_type.upper()} file: {file_info['name']}")
             
-            # Read file content
-            with open(file_info['path'], 'rb') as f:
-                file_content = f.read()
-            
-            # Create file info dictionary
-            file_data = {
-                'name': file_info['name'],
-                'content_type': file_info['content_type'],
-                'size': len(file_content),
-                'content': file_content
-            }
+            file_size = os.path.getsize(file_info['path'])
             
             # Create knowledge document
             knowledge = knowledge_service.create_knowledge({
@@ -186,7 +176,7 @@ def test_rag_functionality():
                 "identifier": f"test_{file_type}_knowledge_{django.utils.timezone.now().timestamp()}",
                 "content": "",  # Will be populated by the document processor
                 "file_path": file_info['name'],
-                "file_size": len(file_content),
+                "file_size": file_size,
                 "file_type": file_info['content_type'],
                 "status": "processing",
             }, user)
@@ -194,7 +184,7 @@ def test_rag_functionality():
             print(f"Created knowledge document: {knowledge.name} (ID: {knowledge.id})")
             
             # Process the file
-            knowledge_service._process_file_with_content(knowledge, file_data)
+            knowledge_service.ingest_file(knowledge, file_info['path'], file_info['name'], file_info['content_type'])
             
             # Verify the knowledge document was updated
             knowledge = knowledge_service.get_knowledge(knowledge.id, user.id)
@@ -253,7 +243,7 @@ def test_rag_functionality():
             
             # Test context preparation in chat service
             print("\nTesting context preparation...")
-            context = chat_service._prepare_context(query, user.id, knowledge_ids=knowledge_ids)
+            context = chat_service._prepare_context(query, user.id, knowledge_ids=knowledge_ids).context
             print(f"Context length: {len(context)}")
             print(f"Context preview: {context[:200]}...")
             